@@ -8,7 +8,10 @@ Run locally with:
 from __future__ import annotations
 
 import datetime
+import hashlib
 import json
+import os
+import time
 from pathlib import Path
 
 import streamlit as st
@@ -16,18 +19,23 @@ import streamlit as st
 from pipeline import (
     precheck,
     parse,
-    profile,
-    topics,
-    alignment,
-    domains,
-    coupling,
-    dynamics,
+    jobs,
+    profiling,
+    runner,
 )
+from pipeline.cache import DEFAULT_MAX_BYTES as STAGE_CACHE_MAX_BYTES
 
 # Persistent session output root (committed as empty dir; contents git-ignored)
 TEMP_OUT = Path(__file__).parent / "temp_out"
 TEMP_OUT.mkdir(exist_ok=True)
 
+# Content-addressed stage results shared by every session ("Run all stages")
+STAGE_CACHE = TEMP_OUT / ".stage_cache"
+
+# Background job table + worker log (see pipeline.jobs); stages run there, not in this script
+JOBS_DIR = TEMP_OUT / ".jobs"
+JOB_POLL_S = 1.0
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Page config
 # ─────────────────────────────────────────────────────────────────────────────
@@ -66,7 +74,8 @@ st.markdown("""
 defaults = {
     "json_tmp_path":      None,
     "work_dir":           None,   # temp dir holding the SQLite db + CSVs
-    "upload_fingerprint": (),     # (name, size) tuples — detects upload set changes
+    "upload_fingerprint": (),     # (name, size, sha256) tuples — detects upload set changes
+    "upload_digests":     {},     # (name, size, file_id) → sha256, so reruns don't re-hash
     "upload_info":        None,   # dict with n_files / n_convs / n_dupes for display
     "precheck_result":    None,
     "parse_result":     None,
@@ -76,12 +85,27 @@ defaults = {
     "domains_result":   None,
     "coupling_result":  None,
     "dynamics_result":  None,
+    "drift_result":     None,
+    "applied_job":      None,   # last finished job whose results are in the session
+    "job_notice":       None,   # failures / cancellation of that job, shown at its step
 }
 for key, val in defaults.items():
     if key not in st.session_state:
         st.session_state[key] = val
 
 
+def _upload_key(f) -> tuple:
+    return (f.name, f.size, getattr(f, "file_id", None))
+
+
+def _upload_digest(f) -> str:
+    """SHA-256 of an uploaded file, hashed once per upload rather than on every rerun."""
+    digests = st.session_state.upload_digests
+    if _upload_key(f) not in digests:
+        digests[_upload_key(f)] = hashlib.sha256(f.getvalue()).hexdigest()
+    return digests[_upload_key(f)]
+
+
 def _reset_downstream(from_step: str):
     """Clear all state at and after a given step so reruns start fresh."""
     order = [
@@ -93,6 +117,7 @@ def _reset_downstream(from_step: str):
         "domains_result",
         "coupling_result",
         "dynamics_result",
+        "drift_result",
     ]
     clear = False
     for key in order:
@@ -102,6 +127,115 @@ def _reset_downstream(from_step: str):
             st.session_state[key] = None
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Background jobs
+# ─────────────────────────────────────────────────────────────────────────────
+# Stages run in the pipeline.jobs worker process.  Each script run reads the
+# work directory's latest job from the on-disk table: while it is queued or
+# running its step shows progress and a Cancel button, and the script reruns
+# every JOB_POLL_S; once it has finished its results are copied into the
+# session.  The work directory's name is kept in the URL (?session=), so a
+# browser refresh or reconnect rebuilds the session from its jobs.
+
+def _apply_job(job: dict) -> None:
+    """Copy a finished job's stage results into the session (once per job)."""
+    if job["job_id"] == st.session_state.applied_job:
+        return
+    st.session_state.applied_job = job["job_id"]
+    notice = {"stages": job["stages"], "status": job["status"],
+              "error": job["error"], "failures": {}}
+    loaded = jobs.load_results(JOBS_DIR, job["job_id"])
+    if loaded is not None:
+        summary, results = loaded
+        for stage, result in results.items():
+            if f"{stage}_result" in defaults:
+                st.session_state[f"{stage}_result"] = result
+        notice["failures"] = {rec["stage"]: rec["error"]
+                              for rec in summary["stages"] if rec["status"] == "failed"}
+    st.session_state.job_notice = notice
+
+
+def _restore_session() -> None:
+    """After a browser reconnect, rebuild the session from ?session= and its jobs."""
+    name = st.query_params.get("session")
+    if st.session_state.work_dir or not name:
+        return
+    work_dir = TEMP_OUT / name
+    if (work_dir.resolve().parent != TEMP_OUT.resolve()
+            or not (work_dir / "upload.json").is_file()):
+        return
+    st.session_state.work_dir      = str(work_dir)
+    st.session_state.json_tmp_path = str(work_dir / "upload.json")
+    st.session_state.precheck_result = precheck.run(st.session_state.json_tmp_path)
+    for job in jobs.list_jobs(JOBS_DIR, work_dir=work_dir):
+        if job["status"] in jobs.FINISHED:
+            _apply_job(job)
+
+
+def _active_job() -> dict | None:
+    """The work directory's queued or running job (with a worker to run it), else None."""
+    if not st.session_state.work_dir:
+        return None
+    job = jobs.latest(JOBS_DIR, st.session_state.work_dir)
+    if job is None:
+        return None
+    if job["status"] in jobs.ACTIVE:
+        jobs.ensure_worker(JOBS_DIR)
+        return job
+    _apply_job(job)
+    return None
+
+
+def _stage_job(label: str, key: str, stages: list[str], config: dict | None = None,
+               n_workers: int = 1, cache_dir: Path | None = None, **button) -> None:
+    """
+    A step's run button: submits *stages* as a background job, and shows the
+    job's progress and a Cancel button in its place while it runs.
+    """
+    if ACTIVE_JOB is not None:
+        if ACTIVE_JOB["stages"] == stages:
+            if ACTIVE_JOB["status"] == "queued":
+                text = "Waiting for the background worker…"
+            elif len(stages) > 1 and ACTIVE_JOB["stage"]:
+                text = f"{ACTIVE_JOB['stage']}: {ACTIVE_JOB['message']}"
+            else:
+                text = ACTIVE_JOB["message"] or "Starting…"
+            st.progress(min(max(ACTIVE_JOB["fraction"], 0.0), 1.0), text=text)
+            if st.button("Cancel", key=f"{key}_cancel"):
+                jobs.cancel(JOBS_DIR, ACTIVE_JOB["job_id"])
+                st.rerun()
+        return
+
+    notice = st.session_state.job_notice
+    if notice:
+        for stage, error in notice["failures"].items():
+            if stage in stages:
+                st.error(f"{stage.capitalize()} failed: {error}", icon="❌")
+        if notice["stages"] == stages:
+            if notice["status"] == "cancelled":
+                st.warning("Run cancelled.", icon="⚠️")
+            elif notice["status"] == "failed" and not notice["failures"]:
+                st.error(f"Run failed: {notice['error']}", icon="❌")
+
+    if st.button(label, key=key, **button):
+        jobs.submit(
+            JOBS_DIR,
+            st.session_state.json_tmp_path,
+            st.session_state.work_dir,
+            stages=stages,
+            config=config,
+            n_workers=n_workers,
+            cache_dir=cache_dir,
+            cache_max_bytes=STAGE_CACHE_MAX_BYTES,
+        )
+        st.session_state.job_notice = None
+        st.rerun()
+
+
+_restore_session()
+ACTIVE_JOB = _active_job()
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Header
 # ─────────────────────────────────────────────────────────────────────────────
@@ -154,11 +288,16 @@ uploaded_files = st.file_uploader(
     ),
 )
 
-# Fingerprint of the current upload set (name + size), used to detect changes
+# Fingerprint of the current upload set (name + size + content hash), used to detect changes
 _current_fp = (
-    tuple(sorted((f.name, f.size) for f in uploaded_files))
+    tuple(sorted((f.name, f.size, _upload_digest(f)) for f in uploaded_files))
     if uploaded_files else ()
 )
+# Drop the digests of files no longer in the uploader
+_live = {_upload_key(f) for f in uploaded_files or ()}
+st.session_state.upload_digests = {
+    k: v for k, v in st.session_state.upload_digests.items() if k in _live
+}
 _stored_fp = st.session_state.get("upload_fingerprint", ())
 
 # Re-process whenever the upload set is non-empty AND has changed
@@ -181,6 +320,7 @@ if uploaded_files and _current_fp != _stored_fp:
         json_path.write_text(json.dumps(merged), encoding="utf-8")
 
         st.session_state.upload_fingerprint = _current_fp
+        st.query_params["session"]          = work_dir.name
         st.session_state.json_tmp_path      = str(json_path)
         st.session_state.work_dir           = str(work_dir)
         st.session_state.upload_info        = {
@@ -189,6 +329,7 @@ if uploaded_files and _current_fp != _stored_fp:
             "n_dupes": n_dupes,
         }
         _reset_downstream("precheck_result")
+        st.session_state.job_notice = None
 
     except ValueError as exc:
         st.error(str(exc), icon="❌")
@@ -258,6 +399,19 @@ if st.session_state.json_tmp_path:
 
         if r.ready:
             st.success("Data looks good — ready to parse.", icon="✅")
+
+            if st.session_state.parse_result is None:
+                st.caption(
+                    "Run every analysis stage in one go (independent stages run in "
+                    "parallel, and stages already computed for this export with the "
+                    "same settings are reused), or step through them one by one below."
+                )
+                _stage_job(
+                    "Run all stages", "btn_run_all",
+                    [s for s in runner.STAGES if s != "report"],
+                    n_workers=runner.DEFAULT_WORKERS,
+                    cache_dir=STAGE_CACHE,
+                )
         else:
             st.error(
                 "Data does not meet minimum requirements. See warnings above.",
@@ -273,22 +427,11 @@ if st.session_state.precheck_result and st.session_state.precheck_result.ready:
     st.subheader("3. Parse conversations")
 
     if st.session_state.parse_result is None:
-        if st.button("Parse", type="primary", key="btn_parse"):
-            db_path = Path(st.session_state.work_dir) / "conversations.db"
-            bar = st.progress(0.0, text="Starting parse…")
-            try:
-                result = parse.run(
-                    json_path=st.session_state.json_tmp_path,
-                    db_path=db_path,
-                    fmt=st.session_state.precheck_result.format,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.parse_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Parse failed: {exc}", icon="❌")
+        _stage_job(
+            "Parse", "btn_parse", ["parse"],
+            config={"parse": {"fmt": st.session_state.precheck_result.format}},
+            type="primary",
+        )
 
     if st.session_state.parse_result:
         p = st.session_state.parse_result
@@ -320,22 +463,7 @@ if st.session_state.parse_result:
     st.subheader("4. Cognitive style profile")
 
     if st.session_state.profile_result is None:
-        if st.button("Run profile", type="primary", key="btn_profile"):
-            db_path = Path(st.session_state.work_dir) / "conversations.db"
-            out_dir = Path(st.session_state.work_dir) / "profile"
-            bar = st.progress(0.0, text="Starting profile…")
-            try:
-                result = profile.run(
-                    db_path=db_path,
-                    out_dir=out_dir,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.profile_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Profile failed: {exc}", icon="❌")
+        _stage_job("Run profile", "btn_profile", ["profile"], type="primary")
 
     if st.session_state.profile_result:
         import pandas as pd
@@ -346,23 +474,28 @@ if st.session_state.parse_result:
             f"{len(pr['markers'])} markers.",
             icon="✅",
         )
+        if "scoring" in pr:
+            sc = pr["scoring"]
+            st.caption(
+                f"Scored {sc['messages']:,} user messages in {sc['seconds']:.2f}s "
+                f"with {sc['n_workers']} worker(s) — {sc['msgs_per_sec']:,.0f} msgs/sec."
+            )
 
         traj_path = Path(st.session_state.work_dir) / "profile" / "trajectory_monthly.csv"
         if traj_path.exists():
             traj = pd.read_csv(traj_path)
             st.markdown("**Monthly marker rates (per 1,000 user messages)**")
-            display_cols = [
-                "year_month", "user_messages",
-                "structural_thinking_per1k",
-                "epistemic_uncertainty_per1k",
-            ]
+            per1k_cols = [c for c in traj.columns if c.endswith("_per1k")]
+            display_cols = ["year_month", "user_messages"] + per1k_cols
             display_cols = [c for c in display_cols if c in traj.columns]
             st.dataframe(
                 traj[display_cols].rename(columns={
-                    "year_month":                  "Month",
-                    "user_messages":               "Messages",
-                    "structural_thinking_per1k":   "Structural thinking /1k",
-                    "epistemic_uncertainty_per1k": "Epistemic uncertainty /1k",
+                    "year_month":    "Month",
+                    "user_messages": "Messages",
+                    **{
+                        c: c[: -len("_per1k")].replace("_", " ").capitalize() + " /1k"
+                        for c in per1k_cols
+                    },
                 }),
                 width="stretch",
                 hide_index=True,
@@ -401,22 +534,7 @@ if st.session_state.profile_result:
             "This step may take 1–3 minutes on large datasets.",
             icon="ℹ️",
         )
-        if st.button("Run topic modelling", type="primary", key="btn_topics"):
-            db_path = Path(st.session_state.work_dir) / "conversations.db"
-            out_dir = Path(st.session_state.work_dir)
-            bar = st.progress(0.0, text="Starting topic modelling…")
-            try:
-                result = topics.run(
-                    db_path=db_path,
-                    out_dir=out_dir,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.topics_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Topic modelling failed: {exc}", icon="❌")
+        _stage_job("Run topic modelling", "btn_topics", ["topics"], type="primary")
 
     if st.session_state.topics_result:
         import pandas as pd
@@ -461,22 +579,7 @@ if st.session_state.topics_result:
             "(Jensen-Shannon divergence — lower = more in sync).",
             icon="ℹ️",
         )
-        if st.button("Run alignment", type="primary", key="btn_alignment"):
-            db_path = Path(st.session_state.work_dir) / "conversations.db"
-            out_dir = Path(st.session_state.work_dir)
-            bar = st.progress(0.0, text="Computing dyadic alignment…")
-            try:
-                result = alignment.run(
-                    db_path=db_path,
-                    out_dir=out_dir,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.alignment_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Alignment failed: {exc}", icon="❌")
+        _stage_job("Run alignment", "btn_alignment", ["alignment"], type="primary")
 
     if st.session_state.alignment_result:
         import pandas as pd
@@ -498,6 +601,8 @@ if st.session_state.topics_result:
                     "user_msgs":     "Your msgs",
                     "asst_msgs":     "AI msgs",
                     "js_divergence": "JS divergence",
+                    "js_ci_lower":   "95% CI low",
+                    "js_ci_upper":   "95% CI high",
                 }),
                 width="stretch",
                 hide_index=True,
@@ -520,22 +625,7 @@ if st.session_state.alignment_result:
             "This step re-runs TF-IDF for labelling and may take 1–3 minutes.",
             icon="ℹ️",
         )
-        if st.button("Run domain mapping", type="primary", key="btn_domains"):
-            db_path = Path(st.session_state.work_dir) / "conversations.db"
-            out_dir = Path(st.session_state.work_dir)
-            bar = st.progress(0.0, text="Building macro-domain map…")
-            try:
-                result = domains.run(
-                    db_path=db_path,
-                    out_dir=out_dir,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.domains_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Domain mapping failed: {exc}", icon="❌")
+        _stage_job("Run domain mapping", "btn_domains", ["domains"], type="primary")
 
     if st.session_state.domains_result:
         import pandas as pd
@@ -576,20 +666,7 @@ if st.session_state.domains_result:
             "permutation p-values (N=2,000).",
             icon="ℹ️",
         )
-        if st.button("Run coupling analysis", type="primary", key="btn_coupling"):
-            out_dir = Path(st.session_state.work_dir)
-            bar = st.progress(0.0, text="Computing lead-lag coupling…")
-            try:
-                result = coupling.run(
-                    out_dir=out_dir,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.coupling_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Coupling analysis failed: {exc}", icon="❌")
+        _stage_job("Run coupling analysis", "btn_coupling", ["coupling"], type="primary")
 
     if st.session_state.coupling_result:
         import pandas as pd
@@ -641,22 +718,7 @@ if st.session_state.domains_result:
             "tests who initiates domain shifts within conversations.",
             icon="ℹ️",
         )
-        if st.button("Run dynamics analysis", type="primary", key="btn_dynamics"):
-            db_path = Path(st.session_state.work_dir) / "conversations.db"
-            out_dir = Path(st.session_state.work_dir)
-            bar = st.progress(0.0, text="Running dynamics analysis…")
-            try:
-                result = dynamics.run(
-                    db_path=db_path,
-                    out_dir=out_dir,
-                    progress_cb=lambda f, m: bar.progress(f, text=m),
-                )
-                bar.empty()
-                st.session_state.dynamics_result = result
-                st.rerun()
-            except Exception as exc:
-                bar.empty()
-                st.error(f"Dynamics analysis failed: {exc}", icon="❌")
+        _stage_job("Run dynamics analysis", "btn_dynamics", ["dynamics"], type="primary")
 
     if st.session_state.dynamics_result:
         import pandas as pd
@@ -675,12 +737,29 @@ if st.session_state.domains_result:
         if "user_initiated_prop" in dyn:
             u_pct  = round(dyn["user_initiated_prop"] * 100, 1)
             a_pct  = round((1.0 - dyn["user_initiated_prop"]) * 100, 1)
-            p_perm = dyn.get("p_perm", "—")
+            p_val  = dyn.get("p_vs_random", "—")
             total  = dyn.get("total_shifts", "—")
             st.markdown(
                 f"**Domain shift initiation** ({total} total shifts) — "
                 f"You: **{u_pct}%** | AI: **{a_pct}%** "
-                f"(permutation p vs 50/50 = {p_perm})"
+                f"(binomial p vs 50/50 = {p_val})"
+            )
+
+        if "episode_user_initiated_prop" in dyn:
+            u_pct = round(dyn["episode_user_initiated_prop"] * 100, 1)
+            st.markdown(
+                f"**Episode initiation** ({dyn.get('episodes', '—')} episodes in "
+                f"{dyn.get('episode_threads', '—')} long threads) — "
+                f"You: **{u_pct}%** | AI: **{round(100 - u_pct, 1)}%** "
+                f"(binomial p vs 50/50 = {dyn.get('episode_p_vs_random', '—')})"
+            )
+
+        if "scale_eta_sq_user" in dyn:
+            st.caption(
+                f"Scale separation over {dyn.get('scale_months', '—')} months: "
+                f"{dyn['scale_eta_sq_user'] * 100:.2f}% of your domain variance is "
+                f"month-to-month drift (AI: {dyn['scale_eta_sq_asst'] * 100:.2f}%); "
+                "the rest is within-month churn."
             )
 
         # Monthly states table
@@ -736,6 +815,7 @@ if st.session_state.dynamics_result:
         "States",
         "Coupling",
         "Shifts",
+        "Drift",
     ])
 
     with tabs[0]:
@@ -793,6 +873,26 @@ if st.session_state.dynamics_result:
             st.plotly_chart(charts.shift_initiation_donut(shift_df),
                             width="stretch")
 
+    with tabs[8]:
+        # "Run all stages" includes drift; after stepping through one by one
+        # it runs here, as a background job like every other stage
+        if not (work / "topic_drift_macro_user.csv").exists():
+            _stage_job("Compute topic drift", "btn_drift", ["drift"])
+        else:
+            drift_level = st.radio(
+                "Topics", ["macro", "fine"], horizontal=True, key="drift_level",
+                format_func=lambda v: "Macro-domains" if v == "macro" else "Fine topics",
+            )
+            for role, who in (("user", "Your"), ("assistant", "The AI's")):
+                drift_df = _csv(f"topic_drift_{drift_level}_{role}.csv")
+                if not drift_df.empty:
+                    st.plotly_chart(
+                        charts.topic_drift_heatmap(
+                            drift_df, title=f"{who} Topic Drift Between Months",
+                        ),
+                        width="stretch",
+                    )
+
     # ── Generate HTML report ──────────────────────────────────────────────────
     st.divider()
     st.markdown("### 📄 Export Report")
@@ -837,6 +937,63 @@ if st.session_state.dynamics_result:
         except Exception as exc:
             st.error(f"Report generation failed: {exc}", icon="❌")
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Timing panel — per-step timing / memory / rows from pipeline.instrument
+# ─────────────────────────────────────────────────────────────────────────────
+
+_timings = []
+for _stage in ("precheck", "parse", "profile", "topics", "alignment",
+               "domains", "coupling", "dynamics", "drift"):
+    _res = st.session_state[f"{_stage}_result"]
+    _inst = (_res.get("instrumentation") if isinstance(_res, dict)
+             else getattr(_res, "instrumentation", None))
+    if _inst:
+        _timings.append(_inst)
+
+if _timings and st.session_state.work_dir:
+    import pandas as pd
+
+    st.divider()
+    with st.expander("⏱ Stage timings", expanded=False):
+        st.dataframe(
+            pd.DataFrame([{
+                "Stage":         t["stage"] + (" (cached)" if t.get("cached") else ""),
+                "Wall (s)":      t["wall_s"],
+                "CPU (s)":       t["cpu_s"],
+                "Peak RSS (MB)": t["peak_rss_mb"],
+            } for t in _timings]),
+            width="stretch",
+            hide_index=True,
+        )
+        st.dataframe(
+            pd.DataFrame([{
+                "Stage":          t["stage"],
+                "Step":           s["name"],
+                "Wall (s)":       s["wall_s"],
+                "CPU (s)":        s["cpu_s"],
+                "Peak RSS (MB)":  s["peak_rss_mb"],
+                "Py alloc (MB)":  s["py_peak_mb"],
+                "Rows in":        s["rows_in"],
+                "Rows out":       s["rows_out"],
+            } for t in _timings for s in t["steps"]]),
+            width="stretch",
+            hide_index=True,
+        )
+        # The runner writes the trace of each job's full run; the panel only points at it
+        trace_path = Path(st.session_state.work_dir) / runner.TRACE_FILE
+        if trace_path.is_file():
+            st.caption(
+                f"Chrome trace of the last run: `{trace_path}` — open it in chrome://tracing "
+                "or ui.perfetto.dev.  Cached stages show the timings of the run "
+                "that filled the cache."
+            )
+        if profiling.mode():
+            st.caption(
+                f"Profiling is on (`{profiling.PROFILE_ENV}={profiling.mode()}`): per-stage "
+                "dumps and collapsed stacks are in "
+                f"`{os.environ.get(profiling.PROFILE_DIR_ENV) or Path(st.session_state.work_dir) / 'profiles'}`."
+            )
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Footer
 # ─────────────────────────────────────────────────────────────────────────────
@@ -847,6 +1004,11 @@ st.caption(
     "[github.com/RayanBVasse/DOL_Analyser](https://github.com/RayanBVasse/DOL_Analyser)"
 )
 
+# A stage is running in the background worker: poll its progress
+if ACTIVE_JOB is not None:
+    time.sleep(JOB_POLL_S)
+    st.rerun()
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # CLI entry point
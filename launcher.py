@@ -6,10 +6,16 @@ When frozen by PyInstaller this module:
   2. Opens the default browser after a short delay
   3. Starts the Streamlit server on localhost:8501
 
+Started with pipeline.jobs.FROZEN_ARG as its first argument it runs the
+background job CLI instead (ensure_worker() launches the worker this way,
+as a frozen executable has no ``-m``).  multiprocessing.freeze_support()
+lets the job and stage processes start from the bundled executable too.
+
 When run from source (python launcher.py) it behaves identically to run.sh/run.bat.
 """
 from __future__ import annotations
 
+import multiprocessing
 import os
 import sys
 import threading
@@ -31,6 +37,11 @@ def _open_browser(port: int = 8501, delay: float = 4.0) -> None:
 
 
 def main() -> None:
+    # Background job worker started by pipeline.jobs.ensure_worker()
+    from pipeline import jobs  # noqa: PLC0415
+    if sys.argv[1:2] == [jobs.FROZEN_ARG]:
+        sys.exit(jobs.main(sys.argv[2:]))
+
     port = 8501
 
     # Streamlit environment flags
@@ -57,4 +68,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
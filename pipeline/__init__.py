@@ -7,9 +7,23 @@ Stages:
     2. profile    — cognitive style markers (Steps 3–4)
     3. topics     — TF-IDF topic modelling, cluster labelling (Steps 5–6)
     4. alignment  — dyadic JS divergence (Step 7)
+       drift      — month-by-month topic drift matrices (Step 7b)
     5. domains    — macro-domain mapping (Steps 8.5–8.6)
-    6. robustness — null model permutation tests (Step 8r)
+       threads    — per-thread feature table, refreshed incrementally (Step 8.7)
+    6. robustness — K × SVD grid search, null model permutation tests (Step 8r)
     7. coupling   — weekly/monthly lead-lag coupling (Steps 9–9.1)
     8. dynamics   — scale separation, state segmentation, rolling entropy,
                     episode initiation (Steps 10a/b)
+
+Orchestration:
+    scheduler     — runs stages by their DEPENDS_ON, independent ones in parallel
+    runner        — headless run of every stage with a per-stage timing summary
+    cache         — content-addressed, LRU-bounded cache of stage outputs
+    instrument    — per-step timing / memory / row counts, Chrome trace export
+    profiling     — opt-in cProfile / sampling profiles per stage (DOL_PROFILE)
+    synthetic     — synthetic ChatGPT / Claude exports of any size
+    benchmark     — per-stage time and memory at 10k–1M messages vs a baseline
+    equivalence   — optimised modes vs the reference: CSV tolerances, cluster ARI
+    jobs          — on-disk job table + worker process the app runs stages in
+    db            — shared SQLite connection (WAL + busy timeout)
 """
@@ -2,36 +2,150 @@
 Step 7 — Dyadic alignment.
 
 Reads fine-cluster assignments already stored in SQLite by topics.py
-(node_to_fine_cluster table) and computes the monthly Jensen-Shannon
-divergence between user and assistant topic distributions.
+(node_to_fine_cluster table) and computes the Jensen-Shannon divergence
+between user and assistant topic distributions per period.
 
 Lower JS divergence = the two roles are covering more similar topics
-that month (more "in sync"). Higher = more divergent agendas.
+that period (more "in sync"). Higher = more divergent agendas.
+
+All periods are computed in one batched array operation: messages are
+coded to (period, role, cluster) integers, reduced to count matrices with
+a single bincount, and the divergence is evaluated for every row at once.
+Rolling windows reuse the same count matrices through cumulative sums.
+
+Monthly values carry a percentile bootstrap interval: each month's user
+and assistant count vectors are resampled multinomially, all months and a
+block of replicates in a single draw.  Plug-in JS is biased upwards when
+counts are sparse, so for small months the interval can sit above the
+point estimate — its width is the useful signal there.
 
 Outputs (out_dir):
-    dyadic_alignment_monthly.csv  — month, user_msgs, asst_msgs, js_divergence
+    dyadic_alignment_monthly.csv            — year_month, user_msgs, asst_msgs, js_divergence,
+                                              js_ci_lower, js_ci_upper
+    dyadic_alignment_weekly.csv             — same, keyed by week_start (Monday)
+    dyadic_alignment_daily.csv              — same, keyed by date (if "day" requested)
+    dyadic_alignment_{period}_rolling{W}.csv — W-period rolling windows, keyed by
+                                               the last period in the window
 """
 
 from __future__ import annotations
 
-import sqlite3
 from pathlib import Path
 from typing import Callable, Optional
 
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import jensenshannon
 
-MIN_MSGS_PER_ROLE = 50   # skip months where either role has too few messages
+from pipeline.db import connect
+from pipeline.distributions import (
+    PERIOD_COLUMNS,
+    bootstrap_js_interval,
+    count_matrix,
+    js_distance,
+    period_codes,
+    rolling_sum,
+)
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+
+DEPENDS_ON = ("topics",)   # node_to_fine_cluster
+OUTPUT_FILES = ("dyadic_alignment_*.csv",)
+
+MIN_MSGS_PER_ROLE = 50   # skip periods where either role has too few messages
+
+DEFAULT_CONFIG = {
+    "periods":           ["month", "week"],   # any of "month", "week", "day"
+    "rolling_windows":   {"week": 4},         # period → window length in periods
+    "min_msgs_per_role": MIN_MSGS_PER_ROLE,
+    "n_bootstrap":       1_000,   # monthly bootstrap replicates (0 = no interval)
+    "ci_level":          0.95,
+    "random_seed":       42,
+}
+
+_FILE_SUFFIX = {"month": "monthly", "week": "weekly", "day": "daily"}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _role_counts(
+    df: pd.DataFrame,
+    period: str,
+    n_clusters: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-period cluster counts for each role.
+
+    Returns (user_counts, asst_counts, labels) where both count matrices
+    are (n_periods × n_clusters).
+    """
+    valid, codes, labels = period_codes(df, period)
+    n_periods = len(labels)
+    is_user = (df["role"].to_numpy() == "user")[valid]
+    cluster = df["cluster_id"].to_numpy(dtype=np.int64)[valid]
+
+    # One bincount over (role, period, cluster) keys
+    counts = count_matrix(
+        is_user.astype(np.int64) * n_periods + codes,
+        cluster,
+        2 * n_periods,
+        n_clusters,
+    )
+    return counts[n_periods:], counts[:n_periods], labels
+
+
+def _alignment_frame(
+    user_counts: np.ndarray,
+    asst_counts: np.ndarray,
+    labels: np.ndarray,
+    label_col: str,
+    min_msgs: int,
+    n_bootstrap: int = 0,
+    ci_level: float = 0.95,
+    rng: Optional[np.random.Generator] = None,
+) -> pd.DataFrame:
+    """
+    Batched JS divergence for every row, filtered to rows with enough messages.
+    With n_bootstrap > 0, adds js_ci_lower / js_ci_upper bootstrap bounds.
+    """
+    user_n = user_counts.sum(axis=1)
+    asst_n = asst_counts.sum(axis=1)
+    keep = (user_n >= min_msgs) & (asst_n >= min_msgs)
+
+    js = js_distance(user_counts[keep], asst_counts[keep])
+
+    out = pd.DataFrame({
+        label_col:       labels[keep],
+        "user_msgs":     user_n[keep].astype(int),
+        "asst_msgs":     asst_n[keep].astype(int),
+        "js_divergence": np.round(js, 6),
+    })
+
+    if n_bootstrap > 0:
+        lower, upper = bootstrap_js_interval(
+            user_counts[keep], asst_counts[keep], n_bootstrap, rng, level=ci_level,
+        )
+        out["js_ci_lower"] = np.round(lower, 6)
+        out["js_ci_upper"] = np.round(upper, 6)
+
+    return out
+
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
 
+@profiled("alignment")
 def run(
     db_path: str | Path,
     out_dir: str | Path,
+    config: Optional[dict] = None,
     progress_cb: Optional[Callable[[float, str], None]] = None,
 ) -> dict:
     """
-    Compute monthly JS divergence between user and assistant topic distributions.
+    Compute JS divergence between user and assistant topic distributions
+    for every configured period (monthly, weekly, daily) and rolling window.
 
     Requires topics.run() to have been called first (node_to_fine_cluster table
     must exist in the database).
@@ -39,11 +153,18 @@ def run(
     Args:
         db_path:     SQLite database
         out_dir:     Directory for output CSVs
+        config:      Optional overrides for DEFAULT_CONFIG
         progress_cb: Optional callable(fraction 0–1, status_string)
 
     Returns:
-        Summary dict: months_computed, mean_js, min_js, max_js
+        Summary dict: months_computed, mean_js, min_js, max_js, plus
+        {period}_computed for every other period / rolling window written, and
+        instrumentation (per-step timing, memory and row counts)
     """
+    cfg = dict(DEFAULT_CONFIG)
+    if config:
+        cfg.update(config)
+
     def _cb(frac: float, msg: str):
         if progress_cb:
             progress_cb(frac, msg)
@@ -51,12 +172,14 @@ def run(
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     db_path = Path(db_path)
+    inst = Recorder("alignment")
 
     # ── 1. Load messages joined with cluster assignments ──────────────────────
     _cb(0.05, "Loading cluster assignments…")
-    con = sqlite3.connect(db_path)
+    inst.step("Load messages")
+    con = connect(db_path)
     df = pd.read_sql_query(
-        """SELECT m.role, m.year_month, n.cluster_id
+        """SELECT m.role, m.year_month, m.timestamp, n.cluster_id
            FROM messages m
            JOIN node_to_fine_cluster n ON m.node_id = n.node_id
            WHERE m.role IN ('user', 'assistant')""",
@@ -68,62 +191,65 @@ def run(
         raise ValueError(
             "No cluster assignments found. Run topics.run() before alignment.run()."
         )
+    inst.rows(len(df))
 
-    months = sorted(df["year_month"].dropna().unique())
     n_clusters = int(df["cluster_id"].max()) + 1
-
-    # ── 2. Monthly JS divergence ──────────────────────────────────────────────
-    _cb(0.20, "Computing monthly JS divergence…")
-    rows = []
-    n = len(months)
-
-    for i, month in enumerate(months):
-        _cb(0.20 + 0.70 * (i / max(n, 1)), f"Aligning month {month}…")
-        g = df[df["year_month"] == month]
-        user_g = g[g["role"] == "user"]
-        asst_g = g[g["role"] == "assistant"]
-
-        if len(user_g) < MIN_MSGS_PER_ROLE or len(asst_g) < MIN_MSGS_PER_ROLE:
-            continue
-
-        # Build full-length probability vectors (one entry per cluster)
-        user_counts = user_g["cluster_id"].value_counts()
-        asst_counts = asst_g["cluster_id"].value_counts()
-
-        user_dist = np.array(
-            [user_counts.get(c, 0) for c in range(n_clusters)], dtype=float
+    min_msgs   = int(cfg["min_msgs_per_role"])
+    rng        = np.random.default_rng(cfg["random_seed"])
+
+    # "month" is always computed — the monthly CSV feeds the report
+    periods = ["month"] + [p for p in cfg["periods"] if p != "month"]
+    rolling = dict(cfg["rolling_windows"] or {})
+
+    # ── 2. Batched JS divergence per period ───────────────────────────────────
+    summary: dict = {}
+    monthly_df = pd.DataFrame()
+
+    for i, period in enumerate(periods):
+        _cb(0.20 + 0.70 * (i / len(periods)), f"Aligning {_FILE_SUFFIX[period]} periods…")
+        inst.step(f"JS divergence ({period})", rows_in=len(df))
+        label_col = PERIOD_COLUMNS[period]
+        user_counts, asst_counts, labels = _role_counts(df, period, n_clusters)
+
+        result_df = _alignment_frame(
+            user_counts, asst_counts, labels, label_col, min_msgs,
+            n_bootstrap=int(cfg["n_bootstrap"]) if period == "month" else 0,
+            ci_level=cfg["ci_level"],
+            rng=rng,
         )
-        asst_dist = np.array(
-            [asst_counts.get(c, 0) for c in range(n_clusters)], dtype=float
-        )
-
-        # Normalise to probability distributions
-        if user_dist.sum() > 0:
-            user_dist /= user_dist.sum()
-        if asst_dist.sum() > 0:
-            asst_dist /= asst_dist.sum()
-
-        js = float(jensenshannon(user_dist, asst_dist))
-
-        rows.append({
-            "year_month":    month,
-            "user_msgs":     len(user_g),
-            "asst_msgs":     len(asst_g),
-            "js_divergence": round(js, 6),
-        })
-
-    result_df = pd.DataFrame(rows).sort_values("year_month")
-    out_path = out_dir / "dyadic_alignment_monthly.csv"
-    result_df.to_csv(out_path, index=False)
+        result_df.to_csv(out_dir / f"dyadic_alignment_{_FILE_SUFFIX[period]}.csv", index=False)
+
+        inst.rows(len(result_df))
+
+        if period == "month":
+            monthly_df = result_df
+        else:
+            summary[f"{period}s_computed"] = len(result_df)
+
+        window = int(rolling.get(period, 0) or 0)
+        if window > 1:
+            roll_df = _alignment_frame(
+                rolling_sum(user_counts, window),
+                rolling_sum(asst_counts, window),
+                labels[window - 1:],
+                label_col,
+                min_msgs,
+            )
+            roll_df.to_csv(
+                out_dir / f"dyadic_alignment_{period}_rolling{window}.csv", index=False
+            )
+            summary[f"{period}_rolling{window}_computed"] = len(roll_df)
 
     _cb(1.0, "Alignment complete.")
+    summary["instrumentation"] = inst.finish()
 
-    if result_df.empty:
-        return {"months_computed": 0}
+    if monthly_df.empty:
+        return {"months_computed": 0, **summary}
 
     return {
-        "months_computed": len(result_df),
-        "mean_js":  round(float(result_df["js_divergence"].mean()), 4),
-        "min_js":   round(float(result_df["js_divergence"].min()), 4),
-        "max_js":   round(float(result_df["js_divergence"].max()), 4),
+        "months_computed": len(monthly_df),
+        "mean_js":  round(float(monthly_df["js_divergence"].mean()), 4),
+        "min_js":   round(float(monthly_df["js_divergence"].min()), 4),
+        "max_js":   round(float(monthly_df["js_divergence"].max()), 4),
+        **summary,
     }
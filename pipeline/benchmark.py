@@ -0,0 +1,352 @@
+"""
+Scaling benchmark: every pipeline stage on synthetic exports of growing size.
+
+For each size (10k / 100k / 1M messages by default) it writes a synthetic
+export (pipeline.synthetic; kept under WORK/exports and reused while the
+generator settings are unchanged), runs the headless runner on it in a
+fresh Python process — so each size starts from a clean heap and peak RSS
+is not inherited from the previous one — and collects per stage:
+
+    status, wall_s, cpu_s, peak_rss_mb       (as in the run summary)
+
+With --repeat N every size runs N times and the smallest figure of each
+metric is kept, which is the least noisy estimate on a busy machine.
+
+Results are written to WORK/benchmark.json.  --baseline FILE compares
+them with an earlier result file and reports a regression when a metric
+grew by more than --threshold (default 25 %) *and* by more than a noise
+floor (MIN_DELTA: half a second, 25 MB), or when a stage that succeeded in
+the baseline now fails.  The exit status is 1 on any regression, so the
+suite can gate CI.  --save-baseline FILE writes the results as the new
+baseline.  Baselines only compare like with like: format, generator
+settings and worker count must match, only the sizes and stages present in
+both are compared, and a baseline from a different machine is flagged in
+the report.
+
+Usage:
+    python -m pipeline.benchmark --out bench/ --save-baseline bench/baseline.json
+    python -m pipeline.benchmark --out bench/ --baseline bench/baseline.json
+    python -m pipeline.benchmark --out bench/ --sizes 10k,100k --format claude --repeat 3
+
+The 1M size needs roughly 1 GB of disk for the export and several GB of
+RAM for the topic and domain stages.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as _dt
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+from pipeline import synthetic
+
+SIZES = ("10k", "100k", "1M")
+
+METRICS = ("wall_s", "cpu_s", "peak_rss_mb")
+
+DEFAULT_THRESHOLD = 0.25
+
+# Growth below these absolute amounts is never reported as a regression
+MIN_DELTA = {"wall_s": 0.5, "cpu_s": 0.5, "peak_rss_mb": 25.0}
+
+BENCHMARK_VERSION = 1
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _generator_config(fmt: str, config: Optional[dict]) -> dict:
+    """The generator settings recorded with the results (without n_messages)."""
+    cfg = {k: v for k, v in synthetic.DEFAULT_CONFIG.items() if k != "n_messages"}
+    cfg.update({k: v for k, v in (config or {}).items() if k != "n_messages"})
+    return json.loads(json.dumps({"format": fmt, **cfg}))
+
+
+def _export(work_dir: Path, n_messages: int, gen: dict) -> tuple[Path, dict]:
+    """The synthetic export for one size, generated unless already on disk."""
+    key = hashlib.sha256(json.dumps(gen, sort_keys=True).encode()).hexdigest()[:12]
+    path = work_dir / "exports" / f"{gen['format']}-{n_messages}-{key}.json"
+    meta_path = path.with_suffix(".stats.json")
+    if path.is_file() and meta_path.is_file():
+        return path, json.loads(meta_path.read_text(encoding="utf-8"))
+
+    config = {k: v for k, v in gen.items() if k != "format"}
+    t0 = time.perf_counter()
+    stats = synthetic.write_export(path, gen["format"], {**config, "n_messages": n_messages})
+    stats["generate_s"] = round(time.perf_counter() - t0, 2)
+    meta_path.write_text(json.dumps(stats, indent=2), encoding="utf-8")
+    return path, stats
+
+
+def _run_pipeline(
+    export: Path,
+    out_dir: Path,
+    n_workers: int,
+    stages: Optional[Sequence[str]],
+    config_path: Optional[Path],
+) -> dict:
+    """One headless run in a child process; returns its run summary."""
+    summary_path = out_dir / "run_summary.json"
+    summary_path.unlink(missing_ok=True)
+    cmd = [sys.executable, "-m", "pipeline.runner", str(export), "--out", str(out_dir),
+           "--summary", str(summary_path), "--workers", str(n_workers), "--no-cache", "--quiet"]
+    if stages:
+        cmd += ["--stages", ",".join(stages)]
+    if config_path is not None:
+        cmd += ["--config", str(config_path)]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(_ROOT), env.get("PYTHONPATH")) if p)
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if not summary_path.is_file():
+        raise RuntimeError(f"Pipeline run on {export.name} wrote no summary "
+                           f"(exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+    return json.loads(summary_path.read_text(encoding="utf-8"))
+
+
+def _stage_figures(summaries: list[dict]) -> dict:
+    """{stage: {status, wall_s, cpu_s, peak_rss_mb}}, the minimum over repeats."""
+    out: dict[str, dict] = {}
+    for summary in summaries:
+        for rec in summary["stages"]:
+            entry = out.setdefault(rec["stage"], {"status": rec["status"]})
+            if rec["status"] != "ok":
+                entry["status"] = rec["status"]
+                entry["error"] = rec.get("error")
+            for metric in METRICS:
+                value = rec.get(metric)
+                if value is not None:
+                    entry[metric] = min(value, entry.get(metric, value))
+    return out
+
+
+def run_suite(
+    work_dir: str | Path,
+    sizes: Sequence[str | int] = SIZES,
+    fmt: str = "chatgpt",
+    generator_config: Optional[dict] = None,
+    n_workers: int = 1,
+    repeat: int = 1,
+    stages: Optional[Sequence[str]] = None,
+    config_path: Optional[str | Path] = None,
+    progress_cb: Optional[Callable[[str, str], None]] = None,
+) -> dict:
+    """
+    Benchmark the pipeline at each size.
+
+    Args:
+        work_dir:         Exports, per-size work directories and results go here
+        sizes:            Message counts ('10k', '1M' or integers)
+        fmt:              'chatgpt' or 'claude'
+        generator_config: Overrides for synthetic.DEFAULT_CONFIG
+        n_workers:        Runner --workers (1 = stages one after another)
+        repeat:           Runs per size; the minimum of each metric is kept
+        stages:           Subset of runner.STAGES (default all)
+        config_path:      Runner config file (JSON / TOML)
+        progress_cb:      Optional callable(size label, status_string)
+
+    Returns:
+        Results dict: version, created, platform, generator, n_workers,
+        repeat, stages, sizes: {label: {messages, conversations, export_mb,
+        generate_s, ok, total_wall_s, stages: {stage: figures}}}
+    """
+    work_dir = Path(work_dir).resolve()
+    gen = _generator_config(fmt, generator_config)
+    config_path = Path(config_path).resolve() if config_path else None
+
+    def _cb(label: str, msg: str):
+        if progress_cb:
+            progress_cb(label, msg)
+
+    results = {
+        "version":   BENCHMARK_VERSION,
+        "created":   _dt.datetime.now(_dt.timezone.utc).isoformat(timespec="seconds"),
+        "platform":  {
+            "python":  platform.python_version(),
+            "system":  platform.system(),
+            "machine": platform.machine(),
+            "node":    platform.node(),
+            "cpus":    os.cpu_count(),
+        },
+        "generator": gen,
+        "n_workers": n_workers,
+        "repeat":    repeat,
+        "stages":    list(stages) if stages else None,
+        "sizes":     {},
+    }
+
+    for size in sizes:
+        n = synthetic.parse_count(size)
+        label = str(size)
+        _cb(label, f"Generating {n:,} messages…")
+        export, stats = _export(work_dir, n, gen)
+
+        summaries = []
+        for i in range(repeat):
+            _cb(label, f"Running the pipeline ({i + 1}/{repeat})…")
+            out_dir = work_dir / "runs" / label
+            summaries.append(_run_pipeline(export, out_dir, n_workers, stages, config_path))
+
+        results["sizes"][label] = {
+            "messages":      stats["messages"],
+            "conversations": stats["conversations"],
+            "export_mb":     round(stats["bytes"] / 2 ** 20, 1),
+            "generate_s":    stats.get("generate_s"),
+            "ok":            all(s["ok"] for s in summaries),
+            "total_wall_s":  min(s["total_wall_s"] for s in summaries),
+            "stages":        _stage_figures(summaries),
+        }
+        _cb(label, f"Done in {results['sizes'][label]['total_wall_s']:.1f} s.")
+
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Baseline comparison
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+    """
+    Regressions of *current* against *baseline*.
+
+    Each is {size, stage, metric, baseline, current, change}; change is the
+    relative growth, or None for a stage that failed where it succeeded in
+    the baseline (metric "status").  Sizes and stages missing from either
+    side are not compared, so a run of a few stages can be checked against
+    a full baseline; the total is only compared when both ran the same
+    stages.
+
+    Raises:
+        ValueError if the two were produced with different generator
+        settings or worker counts.
+    """
+    for key in ("generator", "n_workers"):
+        if baseline.get(key) != current.get(key):
+            raise ValueError(f"Baseline {key} differs ({baseline.get(key)!r} vs "
+                             f"{current.get(key)!r}); record a new baseline.")
+
+    out = []
+    for label, cur_size in current["sizes"].items():
+        base_size = baseline["sizes"].get(label)
+        if base_size is None:
+            continue
+        rows = [(stage, cur_size["stages"].get(stage), figures)
+                for stage, figures in base_size["stages"].items()]
+        if baseline.get("stages") == current.get("stages"):
+            rows.append(("total", {"status": "ok", "wall_s": cur_size["total_wall_s"]},
+                         {"status": "ok", "wall_s": base_size["total_wall_s"]}))
+        for stage, cur, base in rows:
+            if cur is None:
+                continue
+            if base["status"] == "ok" and cur["status"] != "ok":
+                out.append({"size": label, "stage": stage, "metric": "status",
+                            "baseline": base["status"], "current": cur["status"],
+                            "change": None})
+                continue
+            for metric in METRICS:
+                old, new = base.get(metric), cur.get(metric)
+                if old is None or new is None:
+                    continue
+                if new - old > MIN_DELTA[metric] and new > old * (1 + threshold):
+                    out.append({"size": label, "stage": stage, "metric": metric,
+                                "baseline": old, "current": new,
+                                "change": round(new / old - 1, 4) if old else None})
+    return out
+
+
+def format_report(current: dict, baseline: Optional[dict] = None) -> str:
+    """A per-size table of the figures, with the change against *baseline*."""
+    lines = []
+    for label, size in current["sizes"].items():
+        base_stages = ((baseline or {}).get("sizes", {}).get(label) or {}).get("stages", {})
+        lines.append(f"{label}: {size['messages']:,} messages, {size['conversations']:,} "
+                     f"conversations, {size['export_mb']} MB export")
+        for stage, fig in size["stages"].items():
+            base = base_stages.get(stage, {})
+            cells = []
+            for metric, unit in (("wall_s", "s"), ("peak_rss_mb", "MB")):
+                value = fig.get(metric)
+                cell = f"{value:9.2f} {unit}" if value is not None else f"{'—':>9} {unit}"
+                if base.get(metric):
+                    cell += f" ({value / base[metric] - 1:+6.1%})" if value is not None else ""
+                cells.append(cell)
+            lines.append(f"  {stage:<10} {fig['status']:<7} " + "   ".join(cells))
+        lines.append(f"  {'total':<10} {'ok' if size['ok'] else 'failed':<7} "
+                     f"{size['total_wall_s']:9.2f} s")
+    if baseline and baseline.get("platform") != current.get("platform"):
+        lines.append("Note: the baseline was recorded on a different platform "
+                     f"({baseline.get('platform')}).")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """CLI entry point: run the suite, write the results, compare with a baseline."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pipeline.benchmark",
+        description="Benchmark every pipeline stage on synthetic exports of growing size.",
+    )
+    parser.add_argument("--out", required=True, help="work directory (exports, runs, results)")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma-separated message counts")
+    parser.add_argument("--format", choices=synthetic.FORMATS, default="chatgpt")
+    parser.add_argument("--months", type=int, default=synthetic.DEFAULT_CONFIG["months"])
+    parser.add_argument("--duplicate-rate", type=float,
+                        default=synthetic.DEFAULT_CONFIG["duplicate_rate"])
+    parser.add_argument("--seed", type=int, default=synthetic.DEFAULT_CONFIG["seed"])
+    parser.add_argument("--workers", type=int, default=1, help="runner --workers (default 1)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size; minimum kept")
+    parser.add_argument("--stages", help="comma-separated subset of the runner's stages")
+    parser.add_argument("--config", help="runner config file (JSON or TOML)")
+    parser.add_argument("--baseline", help="compare with this results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"relative growth reported as a regression (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--save-baseline", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()] if args.stages else None
+    results = run_suite(
+        args.out, sizes, fmt=args.format,
+        generator_config={"months": args.months, "duplicate_rate": args.duplicate_rate,
+                          "seed": args.seed},
+        n_workers=args.workers, repeat=args.repeat, stages=stages, config_path=args.config,
+        progress_cb=lambda label, msg: print(f"  [{label}] {msg}", file=sys.stderr),
+    )
+    text = json.dumps(results, indent=2)
+    (Path(args.out) / "benchmark.json").write_text(text, encoding="utf-8")
+    if args.save_baseline:
+        Path(args.save_baseline).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save_baseline).write_text(text, encoding="utf-8")
+
+    baseline = None
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    print(format_report(results, baseline))
+
+    failed = [label for label, size in results["sizes"].items() if not size["ok"]]
+    if baseline is None:
+        return 1 if failed else 0
+
+    try:
+        regressions = compare(baseline, results, args.threshold)
+    except ValueError as exc:
+        parser.error(str(exc))
+    for reg in regressions:
+        if reg["metric"] == "status":
+            print(f"REGRESSION {reg['size']} {reg['stage']}: {reg['baseline']} → {reg['current']}")
+        else:
+            print(f"REGRESSION {reg['size']} {reg['stage']} {reg['metric']}: "
+                  f"{reg['baseline']} → {reg['current']}"
+                  + (f" ({reg['change']:+.0%})" if reg["change"] is not None else ""))
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
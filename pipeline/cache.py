@@ -0,0 +1,346 @@
+"""
+Content-addressed cache of stage outputs, shared across sessions.
+
+A stage's key (stage_key) is the SHA-256 of
+    - the export's content (file_digest), for the stages that read it,
+    - the stage's effective config (defaults + overrides),
+    - its code version: the source of the stage module and of every
+      pipeline / reports module it imports, transitively (code_version),
+    - the keys of the stages it depends on,
+so any change upstream changes every downstream key, while re-uploading
+the same export into a fresh work directory — or re-running only the
+report — hits the cache for everything before it.
+
+An entry holds what the stage leaves behind:
+    tables.db    the SQLite tables the module lists in OUTPUT_TABLES,
+                 with their indexes
+    files/       the files under the work dir matching OUTPUT_FILES that
+                 the stage (re)wrote
+    result.pkl   the stage's run() return value
+
+Layout:
+    <cache_dir>/index.db            key, stage, bytes, created, last_used
+    <cache_dir>/<key[:2]>/<key>/    one entry
+
+Entries are written to a temporary directory and renamed into place, so
+concurrent stages (or sessions) never see half-written entries.  The total
+size is bounded by max_bytes: after each store the least recently used
+entries are evicted.  As with the lexicon cache, unreadable entries are
+ignored and a failure to write the cache is not an error.
+"""
+
+from __future__ import annotations
+
+import ast
+import fnmatch
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from pipeline.db import connect
+
+# Bump when the entry layout changes, to invalidate old entries
+_CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Module prefixes whose source is part of a stage's code version
+_OWN_PACKAGES = ("pipeline", "reports")
+
+_INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key        TEXT PRIMARY KEY,
+        stage      TEXT,
+        bytes      INTEGER,
+        created    REAL,
+        last_used  REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_entries_used ON entries(last_used);
+"""
+
+
+def default_cache_dir() -> Path:
+    """``$XDG_CACHE_HOME/dol-analyser/stages`` (``~/.cache`` if unset)."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "dol-analyser" / "stages"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Keys
+# ─────────────────────────────────────────────────────────────────────────────
+
+def file_digest(path: str | Path, block: int = 1 << 20) -> str:
+    """SHA-256 of a file's content."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(block):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _own_imports(source: str, package: str) -> set[str]:
+    """Names of pipeline / reports modules imported by *source*."""
+    found = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            base = node.module if node.level == 0 else f"{package}.{node.module}"
+            names = [base] + [f"{base}.{a.name}" for a in node.names]
+        else:
+            continue
+        found.update(n for n in names if n.split(".")[0] in _OWN_PACKAGES)
+    return found
+
+
+@lru_cache(maxsize=None)
+def code_version(module: str) -> str:
+    """SHA-256 over the source of *module* and every own module it imports."""
+    seen: dict[str, bytes] = {}
+    stack = [module]
+    while stack:
+        name = stack.pop()
+        if name in seen:
+            continue
+        try:
+            spec = importlib.util.find_spec(name)
+        except ImportError:   # `from pipeline.x import func` → "pipeline.x.func"
+            continue
+        if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+            continue
+        source = Path(spec.origin).read_bytes()
+        seen[name] = source
+        stack.extend(_own_imports(source.decode("utf-8"), name.rpartition(".")[0]))
+
+    h = hashlib.sha256()
+    for name in sorted(seen):
+        h.update(name.encode() + b"\0" + hashlib.sha256(seen[name]).digest())
+    return h.hexdigest()
+
+
+def stage_key(
+    stage: str,
+    module: str,
+    config: dict,
+    upstream: Iterable[str] = (),
+    input_digest: Optional[str] = None,
+) -> str:
+    """Cache key for one stage run (see module docstring)."""
+    payload = json.dumps(
+        [_CACHE_VERSION, stage, code_version(module), config, sorted(upstream), input_digest],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SQLite helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _index(cache_dir: Path) -> sqlite3.Connection:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    con = connect(cache_dir / "index.db")
+    con.executescript(_INDEX_SCHEMA)
+    return con
+
+
+def _copy_tables(src: Path, dst: Path, tables: Iterable[str]) -> list[str]:
+    """Replace *tables* (and their indexes) in *dst* with the copies in *src*."""
+    con = connect(dst)
+    try:
+        con.execute("ATTACH DATABASE ? AS src", (str(src),))
+        schema = con.execute(
+            "SELECT type, name, tbl_name, sql FROM src.sqlite_master "
+            "WHERE sql IS NOT NULL AND type IN ('table', 'index')"
+        ).fetchall()
+        copied = []
+        for table in tables:
+            create = [sql for typ, name, tbl, sql in schema if typ == "table" and name == table]
+            if not create:
+                continue
+            con.execute(f'DROP TABLE IF EXISTS main."{table}"')
+            con.execute(create[0])
+            con.execute(f'INSERT INTO main."{table}" SELECT * FROM src."{table}"')
+            for typ, name, tbl, sql in schema:
+                if typ == "index" and tbl == table:
+                    con.execute(sql)
+            copied.append(table)
+        con.commit()
+        con.execute("DETACH DATABASE src")
+    finally:
+        con.close()
+    return copied
+
+
+def _written_files(out_dir: Path, patterns: Iterable[str], since: float) -> list[Path]:
+    """Files under *out_dir* matching *patterns* and modified at or after *since*."""
+    patterns = list(patterns)
+    out = []
+    for path in out_dir.rglob("*"):
+        rel = path.relative_to(out_dir).as_posix()
+        if (path.is_file() and any(fnmatch.fnmatchcase(rel, p) for p in patterns)
+                and path.stat().st_mtime >= since):
+            out.append(path)
+    return sorted(out)
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _entry_dir(cache_dir: Path, key: str) -> Path:
+    return cache_dir / key[:2] / key
+
+
+def lookup(cache_dir: str | Path, key: str) -> Optional[Path]:
+    """Entry directory for *key* (marking it as recently used), or None."""
+    cache_dir = Path(cache_dir)
+    entry = _entry_dir(cache_dir, key)
+    if not (entry / "result.pkl").exists():
+        return None
+    try:
+        con = _index(cache_dir)
+        try:
+            con.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            con.commit()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        pass
+    return entry
+
+
+def restore(entry: str | Path, db_path: str | Path, out_dir: str | Path) -> Any:
+    """Copy an entry's tables into *db_path* and files into *out_dir*; return its result."""
+    entry, out_dir = Path(entry), Path(out_dir)
+    with (entry / "result.pkl").open("rb") as fh:
+        result = pickle.load(fh)
+
+    manifest = json.loads((entry / "manifest.json").read_text(encoding="utf-8"))
+    if manifest["tables"]:
+        _copy_tables(entry / "tables.db", Path(db_path), manifest["tables"])
+    for rel in manifest["files"]:
+        dest = out_dir / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(entry / "files" / rel, dest)
+    return result
+
+
+def store(
+    cache_dir: str | Path,
+    key: str,
+    stage: str,
+    db_path: str | Path,
+    out_dir: str | Path,
+    result: Any,
+    tables: Iterable[str] = (),
+    files: Iterable[str] = (),
+    since: float = 0.0,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> bool:
+    """
+    Save a finished stage's outputs under *key*, then evict down to *max_bytes*.
+
+    Args:
+        tables: SQLite tables the stage wrote (OUTPUT_TABLES)
+        files:  Glob patterns relative to *out_dir* (OUTPUT_FILES); only files
+                modified at or after *since* (the stage's start) are kept
+
+    Returns:
+        True if the entry was written (False if it already existed or the
+        cache could not be written).
+    """
+    cache_dir, out_dir = Path(cache_dir), Path(out_dir)
+    entry = _entry_dir(cache_dir, key)
+    if entry.exists():
+        return False
+
+    tmp = cache_dir / f".tmp-{key[:16]}-{os.getpid()}"
+    try:
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        copied = _copy_tables(Path(db_path), tmp / "tables.db", tables) if tables else []
+        rel_files = []
+        for path in _written_files(out_dir, files, since):
+            rel = path.relative_to(out_dir).as_posix()
+            (tmp / "files" / rel).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, tmp / "files" / rel)
+            rel_files.append(rel)
+        with (tmp / "result.pkl").open("wb") as fh:
+            pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        (tmp / "manifest.json").write_text(
+            json.dumps({"stage": stage, "tables": copied, "files": rel_files}, indent=1),
+            encoding="utf-8",
+        )
+        size = _dir_bytes(tmp)
+
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.rename(tmp, entry)
+        except OSError:          # another process stored the same key first
+            return False
+
+        con = _index(cache_dir)
+        try:
+            now = time.time()
+            con.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, stage, size, now, now),
+            )
+            con.commit()
+        finally:
+            con.close()
+        evict(cache_dir, max_bytes)
+        return True
+    except (OSError, sqlite3.Error, pickle.PicklingError):
+        return False
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def evict(cache_dir: str | Path, max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+    """Delete least recently used entries until the cache fits in *max_bytes*."""
+    cache_dir = Path(cache_dir)
+    con = _index(cache_dir)
+    try:
+        rows = con.execute("SELECT key, bytes FROM entries ORDER BY last_used DESC").fetchall()
+        total, drop = 0, []
+        for key, size in rows:
+            total += size
+            if total > max_bytes:
+                drop.append(key)
+        for key in drop:
+            shutil.rmtree(_entry_dir(cache_dir, key), ignore_errors=True)
+        con.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in drop])
+        con.commit()
+    finally:
+        con.close()
+    return len(drop)
+
+
+def stats(cache_dir: str | Path) -> dict:
+    """entries and bytes currently indexed, per stage and in total."""
+    con = _index(Path(cache_dir))
+    try:
+        rows = con.execute(
+            "SELECT stage, COUNT(*), SUM(bytes) FROM entries GROUP BY stage ORDER BY stage"
+        ).fetchall()
+    finally:
+        con.close()
+    return {
+        "entries":  sum(r[1] for r in rows),
+        "bytes":    sum(r[2] for r in rows),
+        "by_stage": {stage: {"entries": n, "bytes": b} for stage, n, b in rows},
+    }
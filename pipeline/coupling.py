@@ -1,5 +1,5 @@
 """
-Steps 9–9.1 — Directional coupling (monthly lead–lag).
+Steps 9–9.1 — Directional coupling (weekly/monthly lead–lag).
 
 Tests whether user topic changes predict assistant changes one month
 later (user leads) or vice versa (assistant leads), using lag-1 cosine
@@ -18,25 +18,58 @@ Method:
 
     Permutation p-values: shuffle ΔA row order, recompute N=2,000 times.
     Per-domain Pearson r with permutation p-values.
+    All permutation tests run through pipeline.permutation; the serial
+    path draws from one seeded stream in the original order.  Null
+    statistics are batched: each block of permutations gathers the
+    permuted ΔA rows in one indexing step, and all cosines / Pearson
+    correlations of the block come from einsum / matrix products.
+
+Multi-lag analysis (monthly and, if domains.run() wrote
+macro_weekly_domain_shares.csv, weekly):
+
+    forward(L) = mean cos(ΔU(t), ΔA(t+L)),  reverse(L) = mean cos(ΔA(t), ΔU(t+L))
+    r_j(L)     = Pearson(ΔU_j(t), ΔA_j(t+L)) and Pearson(ΔA_j(t), ΔU_j(t+L))
+
+    for L = 1 … max_lag, where lags count qualifying periods (as in the
+    lag-1 test).  All lags come from one pass: the (t × s) cosine matrix
+    between ΔU and ΔA rows is one einsum, and forward / reverse at lag L
+    are the means of its +L / −L diagonals.  Significance reuses the
+    permutation engine, with every lag, domain and direction evaluated on
+    the same ΔA row shuffles.
 
 Outputs (out_dir):
-    coupling_summary.csv    — system-level forward/reverse/diff + p-values
-    coupling_by_domain.csv  — per-domain r (user→asst, asst→user) + p-values
-    coupling_pairs.csv      — raw cosine similarities per month-pair
+    coupling_summary.csv        — system-level forward/reverse/diff + p-values
+    coupling_by_domain.csv      — per-domain r (user→asst, asst→user) + p-values
+    coupling_pairs.csv          — raw cosine similarities per month-pair
+    coupling_lags.csv           — granularity, lag, forward/reverse/diff + p-values
+    coupling_lags_by_domain.csv — granularity, lag, per-domain r + p-values
 """
 
 from __future__ import annotations
 
+from functools import partial
 from pathlib import Path
 from typing import Callable, Optional
 
 import numpy as np
 import pandas as pd
 
+from pipeline.instrument import Recorder
+from pipeline.permutation import permutation_test
+from pipeline.profiling import profiled
+
+DEPENDS_ON = ("domains",)   # macro_*_domain_shares (CSV or in-memory frames)
+OUTPUT_FILES = ("coupling_*.csv",)
+
 DEFAULT_N_PERMUTATIONS    = 2_000
 MIN_MSGS_PER_ROLE_PER_MONTH = 50   # months below this are excluded
+MIN_MSGS_PER_ROLE_PER_WEEK  = 10   # weeks below this are excluded
 RANDOM_SEED               = 42
 
+# Largest lag (in qualifying periods) per granularity for the multi-lag analysis
+DEFAULT_MAX_LAGS = {"month": 3, "week": 8}
+MIN_PAIRS_PER_LAG = 3
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Math helpers
@@ -55,48 +88,261 @@ def _pearson(x: np.ndarray, y: np.ndarray) -> float:
     return float(np.corrcoef(x, y)[0, 1])
 
 
-def _perm_p_greater(null: list[float], observed: float) -> float:
-    arr = np.array([v for v in null if np.isfinite(v)], dtype=float)
-    if not np.isfinite(observed) or len(arr) == 0:
-        return np.nan
-    return float((arr >= observed).mean())
+# Relative tolerance when comparing batched null values with the observed
+# statistics, which come from the scalar helpers above: a tie computed along
+# the two floating-point paths can differ in the last bits.
+_TIE_RTOL = 1e-9
 
 
-def _perm_p_abs(null: list[float], observed: float) -> float:
-    arr = np.array([v for v in null if np.isfinite(v)], dtype=float)
-    if not np.isfinite(observed) or len(arr) == 0:
-        return np.nan
-    return float((np.abs(arr) >= abs(observed)).mean())
+def _batched_cosine(a: np.ndarray, b: np.ndarray, na: np.ndarray, nb: np.ndarray,
+                    eps: float = 1e-12) -> np.ndarray:
+    """Row-wise cosine along the last axis given precomputed norms (NaN if either is ~0)."""
+    num = np.einsum("...m,...m->...", a, b)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cos = num / (na * nb)
+    return np.where((na < eps) | (nb < eps), np.nan, cos)
+
+
+def _nanmean_rows(x: np.ndarray) -> np.ndarray:
+    """np.nanmean over the last axis without the all-NaN warning."""
+    ok = np.isfinite(x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(ok, x, 0.0).sum(axis=-1) / ok.sum(axis=-1)
+
+
+def _system_null(dU: np.ndarray, dA: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """
+    (B, 3) null forward / reverse / lead-diff means for a block of ΔA row orders.
+
+    The permuted ΔA rows of the whole block are gathered in one indexing
+    step into a (B × (T-1) × M) array; row norms are permutation-invariant,
+    so they are computed once and gathered with the same indices.
+    """
+    norm_u = np.linalg.norm(dU, axis=1)
+    norm_a = np.linalg.norm(dA, axis=1)[idx]          # (B, T-1)
+    dA_p = dA[idx]                                    # (B, T-1, M)
+
+    fwd = _batched_cosine(dU[None, :-1], dA_p[:, 1:], norm_u[None, :-1], norm_a[:, 1:])
+    rev = _batched_cosine(dA_p[:, :-1], dU[None, 1:], norm_a[:, :-1], norm_u[None, 1:])
+    mf = _nanmean_rows(fwd)
+    mr = _nanmean_rows(rev)
+    return np.stack([mf, mr, mf - mr], axis=1)
+
+
+def _batched_pearson(x: np.ndarray, y: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """
+    Pearson r of fixed *x* with ``y[perm]`` for every row of *idx*, as one
+    matrix product of the centred permuted y against centred x.
+    """
+    if np.std(x) < 1e-12 or np.std(y) < 1e-12:
+        return np.full(idx.shape[0], np.nan)
+    xc = x - x.mean()
+    yc = y - y.mean()
+    r = (yc[idx] @ xc) / np.sqrt((xc @ xc) * (yc @ yc))
+    return np.clip(r, -1.0, 1.0)
+
+
+def _domain_null(
+    x_u: np.ndarray, y_a: np.ndarray, x_a: np.ndarray, y_u: np.ndarray, idx: np.ndarray,
+) -> np.ndarray:
+    """(B, 2) null r(user→asst), r(asst→user) for one domain; idx is (B, 2, n)."""
+    return np.stack(
+        [_batched_pearson(x_u, y_a, idx[:, 0]), _batched_pearson(x_a, y_u, idx[:, 1])],
+        axis=1,
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Share matrices
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _share_matrices(
+    shares: pd.DataFrame,
+    period_col: str,
+    periods: list[str],
+    domains: list,
+) -> tuple[np.ndarray, np.ndarray]:
+    """(periods × domains) user / assistant share matrices via one pivot; gaps → 0."""
+    wide = shares.pivot_table(
+        index=period_col, columns="macro_domain",
+        values=["user_share", "asst_share"], aggfunc="first",
+    )
+    U = wide["user_share"].reindex(index=periods, columns=domains).fillna(0.0)
+    A = wide["asst_share"].reindex(index=periods, columns=domains).fillna(0.0)
+    return U.to_numpy(dtype=float), A.to_numpy(dtype=float)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Multi-lag coupling
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _unit_rows(x: np.ndarray, eps: float = 1e-12) -> np.ndarray:
+    """Rows scaled to unit length; rows with ~zero norm become NaN."""
+    norm = np.linalg.norm(x, axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(norm < eps, np.nan, x / norm)
+
+
+def _lag_statistics(dU: np.ndarray, dA: np.ndarray, max_lag: int, idx: np.ndarray) -> np.ndarray:
+    """
+    Every multi-lag statistic for a block of ΔA row orders, flattened to (B, s).
+
+    Layout per replicate: forward[L], reverse[L], diff[L] for L = 1…max_lag,
+    then per-domain r(user→asst)[L, j] and r(asst→user)[L, j].
+    """
+    dA_p = dA[idx]                                                # (B, n, M)
+    C = np.einsum("tm,bsm->bts", _unit_rows(dU), _unit_rows(dA_p))   # (B, n, n)
+
+    lags = range(1, max_lag + 1)
+    fwd = np.stack([_nanmean_rows(np.diagonal(C, L, 1, 2)) for L in lags], axis=1)
+    rev = np.stack([_nanmean_rows(np.diagonal(C, -L, 1, 2)) for L in lags], axis=1)
+
+    r_u2a, r_a2u = [], []
+    for L in lags:
+        r_u2a.append(_lagged_pearson(dU[None, :-L], dA_p[:, L:]))
+        r_a2u.append(_lagged_pearson(dA_p[:, :-L], dU[None, L:]))
+
+    b = idx.shape[0]
+    return np.concatenate([
+        fwd, rev, fwd - rev,
+        np.stack(r_u2a, axis=1).reshape(b, -1),
+        np.stack(r_a2u, axis=1).reshape(b, -1),
+    ], axis=1)
+
+
+def _lagged_pearson(x: np.ndarray, y: np.ndarray, eps: float = 1e-12) -> np.ndarray:
+    """Pearson r over the time axis (-2) for every domain column; broadcasts over B."""
+    xc = x - x.mean(axis=-2, keepdims=True)
+    yc = y - y.mean(axis=-2, keepdims=True)
+    sxx = (xc ** 2).sum(axis=-2)
+    syy = (yc ** 2).sum(axis=-2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = (xc * yc).sum(axis=-2) / np.sqrt(sxx * syy)
+    n = x.shape[-2]
+    flat = (np.sqrt(sxx / n) < eps) | (np.sqrt(syy / n) < eps)
+    return np.where(flat, np.nan, np.clip(r, -1.0, 1.0))
+
+
+def _lead_lag(
+    U: np.ndarray,
+    A: np.ndarray,
+    periods: list[str],
+    domains: list,
+    granularity: str,
+    max_lag: int,
+    n_permutations: int,
+    rng: np.random.Generator,
+    n_workers: int,
+    early_stop: Optional[str],
+) -> tuple[list[dict], list[dict]]:
+    """Multi-lag coupling rows (system-level, per-domain) for one granularity."""
+    dU = U[1:] - U[:-1]
+    dA = A[1:] - A[:-1]
+    n, M = dA.shape
+    max_lag = min(max_lag, n - MIN_PAIRS_PER_LAG)
+    if max_lag < 1:
+        return [], []
+
+    stat = partial(_lag_statistics, dU, dA, max_lag)
+    observed = stat(np.arange(n)[None])[0]
+    L = max_lag
+    alternative = ["greater"] * (2 * L) + ["two-sided"] * (L + 2 * L * M)
+
+    res = permutation_test(
+        stat,
+        n=n,
+        observed=observed,
+        n_permutations=n_permutations,
+        rng=rng,
+        alternative=alternative,
+        n_workers=n_workers,
+        early_stop=early_stop,
+        rtol=_TIE_RTOL,
+        max_block_cells=max(n, 4_000_000 // max(n, M)),
+    )
+    obs, p = res.observed, res.p_value
+
+    lag_rows = []
+    for i in range(L):
+        lag_rows.append({
+            "granularity":    granularity,
+            "lag":            i + 1,
+            "n_pairs":        n - (i + 1),
+            "forward_mean":   round(float(obs[i]), 4),
+            "reverse_mean":   round(float(obs[L + i]), 4),
+            "lead_diff":      round(float(obs[2 * L + i]), 4),
+            "p_forward":      round(float(p[i]), 4),
+            "p_reverse":      round(float(p[L + i]), 4),
+            "p_diff_abs":     round(float(p[2 * L + i]), 4),
+            "n_permutations": res.n_permutations,
+            "first_period":   periods[0],
+            "last_period":    periods[-1],
+        })
+
+    base_u2a, base_a2u = 3 * L, 3 * L + L * M
+    domain_rows = []
+    for i in range(L):
+        for j, d in enumerate(domains):
+            k = i * M + j
+            domain_rows.append({
+                "granularity":       granularity,
+                "lag":               i + 1,
+                "macro_domain":      d,
+                "r_user_leads_asst": float(obs[base_u2a + k]),
+                "p_user_leads_asst": float(p[base_u2a + k]),
+                "r_asst_leads_user": float(obs[base_a2u + k]),
+                "p_asst_leads_user": float(p[base_a2u + k]),
+            })
+    return lag_rows, domain_rows
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Public API
 # ─────────────────────────────────────────────────────────────────────────────
 
+@profiled("coupling")
 def run(
     out_dir: str | Path,
     n_permutations: int = DEFAULT_N_PERMUTATIONS,
+    n_workers: int = 1,
+    early_stop: Optional[str] = None,
+    max_lags: Optional[dict[str, int]] = None,
+    frames: Optional[dict[str, pd.DataFrame]] = None,
     progress_cb: Optional[Callable[[float, str], None]] = None,
 ) -> dict:
     """
-    Compute monthly lead-lag directional coupling statistics.
+    Compute weekly/monthly lead-lag directional coupling statistics.
 
     Reads:
         out_dir/macro_monthly_domain_shares.csv
         out_dir/macro_monthly_metrics.csv
+        out_dir/macro_weekly_domain_shares.csv  (optional — weekly lags skipped if absent)
+
+        or, when *frames* is given, the same tables already in memory.
 
     Writes:
         out_dir/coupling_summary.csv
         out_dir/coupling_by_domain.csv
         out_dir/coupling_pairs.csv
+        out_dir/coupling_lags.csv
+        out_dir/coupling_lags_by_domain.csv
 
     Args:
         out_dir:         Directory containing domain CSVs (from domains.run())
         n_permutations:  Number of permutations for p-values (default 2,000)
+        n_workers:       > 1 runs permutations in a process pool over
+                         SeedSequence.spawn streams (pipeline.permutation)
+        early_stop:      None, "besag-clifford" or "confidence"
+        max_lags:        Largest lag per granularity ("month", "week");
+                         defaults to DEFAULT_MAX_LAGS, 0 skips a granularity
+        frames:          Optional {"shares", "metrics", "weekly"} DataFrames
+                         (domains.run()["frames"]); skips re-reading the CSVs
         progress_cb:     Optional callable(fraction 0–1, status_string)
 
     Returns:
-        Summary dict with forward_mean, reverse_mean, lead_diff, p-values
+        Summary dict with forward_mean, reverse_mean, lead_diff, p-values,
+        the multi-lag rows and instrumentation (per-step timing, memory and
+        row counts).
     """
     def _cb(frac: float, msg: str):
         if progress_cb:
@@ -104,22 +350,30 @@ def run(
 
     out_dir = Path(out_dir)
     rng = np.random.default_rng(RANDOM_SEED)
+    inst = Recorder("coupling")
 
-    # ── 1. Load CSVs ──────────────────────────────────────────────────────────
+    # ── 1. Load domain tables (in-memory frames or CSVs) ──────────────────────
     _cb(0.05, "Loading domain share data…")
+    inst.step("Load domain tables")
+    frames = frames or {}
     shares_path  = out_dir / "macro_monthly_domain_shares.csv"
     metrics_path = out_dir / "macro_monthly_metrics.csv"
 
-    if not shares_path.exists() or not metrics_path.exists():
+    if "shares" in frames and "metrics" in frames:
+        shares, metrics = frames["shares"], frames["metrics"]
+    elif shares_path.exists() and metrics_path.exists():
+        shares  = pd.read_csv(shares_path)
+        metrics = pd.read_csv(metrics_path)
+    else:
         raise FileNotFoundError(
             "macro_monthly_domain_shares.csv / macro_monthly_metrics.csv not found. "
             "Run domains.run() first."
         )
 
-    shares  = pd.read_csv(shares_path)
-    metrics = pd.read_csv(metrics_path)
+    inst.rows(len(shares))
 
     # ── 2. Filter months by message threshold ─────────────────────────────────
+    inst.step("Filter months", rows_in=len(metrics))
     keep = metrics[
         (metrics["user_msgs"]  >= MIN_MSGS_PER_ROLE_PER_MONTH) &
         (metrics["asst_msgs"]  >= MIN_MSGS_PER_ROLE_PER_MONTH)
@@ -130,6 +384,7 @@ def run(
     domains = sorted(shares["macro_domain"].unique())
     M = len(domains)
     T = len(months)
+    inst.rows(T)
 
     if T < 4:
         raise ValueError(
@@ -139,21 +394,16 @@ def run(
 
     # ── 3. Build U(t), A(t) matrices ─────────────────────────────────────────
     _cb(0.15, "Building share matrices…")
-    U = np.zeros((T, M), dtype=float)
-    A = np.zeros((T, M), dtype=float)
-
-    for ti, month in enumerate(months):
-        g = shares[shares["year_month"] == month]
-        for ji, d in enumerate(domains):
-            row = g[g["macro_domain"] == d]
-            U[ti, ji] = row["user_share"].values[0]  if len(row) else 0.0
-            A[ti, ji] = row["asst_share"].values[0]  if len(row) else 0.0
+    inst.step("Share matrices", rows_in=len(shares))
+    U, A = _share_matrices(shares, "year_month", months, domains)
 
     dU = U[1:] - U[:-1]   # (T-1) × M
     dA = A[1:] - A[:-1]
+    inst.rows(T)
 
     # ── 4. Pairwise cosine similarities ───────────────────────────────────────
     _cb(0.25, "Computing lag-1 cosine similarities…")
+    inst.step("Cosine similarities", rows_in=dU.shape[0])
     pair_rows     = []
     forward_sims  = []
     reverse_sims  = []
@@ -173,30 +423,28 @@ def run(
     forward_mean = float(np.nanmean(forward_sims))
     reverse_mean = float(np.nanmean(reverse_sims))
     lead_diff    = forward_mean - reverse_mean
+    inst.rows(len(pair_rows))
 
     # ── 5. Permutation test (system-level) ────────────────────────────────────
     _cb(0.40, f"Permutation test ({n_permutations:,} iterations)…")
-    null_f, null_r, null_d = [], [], []
-
-    for _ in range(n_permutations):
-        perm = rng.permutation(dA.shape[0])
-        dA_p = dA[perm]
-        sf, sr = [], []
-        for t in range(T - 2):
-            sf.append(_cosine(dU[t], dA_p[t + 1]))
-            sr.append(_cosine(dA_p[t], dU[t + 1]))
-        mf = float(np.nanmean(sf))
-        mr = float(np.nanmean(sr))
-        null_f.append(mf)
-        null_r.append(mr)
-        null_d.append(mf - mr)
-
-    p_forward = _perm_p_greater(null_f, forward_mean)
-    p_reverse = _perm_p_greater(null_r, reverse_mean)
-    p_diff    = _perm_p_abs(null_d, lead_diff)
+    inst.step("Permutation test", rows_in=dA.shape[0])
+    system = permutation_test(
+        partial(_system_null, dU, dA),
+        n=dA.shape[0],
+        observed=[forward_mean, reverse_mean, lead_diff],
+        n_permutations=n_permutations,
+        rng=rng,
+        alternative=["greater", "greater", "two-sided"],
+        n_workers=n_workers,
+        early_stop=early_stop,
+        rtol=_TIE_RTOL,
+        max_block_cells=4_000_000 // max(M, 1),
+    )
+    p_forward, p_reverse, p_diff = (float(v) for v in system.p_value)
 
     # ── 6. Per-domain coupling ─────────────────────────────────────────────────
     _cb(0.70, "Computing per-domain coupling…")
+    inst.step("Per-domain coupling", rows_in=M)
     Xu  = dU[0:T - 2, :]
     Ya  = dA[1:T - 1, :]
     Xa  = dA[0:T - 2, :]
@@ -207,23 +455,70 @@ def run(
         r_u2a = _pearson(Xu[:, j], Ya[:, j])
         r_a2u = _pearson(Xa[:, j], Yu[:, j])
 
-        null_u2a, null_a2u = [], []
-        for _ in range(n_permutations):
-            p1 = rng.permutation(len(Ya))
-            null_u2a.append(_pearson(Xu[:, j], Ya[p1, j]))
-            p2 = rng.permutation(len(Yu))
-            null_a2u.append(_pearson(Xa[:, j], Yu[p2, j]))
+        res = permutation_test(
+            partial(_domain_null, Xu[:, j], Ya[:, j], Xa[:, j], Yu[:, j]),
+            n=len(Ya),
+            observed=[r_u2a, r_a2u],
+            n_permutations=n_permutations,
+            rng=rng,
+            alternative="two-sided",
+            draws_per_replicate=2,
+            n_workers=n_workers,
+            early_stop=early_stop,
+            rtol=_TIE_RTOL,
+        )
 
         domain_rows.append({
             "macro_domain":              d,
             "r_user_leads_asst":         r_u2a,
-            "p_user_leads_asst":         _perm_p_abs(null_u2a, r_u2a),
+            "p_user_leads_asst":         float(res.p_value[0]),
             "r_asst_leads_user":         r_a2u,
-            "p_asst_leads_user":         _perm_p_abs(null_a2u, r_a2u),
+            "p_asst_leads_user":         float(res.p_value[1]),
         })
 
-    # ── 7. Write outputs ───────────────────────────────────────────────────────
+    inst.rows(len(domain_rows))
+
+    # ── 7. Multi-lag coupling (monthly + weekly) ──────────────────────────────
+    lags_cfg = {**DEFAULT_MAX_LAGS, **(max_lags or {})}
+    lag_rows: list[dict] = []
+    lag_domain_rows: list[dict] = []
+
+    if lags_cfg.get("month", 0) > 0:
+        _cb(0.78, "Multi-lag coupling (monthly)…")
+        inst.step("Multi-lag (month)", rows_in=T)
+        rows, drows = _lead_lag(
+            U, A, months, domains, "month", lags_cfg["month"],
+            n_permutations, rng, n_workers, early_stop,
+        )
+        lag_rows += rows
+        lag_domain_rows += drows
+        inst.rows(len(rows) + len(drows))
+
+    weekly_path = out_dir / "macro_weekly_domain_shares.csv"
+    weeks: list[str] = []
+    if lags_cfg.get("week", 0) > 0 and ("weekly" in frames or weekly_path.exists()):
+        _cb(0.85, "Multi-lag coupling (weekly)…")
+        inst.step("Multi-lag (week)")
+        weekly = frames["weekly"] if "weekly" in frames else pd.read_csv(weekly_path)
+        weekly = weekly[
+            (weekly["user_msgs"] >= MIN_MSGS_PER_ROLE_PER_WEEK) &
+            (weekly["asst_msgs"] >= MIN_MSGS_PER_ROLE_PER_WEEK)
+        ]
+        weeks = sorted(weekly["week_start"].unique())
+        inst.rows(rows_in=len(weeks))
+        if len(weeks) >= 4:
+            Uw, Aw = _share_matrices(weekly, "week_start", weeks, domains)
+            rows, drows = _lead_lag(
+                Uw, Aw, weeks, domains, "week", lags_cfg["week"],
+                n_permutations, rng, n_workers, early_stop,
+            )
+            lag_rows += rows
+            lag_domain_rows += drows
+            inst.rows(len(rows) + len(drows))
+
+    # ── 8. Write outputs ───────────────────────────────────────────────────────
     _cb(0.92, "Writing coupling results…")
+    inst.step("Write CSV")
 
     summary = pd.DataFrame([{
         "months_used":        ", ".join(months),
@@ -235,7 +530,7 @@ def run(
         "p_forward":          round(p_forward, 4),
         "p_reverse":          round(p_reverse, 4),
         "p_diff_abs":         round(p_diff, 4),
-        "n_permutations":     n_permutations,
+        "n_permutations":     system.n_permutations,
         "min_msgs_threshold": MIN_MSGS_PER_ROLE_PER_MONTH,
     }])
 
@@ -248,6 +543,9 @@ def run(
     summary.to_csv(   out_dir / "coupling_summary.csv",    index=False)
     domain_df.to_csv( out_dir / "coupling_by_domain.csv",  index=False)
     pairs_df.to_csv(  out_dir / "coupling_pairs.csv",      index=False)
+    pd.DataFrame(lag_rows).to_csv(       out_dir / "coupling_lags.csv",           index=False)
+    pd.DataFrame(lag_domain_rows).to_csv(out_dir / "coupling_lags_by_domain.csv", index=False)
+    inst.rows(1 + len(domain_df) + len(pairs_df) + len(lag_rows) + len(lag_domain_rows))
 
     _cb(1.0, "Coupling analysis complete.")
 
@@ -258,4 +556,7 @@ def run(
         "lead_diff":    round(lead_diff, 4),
         "p_diff":       round(p_diff, 4),
         "user_leads":   lead_diff > 0,
+        "n_weeks":      len(weeks),
+        "lags":         lag_rows,
+        "instrumentation": inst.finish(),
     }
@@ -0,0 +1,26 @@
+"""
+SQLite connections for the pipeline database.
+
+Every stage opens conversations.db through connect(), which puts the
+database in WAL mode and sets a busy timeout.  The scheduler runs
+independent stages concurrently in separate processes (e.g. profile next
+to topics, alignment next to domains); with WAL, readers never block the
+one stage that is writing, and a second writer waits for the lock instead
+of failing with "database is locked".
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+BUSY_TIMEOUT_S = 120.0
+
+
+def connect(db_path: str | Path, timeout: float = BUSY_TIMEOUT_S) -> sqlite3.Connection:
+    """Open *db_path* in WAL mode with a busy timeout of *timeout* seconds."""
+    con = sqlite3.connect(db_path, timeout=timeout)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    con.execute("PRAGMA synchronous = NORMAL")
+    return con
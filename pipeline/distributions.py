@@ -0,0 +1,204 @@
+"""
+Batched count-matrix and divergence helpers.
+
+Shared by the stages that compare topic distributions across time periods
+(alignment, domains).  Everything here works on integer-coded numpy arrays
+so that a whole corpus is reduced to a (periods × categories) count matrix
+with a single bincount, and divergences are evaluated for every period in
+one array operation instead of one scipy call per period.
+
+Period codes are calendar-contiguous: every month / ISO week / day between
+the first and last message gets a row, including empty ones, so rolling
+windows built on cumulative sums cover a fixed span of calendar time.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from scipy.special import rel_entr
+
+PERIODS = ("month", "week", "day")
+
+# Column name used for the period label in each output CSV
+PERIOD_COLUMNS: dict[str, str] = {
+    "month": "year_month",
+    "week":  "week_start",
+    "day":   "date",
+}
+
+_SECONDS_PER_DAY = 86_400
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Period encoding
+# ─────────────────────────────────────────────────────────────────────────────
+
+def period_codes(
+    df: pd.DataFrame,
+    period: str,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Encode each message row of *df* into a contiguous calendar period index.
+
+    Months are taken from the ``year_month`` column (so labels match the
+    parser exactly); weeks (Monday start) and days are derived from the
+    ``timestamp`` column in UTC.
+
+    Returns:
+        (valid, codes, labels)
+        valid  — boolean mask of rows that could be assigned a period
+        codes  — int64 period index for the valid rows (0 … len(labels)-1)
+        labels — string label for every period in the contiguous range
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; expected one of {PERIODS}.")
+
+    if period == "month":
+        ym = df["year_month"].fillna("").astype(str)
+        valid = ym.str.match(r"^\d{4}-\d{2}$").to_numpy()
+        parts = ym[valid].str.split("-", expand=True)
+        raw = (
+            parts[0].astype(np.int64).to_numpy() * 12
+            + parts[1].astype(np.int64).to_numpy() - 1
+        ) if valid.any() else np.zeros(0, dtype=np.int64)
+    else:
+        ts = pd.to_numeric(df["timestamp"], errors="coerce").to_numpy(dtype=float)
+        valid = np.isfinite(ts)
+        day = np.floor(ts[valid] / _SECONDS_PER_DAY).astype(np.int64)
+        # 1970-01-01 was a Thursday → shift by 3 days so weeks start on Monday
+        raw = (day + 3) // 7 if period == "week" else day
+
+    if raw.size == 0:
+        return valid, raw, np.array([], dtype=object)
+
+    lo = int(raw.min())
+    codes = raw - lo
+    span = np.arange(lo, int(raw.max()) + 1)
+
+    if period == "month":
+        labels = np.array([f"{s // 12:04d}-{s % 12 + 1:02d}" for s in span], dtype=object)
+    else:
+        first_day = span * 7 - 3 if period == "week" else span
+        labels = np.datetime_as_string(first_day.astype("datetime64[D]")).astype(object)
+
+    return valid, codes, labels
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Count matrices
+# ─────────────────────────────────────────────────────────────────────────────
+
+def count_matrix(
+    row_codes: np.ndarray,
+    col_codes: np.ndarray,
+    n_rows: int,
+    n_cols: int,
+) -> np.ndarray:
+    """(n_rows × n_cols) int64 contingency table from two code arrays (one bincount)."""
+    key = np.asarray(row_codes, dtype=np.int64) * n_cols + np.asarray(col_codes, dtype=np.int64)
+    return np.bincount(key, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+
+def rolling_sum(counts: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum of each run of *window* consecutive rows, via one cumulative sum.
+
+    Row i of the result covers input rows i … i+window-1, so the result has
+    ``len(counts) - window + 1`` rows (zero rows if the input is shorter).
+    """
+    if window < 1:
+        raise ValueError("window must be >= 1")
+    n = counts.shape[0]
+    if n < window:
+        return np.zeros((0,) + counts.shape[1:], dtype=counts.dtype)
+    cum = np.concatenate(
+        [np.zeros((1,) + counts.shape[1:], dtype=counts.dtype), np.cumsum(counts, axis=0)]
+    )
+    return cum[window:] - cum[:-window]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Divergence
+# ─────────────────────────────────────────────────────────────────────────────
+
+def js_distance(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    Jensen-Shannon distance along the last axis (natural log, square-rooted).
+
+    Batched equivalent of ``scipy.spatial.distance.jensenshannon`` applied to
+    every leading-axis slice.  Inputs may be raw counts — each slice is
+    normalised first.  Slices where either side sums to zero give NaN.
+    """
+    p = np.asarray(p, dtype=float)
+    q = np.asarray(q, dtype=float)
+    p_sum = p.sum(axis=-1, keepdims=True)
+    q_sum = q.sum(axis=-1, keepdims=True)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = p / p_sum
+        q = q / q_sum
+        m = (p + q) / 2.0
+        js = (rel_entr(p, m).sum(axis=-1) + rel_entr(q, m).sum(axis=-1)) / 2.0
+
+    js = np.sqrt(np.maximum(js, 0.0))
+    empty = (p_sum[..., 0] <= 0) | (q_sum[..., 0] <= 0)
+    return np.where(empty, np.nan, js)
+
+
+def bootstrap_js_interval(
+    p_counts: np.ndarray,
+    q_counts: np.ndarray,
+    n_boot: int,
+    rng: np.random.Generator,
+    level: float = 0.95,
+    max_block_cells: int = 4_000_000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Percentile bootstrap interval for the JS distance of each row pair.
+
+    Each row's count vectors are resampled as Multinomial(n, observed shares)
+    for both sides independently; all rows and a block of replicates are
+    drawn in one ``rng.multinomial`` call, and the divergence of every
+    replicate is evaluated with one ``js_distance`` call per block.
+
+    Args:
+        p_counts, q_counts: (rows × categories) count matrices
+        n_boot:             Number of bootstrap replicates
+        rng:                Generator used for all draws
+        level:              Two-sided coverage of the interval
+        max_block_cells:    Upper bound on replicate-array size per block
+
+    Returns:
+        (lower, upper) arrays, one entry per row; NaN where either side is empty.
+    """
+    p_counts = np.asarray(p_counts, dtype=np.int64)
+    q_counts = np.asarray(q_counts, dtype=np.int64)
+    n_rows, n_cols = p_counts.shape
+    lower = np.full(n_rows, np.nan)
+    upper = np.full(n_rows, np.nan)
+
+    n_p = p_counts.sum(axis=1)
+    n_q = q_counts.sum(axis=1)
+    ok = (n_p > 0) & (n_q > 0)
+    if not ok.any() or n_boot < 1:
+        return lower, upper
+
+    n_p, n_q = n_p[ok], n_q[ok]
+    p_share = p_counts[ok] / n_p[:, None]
+    q_share = q_counts[ok] / n_q[:, None]
+    rows = int(ok.sum())
+
+    block = max(1, max_block_cells // (rows * n_cols))
+    reps = []
+    for start in range(0, n_boot, block):
+        b = min(block, n_boot - start)
+        boot_p = rng.multinomial(n_p, p_share, size=(b, rows))
+        boot_q = rng.multinomial(n_q, q_share, size=(b, rows))
+        reps.append(js_distance(boot_p, boot_q))
+
+    alpha = (1.0 - level) / 2.0
+    lo, hi = np.quantile(np.concatenate(reps), [alpha, 1.0 - alpha], axis=0)
+    lower[ok] = lo
+    upper[ok] = hi
+    return lower, upper
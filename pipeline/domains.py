@@ -10,17 +10,20 @@ its constituent fine clusters (weighted by cluster size).
 
 Writes to SQLite:
     node_to_macro_domain  (node_id TEXT, macro_domain INT)
+    thread_features       (rebuilt — see pipeline.threads)
 
 Writes to out_dir:
     macro_cluster_map.csv           — fine_cluster → macro_domain
     macro_domain_summary.csv        — macro domain sizes + top terms
     macro_monthly_metrics.csv       — monthly user entropy + JS divergence
+                                      (with bootstrap interval bounds)
     macro_monthly_domain_shares.csv — monthly user/assistant share per domain
+    macro_weekly_domain_shares.csv  — weekly (Monday start) message counts and
+                                      user/assistant share per domain
 """
 
 from __future__ import annotations
 
-import sqlite3
 from pathlib import Path
 from typing import Callable, Optional
 
@@ -33,12 +36,24 @@ from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import normalize
 
+from pipeline.db import connect
+from pipeline.distributions import bootstrap_js_interval, count_matrix, period_codes
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+from pipeline.threads import refresh as refresh_thread_features
+
+DEPENDS_ON = ("topics",)   # node_to_fine_cluster
+OUTPUT_TABLES = ("node_to_macro_domain", "thread_features")
+OUTPUT_FILES = ("macro_*.csv",)
+
 DEFAULT_N_MACRO           = 8
 TOP_TERMS_FINE            = 20
 TOP_TERMS_MACRO           = 25
 RANDOM_SEED               = 42
 MIN_MSGS_PER_ROLE         = 50   # per-role minimum for JS divergence
 MIN_USER_MSGS_PER_MONTH   = 50   # months below this are excluded from all monthly outputs
+DEFAULT_N_BOOTSTRAP       = 1_000  # replicates for the monthly JS interval
+CI_LEVEL                  = 0.95
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -120,11 +135,47 @@ def _clean_label_terms(terms: list[str], n: int = 4) -> list[str]:
     return result
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Period share tables
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _weekly_shares(df: pd.DataFrame, m: int) -> pd.DataFrame:
+    """
+    Long-format weekly table: week_start, macro_domain, user_msgs, asst_msgs,
+    user_share, asst_share — one row per (week with messages × domain).
+    """
+    valid, codes, labels = period_codes(df, "week")
+    domain = df["macro_domain"].to_numpy(dtype=np.int64)[valid]
+    is_user = (df["role"] == "user").to_numpy()[valid]
+
+    user = count_matrix(codes[is_user], domain[is_user], len(labels), m)
+    asst = count_matrix(codes[~is_user], domain[~is_user], len(labels), m)
+    n_user = user.sum(axis=1, keepdims=True)
+    n_asst = asst.sum(axis=1, keepdims=True)
+    active = (n_user[:, 0] + n_asst[:, 0]) > 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        u_share = np.where(n_user > 0, user / n_user, 0.0)[active]
+        a_share = np.where(n_asst > 0, asst / n_asst, 0.0)[active]
+
+    n_weeks = int(active.sum())
+    return pd.DataFrame({
+        "week_start":   np.repeat(labels[active], m),
+        "macro_domain": np.tile(np.arange(m), n_weeks),
+        "user_msgs":    np.repeat(n_user[active, 0], m),
+        "asst_msgs":    np.repeat(n_asst[active, 0], m),
+        "user_share":   u_share.ravel(),
+        "asst_share":   a_share.ravel(),
+    })
+
+
+@profiled("domains")
 def run(
     db_path: str | Path,
     out_dir: str | Path,
     n_macro: int = DEFAULT_N_MACRO,
     progress_cb: Optional[Callable[[float, str], None]] = None,
+    n_bootstrap: int = DEFAULT_N_BOOTSTRAP,
 ) -> dict:
     """
     Build macro-domain hierarchy from fine cluster assignments in SQLite.
@@ -136,9 +187,13 @@ def run(
         out_dir:     Directory for output CSVs
         n_macro:     Number of macro-domains (default 8)
         progress_cb: Optional callable(fraction 0–1, status_string)
+        n_bootstrap: Bootstrap replicates for the monthly JS interval (0 = skip)
 
     Returns:
-        Summary dict: n_macro, domain labels, monthly metrics shape
+        Summary dict: n_macro, domain labels, monthly metrics shape, and
+        "frames" — the monthly shares / metrics and weekly shares DataFrames,
+        which coupling.run(frames=...) accepts without re-reading the CSVs,
+        and instrumentation (per-step timing, memory and row counts)
     """
     def _cb(frac: float, msg: str):
         if progress_cb:
@@ -147,12 +202,14 @@ def run(
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     db_path = Path(db_path)
+    inst = Recorder("domains")
 
     # ── 1. Load messages + fine cluster assignments ───────────────────────────
     _cb(0.03, "Loading messages and cluster assignments…")
-    con = sqlite3.connect(db_path)
+    inst.step("Load messages")
+    con = connect(db_path)
     df = pd.read_sql_query(
-        """SELECT m.node_id, m.role, m.year_month, m.text,
+        """SELECT m.node_id, m.role, m.year_month, m.timestamp, m.text,
                   n.cluster_id AS fine_cluster
            FROM messages m
            JOIN node_to_fine_cluster n ON m.node_id = n.node_id
@@ -167,11 +224,14 @@ def run(
             "No cluster data found. Run topics.run() before domains.run()."
         )
 
+    inst.rows(len(df))
+
     k_fine = int(df["fine_cluster"].max()) + 1
     texts = df["text"].astype(str).tolist()
 
     # ── 2. Re-fit TF-IDF to get term vocabulary for labelling ─────────────────
     _cb(0.10, "Vectorising for domain labelling…")
+    inst.step("TF-IDF", rows_in=len(texts))
     vec = TfidfVectorizer(
         max_features=60_000,
         min_df=3,
@@ -181,17 +241,21 @@ def run(
     )
     X = vec.fit_transform(texts)
     terms = np.array(vec.get_feature_names_out())
+    inst.rows(X.shape[0])
 
     # ── 3. SVD reduce ─────────────────────────────────────────────────────────
     n_components = min(200, X.shape[1] - 1)
     _cb(0.20, f"Reducing dimensions (SVD → {n_components})…")
+    inst.step("SVD", rows_in=X.shape[0])
     svd = TruncatedSVD(n_components=n_components, random_state=RANDOM_SEED)
     X_red = normalize(svd.fit_transform(X))
+    inst.rows(X_red.shape[0])
 
     fine_labels = df["fine_cluster"].values
 
     # ── 4. Compute fine-cluster centroids + top terms ──────────────────────────
     _cb(0.35, "Computing fine-cluster centroids…")
+    inst.step("Fine centroids", rows_in=X_red.shape[0])
     centroids = np.zeros((k_fine, X_red.shape[1]), dtype=float)
     fine_top_terms: dict[int, list[str]] = {}
 
@@ -204,18 +268,22 @@ def run(
         mean_tfidf = np.asarray(X[idx].mean(axis=0)).ravel()
         top_idx = mean_tfidf.argsort()[-TOP_TERMS_FINE:][::-1]
         fine_top_terms[c] = terms[top_idx].tolist()
+    inst.rows(k_fine)
 
     # ── 5. Meta-cluster fine centroids → macro-domains ────────────────────────
     m = min(n_macro, k_fine)
     _cb(0.50, f"Meta-clustering {k_fine} fine clusters → {m} macro-domains…")
+    inst.step("KMeans", rows_in=k_fine)
     km_macro = KMeans(n_clusters=m, random_state=RANDOM_SEED, n_init=20)
     macro_labels = km_macro.fit_predict(centroids)
 
     fine_to_macro: dict[int, int] = {c: int(macro_labels[c]) for c in range(k_fine)}
     df["macro_domain"] = df["fine_cluster"].map(fine_to_macro)
+    inst.rows(k_fine)
 
     # ── 6. Auto-label macro-domains ───────────────────────────────────────────
     _cb(0.60, "Labelling macro-domains…")
+    inst.step("Macro labels", rows_in=m)
     macro_rows = []
     for md in range(m):
         fine_in_md = [c for c in range(k_fine) if fine_to_macro[c] == md]
@@ -243,10 +311,12 @@ def run(
         })
 
     macro_summary = pd.DataFrame(macro_rows).sort_values("size", ascending=False)
+    inst.rows(len(macro_summary))
 
     # ── 7. Write node_to_macro_domain to SQLite ───────────────────────────────
     _cb(0.68, "Writing macro-domain assignments to database…")
-    con = sqlite3.connect(db_path)
+    inst.step("Write SQLite", rows_in=len(df))
+    con = connect(db_path)
     cur = con.cursor()
     cur.executescript("""
         DROP TABLE IF EXISTS node_to_macro_domain;
@@ -263,9 +333,17 @@ def run(
     )
     con.commit()
     con.close()
+    inst.rows(len(df))
+
+    # New mapping → every thread's domain features are stale
+    _cb(0.72, "Rebuilding thread features…")
+    inst.step("Thread features")
+    thread_summary = refresh_thread_features(db_path, full=True)
+    inst.rows(thread_summary["threads"])
 
     # ── 8. Monthly macro metrics ──────────────────────────────────────────────
     _cb(0.78, "Computing monthly macro metrics…")
+    inst.step("Monthly metrics", rows_in=len(df))
     # Only include months that have enough user messages to be meaningful
     all_months     = sorted(df["year_month"].dropna().unique())
     user_per_month = df[df["role"] == "user"].groupby("year_month").size()
@@ -275,8 +353,10 @@ def run(
     ]
     metrics_rows = []
     shares_rows  = []
+    user_counts  = np.zeros((len(months), m), dtype=np.int64)
+    asst_counts  = np.zeros((len(months), m), dtype=np.int64)
 
-    for month in months:
+    for mi, month in enumerate(months):
         g  = df[df["year_month"] == month]
         ug = g[g["role"] == "user"]
         ag = g[g["role"] == "assistant"]
@@ -295,6 +375,9 @@ def run(
         js = float(jensenshannon(u_share, a_share)) \
             if (u.sum() >= MIN_MSGS_PER_ROLE and a.sum() >= MIN_MSGS_PER_ROLE) \
             else np.nan
+        if np.isfinite(js):
+            user_counts[mi] = u
+            asst_counts[mi] = a
 
         metrics_rows.append({
             "year_month":          month,
@@ -312,11 +395,29 @@ def run(
                 "asst_share":      float(a_share[d]),
             })
 
+    # Bootstrap interval for every qualifying month in one batched resample
+    # (rows left at zero — months without a JS value — come back as NaN)
+    js_lower, js_upper = bootstrap_js_interval(
+        user_counts, asst_counts, n_bootstrap,
+        np.random.default_rng(RANDOM_SEED), level=CI_LEVEL,
+    )
+    for row, lo, hi in zip(metrics_rows, js_lower, js_upper):
+        row["macro_js_ci_lower"] = float(lo)
+        row["macro_js_ci_upper"] = float(hi)
+
     metrics_df = pd.DataFrame(metrics_rows).sort_values("year_month")
     shares_df  = pd.DataFrame(shares_rows).sort_values(["year_month", "macro_domain"])
+    inst.rows(len(metrics_df))
+
+    # ── 8b. Weekly domain shares (for weekly lead–lag coupling) ──────────────
+    _cb(0.88, "Computing weekly domain shares…")
+    inst.step("Weekly shares", rows_in=len(df))
+    weekly_df = _weekly_shares(df, m)
+    inst.rows(len(weekly_df))
 
     # ── 9. Write CSVs ─────────────────────────────────────────────────────────
     _cb(0.92, "Writing CSVs…")
+    inst.step("Write CSV")
     map_df = pd.DataFrame([
         {"fine_cluster": c, "macro_domain": fine_to_macro[c],
          "fine_top_terms": ", ".join(fine_top_terms.get(c, []))}
@@ -327,6 +428,8 @@ def run(
     map_df.to_csv(       out_dir / "macro_cluster_map.csv",             index=False)
     metrics_df.to_csv(   out_dir / "macro_monthly_metrics.csv",         index=False)
     shares_df.to_csv(    out_dir / "macro_monthly_domain_shares.csv",   index=False)
+    weekly_df.to_csv(    out_dir / "macro_weekly_domain_shares.csv",    index=False)
+    inst.rows(len(macro_summary) + len(map_df) + len(metrics_df) + len(shares_df) + len(weekly_df))
 
     _cb(1.0, "Macro-domain mapping complete.")
 
@@ -334,4 +437,12 @@ def run(
         "n_macro":         m,
         "domain_labels":   macro_summary["auto_label"].tolist(),
         "months_computed": len(metrics_df),
+        "weeks_computed":  int(weekly_df["week_start"].nunique()) if len(weekly_df) else 0,
+        "threads_featurised": thread_summary["threads"],
+        "instrumentation": inst.finish(),
+        "frames": {
+            "shares":  shares_df,
+            "metrics": metrics_df,
+            "weekly":  weekly_df,
+        },
     }
@@ -0,0 +1,165 @@
+"""
+Step 7b — Topic drift between months.
+
+Where alignment.py compares user against assistant within a month, this
+compares each role against itself across months: the full T×T
+Jensen-Shannon distance matrix between every pair of monthly topic
+distributions, for both roles, over fine clusters and macro-domains.
+
+Each matrix comes from one vectorised pairwise operation on the
+(month × cluster) share matrix — no loop over month pairs.
+
+Requires topics.run() (node_to_fine_cluster) and, for the macro level,
+domains.run() (node_to_macro_domain).  The macro level is skipped if
+domains has not run yet; as a runner stage, drift runs after domains.
+
+Outputs (out_dir):
+    topic_drift.npz                   — float32 matrices + month labels,
+                                        keys "{level}_{role}" / "{level}_{role}_months"
+    topic_drift_{level}_{role}.csv    — same matrix as a labelled square CSV
+                                        (level ∈ fine, macro; role ∈ user, assistant)
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.db import connect
+from pipeline.distributions import count_matrix, js_distance, period_codes
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+
+DEPENDS_ON = ("domains",)   # node_to_macro_domain (and topics' node_to_fine_cluster)
+OUTPUT_FILES = ("topic_drift.npz", "topic_drift_*.csv")
+
+MIN_MSGS_PER_MONTH = 50   # months below this (per role) are left out of that role's matrix
+
+ROLES = ("user", "assistant")
+
+_LEVELS = {
+    "fine":  ("node_to_fine_cluster", "cluster_id"),
+    "macro": ("node_to_macro_domain", "macro_domain"),
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _load_level(con: sqlite3.Connection, table: str, column: str) -> pd.DataFrame:
+    return pd.read_sql_query(
+        f"""SELECT m.role, m.year_month, n.{column} AS category
+            FROM messages m
+            JOIN {table} n ON m.node_id = n.node_id
+            WHERE m.role IN ('user', 'assistant')""",
+        con,
+    )
+
+
+def _has_table(con: sqlite3.Connection, table: str) -> bool:
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _drift_matrix(counts: np.ndarray) -> np.ndarray:
+    """
+    Pairwise JS distance between every pair of rows of a (T × K) count matrix.
+
+    Broadcasts the matrix against itself to a (T × T × K) stack and reduces
+    the last axis in one ``js_distance`` call.
+    """
+    return js_distance(counts[:, None, :], counts[None, :, :])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+@profiled("drift")
+def run(
+    db_path: str | Path,
+    out_dir: str | Path,
+    progress_cb: Optional[Callable[[float, str], None]] = None,
+) -> dict:
+    """
+    Compute month-by-month topic drift matrices for each role and level.
+
+    Args:
+        db_path:     SQLite database
+        out_dir:     Directory for output files
+        progress_cb: Optional callable(fraction 0–1, status_string)
+
+    Returns:
+        Summary dict keyed "{level}_{role}" with months, mean consecutive-month
+        drift and maximum pairwise drift, and instrumentation (per-step
+        timing, memory and row counts)
+    """
+    def _cb(frac: float, msg: str):
+        if progress_cb:
+            progress_cb(frac, msg)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    inst = Recorder("drift")
+
+    con = connect(db_path)
+    if not _has_table(con, "node_to_fine_cluster"):
+        con.close()
+        raise ValueError("No cluster assignments found. Run topics.run() before drift.run().")
+
+    arrays: dict[str, np.ndarray] = {}
+    summary: dict = {}
+    levels = [lv for lv, (table, _) in _LEVELS.items() if _has_table(con, table)]
+
+    for li, level in enumerate(levels):
+        _cb(0.05 + 0.85 * li / len(levels), f"Computing {level} topic drift…")
+        table, column = _LEVELS[level]
+        inst.step(f"Load {level} assignments")
+        df = _load_level(con, table, column)
+        inst.rows(len(df))
+        if df.empty:
+            continue
+
+        valid, codes, labels = period_codes(df, "month")
+        category = df["category"].to_numpy(dtype=np.int64)[valid]
+        roles = df["role"].to_numpy()[valid]
+        n_cat = int(category.max()) + 1
+
+        inst.step(f"Drift matrices ({level})", rows_in=len(df))
+        for role in ROLES:
+            mask = roles == role
+            counts = count_matrix(codes[mask], category[mask], len(labels), n_cat)
+            keep = counts.sum(axis=1) >= MIN_MSGS_PER_MONTH
+            months = labels[keep]
+            D = _drift_matrix(counts[keep])
+
+            key = f"{level}_{role}"
+            arrays[key] = D.astype(np.float32)
+            arrays[f"{key}_months"] = months.astype(str)
+
+            pd.DataFrame(np.round(D, 6), index=pd.Index(months, name="year_month"),
+                         columns=months).to_csv(out_dir / f"topic_drift_{key}.csv")
+
+            summary[key] = {
+                "months":           int(len(months)),
+                "mean_step_drift":  round(float(np.nanmean(np.diagonal(D, 1))), 4)
+                                    if len(months) > 1 else None,
+                "max_drift":        round(float(np.nanmax(D)), 4) if len(months) else None,
+            }
+        inst.rows(sum(summary[f"{level}_{role}"]["months"] for role in ROLES))
+
+    con.close()
+
+    _cb(0.95, "Writing drift arrays…")
+    inst.step("Write arrays")
+    np.savez_compressed(out_dir / "topic_drift.npz", **arrays)
+
+    _cb(1.0, "Topic drift complete.")
+    summary["instrumentation"] = inst.finish()
+    return summary
@@ -3,6 +3,12 @@ Steps 10a/b — Behavioural dynamics.
 
 Sub-steps (all run from a single run() call):
 
+  10a1  scale_separation     — (optional) split the variance of each domain's
+                               message indicator into between-month and
+                               within-month parts (law of total variance),
+                               per role, from one month × domain count
+                               matrix.  Needs ≥ 6 qualifying months.
+
   10a2  state_segmentation   — assign each month to Exploration /
                                Consolidation / Transitional based on
                                quantile thresholds on macro entropy + JS.
@@ -10,44 +16,188 @@ Sub-steps (all run from a single run() call):
 
   10a3  rolling_entropy      — sliding-window Shannon entropy over all
                                user messages ordered by timestamp.
-                               window = stride = 250 messages.
+                               Message-count windows (default window =
+                               stride = 250) and calendar windows (default
+                               7 and 30 days, advancing by 7 days).  One
+                               incremental pass per window family: cluster
+                               counts and Σ c·log c are updated as messages
+                               enter and leave the window.
 
   10b   shift_initiation     — detect domain shifts within threads and
                                test whether user or assistant initiates
-                               more than 50 % (permutation test, N=5,000).
+                               more than 50 % (exact binomial test).
+
+  10b2  episode_initiation   — (optional) segment threads of ≥ 20 messages
+                               into episodes (runs of one macro-domain,
+                               ≥ 3 messages) with a run-length encoding over
+                               the whole ordered message array; test who
+                               starts the episodes that do not open a thread.
 
-Note: scale_separation (10a1) and episode_initiation (10b2) are omitted
-      here — they require ≥6 qualifying months and ≥20-message threads
-      respectively, which may not hold for all user corpora.  They can be
-      added as optional steps once the base pipeline is validated.
+Thread-level facts (length, shifts, turn balance) come from the
+thread_features table (pipeline.threads), refreshed incrementally at the
+start of 10b; message rows are read only for threads that can contribute.
+
+The optional steps are skipped (with a note in the summary) when the corpus
+has too few qualifying months or long threads.
 
 Outputs (all written to out_dir):
+    scale_separation.csv
     monthly_states.csv
     monthly_states_refined.csv
     state_transition_summary.csv
     state_transition_summary_refined.csv
-    rolling_entropy_250.csv
-    shift_initiation_summary.csv
+    rolling_entropy_250.csv           — message-count windows
+    rolling_entropy_{d}d.csv          — one per calendar window length d (days)
+    thread_features.csv               — export of the thread_features table
+    shift_initiation_summary.csv      — p_vs_random + test ("binomial-exact");
+                                        summaries from the old permutation
+                                        test had perm_p_vs_random instead
     shift_initiation_detail.csv
+    episode_initiation_summary.csv
+    episode_initiation_detail.csv
 """
 
 from __future__ import annotations
 
-import sqlite3
+import math
+import warnings
 from pathlib import Path
 from typing import Callable, Optional
 
 import numpy as np
 import pandas as pd
-from scipy.stats import entropy as shannon_entropy
+from scipy.stats import binomtest
+
+from pipeline.db import connect
+from pipeline.distributions import count_matrix, period_codes
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+from pipeline.threads import load as load_thread_features
+from pipeline.threads import refresh as refresh_thread_features
+
+DEPENDS_ON = ("domains",)   # node_to_macro_domain, macro_monthly_metrics.csv
+OUTPUT_TABLES = ("thread_features",)
+OUTPUT_FILES = (
+    "scale_separation.csv", "monthly_states*.csv", "state_transition_summary*.csv",
+    "rolling_entropy_*.csv", "shift_initiation_*.csv", "episode_initiation_*.csv",
+    "thread_features.csv",
+)
 
 DEFAULT_CONFIG = {
     "rolling_window":    250,
     "rolling_stride":    250,
-    "shift_permutations": 5_000,
-    "random_seed":       42,
+    "rolling_days":      [7, 30],  # calendar window lengths; [] = count windows only
+    "rolling_stride_days": 7,
+    "scale_separation":  True,
+    "scale_min_months":  6,
+    "scale_min_msgs_per_month": 50,  # per role; months below this are excluded
+    "episode_initiation": True,
+    "episode_min_thread_len": 20,
+    "episode_min_len":   3,        # shorter domain runs are not episodes
 }
 
+# Options of the old shift-initiation permutation test; the exact binomial
+# test needs none of them, so they are ignored with a warning
+_OBSOLETE_CONFIG = ("shift_permutations", "random_seed", "permutation_workers", "early_stop")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 10a1 — Scale separation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _variance_split(counts: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Between- / within-month variance of one-hot domain indicators.
+
+    counts is (months × domains).  For domain j with monthly share p_tj,
+    month weight w_t = n_t / N and pooled share p̄_j:
+
+        between_j = Σ_t w_t (p_tj − p̄_j)²
+        within_j  = Σ_t w_t p_tj (1 − p_tj)
+        between_j + within_j = p̄_j (1 − p̄_j)
+
+    Returned arrays have one entry per domain plus a final "all domains"
+    entry (sums over j, i.e. the Gini–Simpson decomposition).
+    """
+    counts = counts.astype(float)
+    n_t = counts.sum(axis=1, keepdims=True)
+    w = n_t / n_t.sum()
+    p = counts / n_t
+    p_bar = (w * p).sum(axis=0)
+
+    between = (w * (p - p_bar) ** 2).sum(axis=0)
+    within = (w * p * (1.0 - p)).sum(axis=0)
+    return {
+        "between": np.append(between, between.sum()),
+        "within":  np.append(within, within.sum()),
+        "p_bar":   np.append(p_bar, 1.0),
+    }
+
+
+def _scale_separation(
+    db_path: Path,
+    out_dir: Path,
+    min_months: int,
+    min_msgs: int,
+) -> dict:
+    """
+    Between- vs within-month variance of macro-domain use, per role.
+
+    eta_sq = between / total is the share of domain variance carried by
+    month-to-month drift (slow scale); the rest is within-month churn.
+    """
+    con = connect(db_path)
+    df = pd.read_sql_query(
+        """SELECT m.role, m.year_month, n.macro_domain
+           FROM messages m
+           JOIN node_to_macro_domain n ON m.node_id = n.node_id
+           WHERE m.role IN ('user', 'assistant')""",
+        con,
+    )
+    con.close()
+
+    valid, month, labels = period_codes(df, "month")
+    domain = df["macro_domain"].to_numpy(dtype=np.int64)[valid]
+    is_user = (df["role"] == "user").to_numpy()[valid]
+    n_dom = int(domain.max()) + 1 if domain.size else 0
+
+    tables = {
+        "user":      count_matrix(month[is_user], domain[is_user], len(labels), n_dom),
+        "assistant": count_matrix(month[~is_user], domain[~is_user], len(labels), n_dom),
+    }
+    keep = (tables["user"].sum(axis=1) >= min_msgs) & (tables["assistant"].sum(axis=1) >= min_msgs)
+    n_months = int(keep.sum())
+    if n_months < min_months:
+        return {"scale_separation": f"skipped — {n_months} qualifying months (need ≥ {min_months})"}
+
+    frames = []
+    for role, counts in tables.items():
+        split = _variance_split(counts[keep])
+        total = split["between"] + split["within"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            eta_sq = np.where(total > 0, split["between"] / total, np.nan)
+            ratio = np.where(split["within"] > 0, split["between"] / split["within"], np.nan)
+        frames.append(pd.DataFrame({
+            "role":           role,
+            "macro_domain":   [str(j) for j in range(n_dom)] + ["all"],
+            "pooled_share":   np.round(split["p_bar"], 6),
+            "between_var":    split["between"],
+            "within_var":     split["within"],
+            "eta_sq":         eta_sq,
+            "between_within": ratio,
+            "n_months":       n_months,
+        }))
+
+    result = pd.concat(frames, ignore_index=True)
+    result.to_csv(out_dir / "scale_separation.csv", index=False)
+
+    overall = result[result["macro_domain"] == "all"].set_index("role")["eta_sq"]
+    return {
+        "scale_months":      n_months,
+        "scale_eta_sq_user": round(float(overall["user"]), 6),
+        "scale_eta_sq_asst": round(float(overall["assistant"]), 6),
+    }
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 10a2 — State segmentation
@@ -134,17 +284,61 @@ def _state_segmentation(metrics_path: Path, out_dir: Path) -> pd.DataFrame:
 # 10a3 — Rolling entropy
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _rolling_entropy(
-    db_path: Path,
-    out_dir: Path,
-    window: int,
-    stride: int,
-) -> pd.DataFrame:
+def _sliding_entropy(labels: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
     """
-    Sliding-window Shannon entropy over user messages ordered by timestamp.
-    Each window covers `window` messages; windows advance by `stride`.
+    Shannon entropy (bits) of labels[lo[i]:hi[i]] for every window i.
+
+    *lo* and *hi* must be non-decreasing, so each message enters and leaves
+    the window at most once.  With N messages in the window and counts c,
+    H = log2 N − Σ c·log2 c / N, so only Σ c·log2 c has to be kept up to
+    date — two table lookups per message entering or leaving.  Empty
+    windows give NaN.
     """
-    con = sqlite3.connect(db_path)
+    codes = np.unique(labels, return_inverse=True)[1].tolist()
+    max_n = int((hi - lo).max()) if len(lo) else 0
+    clogc = (np.arange(max_n + 1) * np.log2(np.maximum(np.arange(max_n + 1), 1))).tolist()
+
+    counts = [0] * (max(codes) + 1 if codes else 0)
+    s = 0.0
+    left = right = 0
+    out = np.full(len(lo), np.nan)
+    for i, (a, b) in enumerate(zip(lo.tolist(), hi.tolist())):
+        while right < b:
+            c = counts[codes[right]]
+            s += clogc[c + 1] - clogc[c]
+            counts[codes[right]] = c + 1
+            right += 1
+        while left < a:
+            c = counts[codes[left]]
+            s += clogc[c - 1] - clogc[c]
+            counts[codes[left]] = c - 1
+            left += 1
+        n = b - a
+        if n > 0:
+            out[i] = max(0.0, math.log2(n) - s / n)
+    return out
+
+
+def _window_medians(ts: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Median timestamp of each window over sorted *ts*, ignoring NaNs.
+
+    SQLite sorts NULL timestamps first, so the non-NaN part of every window
+    is the contiguous, sorted range [max(lo, n_nan), hi) and its median
+    is read off by index.
+    """
+    n_nan = int(np.isnan(ts).sum())
+    a = np.maximum(lo, n_nan)
+    n = hi - a
+    out = np.full(len(lo), np.nan)
+    ok = n > 0
+    a, n = a[ok], n[ok]
+    out[ok] = (ts[a + (n - 1) // 2] + ts[a + n // 2]) / 2.0
+    return out
+
+
+def _load_user_clusters(db_path: Path) -> pd.DataFrame:
+    con = connect(db_path)
     df = pd.read_sql_query(
         """SELECT m.node_id, m.timestamp, n.cluster_id
            FROM messages m
@@ -154,100 +348,275 @@ def _rolling_entropy(
         con,
     )
     con.close()
+    return df
 
+
+def _rolling_entropy(
+    df: pd.DataFrame,
+    out_dir: Path,
+    window: int,
+    stride: int,
+) -> pd.DataFrame:
+    """
+    Sliding-window Shannon entropy over user messages ordered by timestamp.
+    Each window covers `window` messages; windows advance by `stride`.
+    """
     if len(df) < window:
         return pd.DataFrame()
 
-    rows = []
-    for start in range(0, len(df) - window + 1, stride):
-        chunk = df.iloc[start: start + window]
-        counts = chunk["cluster_id"].value_counts()
-        probs  = counts / counts.sum()
-        H      = float(shannon_entropy(probs, base=2))  # bits
-        mid_ts = chunk["timestamp"].median()
-        rows.append({
-            "window_start":       start,
-            "window_end":         start + window - 1,
-            "mid_timestamp":      mid_ts,
-            "entropy_bits":       round(H, 4),
-        })
-
-    result = pd.DataFrame(rows)
+    lo = np.arange(0, len(df) - window + 1, stride)
+    hi = lo + window
+    ts = df["timestamp"].to_numpy(dtype=float)
+
+    result = pd.DataFrame({
+        "window_start":  lo,
+        "window_end":    hi - 1,
+        "mid_timestamp": _window_medians(ts, lo, hi),
+        "entropy_bits":  np.round(_sliding_entropy(df["cluster_id"].to_numpy(), lo, hi), 4),
+    })
     result.to_csv(out_dir / "rolling_entropy_250.csv", index=False)
     return result
 
 
+def _calendar_entropy(
+    df: pd.DataFrame,
+    out_dir: Path,
+    days: int,
+    stride_days: int,
+) -> pd.DataFrame:
+    """
+    Sliding-window entropy over calendar windows [start, start + days),
+    with starts every `stride_days` from the first message's UTC midnight.
+    Window bounds are located by binary search on the sorted timestamps.
+    """
+    valid = df["timestamp"].notna().to_numpy()
+    ts = df["timestamp"].to_numpy(dtype=float)[valid]
+    labels = df["cluster_id"].to_numpy()[valid]
+    if len(ts) == 0:
+        return pd.DataFrame()
+
+    day = 86_400.0
+    first = np.floor(ts[0] / day) * day
+    starts = np.arange(first, ts[-1] + 1.0, stride_days * day)
+    lo = np.searchsorted(ts, starts, side="left")
+    hi = np.searchsorted(ts, starts + days * day, side="left")
+
+    result = pd.DataFrame({
+        "window_start":  pd.to_datetime(starts, unit="s").strftime("%Y-%m-%d"),
+        "window_end":    pd.to_datetime(starts + (days - 1) * day, unit="s").strftime("%Y-%m-%d"),
+        "n_messages":    hi - lo,
+        "mid_timestamp": _window_medians(ts, lo, hi),
+        "entropy_bits":  np.round(_sliding_entropy(labels, lo, hi), 4),
+    })
+    result.to_csv(out_dir / f"rolling_entropy_{days}d.csv", index=False)
+    return result
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 10b — Shift initiation
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _shift_initiation(
-    db_path: Path,
-    out_dir: Path,
-    n_perm: int,
-    rng: np.random.Generator,
-) -> dict:
+def _detect_shifts(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Detect macro-domain shifts within threads; test who initiates them.
+    Macro-domain shifts within threads.
+
+    *df* must be ordered by thread_id, timestamp.  A shift is any message
+    whose domain differs from the previous message of the same thread; one
+    shifted-array comparison over the whole frame, with thread boundaries
+    (and messages without a thread) masked out.
     """
-    con = sqlite3.connect(db_path)
+    tid = df["thread_id"].to_numpy(dtype=object)
+    dom = df["macro_domain"].to_numpy()
+    has_tid = pd.notna(tid)
+
+    same_thread = (tid[1:] == tid[:-1]) & has_tid[1:] & has_tid[:-1]
+    at = np.flatnonzero(same_thread & (dom[1:] != dom[:-1])) + 1
+
+    return pd.DataFrame({
+        "thread_id":      tid[at],
+        "initiator_role": df["role"].to_numpy(dtype=object)[at],
+        "from_domain":    dom[at - 1],
+        "to_domain":      dom[at],
+    })
+
+
+def _load_thread_domains(db_path: Path, min_thread_len: Optional[int] = None) -> pd.DataFrame:
+    """
+    thread_id, role, macro_domain per message, ordered by thread then time.
+
+    Only threads that can contribute are read, as listed in thread_features:
+    those with at least one shift, or (for episodes) at least
+    *min_thread_len* mapped messages.
+    """
+    long_threads = "OR n_mapped >= ?" if min_thread_len is not None else ""
+    con = connect(db_path)
     df = pd.read_sql_query(
-        """SELECT m.node_id, m.thread_id, m.role, m.timestamp, n.macro_domain
-           FROM messages m
-           JOIN node_to_macro_domain n ON m.node_id = n.node_id
-           WHERE m.role IN ('user', 'assistant')
-           ORDER BY m.thread_id, m.timestamp ASC""",
+        f"""SELECT m.thread_id, m.role, n.macro_domain
+            FROM messages m
+            JOIN node_to_macro_domain n ON m.node_id = n.node_id
+            WHERE m.role IN ('user', 'assistant')
+              AND m.thread_id IN (
+                  SELECT thread_id FROM thread_features WHERE n_shifts > 0 {long_threads}
+              )
+            ORDER BY m.thread_id, m.timestamp ASC""",
         con,
+        params=(int(min_thread_len),) if min_thread_len is not None else (),
     )
     con.close()
+    return df
+
+
+def _shift_initiation(df: pd.DataFrame, out_dir: Path) -> dict:
+    """
+    Detect macro-domain shifts within threads; test who initiates them.
 
+    Under the null each shift is equally likely to come from either role,
+    so the user-initiated count is Binomial(total, ½) and the two-sided
+    p-value is exact.
+    """
     if df.empty:
         return {}
 
-    shifts = []
-    for _, grp in df.groupby("thread_id"):
-        grp = grp.reset_index(drop=True)
-        for i in range(1, len(grp)):
-            if grp.loc[i, "macro_domain"] != grp.loc[i - 1, "macro_domain"]:
-                shifts.append({
-                    "thread_id":      grp.loc[i, "thread_id"],
-                    "initiator_role": grp.loc[i, "role"],
-                    "from_domain":    grp.loc[i - 1, "macro_domain"],
-                    "to_domain":      grp.loc[i, "macro_domain"],
-                })
-
-    shift_df = pd.DataFrame(shifts)
+    shift_df = _detect_shifts(df)
     if shift_df.empty:
         return {"total_shifts": 0}
 
     shift_df.to_csv(out_dir / "shift_initiation_detail.csv", index=False)
 
     total  = len(shift_df)
-    roles  = shift_df["initiator_role"].values
-    u_prop = float((roles == "user").mean())
+    n_user = int((shift_df["initiator_role"] == "user").sum())
+    u_prop = n_user / total
     a_prop = 1.0 - u_prop
-
-    # Two-tailed permutation test vs 50/50
-    observed_abs = abs(u_prop - 0.5)
-    null_abs = np.array([
-        abs((rng.permutation(roles) == "user").mean() - 0.5)
-        for _ in range(n_perm)
-    ])
-    p_perm = float((null_abs >= observed_abs).mean())
+    p_val  = float(binomtest(n_user, total, 0.5).pvalue)
 
     summary = pd.DataFrame([{
         "total_shifts":           total,
+        "user_shifts":            n_user,
         "user_initiated_prop":    round(u_prop, 4),
         "asst_initiated_prop":    round(a_prop, 4),
-        "perm_p_vs_random":       round(p_perm, 4),
-        "n_permutations":         n_perm,
+        "p_vs_random":            round(p_val, 4),
+        "test":                   "binomial-exact",
     }])
     summary.to_csv(out_dir / "shift_initiation_summary.csv", index=False)
 
     return {
         "total_shifts":        total,
         "user_initiated_prop": round(u_prop, 4),
-        "p_perm":              round(p_perm, 4),
+        "p_vs_random":         round(p_val, 4),
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 10b2 — Episode initiation
+# ─────────────────────────────────────────────────────────────────────────────
+
+_EPISODE_COLUMNS = [
+    "thread_id", "episode", "start_pos", "n_messages", "macro_domain", "initiator_role",
+]
+
+
+def _run_starts(keys: np.ndarray) -> np.ndarray:
+    """Boolean mask: row starts a new run of equal consecutive *keys*."""
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    return starts
+
+
+def _episodes(df: pd.DataFrame, min_thread_len: int, min_len: int) -> pd.DataFrame:
+    """
+    Domain episodes of long threads, by run-length encoding.
+
+    *df* must be ordered by thread_id, timestamp.  Threads are runs of equal
+    thread_id (messages without one are dropped); threads shorter than
+    *min_thread_len* are dropped; the remaining rows are cut into runs of
+    one macro-domain, and runs of at least *min_len* messages are episodes.
+    """
+    df = df[df["thread_id"].notna()]
+    tid = df["thread_id"].to_numpy(dtype=object)
+    if len(tid) == 0:
+        return pd.DataFrame(columns=_EPISODE_COLUMNS)
+
+    # Threads: run-length encode thread_id, keep the long ones
+    t_start = _run_starts(tid)
+    t_id = np.cumsum(t_start) - 1
+    t_len = np.bincount(t_id)
+    keep = t_len[t_id] >= min_thread_len
+
+    tid = tid[keep]
+    dom = df["macro_domain"].to_numpy()[keep]
+    role = df["role"].to_numpy(dtype=object)[keep]
+    t_first = np.flatnonzero(t_start[keep])        # row where each kept thread begins
+    t_id = np.cumsum(_run_starts(tid)) - 1
+    if len(tid) == 0:
+        return pd.DataFrame(columns=_EPISODE_COLUMNS)
+
+    # Domain runs inside threads: a run breaks on a domain change or a new thread
+    r_start = _run_starts(dom)
+    r_start[t_first] = True
+    r_first = np.flatnonzero(r_start)
+    r_len = np.diff(np.append(r_first, len(dom)))
+
+    ep = r_len >= min_len
+    first, length = r_first[ep], r_len[ep]
+    ep_thread = t_id[first]
+    new_thread = _run_starts(ep_thread)
+    idx = np.arange(len(first))
+    ep_index = idx - np.maximum.accumulate(np.where(new_thread, idx, 0))
+
+    return pd.DataFrame({
+        "thread_id":      tid[first],
+        "episode":        ep_index,
+        "start_pos":      first - t_first[ep_thread],
+        "n_messages":     length,
+        "macro_domain":   dom[first],
+        "initiator_role": role[first],
+    })
+
+
+def _episode_initiation(
+    df: pd.DataFrame,
+    out_dir: Path,
+    min_thread_len: int,
+    min_len: int,
+) -> dict:
+    """
+    Who starts domain episodes inside long threads.
+
+    Episodes that open their thread (start_pos 0) are reported but not
+    tested — nobody switched into them.  The rest are tested against 50/50
+    with an exact binomial test, as for shift initiation.
+    """
+    episodes = _episodes(df, min_thread_len, min_len)
+    n_threads = int(episodes["thread_id"].nunique())
+    if n_threads == 0:
+        return {"episode_initiation": f"skipped — no threads with ≥ {min_thread_len} messages"}
+
+    episodes.to_csv(out_dir / "episode_initiation_detail.csv", index=False)
+
+    switched = episodes[episodes["start_pos"] > 0]
+    total = len(switched)
+    n_user = int((switched["initiator_role"] == "user").sum())
+    u_prop = n_user / total if total else float("nan")
+    p_val = float(binomtest(n_user, total, 0.5).pvalue) if total else float("nan")
+
+    summary = pd.DataFrame([{
+        "threads_used":         n_threads,
+        "total_episodes":       len(episodes),
+        "initiated_episodes":   total,
+        "user_initiated":       n_user,
+        "user_initiated_prop":  round(u_prop, 4),
+        "asst_initiated_prop":  round(1.0 - u_prop, 4),
+        "mean_episode_len":     round(float(episodes["n_messages"].mean()), 2),
+        "p_vs_random":          round(p_val, 4),
+        "test":                 "binomial-exact",
+    }])
+    summary.to_csv(out_dir / "episode_initiation_summary.csv", index=False)
+
+    return {
+        "episode_threads":             n_threads,
+        "episodes":                    len(episodes),
+        "episode_user_initiated_prop": round(u_prop, 4),
+        "episode_p_vs_random":         round(p_val, 4),
     }
 
 
@@ -255,6 +624,7 @@ def _shift_initiation(
 # Public API
 # ─────────────────────────────────────────────────────────────────────────────
 
+@profiled("dynamics")
 def run(
     db_path: str | Path,
     out_dir: str | Path,
@@ -276,11 +646,23 @@ def run(
         progress_cb: Optional callable(fraction 0–1, status_string)
 
     Returns:
-        Summary dict with results from each sub-step.
+        Summary dict with results from each sub-step, and instrumentation
+        (per-step timing, memory and row counts).
     """
     cfg = dict(DEFAULT_CONFIG)
     if config:
         cfg.update(config)
+    obsolete = [key for key in _OBSOLETE_CONFIG if key in cfg]
+    for key in obsolete:
+        del cfg[key]
+    if obsolete:
+        warnings.warn(
+            f"dynamics config {obsolete} ignored: shift initiation now uses an exact "
+            "binomial test (shift_initiation_summary.csv column p_vs_random, formerly "
+            "perm_p_vs_random).",
+            UserWarning,
+            stacklevel=2,
+        )
 
     def _cb(frac: float, msg: str):
         if progress_cb:
@@ -288,15 +670,27 @@ def run(
 
     out_dir  = Path(out_dir)
     db_path  = Path(db_path)
-    rng      = np.random.default_rng(cfg["random_seed"])
     results  = {}
+    inst     = Recorder("dynamics")
+
+    # ── 10a1 Scale separation (optional) ──────────────────────────────────────
+    if cfg["scale_separation"]:
+        _cb(0.02, "10a1 — Separating monthly and within-month variance…")
+        inst.step("10a1 Scale separation")
+        results.update(_scale_separation(
+            db_path, out_dir,
+            min_months=cfg["scale_min_months"],
+            min_msgs=cfg["scale_min_msgs_per_month"],
+        ))
 
     # ── 10a2 State segmentation ───────────────────────────────────────────────
     _cb(0.05, "10a2 — Assigning behavioural states…")
+    inst.step("10a2 State segmentation")
     metrics_path = out_dir / "macro_monthly_metrics.csv"
     if metrics_path.exists():
         states_df = _state_segmentation(metrics_path, out_dir)
         results["state_months"] = len(states_df)
+        inst.rows(len(states_df))
         if "state" in states_df.columns:
             results["state_counts"] = states_df["state"].value_counts().to_dict()
     else:
@@ -304,21 +698,53 @@ def run(
 
     # ── 10a3 Rolling entropy ──────────────────────────────────────────────────
     _cb(0.30, "10a3 — Computing rolling topic entropy…")
+    inst.step("10a3 Rolling entropy")
+    user_df = _load_user_clusters(db_path)
+    inst.rows(rows_in=len(user_df))
     rolling_df = _rolling_entropy(
-        db_path, out_dir,
+        user_df, out_dir,
         window=cfg["rolling_window"],
         stride=cfg["rolling_stride"],
     )
     results["rolling_windows"] = len(rolling_df)
+    for days in cfg["rolling_days"]:
+        cal_df = _calendar_entropy(user_df, out_dir, int(days), int(cfg["rolling_stride_days"]))
+        results[f"rolling_windows_{int(days)}d"] = len(cal_df)
+    inst.rows(sum(v for k, v in results.items() if k.startswith("rolling_windows")))
+
+    # ── Thread features (refreshed incrementally, shared with the reports) ────
+    _cb(0.55, "Refreshing thread features…")
+    inst.step("Thread features")
+    refresh_thread_features(db_path)
+    features = load_thread_features(db_path)
+    features.drop(columns="signature").to_csv(out_dir / "thread_features.csv", index=False)
+    results["threads"] = len(features)
+    results["threads_with_shifts"] = int((features["n_shifts"] > 0).sum())
+    inst.rows(len(features))
 
     # ── 10b Shift initiation ──────────────────────────────────────────────────
     _cb(0.60, "10b — Detecting domain shifts…")
-    shift_results = _shift_initiation(
-        db_path, out_dir,
-        n_perm=cfg["shift_permutations"],
-        rng=rng,
+    inst.step("10b Shift initiation")
+    thread_df = _load_thread_domains(
+        db_path,
+        min_thread_len=cfg["episode_min_thread_len"] if cfg["episode_initiation"] else None,
     )
-    results.update(shift_results)
-
+    inst.rows(rows_in=len(thread_df))
+    if not features.empty:
+        results.update(_shift_initiation(thread_df, out_dir) or {"total_shifts": 0})
+        inst.rows(results["total_shifts"])
+
+    # ── 10b2 Episode initiation (optional) ────────────────────────────────────
+    if cfg["episode_initiation"] and not thread_df.empty:
+        _cb(0.85, "10b2 — Segmenting long threads into episodes…")
+        inst.step("10b2 Episode initiation", rows_in=len(thread_df))
+        results.update(_episode_initiation(
+            thread_df, out_dir,
+            min_thread_len=cfg["episode_min_thread_len"],
+            min_len=cfg["episode_min_len"],
+        ))
+        inst.rows(results.get("episodes"))
+
+    results["instrumentation"] = inst.finish()
     _cb(1.0, "Dynamics analysis complete.")
     return results
@@ -0,0 +1,486 @@
+"""
+Numerical equivalence harness: optimised code paths against the reference.
+
+Speedups must not silently move the published metrics.  For each corpus
+the harness runs the whole pipeline once in the reference configuration
+(REFERENCE_CONFIG: every optimisation off, pinned explicitly so a change
+of defaults cannot move the reference) and once per optimised mode, then
+compares the two work directories:
+
+    CSVs      every *.csv under the work dir (incl. profile/), column by
+              column: numbers within the column's Tolerance, NaNs in the
+              same places, everything else equal; files, columns and row
+              counts must match.  Rows are matched by position, or on the
+              ROW_KEYS columns for files sorted by a compared value.
+    clusters  message → cluster assignments (node_to_fine_cluster,
+              node_to_macro_domain) by adjusted Rand index, i.e. up to a
+              permutation of the labels.  Label-valued CSV columns
+              (cluster_id, macro_domain, …) are still compared literally,
+              so a mode that only relabels clusters passes on ARI but
+              shows in those columns.
+
+Modes (MODES) in this tree:
+
+    parallel-stages        runner n_workers=3 (stages in worker processes)
+    parallel-scoring       profile lexicon scoring in a 2-process pool
+    parallel-permutations  SeedSequence streams for profile and coupling
+                           permutations — different draws, so p-values
+                           agree within Monte-Carlo error only
+    early-stop             "confidence" early stopping of permutation
+                           tests — p-values on the same side of 0.05,
+                           permutation counts vary
+    stage-cache            outputs restored from the stage cache
+
+A new optimised path (float32 SVD, a parallel parser, …) gets a config
+switch in its stage and an entry here, with tolerances for the columns it
+is allowed to move, and ships once the harness passes on it.
+
+Corpora: synthetic ChatGPT and Claude exports (pipeline.synthetic) and any
+real exports passed with --export.
+
+Usage:
+    python -m pipeline.equivalence --out eq/
+    python -m pipeline.equivalence --out eq/ --modes early-stop --export conversations.json
+    python -m pipeline.equivalence --compare work_a/ work_b/ --modes parallel-permutations
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import fnmatch
+import json
+import math
+import sqlite3
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import adjusted_rand_score
+
+from pipeline import runner, synthetic
+
+
+@dataclass(frozen=True)
+class Tolerance:
+    """How closely one numeric column must agree with the reference."""
+
+    atol: float = 1e-9
+    rtol: float = 1e-9
+    alpha: Optional[float] = None   # also require both values on the same side of alpha
+    skip: str = ""                  # non-empty: column not compared, for this reason
+
+    def describe(self) -> str:
+        if self.skip:
+            return f"skipped: {self.skip}"
+        parts = []
+        if math.isfinite(self.atol):
+            parts.append(f"atol {self.atol:g}")
+        if self.rtol and math.isfinite(self.atol):
+            parts.append(f"rtol {self.rtol:g}")
+        if self.alpha is not None:
+            parts.append(f"same side of {self.alpha:g}")
+        return ", ".join(parts) or "any"
+
+
+EXACT = Tolerance()
+
+# (file glob relative to the work dir, column glob, tolerance); first match wins
+Rules = list[tuple[str, str, Tolerance]]
+
+P_VALUE_COLUMNS = ("p_value", "p_forward", "p_reverse", "p_diff_abs",
+                   "p_user_leads_asst", "p_asst_leads_user")
+PERMUTATION_FILES = ("coupling_*.csv", "profile/spearman_results.csv")
+
+# Files whose row order follows a compared value: rows are matched on these
+# key columns instead of by position
+ROW_KEYS = {
+    "coupling_by_domain.csv": ("macro_domain",),    # sorted by p_user_leads_asst
+}
+
+# Cluster assignment tables: (table, label column)
+CLUSTER_TABLES = {
+    "fine":  ("node_to_fine_cluster", "cluster_id"),
+    "macro": ("node_to_macro_domain", "macro_domain"),
+}
+
+# Everything a mode may switch on, off
+REFERENCE_CONFIG = {
+    "profile":  {"n_workers": 1, "permutation_workers": 1, "early_stop": None},
+    "coupling": {"n_workers": 1, "early_stop": None},
+}
+
+
+def _p_rules(tol: Tolerance) -> Rules:
+    return [(f, c, tol) for f in PERMUTATION_FILES for c in P_VALUE_COLUMNS]
+
+
+MODES: dict[str, dict] = {
+    "parallel-stages": {
+        "description": "independent stages in worker processes",
+        "n_workers":   3,
+    },
+    "parallel-scoring": {
+        "description": "profile lexicon scoring in a process pool",
+        "config":      {"profile": {"n_workers": 2, "chunk_size": 500}},
+    },
+    "parallel-permutations": {
+        "description": "parallel SeedSequence permutation streams",
+        "config":      {"profile": {"permutation_workers": 2}, "coupling": {"n_workers": 2}},
+        # Other draws: two independent 1,000-draw estimates of p = 0.5 differ
+        # by 0.08 at about 3.5 standard errors
+        "rules":       _p_rules(Tolerance(atol=0.08, rtol=0.0)),
+    },
+    "early-stop": {
+        "description": "confidence-interval early stopping of permutation tests",
+        "config":      {"profile": {"early_stop": "confidence"},
+                        "coupling": {"early_stop": "confidence"}},
+        "rules":       _p_rules(Tolerance(atol=math.inf, alpha=0.05)) + [
+            (f, "n_permutations", Tolerance(skip="varies with early stopping"))
+            for f in PERMUTATION_FILES
+        ],
+    },
+    "stage-cache": {
+        "description": "every stage restored from the stage cache",
+        "cache":       True,
+    },
+}
+
+# Synthetic corpora: (format, generator config)
+CORPORA = {
+    "synthetic-chatgpt": ("chatgpt", {"n_messages": 6_000, "months": 8, "seed": 11}),
+    "synthetic-claude":  ("claude",  {"n_messages": 4_000, "months": 6, "seed": 12}),
+}
+
+# Work-dir files that legitimately differ between runs
+_IGNORED_FILES = ("trace.json", "run_summary.json", "*.html", "profiles/*")
+
+
+def _merge(base: dict, *overlays: Optional[dict]) -> dict:
+    """{stage: section} configs merged section by section."""
+    out = copy.deepcopy(base)
+    for overlay in overlays:
+        for stage, section in (overlay or {}).items():
+            out.setdefault(stage, {}).update(section)
+    return out
+
+
+def _tolerance(rules: Rules, file: str, column: str) -> Tolerance:
+    for file_glob, column_glob, tol in rules:
+        if fnmatch.fnmatch(file, file_glob) and fnmatch.fnmatch(column, column_glob):
+            return tol
+    return EXACT
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Comparison
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _row(file: str, column: str, status: str, detail: str = "", diff=None,
+         tolerance: str = "") -> dict:
+    return {"file": file, "column": column, "status": status, "max_abs_diff": diff,
+            "tolerance": tolerance, "detail": detail}
+
+
+def _compare_column(file: str, column: str, ref: pd.Series, opt: pd.Series,
+                    tol: Tolerance) -> dict:
+    if tol.skip:
+        return _row(file, column, "skipped", tolerance=tol.describe())
+
+    numeric = (pd.api.types.is_numeric_dtype(ref) and pd.api.types.is_numeric_dtype(opt)
+               and not pd.api.types.is_bool_dtype(ref) and not pd.api.types.is_bool_dtype(opt))
+    if not numeric:
+        same = (ref.astype(str) == opt.astype(str)) | (ref.isna() & opt.isna())
+        bad = int((~same).sum())
+        if bad:
+            first = int(np.flatnonzero(~same.to_numpy())[0])
+            return _row(file, column, "FAIL", f"{bad} value(s) differ, first at row {first}: "
+                        f"{ref.iloc[first]!r} vs {opt.iloc[first]!r}")
+        return _row(file, column, "identical")
+
+    a = ref.to_numpy(dtype=float)
+    b = opt.to_numpy(dtype=float)
+    nan_a, nan_b = np.isnan(a), np.isnan(b)
+    if (nan_a != nan_b).any():
+        return _row(file, column, "FAIL", f"{int((nan_a != nan_b).sum())} NaN position(s) differ",
+                    tolerance=tol.describe())
+    valid = ~nan_a
+    diff = np.abs(a[valid] - b[valid])
+    max_diff = float(diff.max()) if diff.size else 0.0
+    if max_diff == 0.0:
+        return _row(file, column, "identical", diff=0.0)
+
+    bound = tol.atol + tol.rtol * np.abs(a[valid])
+    outside = int((diff > bound).sum())
+    flipped = 0
+    if tol.alpha is not None:
+        flipped = int(((a[valid] < tol.alpha) != (b[valid] < tol.alpha)).sum())
+    if outside or flipped:
+        detail = ", ".join(filter(None, (
+            f"{outside} value(s) beyond tolerance" if outside else "",
+            f"{flipped} value(s) cross {tol.alpha:g}" if flipped else "",
+        )))
+        return _row(file, column, "FAIL", detail, max_diff, tol.describe())
+    return _row(file, column, "within", diff=max_diff, tolerance=tol.describe())
+
+
+def _csv_files(work_dir: Path) -> set[str]:
+    return {
+        p.relative_to(work_dir).as_posix() for p in work_dir.rglob("*.csv")
+        if not any(fnmatch.fnmatch(p.relative_to(work_dir).as_posix(), g) for g in _IGNORED_FILES)
+    }
+
+
+def compare_csvs(ref_dir: str | Path, opt_dir: str | Path, rules: Optional[Rules] = None) -> list[dict]:
+    """One row per compared column (plus rows for missing files / shape mismatches)."""
+    ref_dir, opt_dir = Path(ref_dir), Path(opt_dir)
+    rules = rules or []
+    ref_files, opt_files = _csv_files(ref_dir), _csv_files(opt_dir)
+    rows = [_row(f, "", "FAIL", "missing from the optimised run") for f in sorted(ref_files - opt_files)]
+    rows += [_row(f, "", "FAIL", "not written by the reference run") for f in sorted(opt_files - ref_files)]
+
+    for file in sorted(ref_files & opt_files):
+        ref = pd.read_csv(ref_dir / file)
+        opt = pd.read_csv(opt_dir / file)
+        if list(ref.columns) != list(opt.columns):
+            rows.append(_row(file, "", "FAIL", f"columns differ: {list(ref.columns)} vs "
+                                                f"{list(opt.columns)}"))
+            continue
+        if len(ref) != len(opt):
+            rows.append(_row(file, "", "FAIL", f"{len(ref)} vs {len(opt)} rows"))
+            continue
+        keys = list(ROW_KEYS.get(file, ()))
+        if keys:
+            ref = ref.sort_values(keys, kind="stable").reset_index(drop=True)
+            opt = opt.sort_values(keys, kind="stable").reset_index(drop=True)
+        for column in ref.columns:
+            rows.append(_compare_column(file, column, ref[column], opt[column],
+                                        _tolerance(rules, file, column)))
+    return rows
+
+
+def _assignments(db_path: Path, table: str, column: str) -> Optional[pd.Series]:
+    if not db_path.is_file():
+        return None
+    con = sqlite3.connect(db_path)
+    try:
+        exists = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                             (table,)).fetchone()
+        if not exists:
+            return None
+        df = pd.read_sql_query(f"SELECT node_id, {column} FROM {table}", con)
+    finally:
+        con.close()
+    return df.set_index("node_id")[column]
+
+
+def compare_clusters(
+    ref_dir: str | Path,
+    opt_dir: str | Path,
+    min_ari: float = 1.0,
+    db_name: str = "conversations.db",
+) -> list[dict]:
+    """ARI of each CLUSTER_TABLES assignment; one row per clustering present in the reference."""
+    rows = []
+    for name, (table, column) in CLUSTER_TABLES.items():
+        ref = _assignments(Path(ref_dir) / db_name, table, column)
+        if ref is None:
+            continue
+        label = f"{table}.{column}"
+        opt = _assignments(Path(opt_dir) / db_name, table, column)
+        if opt is None:
+            rows.append(_row("clusters", label, "FAIL", "missing from the optimised run"))
+            continue
+        common = ref.index.intersection(opt.index)
+        if len(common) != len(ref) or len(common) != len(opt):
+            rows.append(_row("clusters", label, "FAIL",
+                             f"{len(ref):,} vs {len(opt):,} messages, {len(common):,} in both"))
+            continue
+        a, b = ref.loc[common].to_numpy(), opt.loc[common].to_numpy()
+        ari = float(adjusted_rand_score(a, b))
+        same_labels = float((a == b).mean())
+        detail = f"ARI {ari:.4f}, {same_labels:.1%} same label, {len(common):,} messages"
+        status = "identical" if same_labels == 1.0 else ("within" if ari >= min_ari - 1e-12 else "FAIL")
+        rows.append(_row("clusters", label, status, detail,
+                         tolerance=f"ARI ≥ {min_ari:g}"))
+    return rows
+
+
+def compare_dirs(
+    ref_dir: str | Path,
+    opt_dir: str | Path,
+    rules: Optional[Rules] = None,
+    min_ari: float = 1.0,
+) -> dict:
+    """CSV and cluster comparison of two work directories: {ok, rows}."""
+    rows = compare_csvs(ref_dir, opt_dir, rules) + compare_clusters(ref_dir, opt_dir, min_ari)
+    return {"ok": all(r["status"] != "FAIL" for r in rows), "rows": rows}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Harness
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _run(export: Path, work_dir: Path, config: dict, n_workers: int,
+         cache_dir: Optional[Path] = None) -> dict:
+    summary = runner.run(export, work_dir, config=config, n_workers=n_workers,
+                         cache_dir=cache_dir)
+    if not summary["ok"]:
+        failed = [f"{r['stage']}: {r['error']}" for r in summary["stages"] if r["status"] == "failed"]
+        raise RuntimeError(f"Pipeline failed on {export.name} in {work_dir.name}: {failed}")
+    return summary
+
+
+def run_harness(
+    out_dir: str | Path,
+    modes: Optional[Sequence[str]] = None,
+    corpora: Optional[dict[str, tuple[str, dict]]] = None,
+    exports: Sequence[str | Path] = (),
+    base_config: Optional[dict] = None,
+    progress_cb: Optional[Callable[[str, str], None]] = None,
+) -> dict:
+    """
+    Run the reference and every optimised mode on each corpus and compare.
+
+    Args:
+        out_dir:     Corpora and one work directory per (corpus, mode) go here
+        modes:       Names from MODES (default all)
+        corpora:     {name: (format, synthetic config)}; default CORPORA, {} = none
+        exports:     Real conversations.json files, added as corpora
+        base_config: Runner config applied to the reference and every mode
+                     (e.g. fewer permutations for a quick check)
+        progress_cb: Optional callable(corpus, status_string)
+
+    Returns:
+        Report dict: ok, modes, corpora: {name: {mode: {ok, rows}}}
+    """
+    out_dir = Path(out_dir).resolve()
+    modes = list(MODES) if modes is None else list(modes)
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        raise ValueError(f"Unknown mode(s) {sorted(unknown)}; expected some of {list(MODES)}.")
+    corpora = CORPORA if corpora is None else corpora
+    reference = _merge(REFERENCE_CONFIG, base_config)
+
+    sources: dict[str, Path] = {}
+    for name, (fmt, gen) in corpora.items():
+        sources[name] = out_dir / "corpora" / f"{name}.json"
+        synthetic.write_export(sources[name], fmt, gen)
+    for path in exports:
+        sources[Path(path).stem] = Path(path).resolve()
+
+    def _cb(corpus: str, msg: str):
+        if progress_cb:
+            progress_cb(corpus, msg)
+
+    report = {"ok": True, "modes": modes, "corpora": {}}
+    for name, export in sources.items():
+        base = out_dir / "runs" / name
+        _cb(name, "Running the reference…")
+        _run(export, base / "reference", reference, n_workers=1)
+
+        report["corpora"][name] = {}
+        for mode in modes:
+            spec = MODES[mode]
+            config = _merge(reference, spec.get("config"))
+            work = base / mode
+            _cb(name, f"Running {mode}…")
+            if spec.get("cache"):
+                cache_dir = base / f"{mode}-cache"
+                _run(export, base / f"{mode}-fill", config, spec.get("n_workers", 1), cache_dir)
+                summary = _run(export, work, config, spec.get("n_workers", 1), cache_dir)
+                if not all(r["cached"] for r in summary["stages"] if r["stage"] not in runner._UNCACHED):
+                    raise RuntimeError(f"{mode}: not every stage was restored from the cache.")
+            else:
+                _run(export, work, config, spec.get("n_workers", 1))
+            result = compare_dirs(base / "reference", work, spec.get("rules"),
+                                  spec.get("min_ari", 1.0))
+            report["corpora"][name][mode] = result
+            report["ok"] &= result["ok"]
+            _cb(name, f"{mode}: {'pass' if result['ok'] else 'FAIL'}")
+    return report
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Report
+# ─────────────────────────────────────────────────────────────────────────────
+
+def format_table(rows: list[dict], verbose: bool = False) -> str:
+    """Aligned table of comparison rows; identical columns only when *verbose*."""
+    shown = [r for r in rows if verbose or r["status"] != "identical"]
+    n_identical = sum(r["status"] == "identical" for r in rows)
+    lines = []
+    if shown:
+        table = [("file", "column", "status", "max |Δ|", "tolerance", "detail")]
+        for r in shown:
+            diff = "" if r["max_abs_diff"] is None else f"{r['max_abs_diff']:.3g}"
+            table.append((r["file"], r["column"], r["status"], diff, r["tolerance"], r["detail"]))
+        widths = [max(len(row[i]) for row in table) for i in range(5)]
+        for row in table:
+            lines.append("  " + "  ".join(cell.ljust(w) for cell, w in zip(row, widths))
+                         + "  " + row[5])
+    lines.append(f"  {n_identical} of {len(rows)} columns identical")
+    return "\n".join(line.rstrip() for line in lines)
+
+
+def format_report(report: dict, verbose: bool = False) -> str:
+    """Readable report of run_harness(): one table per corpus and mode."""
+    lines = []
+    for corpus, results in report["corpora"].items():
+        for mode, result in results.items():
+            lines.append(f"{corpus} · {mode}: {'PASS' if result['ok'] else 'FAIL'}")
+            lines.append(format_table(result["rows"], verbose))
+            lines.append("")
+    lines.append("All modes equivalent." if report["ok"] else "Differences beyond tolerance.")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """CLI entry point: run the harness (or compare two work dirs) and print the report."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pipeline.equivalence",
+        description="Check optimised pipeline modes against the reference configuration.",
+    )
+    parser.add_argument("--out", help="harness work directory")
+    parser.add_argument("--modes", help=f"comma-separated subset of: {','.join(MODES)} "
+                                        "(with --compare: the mode whose tolerances apply)")
+    parser.add_argument("--export", action="append", default=[],
+                        help="real conversations.json to include (repeatable)")
+    parser.add_argument("--no-synthetic", action="store_true", help="only the --export corpora")
+    parser.add_argument("--config", help="runner config applied to every run (JSON or TOML)")
+    parser.add_argument("--compare", nargs=2, metavar=("REF_DIR", "OPT_DIR"),
+                        help="only compare two existing work directories")
+    parser.add_argument("--json", help="also write the report as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="list identical columns too")
+    args = parser.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()] if args.modes else None
+    if args.compare:
+        if modes and (len(modes) > 1 or modes[0] not in MODES):
+            parser.error("--compare takes the tolerances of one mode from MODES")
+        spec = MODES[modes[0]] if modes else {}
+        result = compare_dirs(*args.compare, spec.get("rules"), spec.get("min_ari", 1.0))
+        report = {"ok": result["ok"], "modes": modes or ["compare"],
+                  "corpora": {" vs ".join(args.compare): {modes[0] if modes else "compare": result}}}
+    else:
+        if not args.out:
+            parser.error("--out is required unless --compare is given")
+        report = run_harness(
+            args.out, modes,
+            corpora={} if args.no_synthetic else None,
+            exports=args.export,
+            base_config=runner.load_config(args.config) if args.config else None,
+            progress_cb=lambda corpus, msg: print(f"  [{corpus}] {msg}", file=sys.stderr),
+        )
+
+    print(format_report(report, args.verbose))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
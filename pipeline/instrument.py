@@ -0,0 +1,256 @@
+"""
+Per-stage instrumentation: timing, memory and row counts for each sub-step.
+
+Every stage's run() reports through a Recorder:
+
+    inst = Recorder("topics")
+    inst.step("TF-IDF", rows_in=n_msgs)     # closes the previous step
+    X = vec.fit_transform(texts)
+    inst.rows(X.shape[0])                   # rows out of the current step
+    ...
+    return {..., "instrumentation": inst.finish()}
+
+finish() returns a JSON-safe record:
+
+    stage, pid, start (epoch s), wall_s, cpu_s, peak_rss_mb, py_peak_mb,
+    rss_scope, steps: [{name, start, wall_s, cpu_s, peak_rss_mb, py_peak_mb,
+                        rows_in, rows_out}, ...]
+
+Figures (for the process running the stage):
+    wall_s       time.perf_counter delta
+    cpu_s        user + system CPU of the process and its finished children
+    peak_rss_mb  RSS high-water mark within the span.  On Linux the kernel
+                 mark is reset when a span opens (/proc/self/clear_refs) and
+                 folded into every enclosing span first, so nested spans
+                 (runner stage ⊃ recorder ⊃ step) each stay correct;
+                 rss_scope is then "span", elsewhere "process" (peak so far).
+    py_peak_mb   peak Python allocation above the span's starting level,
+                 from tracemalloc.  Tracing slows allocation-heavy stages
+                 several-fold (parse ×4, dynamics ×6), so it is off unless
+                 the DOL_TRACEMALLOC environment variable is set (the
+                 runner's --trace-malloc); None otherwise.
+
+chrome_trace() / write_chrome_trace() turn records into the Chrome trace
+event format (chrome://tracing, Perfetto), one complete ("X") event per
+stage and step, grouped by process.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Iterable, Optional
+
+try:
+    import resource
+except ImportError:           # Windows
+    resource = None
+
+TRACEMALLOC_ENV = "DOL_TRACEMALLOC"
+
+_PROC_STATUS = Path("/proc/self/status")
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Resource probes
+# ─────────────────────────────────────────────────────────────────────────────
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's RSS high-water mark (Linux ≥ 4.0); False if unsupported."""
+    try:
+        _CLEAR_REFS.write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def maxrss_mb(who: int) -> Optional[float]:
+    """getrusage peak RSS for RUSAGE_SELF / RUSAGE_CHILDREN, in MB."""
+    if resource is None:
+        return None
+    kb = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return kb / 1024 / 1024 if sys.platform == "darwin" else kb / 1024
+
+
+def peak_rss_mb() -> Optional[float]:
+    """VmHWM from /proc when available, else getrusage's process-wide peak."""
+    try:
+        for line in _PROC_STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return maxrss_mb(resource.RUSAGE_SELF) if resource is not None else None
+
+
+def cpu_seconds() -> float:
+    """User + system CPU of this process and its finished child processes."""
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + kids.ru_utime + kids.ru_stime
+
+
+def _tracing() -> bool:
+    """True if tracemalloc is (or, via DOL_TRACEMALLOC, has now been) started."""
+    if not tracemalloc.is_tracing() and os.environ.get(TRACEMALLOC_ENV, "") not in ("", "0"):
+        tracemalloc.start()
+    return tracemalloc.is_tracing()
+
+
+def _round(value: Optional[float], ndigits: int) -> Optional[float]:
+    return round(value, ndigits) if value is not None else None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Spans
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Open spans, outermost first.  Opening a span resets the peak marks, so the
+# peaks reached so far are folded into every open span beforehand.
+_OPEN: list["Span"] = []
+
+
+class Span:
+    """Wall / CPU / peak memory between construction and close()."""
+
+    def __init__(self):
+        rss = peak_rss_mb()
+        py = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        for span in _OPEN:
+            span._absorb(rss, py)
+
+        self.start = time.time()
+        self._wall0 = time.perf_counter()
+        self._cpu0 = cpu_seconds()
+        self._rss_peak: Optional[float] = None
+        self.scoped = reset_peak_rss()
+        self._py0: Optional[int] = None
+        self._py_peak = 0
+        if _tracing():
+            self._py0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        _OPEN.append(self)
+
+    def _absorb(self, rss: Optional[float], py: Optional[int]) -> None:
+        if rss is not None:
+            self._rss_peak = max(rss, self._rss_peak or 0.0)
+        if py is not None:
+            self._py_peak = max(py, self._py_peak)
+
+    def close(self) -> dict:
+        """Stop measuring; return wall_s, cpu_s, peak_rss_mb, py_peak_mb, rss_scope."""
+        if self in _OPEN:
+            # Spans opened inside this one and never closed (a stage that
+            # raised mid-step) end here too
+            del _OPEN[_OPEN.index(self):]
+        self._absorb(peak_rss_mb(),
+                     tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None)
+        py_peak = None
+        if self._py0 is not None and tracemalloc.is_tracing():
+            py_peak = max(0, self._py_peak - self._py0) / 2 ** 20
+        return {
+            "start":       round(self.start, 6),
+            "wall_s":      round(time.perf_counter() - self._wall0, 4),
+            "cpu_s":       round(cpu_seconds() - self._cpu0, 4),
+            "peak_rss_mb": _round(self._rss_peak, 1),
+            "py_peak_mb":  _round(py_peak, 2),
+            "rss_scope":   "span" if self.scoped else "process",
+        }
+
+
+class Recorder:
+    """Collects one stage's sub-steps; see the module docstring."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.steps: list[dict] = []
+        self._span = Span()
+        self._current: Optional[dict] = None
+        self._step_span: Optional[Span] = None
+
+    def step(self, name: str, rows_in: Optional[int] = None) -> None:
+        """Close the open step (if any) and start *name*."""
+        self._close_step()
+        self._current = {"name": name, "rows_in": None, "rows_out": None}
+        self.rows(rows_in=rows_in)
+        self._step_span = Span()
+
+    def rows(self, rows_out: Optional[int] = None, rows_in: Optional[int] = None) -> None:
+        """Set the row counts of the open step."""
+        if self._current is None:
+            return
+        if rows_out is not None:
+            self._current["rows_out"] = int(rows_out)
+        if rows_in is not None:
+            self._current["rows_in"] = int(rows_in)
+
+    def _close_step(self) -> None:
+        if self._current is None:
+            return
+        figures = self._step_span.close()
+        figures.pop("rss_scope")
+        rows = {"rows_in": self._current["rows_in"], "rows_out": self._current["rows_out"]}
+        self.steps.append({"name": self._current["name"], **figures, **rows})
+        self._current = self._step_span = None
+
+    def finish(self) -> dict:
+        """Close the open step and the stage; return the stage's record."""
+        self._close_step()
+        return {"stage": self.stage, "pid": os.getpid(), **self._span.close(),
+                "steps": self.steps}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Chrome trace
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _args(rec: dict, keys: Iterable[str]) -> dict:
+    return {k: rec[k] for k in keys if rec.get(k) is not None}
+
+
+def chrome_trace(records: Iterable[dict]) -> dict:
+    """
+    Chrome trace event JSON for Recorder records (stage name, pid, start,
+    wall_s, optional cached, steps), with timestamps relative to the
+    earliest stage.
+    """
+    records = [r for r in records if r and r.get("start") is not None]
+    t0 = min((r["start"] for r in records), default=0.0)
+    events: list[dict] = []
+    for pid in sorted({r.get("pid", 0) for r in records}):
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": pid,
+                       "args": {"name": f"pid {pid}"}})
+
+    def _event(name: str, cat: str, rec: dict, pid: int, args: dict) -> dict:
+        return {
+            "name": name, "cat": cat, "ph": "X", "pid": pid, "tid": pid,
+            "ts":   round((rec["start"] - t0) * 1e6),
+            "dur":  round((rec.get("wall_s") or 0.0) * 1e6),
+            "args": args,
+        }
+
+    for rec in sorted(records, key=lambda r: r["start"]):
+        pid = rec.get("pid", 0)
+        name = rec["stage"] + (" (cached)" if rec.get("cached") else "")
+        events.append(_event(name, "stage", rec, pid,
+                             _args(rec, ("cpu_s", "peak_rss_mb", "py_peak_mb"))))
+        for step in rec.get("steps") or []:
+            events.append(_event(step["name"], rec["stage"], step, pid, _args(
+                step, ("cpu_s", "peak_rss_mb", "py_peak_mb", "rows_in", "rows_out"))))
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(records: Iterable[dict], path: str | Path) -> Path:
+    """Write chrome_trace(*records*) to *path* and return it."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(chrome_trace(records)), encoding="utf-8")
+    return path
@@ -0,0 +1,539 @@
+"""
+Background jobs for the Streamlit app.
+
+The app's steps used to call each stage inside the Streamlit script
+thread, so topics or domains blocked the session for minutes and a
+browser refresh lost the run.  Instead the app submits stages here:
+
+    submit()        writes a queued row to the job table and makes sure a
+                    worker process is running
+    worker          claims queued jobs one at a time and runs each through
+                    runner.execute in a child process of its own; the
+                    runner's progress_cb(stage, fraction, message) calls
+                    are written back to the job's row
+    get() / latest() what the app polls (latest() finds a work directory's
+                    job again after a browser reconnect)
+    cancel()        a queued job is dropped; a running job's process group
+                    (its stage pools included) is terminated by the worker
+    load_results()  the runner's (summary, results) once the job finished
+
+Job states: queued → running → done | failed | cancelled.  A job whose
+runner summary has a failed stage is "failed"; the results of the stages
+that succeeded are saved all the same.
+
+One worker serves a jobs directory: it heartbeats into the table, exits
+after IDLE_EXIT_S without work, and ensure_worker() starts a new one when
+the heartbeat is stale.  A job left running by a worker that died is
+marked failed when the next worker starts.
+
+Outputs (under the jobs directory; the app uses temp_out/.jobs):
+    jobs.db                  job table + worker heartbeat
+    <job_id>/results.pkl     runner.execute results for the stages that ran
+    <job_id>/summary.json    runner.execute summary
+    worker.log               stderr of the worker processes
+
+Usage (the frozen app takes the same arguments after FROZEN_ARG):
+    python -m pipeline.jobs worker --dir temp_out/.jobs
+    python -m pipeline.jobs list   --dir temp_out/.jobs
+    python -m pipeline.jobs cancel JOB_ID --dir temp_out/.jobs
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from pipeline import cache
+from pipeline.db import connect
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed", "cancelled")
+
+POLL_S = 0.5                  # worker: table poll / heartbeat interval
+HEARTBEAT_TIMEOUT_S = 15.0    # a worker silent this long is presumed dead
+IDLE_EXIT_S = 600.0           # worker exits after this long without a job
+PROGRESS_INTERVAL_S = 0.25    # minimum gap between progress writes
+CANCEL_GRACE_S = 5.0          # SIGTERM → SIGKILL
+
+# First argument that makes the frozen app (launcher.py) run this CLI
+# instead of the Streamlit server: its executable has no -m
+FROZEN_ARG = "--pipeline-jobs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    work_dir    TEXT NOT NULL,
+    export      TEXT NOT NULL,
+    stages      TEXT NOT NULL,
+    options     TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    stage       TEXT,
+    fraction    REAL NOT NULL DEFAULT 0,
+    message     TEXT NOT NULL DEFAULT '',
+    error       TEXT,
+    traceback   TEXT,
+    cancel      INTEGER NOT NULL DEFAULT 0,
+    pid         INTEGER,
+    submitted   REAL NOT NULL,
+    started     REAL,
+    finished    REAL,
+    updated     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_work_dir ON jobs (work_dir, submitted);
+CREATE TABLE IF NOT EXISTS worker (
+    id          INTEGER PRIMARY KEY CHECK (id = 1),
+    pid         INTEGER NOT NULL,
+    heartbeat   REAL NOT NULL
+);
+"""
+
+_JSON_COLUMNS = ("stages", "options")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Job table
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _table(jobs_dir: str | Path) -> sqlite3.Connection:
+    jobs_dir = Path(jobs_dir)
+    jobs_dir.mkdir(parents=True, exist_ok=True)
+    con = connect(jobs_dir / "jobs.db", timeout=30.0)
+    con.row_factory = sqlite3.Row
+    con.executescript(_SCHEMA)
+    return con
+
+
+def _row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    for col in _JSON_COLUMNS:
+        job[col] = json.loads(job[col])
+    job["cancel"] = bool(job["cancel"])
+    return job
+
+
+def _update(jobs_dir: str | Path, job_id: str, where: str = "", **values: Any) -> bool:
+    """Set *values* on one job (optionally only WHERE *where*); True if a row changed."""
+    values["updated"] = time.time()
+    cols = ", ".join(f"{k} = ?" for k in values)
+    con = _table(jobs_dir)
+    try:
+        cur = con.execute(
+            f"UPDATE jobs SET {cols} WHERE job_id = ?" + (f" AND {where}" if where else ""),
+            (*values.values(), job_id),
+        )
+        con.commit()
+        return cur.rowcount > 0
+    finally:
+        con.close()
+
+
+def _job_dir(jobs_dir: str | Path, job_id: str) -> Path:
+    return Path(jobs_dir) / job_id
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+def submit(
+    jobs_dir: str | Path,
+    export_path: str | Path,
+    work_dir: str | Path,
+    stages: Optional[Sequence[str]] = None,
+    config: Optional[dict] = None,
+    n_workers: int = 1,
+    cache_dir: Optional[str | Path] = None,
+    cache_max_bytes: int = cache.DEFAULT_MAX_BYTES,
+    start_worker: bool = True,
+) -> str:
+    """
+    Queue a runner.execute call and return its job id.
+
+    Arguments are those of runner.execute; *stages* = None runs every
+    stage.  With *start_worker* (the default) a worker process is started
+    if none is alive.
+    """
+    from pipeline import runner
+
+    wanted = list(runner.STAGES) if stages is None else list(stages)
+    unknown = set(wanted) - set(runner.STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {sorted(unknown)}; expected {runner.STAGES}.")
+
+    job_id = uuid.uuid4().hex[:16]
+    options = {
+        "config":          config or {},
+        "n_workers":       n_workers,
+        "cache_dir":       str(cache_dir) if cache_dir is not None else None,
+        "cache_max_bytes": cache_max_bytes,
+    }
+    now = time.time()
+    con = _table(jobs_dir)
+    try:
+        con.execute(
+            "INSERT INTO jobs (job_id, work_dir, export, stages, options, status, "
+            "submitted, updated) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, str(Path(work_dir).resolve()), str(Path(export_path).resolve()),
+             json.dumps(wanted), json.dumps(options), now, now),
+        )
+        con.commit()
+    finally:
+        con.close()
+    if start_worker:
+        ensure_worker(jobs_dir)
+    return job_id
+
+
+def get(jobs_dir: str | Path, job_id: str) -> Optional[dict]:
+    """The job's row as a dict (stages and options decoded), or None."""
+    con = _table(jobs_dir)
+    try:
+        return _row(con.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+    finally:
+        con.close()
+
+
+def latest(jobs_dir: str | Path, work_dir: str | Path) -> Optional[dict]:
+    """The most recently submitted job for *work_dir*, or None."""
+    con = _table(jobs_dir)
+    try:
+        return _row(con.execute(
+            "SELECT * FROM jobs WHERE work_dir = ? ORDER BY submitted DESC, rowid DESC LIMIT 1",
+            (str(Path(work_dir).resolve()),),
+        ).fetchone())
+    finally:
+        con.close()
+
+
+def list_jobs(
+    jobs_dir: str | Path,
+    work_dir: Optional[str | Path] = None,
+    limit: Optional[int] = None,
+) -> list[dict]:
+    """Jobs oldest first — all of them, or those of *work_dir*; *limit* keeps the newest."""
+    sql, params = "SELECT * FROM jobs", []
+    if work_dir is not None:
+        sql += " WHERE work_dir = ?"
+        params.append(str(Path(work_dir).resolve()))
+    sql += " ORDER BY submitted DESC, rowid DESC"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    con = _table(jobs_dir)
+    try:
+        rows = [_row(r) for r in con.execute(sql, params).fetchall()]
+    finally:
+        con.close()
+    return rows[::-1]
+
+
+def cancel(jobs_dir: str | Path, job_id: str) -> bool:
+    """
+    Cancel a job: a queued job is marked cancelled at once; a running job is
+    flagged and its process terminated by the worker within POLL_S.
+    Returns False if the job has already finished (or does not exist).
+    """
+    if _update(jobs_dir, job_id, where="status = 'queued'",
+               status="cancelled", finished=time.time(), message="Cancelled"):
+        return True
+    return _update(jobs_dir, job_id, where="status = 'running'", cancel=1)
+
+
+def load_results(jobs_dir: str | Path, job_id: str) -> Optional[tuple[dict, dict]]:
+    """(summary, results) as returned by runner.execute, or None if the job saved none."""
+    out = _job_dir(jobs_dir, job_id)
+    if not (out / "results.pkl").is_file():
+        return None
+    summary = json.loads((out / "summary.json").read_text(encoding="utf-8"))
+    with (out / "results.pkl").open("rb") as fh:
+        return summary, pickle.load(fh)
+
+
+def _worker_command(jobs_dir: Path, idle_exit_s: float) -> list[str]:
+    """Command line that starts a worker, from source or from the PyInstaller bundle."""
+    if getattr(sys, "frozen", False):
+        prefix = [sys.executable, FROZEN_ARG]
+    else:
+        prefix = [sys.executable, "-m", "pipeline.jobs"]
+    return prefix + ["worker", "--dir", str(jobs_dir), "--idle-exit", str(idle_exit_s)]
+
+
+def ensure_worker(jobs_dir: str | Path, idle_exit_s: float = IDLE_EXIT_S) -> Optional[int]:
+    """Start a worker process for *jobs_dir* unless one is alive; return the new pid or None."""
+    jobs_dir = Path(jobs_dir)
+    con = _table(jobs_dir)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute("SELECT pid, heartbeat FROM worker WHERE id = 1").fetchone()
+        if row is not None and time.time() - row["heartbeat"] < HEARTBEAT_TIMEOUT_S:
+            con.rollback()
+            return None
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (str(_ROOT), env.get("PYTHONPATH")) if p)
+        with (jobs_dir / "worker.log").open("ab") as log:
+            proc = subprocess.Popen(
+                _worker_command(jobs_dir, idle_exit_s),
+                env=env, cwd=_ROOT, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                start_new_session=True,
+            )
+        # Claim the slot for the new process so polls during its start-up don't start another
+        con.execute("INSERT OR REPLACE INTO worker (id, pid, heartbeat) VALUES (1, ?, ?)",
+                    (proc.pid, time.time()))
+        con.commit()
+        return proc.pid
+    finally:
+        con.close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Job process
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _run_job(jobs_dir: str, job_id: str) -> None:
+    """Child process: run one job through runner.execute and record the outcome."""
+    if hasattr(os, "setsid"):
+        os.setsid()       # own process group, so cancel also reaches the stage pools
+
+    from pipeline import runner
+
+    job = get(jobs_dir, job_id)
+    opts = job["options"]
+    last = [0.0]
+
+    def _progress(stage: str, frac: float, msg: str) -> None:
+        now = time.monotonic()
+        if now - last[0] < PROGRESS_INTERVAL_S and frac < 1.0:
+            return
+        last[0] = now
+        _update(jobs_dir, job_id, where="status = 'running'",
+                stage=stage, fraction=float(frac), message=str(msg))
+
+    try:
+        summary, results = runner.execute(
+            job["export"], job["work_dir"],
+            config=opts["config"], stages=job["stages"], n_workers=opts["n_workers"],
+            progress_cb=_progress, cache_dir=opts["cache_dir"],
+            cache_max_bytes=opts["cache_max_bytes"],
+        )
+        out = _job_dir(jobs_dir, job_id)
+        out.mkdir(parents=True, exist_ok=True)
+        with (out / "results.pkl").open("wb") as fh:
+            pickle.dump(results, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        (out / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    except Exception as exc:
+        _update(jobs_dir, job_id, where="status = 'running'", status="failed",
+                error=f"{type(exc).__name__}: {exc}", traceback=traceback.format_exc(),
+                finished=time.time())
+        return
+
+    failed = [rec for rec in summary["stages"] if rec["status"] == "failed"]
+    _update(
+        jobs_dir, job_id, where="status = 'running'",
+        status="failed" if failed else "done",
+        error="; ".join(f"{rec['stage']}: {rec['error']}" for rec in failed) or None,
+        fraction=1.0, message="Finished", finished=time.time(),
+    )
+
+
+def _terminate(proc: multiprocessing.Process) -> None:
+    """Stop a job process and everything it started."""
+    def _signal(sig: int) -> None:
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, sig)
+                return
+        except (ProcessLookupError, PermissionError):
+            pass          # no group yet: cancelled before the child's setsid()
+        if proc.is_alive():
+            proc.terminate()
+
+    _signal(signal.SIGTERM)
+    proc.join(CANCEL_GRACE_S)
+    # Stage pool workers can outlive the job process; the group goes regardless
+    _signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+    proc.join()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Worker
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _heartbeat(jobs_dir: str | Path) -> bool:
+    """Refresh this process's heartbeat; False if another worker owns the table."""
+    con = _table(jobs_dir)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute("SELECT pid, heartbeat FROM worker WHERE id = 1").fetchone()
+        if (row is not None and row["pid"] != os.getpid()
+                and time.time() - row["heartbeat"] < HEARTBEAT_TIMEOUT_S):
+            con.rollback()
+            return False
+        con.execute("INSERT OR REPLACE INTO worker (id, pid, heartbeat) VALUES (1, ?, ?)",
+                    (os.getpid(), time.time()))
+        con.commit()
+        return True
+    finally:
+        con.close()
+
+
+def _claim(jobs_dir: str | Path) -> Optional[str]:
+    """Mark the oldest queued job running and return its id."""
+    con = _table(jobs_dir)
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute(
+            "SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY submitted, rowid LIMIT 1"
+        ).fetchone()
+        if row is None:
+            con.rollback()
+            return None
+        now = time.time()
+        con.execute(
+            "UPDATE jobs SET status = 'running', message = 'Starting…', started = ?, "
+            "updated = ? WHERE job_id = ?", (now, now, row["job_id"]),
+        )
+        con.commit()
+        return row["job_id"]
+    finally:
+        con.close()
+
+
+def _supervise(jobs_dir: str, job_id: str, poll_s: float) -> str:
+    """Run *job_id* in a child process until it ends or is cancelled; return its status."""
+    proc = multiprocessing.Process(target=_run_job, args=(jobs_dir, job_id),
+                                   name=f"job-{job_id}")
+    proc.start()
+    _update(jobs_dir, job_id, pid=proc.pid)
+
+    while proc.is_alive():
+        proc.join(poll_s)
+        _heartbeat(jobs_dir)
+        job = get(jobs_dir, job_id)
+        if job is not None and job["cancel"] and proc.is_alive():
+            _terminate(proc)
+            _update(jobs_dir, job_id, where="status = 'running'", status="cancelled",
+                    message="Cancelled", finished=time.time())
+            break
+
+    # A job process that died without recording its outcome (killed, segfault)
+    _update(jobs_dir, job_id, where="status = 'running'", status="failed",
+            error=f"Job process exited with code {proc.exitcode}", finished=time.time())
+    return get(jobs_dir, job_id)["status"]
+
+
+def work(
+    jobs_dir: str | Path,
+    idle_exit_s: float = IDLE_EXIT_S,
+    poll_s: float = POLL_S,
+) -> int:
+    """
+    Worker loop: run queued jobs one at a time until idle for *idle_exit_s*.
+
+    Returns the number of jobs run, or -1 if another live worker already
+    serves *jobs_dir*.
+    """
+    jobs_dir = str(Path(jobs_dir).resolve())
+    if not _heartbeat(jobs_dir):
+        return -1
+
+    # Only one worker runs at a time, so anything still "running" was orphaned
+    con = _table(jobs_dir)
+    try:
+        now = time.time()
+        con.execute(
+            "UPDATE jobs SET status = 'failed', error = 'The worker stopped before the job "
+            "finished', finished = ?, updated = ? WHERE status = 'running'", (now, now),
+        )
+        con.commit()
+    finally:
+        con.close()
+
+    n_run, idle_since = 0, time.monotonic()
+    try:
+        while True:
+            if not _heartbeat(jobs_dir):
+                break
+            job_id = _claim(jobs_dir)
+            if job_id is not None:
+                status = _supervise(jobs_dir, job_id, poll_s)
+                print(f"job {job_id}: {status}", file=sys.stderr, flush=True)
+                n_run += 1
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= idle_exit_s:
+                break
+            else:
+                time.sleep(poll_s)
+    finally:
+        con = _table(jobs_dir)
+        try:
+            con.execute("DELETE FROM worker WHERE id = 1 AND pid = ?", (os.getpid(),))
+            con.commit()
+        finally:
+            con.close()
+    return n_run
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _format_job(job: dict) -> str:
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["submitted"]))
+    where = f"{job['stage']} {job['fraction']:.0%}" if job["status"] == "running" else ""
+    return (f"{job['job_id']}  {stamp}  {job['status']:<9} {where:<16} "
+            f"{','.join(job['stages'])}  {Path(job['work_dir']).name}"
+            + (f"\n    {job['error']}" if job["error"] else ""))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """CLI entry point: ``python -m pipeline.jobs``."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pipeline.jobs",
+        description="Background job worker and job table for the DOL Analyser app.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_worker = sub.add_parser("worker", help="run queued jobs until idle")
+    p_worker.add_argument("--dir", required=True, help="jobs directory")
+    p_worker.add_argument("--idle-exit", type=float, default=IDLE_EXIT_S,
+                          help=f"seconds without a job before exiting (default {IDLE_EXIT_S:.0f})")
+
+    p_list = sub.add_parser("list", help="show recent jobs")
+    p_list.add_argument("--dir", required=True, help="jobs directory")
+    p_list.add_argument("--limit", type=int, default=20)
+
+    p_cancel = sub.add_parser("cancel", help="cancel a queued or running job")
+    p_cancel.add_argument("job_id")
+    p_cancel.add_argument("--dir", required=True, help="jobs directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        return 0 if work(args.dir, idle_exit_s=args.idle_exit) >= 0 else 1
+    if args.command == "list":
+        for job in list_jobs(args.dir, limit=args.limit):
+            print(_format_job(job))
+        return 0
+    if not cancel(args.dir, args.job_id):
+        print(f"Job {args.job_id} is not queued or running.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
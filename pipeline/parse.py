@@ -34,11 +34,18 @@ threads table
 from __future__ import annotations
 
 import json
-import sqlite3
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from pipeline.db import connect
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+from pipeline.threads import refresh as refresh_thread_features
+
+DEPENDS_ON = ("precheck",)   # needs the detected export format
+OUTPUT_TABLES = ("messages", "threads")
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Encoding helpers
@@ -389,7 +396,7 @@ def _parse_claude(
 
 def _write_db(db_path: Path, messages: List[dict], threads: List[dict]) -> None:
     """Create (or overwrite) the SQLite database and write both tables."""
-    con = sqlite3.connect(db_path)
+    con = connect(db_path)
     cur = con.cursor()
 
     cur.executescript("""
@@ -530,6 +537,7 @@ def merge_exports(raw_files: list[bytes]) -> tuple[list[dict], str, int]:
     return unique, detected_fmt, n_dupes
 
 
+@profiled("parse")
 def run(
     json_path: str | Path,
     db_path: str | Path,
@@ -546,35 +554,51 @@ def run(
         progress_cb: Optional callable(fraction 0–1, status_string)
 
     Returns:
-        Summary dict: threads, messages, user_messages, asst_messages
+        Summary dict: threads, messages, user_messages, asst_messages,
+        threads_refreshed (thread_features rows recomputed, if the table exists),
+        instrumentation (per-step timing, memory and row counts)
     """
     def _cb(frac: float, msg: str):
         if progress_cb:
             progress_cb(frac * 0.85, msg)  # reserve last 15% for DB write
 
     path = Path(json_path)
+    inst = Recorder("parse")
 
     if progress_cb:
         progress_cb(0.0, "Loading file…")
 
+    inst.step("Load JSON")
     data = _load_json(path)
 
     if not isinstance(data, list):
         raise ValueError("conversations.json must be a JSON array at the top level.")
 
     fmt = fmt.lower().strip()
+    inst.rows(len(data))
 
+    inst.step("Extract messages", rows_in=len(data))
     if fmt == "chatgpt":
         messages, threads = _parse_chatgpt(data, _cb)
     elif fmt == "claude":
         messages, threads = _parse_claude(data, _cb)
     else:
         raise ValueError(f"Unknown format '{fmt}'. Expected 'chatgpt' or 'claude'.")
+    inst.rows(len(messages))
 
     if progress_cb:
         progress_cb(0.87, "Writing database…")
 
+    inst.step("Write SQLite", rows_in=len(messages) + len(threads))
     _write_db(Path(db_path), messages, threads)
+    inst.rows(len(messages) + len(threads))
+
+    # Re-ingest into an analysed database: recompute only the touched threads
+    if progress_cb:
+        progress_cb(0.95, "Refreshing thread features…")
+    inst.step("Thread features")
+    refreshed = refresh_thread_features(db_path, create=False)
+    inst.rows(refreshed.get("refreshed", 0))
 
     if progress_cb:
         progress_cb(1.0, "Parse complete.")
@@ -586,4 +610,6 @@ def run(
         "asst_messages": sum(1 for m in messages if m["role"] == "assistant"),
         "user_chars":    sum(m.get("char_count", 0) for m in messages if m["role"] == "user"),
         "asst_chars":    sum(m.get("char_count", 0) for m in messages if m["role"] == "assistant"),
+        "threads_refreshed": refreshed.get("refreshed", 0),
+        "instrumentation":   inst.finish(),
     }
@@ -0,0 +1,311 @@
+"""
+Shared permutation-test engine.
+
+Used by profile (Spearman trends) and coupling (lead–lag cosines and
+per-domain correlations).  Callers supply
+a *vectorised* statistic: a function that takes a block of permutation
+index arrays and returns one null statistic per replicate, so a whole
+block is evaluated in a few array operations.
+
+    statistic(idx) → null values
+        idx:  (B, n) int array            — draws_per_replicate == 1
+              (B, k, n) int array         — draws_per_replicate == k
+        returns (B,) or (B, s) for s statistics tested on the same permutations
+
+Random streams:
+
+    serial   (n_workers == 1) — one Generator.  Each block is drawn with
+             ``rng.permuted`` on a tiled ``arange(n)``, which consumes the
+             stream exactly like one ``rng.permutation(n)`` call per draw.
+             Passing a caller's Generator therefore reproduces code that
+             used to loop over ``rng.permutation``.
+    parallel (n_workers > 1)  — the replicates are split into fixed-size
+             chunks, each with its own stream from ``SeedSequence.spawn``.
+             Chunks are scored in a process pool; the statistic is shipped
+             to each worker once through the initializer.  Results are
+             reproducible for a given seed and chunk size, whatever the
+             worker count.
+
+Early stopping (optional, checked after every block / chunk, in order):
+
+    "besag-clifford" — stop once every statistic has at least ``h``
+                       exceedances; the p-value is then clearly large
+                       (Besag & Clifford 1991 sequential Monte Carlo test).
+    "confidence"     — stop once the Clopper–Pearson interval (``stop_level``)
+                       of every p-value lies entirely above or below ``alpha``.
+
+P-values are the share of finite null values at least as extreme as the
+observed value, ``n_exceed / n_valid`` — the same estimator the stages
+used before.  ``rtol`` widens "at least as extreme" by a relative
+tolerance, so that ties computed along different floating-point paths
+still count.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+from scipy.stats import beta
+
+ALTERNATIVES = ("greater", "less", "two-sided")
+EARLY_STOP_RULES = ("besag-clifford", "confidence")
+
+Statistic = Callable[[np.ndarray], np.ndarray]
+
+
+@dataclass
+class PermutationResult:
+    """
+    Outcome of :func:`permutation_test`.
+
+    Fields are scalars when a single observed value was tested, otherwise
+    arrays with one entry per statistic.
+    """
+
+    observed: float | np.ndarray
+    p_value: float | np.ndarray
+    n_exceed: int | np.ndarray
+    n_valid: int | np.ndarray        # finite null values per statistic
+    n_permutations: int              # replicates actually drawn
+    stopped_early: bool = False
+    null: Optional[np.ndarray] = None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Drawing + scoring
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _draw(rng: np.random.Generator, b: int, k: int, n: int) -> np.ndarray:
+    """(b, n) or (b, k, n) permutation indices, drawn row by row from *rng*."""
+    idx = rng.permuted(np.broadcast_to(np.arange(n), (b * k, n)), axis=1)
+    return idx if k == 1 else idx.reshape(b, k, n)
+
+
+def _as_2d(values: np.ndarray, b: int) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    return values.reshape(b, -1)
+
+
+def _exceed(null: np.ndarray, observed: np.ndarray, alternative: np.ndarray, rtol: float) -> np.ndarray:
+    """Boolean (B, s): null value at least as extreme as observed."""
+    slack = rtol * np.abs(observed)
+    greater = null >= observed - slack
+    less = null <= observed + slack
+    two = np.abs(null) >= np.abs(observed) - slack
+    return np.where(alternative == "greater", greater, np.where(alternative == "less", less, two))
+
+
+def _block_size(n: int, k: int, max_block_cells: int) -> int:
+    return max(1, max_block_cells // max(1, n * k))
+
+
+def _seed_sequence(rng: np.random.Generator) -> np.random.SeedSequence:
+    """The Generator's SeedSequence, or one drawn from it where numpy < 1.25 hides it."""
+    seq = getattr(rng.bit_generator, "seed_seq", None)
+    if seq is None:
+        seq = np.random.SeedSequence(int(rng.integers(2**63)))
+    return seq
+
+
+# Set once per worker process by _init_worker
+_WORKER_STATISTIC: Optional[Statistic] = None
+
+
+def _init_worker(statistic: Statistic) -> None:
+    global _WORKER_STATISTIC
+    _WORKER_STATISTIC = statistic
+
+
+def _run_chunk(
+    seed: np.random.SeedSequence,
+    n_reps: int,
+    n: int,
+    k: int,
+    block: int,
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    parts = []
+    for start in range(0, n_reps, block):
+        b = min(block, n_reps - start)
+        parts.append(_as_2d(_WORKER_STATISTIC(_draw(rng, b, k, n)), b))
+    return np.concatenate(parts)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Early stopping
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _should_stop(
+    rule: Optional[str],
+    n_exceed: np.ndarray,
+    n_valid: np.ndarray,
+    alpha: float,
+    h: int,
+    stop_level: float,
+    decidable: np.ndarray,
+) -> bool:
+    if rule is None:
+        return False
+    ex, nv = n_exceed[decidable], n_valid[decidable]
+    if ex.size == 0:
+        return False
+    if rule == "besag-clifford":
+        return bool(np.all(ex >= h))
+
+    # Clopper–Pearson interval for each p-value
+    tail = (1.0 - stop_level) / 2.0
+    with np.errstate(invalid="ignore"):
+        lower = np.where(ex > 0, beta.ppf(tail, ex, nv - ex + 1), 0.0)
+        upper = np.where(ex < nv, beta.ppf(1.0 - tail, ex + 1, nv - ex), 1.0)
+    return bool(np.all((nv > 0) & ((upper < alpha) | (lower > alpha))))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+def permutation_test(
+    statistic: Statistic,
+    n: int,
+    observed: float | Sequence[float],
+    n_permutations: int,
+    *,
+    rng: Optional[np.random.Generator] = None,
+    seed: Optional[int] = None,
+    alternative: str | Sequence[str] = "greater",
+    draws_per_replicate: int = 1,
+    n_workers: int = 1,
+    chunk_size: int = 1_000,
+    early_stop: Optional[str] = None,
+    alpha: float = 0.05,
+    h: int = 20,
+    stop_level: float = 0.99,
+    rtol: float = 0.0,
+    max_block_cells: int = 4_000_000,
+    keep_null: bool = False,
+) -> PermutationResult:
+    """
+    Monte Carlo permutation test of one or more statistics.
+
+    Args:
+        statistic:           Vectorised null statistic (see module docstring).
+                             Must be picklable (module-level function or
+                             functools.partial of one) when n_workers > 1.
+        n:                   Length of each permutation
+        observed:            Observed statistic(s)
+        n_permutations:      Maximum number of replicates
+        rng:                 Generator to draw from (serial path); takes
+                             precedence over *seed*
+        seed:                Seed for a fresh Generator / SeedSequence
+        alternative:         "greater", "less" or "two-sided" (|null| ≥ |observed|),
+                             one value or one per statistic
+        draws_per_replicate: Independent permutations per replicate (k)
+        n_workers:           1 = in-process single stream; > 1 = process pool
+                             over SeedSequence.spawn chunks
+        chunk_size:          Replicates per parallel chunk (part of the stream layout)
+        early_stop:          None, "besag-clifford" or "confidence"
+        alpha:               Significance level for the "confidence" rule
+        h:                   Exceedance count for the "besag-clifford" rule
+        stop_level:          Interval coverage for the "confidence" rule
+        rtol:                Relative tolerance when comparing to *observed*
+        max_block_cells:     Upper bound on index cells (B × k × n) per block
+        keep_null:           Return the (replicates × s) null values
+
+    Returns:
+        PermutationResult.  Statistics whose observed value is not finite
+        get a NaN p-value.
+    """
+    if early_stop is not None and early_stop not in EARLY_STOP_RULES:
+        raise ValueError(f"Unknown early_stop rule {early_stop!r}; expected one of {EARLY_STOP_RULES}.")
+
+    scalar = np.ndim(observed) == 0
+    obs = np.atleast_1d(np.asarray(observed, dtype=float))
+    alt = np.broadcast_to(np.asarray(alternative, dtype=object), obs.shape)
+    if not set(alt.tolist()) <= set(ALTERNATIVES):
+        raise ValueError(f"alternative must be one of {ALTERNATIVES}.")
+
+    decidable = np.isfinite(obs)
+    n_exceed = np.zeros(obs.shape, dtype=np.int64)
+    n_valid = np.zeros(obs.shape, dtype=np.int64)
+    kept: list[np.ndarray] = []
+    drawn = 0
+    stopped = False
+    k = int(draws_per_replicate)
+    block = _block_size(n, k, max_block_cells)
+
+    def _absorb(null: np.ndarray) -> bool:
+        nonlocal drawn
+        finite = np.isfinite(null)
+        n_valid[:] += finite.sum(axis=0)
+        with np.errstate(invalid="ignore"):
+            n_exceed[:] += (_exceed(null, obs, alt, rtol) & finite).sum(axis=0)
+        drawn += null.shape[0]
+        if keep_null:
+            kept.append(null)
+        return _should_stop(early_stop, n_exceed, n_valid, alpha, h, stop_level, decidable)
+
+    if n_workers <= 1:
+        if rng is None:
+            rng = np.random.default_rng(seed)
+        for start in range(0, n_permutations, block):
+            b = min(block, n_permutations - start)
+            if _absorb(_as_2d(statistic(_draw(rng, b, k, n)), b)):
+                stopped = drawn < n_permutations
+                break
+    else:
+        if rng is not None:
+            children = _seed_sequence(rng).spawn(math.ceil(n_permutations / chunk_size))
+        else:
+            children = np.random.SeedSequence(seed).spawn(math.ceil(n_permutations / chunk_size))
+        sizes = [min(chunk_size, n_permutations - i * chunk_size) for i in range(len(children))]
+
+        pool = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(statistic,),
+        )
+        try:
+            pending: deque = deque()
+            tasks = iter(zip(children, sizes))
+            for child, size in tasks:
+                pending.append(pool.submit(_run_chunk, child, size, n, k, block))
+                if len(pending) >= 2 * n_workers:
+                    break
+            while pending:
+                if _absorb(pending.popleft().result()):
+                    stopped = drawn < n_permutations
+                    break
+                nxt = next(tasks, None)
+                if nxt is not None:
+                    pending.append(pool.submit(_run_chunk, nxt[0], nxt[1], n, k, block))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = np.where(decidable & (n_valid > 0), n_exceed / n_valid, np.nan)
+
+    null = np.concatenate(kept) if keep_null and kept else None
+    if scalar:
+        return PermutationResult(
+            observed=float(obs[0]),
+            p_value=float(p[0]),
+            n_exceed=int(n_exceed[0]),
+            n_valid=int(n_valid[0]),
+            n_permutations=drawn,
+            stopped_early=stopped,
+            null=null[:, 0] if null is not None else None,
+        )
+    return PermutationResult(
+        observed=obs,
+        p_value=p,
+        n_exceed=n_exceed,
+        n_valid=n_valid,
+        n_permutations=drawn,
+        stopped_early=stopped,
+        null=null,
+    )
@@ -22,6 +22,11 @@ from datetime import datetime, timezone
 from pathlib import Path
 from typing import Literal
 
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+
+DEPENDS_ON = ()   # reads only the uploaded export
+
 MIN_CONVERSATIONS           = 50
 MIN_MONTHS                  = 3
 MIN_AVG_USER_MSGS_PER_MONTH = 30
@@ -61,6 +66,9 @@ class PrecheckResult:
     # Warnings raised during inspection
     warnings: list[str] = field(default_factory=list)
 
+    # Per-step timing, memory and row counts (pipeline.instrument)
+    instrumentation: dict = field(default_factory=dict)
+
     # ── Derived metrics ───────────────────────────────────────────────────
 
     @property
@@ -230,6 +238,7 @@ def _to_unix(value: object) -> float | None:
 # Main entry point
 # ---------------------------------------------------------------------------
 
+@profiled("precheck")
 def run(json_path: str | Path, progress_cb=None) -> PrecheckResult:
     """
     Inspect *json_path* and return a PrecheckResult.
@@ -241,6 +250,7 @@ def run(json_path: str | Path, progress_cb=None) -> PrecheckResult:
     """
     result = PrecheckResult()
     path = Path(json_path)
+    inst = Recorder("precheck")
 
     def _progress(frac: float, msg: str):
         if progress_cb:
@@ -250,26 +260,31 @@ def run(json_path: str | Path, progress_cb=None) -> PrecheckResult:
     # 1. Load JSON
     # ------------------------------------------------------------------
     _progress(0.0, "Loading file…")
+    inst.step("Load JSON")
     try:
         with path.open(encoding="utf-8") as fh:
             data = json.load(fh)
     except (json.JSONDecodeError, UnicodeDecodeError) as exc:
         result.warnings.append(f"Could not parse JSON: {exc}")
+        result.instrumentation = inst.finish()
         return result
     except OSError as exc:
         result.warnings.append(f"Could not open file: {exc}")
+        result.instrumentation = inst.finish()
         return result
 
     # ------------------------------------------------------------------
     # 2. Detect format
     # ------------------------------------------------------------------
     _progress(0.2, "Detecting format…")
+    inst.step("Detect format", rows_in=len(data) if isinstance(data, list) else None)
     result.format, result.format_confidence = _detect_format(data)
 
     if result.format == "unknown":
         result.warnings.append(
             "Format not recognised. Expected a ChatGPT or Claude conversations.json export."
         )
+        result.instrumentation = inst.finish()
         return result
 
     result.total_conversations = len(data)
@@ -290,6 +305,7 @@ def run(json_path: str | Path, progress_cb=None) -> PrecheckResult:
     # 4. Extract messages (with character counts)
     # ------------------------------------------------------------------
     _progress(0.4, "Counting messages…")
+    inst.step("Extract messages", rows_in=result.total_conversations)
     if result.format == "chatgpt":
         messages = _extract_chatgpt_messages(data)
     else:
@@ -300,11 +316,13 @@ def run(json_path: str | Path, progress_cb=None) -> PrecheckResult:
     result.assistant_messages = sum(1 for m in messages if m["role"] == "assistant")
     result.user_chars         = sum(m["chars"] for m in messages if m["role"] == "user")
     result.assistant_chars    = sum(m["chars"] for m in messages if m["role"] == "assistant")
+    inst.rows(len(messages))
 
     # ------------------------------------------------------------------
     # 5. Temporal coverage + avg msgs/month
     # ------------------------------------------------------------------
     _progress(0.7, "Checking date range…")
+    inst.step("Date coverage", rows_in=len(messages))
     timestamps = [m["timestamp"] for m in messages if m["timestamp"] is not None]
 
     if timestamps:
@@ -342,5 +360,7 @@ def run(json_path: str | Path, progress_cb=None) -> PrecheckResult:
     else:
         result.warnings.append("No valid timestamps found in messages.")
 
+    inst.rows(result.months_covered)
+    result.instrumentation = inst.finish()
     _progress(1.0, "Pre-check complete.")
     return result
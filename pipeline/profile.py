@@ -1,7 +1,7 @@
 """
 Steps 3–4 — Cognitive style profiling & longitudinal trajectory.
 
-Two markers only (relational framing dropped — dominated by structural
+Two built-in markers (relational framing dropped — dominated by structural
 AI-address pronoun 'you', not a cognitive signal):
 
     - structural_thinking  : systems / process / framework language (30 terms)
@@ -9,6 +9,17 @@ AI-address pronoun 'you', not a cognitive signal):
 
 Word lists sourced from DOL/step3_expanded_lexicon.py (validated).
 
+All markers are matched in a single pass over each user message
+(pipeline.lexicon); per-message counts are stored in SQLite and the
+monthly trajectory is a SQL aggregate over them.  Additional markers can
+be loaded from lexicon packs (config "lexicon_packs", see pipeline.lexicon);
+they extend both output CSVs automatically.  Scoring streams user
+messages from SQLite in chunks and can run in a process pool
+(config "n_workers"); the summary reports throughput for the worker count.
+
+Writes to SQLite:
+    message_markers  (node_id, marker, count) — per-message marker counts
+
 Outputs:
     trajectory_monthly.csv  — monthly counts + per-1,000 user-message rates
     spearman_results.csv    — Spearman ρ + permutation p-values per marker
@@ -16,14 +27,25 @@ Outputs:
 
 from __future__ import annotations
 
-import re
-import sqlite3
+import os
+import time
+from functools import partial
 from pathlib import Path
 from typing import Callable, Optional
 
 import numpy as np
 import pandas as pd
-from scipy.stats import spearmanr
+from scipy.stats import rankdata, spearmanr
+
+from pipeline.db import connect
+from pipeline.instrument import Recorder
+from pipeline.lexicon import compile_cached, load_packs, score_chunks, trajectory, write_message_markers
+from pipeline.permutation import permutation_test
+from pipeline.profiling import profiled
+
+DEPENDS_ON = ("parse",)   # messages table
+OUTPUT_TABLES = ("message_markers",)
+OUTPUT_FILES = ("profile/*.csv",)   # relative to the work dir
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Word lists  (from step3_expanded_lexicon.py)
@@ -56,6 +78,14 @@ MARKERS: dict[str, list[str]] = {
     "epistemic_uncertainty": EPISTEMIC_UNCERTAINTY,
 }
 
+# Tail of each built-in marker's permutation test
+# structural: one-tailed (expected positive trend)
+# epistemic:  two-tailed (non-monotonic predicted)
+TWO_TAILED: dict[str, bool] = {
+    "structural_thinking":   False,
+    "epistemic_uncertainty": True,
+}
+
 # Months with fewer than this many user messages are excluded
 MIN_MESSAGES = 100
 
@@ -63,22 +93,35 @@ MIN_MESSAGES = 100
 N_PERMUTATIONS = 10_000
 RANDOM_SEED = 42
 
+DEFAULT_CONFIG = {
+    "n_workers":  1,       # scoring processes; 1 = in-process, 0 = one per CPU core
+    "chunk_size": 5_000,   # user messages fetched from SQLite per scoring task
+    "lexicon_packs":     [],     # extra marker packs (.json / .txt files or directories)
+    "lexicon_cache_dir": None,   # compiled-lexicon cache directory; None = no disk cache
+    "n_permutations":      N_PERMUTATIONS,
+    "permutation_workers": 1,      # > 1 = parallel SeedSequence streams (different draws)
+    "early_stop":          None,   # None, "besag-clifford" or "confidence" (pipeline.permutation)
+}
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Helpers
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _build_pattern(word_list: list[str]) -> re.Pattern:
-    """Compile a single word-boundary regex from a word/phrase list."""
-    escaped = sorted(map(re.escape, word_list), key=len, reverse=True)
-    return re.compile(
-        r"(?<!\w)(" + "|".join(escaped) + r")(?!\w)",
-        re.IGNORECASE,
-    )
+def _centred_ranks(v: np.ndarray) -> np.ndarray:
+    """
+    Twice the mean-centred average ranks of *v*.
+
+    Average ranks are multiples of ½, so doubling them makes every centred
+    value an integer — dot products of these vectors are exact in float64,
+    and ties between null and observed statistics compare exactly.
+    """
+    return 2.0 * rankdata(v) - (len(v) + 1)
 
 
-def _count_matches(texts: list[str], pattern: re.Pattern) -> int:
-    return sum(len(pattern.findall(t)) for t in texts if isinstance(t, str))
+def _rank_dots(rx: np.ndarray, ry: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """Null statistics for a block of permutations: permuted y-ranks · x-ranks."""
+    return ry[idx] @ rx
 
 
 def _permutation_p(
@@ -88,25 +131,52 @@ def _permutation_p(
     n_perms: int = N_PERMUTATIONS,
     seed: int = RANDOM_SEED,
     two_tailed: bool = False,
+    max_block_cells: int = 4_000_000,
+    n_workers: int = 1,
+    early_stop: Optional[str] = None,
 ) -> float:
-    """Permutation p-value for Spearman ρ."""
-    rng = np.random.default_rng(seed)
-    null = np.array([
-        spearmanr(x, rng.permutation(y)).statistic
-        for _ in range(n_perms)
-    ])
-    if two_tailed:
-        return float(np.mean(np.abs(null) >= abs(observed_rho)))
-    return float(np.mean(null >= observed_rho))
+    """
+    Permutation p-value for Spearman ρ.
+
+    Ranks are computed once: ranking commutes with permutation, so each
+    null ρ is the correlation of the fixed centred x-ranks with a permuted
+    copy of the centred y-ranks, and a block of null statistics is one
+    matrix product (pipeline.permutation).  The serial path draws the same
+    stream as calling ``rng.permutation(y)`` once per replicate.
+
+    Since the normalising constant is shared by the observed and every
+    permuted statistic, the comparison is made on the raw dot products.
+    *observed_rho* is accepted for API compatibility; the observed dot
+    product is recomputed from the same ranks so ties are counted exactly.
+    """
+    rx = _centred_ranks(np.asarray(x))
+    ry = _centred_ranks(np.asarray(y))
+    if not (rx.any() and ry.any()):
+        return float("nan")  # constant series: ρ undefined
+
+    result = permutation_test(
+        partial(_rank_dots, rx, ry),
+        n=len(ry),
+        observed=float(rx @ ry),
+        n_permutations=n_perms,
+        seed=seed,
+        alternative="two-sided" if two_tailed else "greater",
+        n_workers=n_workers,
+        early_stop=early_stop,
+        max_block_cells=max_block_cells,
+    )
+    return result.p_value
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Public API
 # ─────────────────────────────────────────────────────────────────────────────
 
+@profiled("profile")
 def run(
     db_path: str | Path,
     out_dir: str | Path,
+    config: Optional[dict] = None,
     progress_cb: Optional[Callable[[float, str], None]] = None,
 ) -> dict:
     """
@@ -115,99 +185,147 @@ def run(
     Args:
         db_path:     SQLite database written by pipeline.parse.run()
         out_dir:     Directory to write output CSVs
+        config:      Optional overrides for DEFAULT_CONFIG
         progress_cb: Optional callable(fraction 0–1, status_string)
 
     Returns:
-        Summary dict with monthly row count and Spearman results per marker.
+        Summary dict with monthly row count, Spearman results per marker and
+        scoring throughput (messages/sec overall and per worker), instrumentation
+        (per-step timing, memory and row counts).
     """
+    cfg = dict(DEFAULT_CONFIG)
+    if config:
+        cfg.update(config)
+    n_workers = int(cfg["n_workers"]) or (os.cpu_count() or 1)
+    chunk_size = int(cfg["chunk_size"])
+
     def _cb(frac: float, msg: str):
         if progress_cb:
             progress_cb(frac, msg)
 
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-
-    # ── 1. Load user messages from DB ────────────────────────────────────────
-    _cb(0.05, "Loading messages from database…")
-    con = sqlite3.connect(db_path)
-    df = pd.read_sql_query(
-        "SELECT year_month, text FROM messages WHERE role = 'user'",
-        con,
-    )
-    con.close()
-
-    if df.empty:
+    inst = Recorder("profile")
+
+    # ── 1. Load packs + compile the combined lexicon ─────────────────────────
+    _cb(0.05, "Compiling lexicon…")
+    inst.step("Compile lexicon")
+    pack_markers, pack_tails = load_packs(cfg["lexicon_packs"] or [], reserved=MARKERS)
+    markers = {**MARKERS, **pack_markers}
+    two_tailed_by_marker = {**TWO_TAILED, **pack_tails}
+    lexicon = compile_cached(markers, cfg["lexicon_cache_dir"])
+    inst.rows(len(markers))
+
+    # ── 2. Score every user message once ──────────────────────────────────────
+    _cb(0.10, "Loading messages from database…")
+    inst.step("Score messages")
+    con = connect(db_path)
+    n_user = con.execute("SELECT COUNT(*) FROM messages WHERE role = 'user'").fetchone()[0]
+    if n_user == 0:
+        con.close()
         raise ValueError("No user messages found in database.")
+    inst.rows(rows_in=n_user)
+
+    def _chunks():
+        cur = con.execute("SELECT node_id, text FROM messages WHERE role = 'user'")
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    records: list[tuple[str, str, int]] = []
+    scored = 0
+    t0 = time.perf_counter()
+    for n_rows, chunk_records in score_chunks(lexicon, _chunks(), n_workers):
+        records.extend(chunk_records)
+        scored += n_rows
+        _cb(0.10 + 0.55 * scored / n_user, f"Scoring messages ({scored:,}/{n_user:,})…")
+    elapsed = time.perf_counter() - t0
+    throughput = scored / elapsed if elapsed > 0 else float("inf")
+    inst.rows(len(records))
+
+    _cb(0.67, "Writing per-message marker counts…")
+    inst.step("Write SQLite", rows_in=len(records))
+    write_message_markers(con, records)
+    inst.rows(len(records))
+
+    # ── 3. Monthly counts (SQL aggregate over message_markers) ────────────────
+    _cb(0.70, "Aggregating monthly trajectories…")
+    inst.step("Monthly trajectories")
+    monthly = trajectory(db_path, markers, by="month", min_messages=MIN_MESSAGES, con=con)
+    con.close()
 
-    months = sorted(df["year_month"].dropna().unique())
-
-    # ── 2. Compile regex patterns ─────────────────────────────────────────────
-    _cb(0.10, "Compiling lexicon patterns…")
-    patterns = {name: _build_pattern(wlist) for name, wlist in MARKERS.items()}
-
-    # ── 3. Monthly counts ─────────────────────────────────────────────────────
-    _cb(0.15, "Counting marker occurrences by month…")
     traj_rows = []
-    n_months = len(months)
-
-    for i, month in enumerate(months):
-        _cb(0.15 + 0.55 * (i / max(n_months, 1)), f"Scoring month {month}…")
-        texts = df[df["year_month"] == month]["text"].tolist()
-        n = len(texts)
-
-        if n < MIN_MESSAGES:
-            continue
-
-        row: dict = {"year_month": month, "user_messages": n}
-        for name, pat in patterns.items():
-            count = _count_matches(texts, pat)
+    for rec in monthly.to_dict("records"):
+        n = int(rec["user_messages"])
+        row: dict = {"year_month": rec["period"], "user_messages": n}
+        for name in markers:
+            count = int(rec[f"{name}_count"])
             row[f"{name}_count"] = count
             row[f"{name}_per1k"] = count / n * 1000
-
         traj_rows.append(row)
 
     traj = pd.DataFrame(traj_rows)
     traj_path = out_dir / "trajectory_monthly.csv"
     traj.to_csv(traj_path, index=False)
+    inst.rows(len(traj))
 
     # ── 4. Spearman + permutation p ──────────────────────────────────────────
     _cb(0.75, "Computing Spearman correlations…")
+    inst.step("Spearman + permutation", rows_in=len(traj))
     time_idx = np.arange(1, len(traj) + 1, dtype=float)
     stat_rows = []
 
-    for name in MARKERS:
+    for name in markers:
         col = f"{name}_per1k"
         if col not in traj.columns or len(traj) < 3:
             continue
 
         vals = traj[col].values
-        rho, _ = spearmanr(time_idx, vals)
-
-        # structural: one-tailed (expected positive trend)
-        # epistemic:  two-tailed (non-monotonic predicted)
-        two_tailed = name == "epistemic_uncertainty"
-        p = _permutation_p(rho, time_idx, vals, two_tailed=two_tailed)
+        two_tailed = two_tailed_by_marker[name]
+        if np.ptp(vals) == 0:
+            # e.g. a pack marker that never occurs — no trend to test
+            rho = p = float("nan")
+        else:
+            rho, _ = spearmanr(time_idx, vals)
+            p = _permutation_p(
+                rho, time_idx, vals,
+                n_perms=int(cfg["n_permutations"]),
+                two_tailed=two_tailed,
+                n_workers=int(cfg["permutation_workers"]),
+                early_stop=cfg["early_stop"],
+            )
 
         stat_rows.append({
             "marker":          name,
             "spearman_rho":    round(rho, 3),
             "p_value":         round(p, 4),
             "two_tailed":      two_tailed,
-            "significant":     p < 0.05,
+            "significant":     bool(p < 0.05),
             "min_per1k":       round(float(vals.min()), 1),
             "max_per1k":       round(float(vals.max()), 1),
             "fold_change":     round(float(vals.max() / vals.min()), 2) if vals.min() > 0 else None,
-            "n_terms":         len(MARKERS[name]),
+            "n_terms":         len(markers[name]),
         })
 
     stat_df = pd.DataFrame(stat_rows)
     stat_path = out_dir / "spearman_results.csv"
     stat_df.to_csv(stat_path, index=False)
+    inst.rows(len(stat_df))
 
     _cb(1.0, "Profiling complete.")
 
     return {
         "months_scored": len(traj),
-        "markers": list(MARKERS.keys()),
+        "markers": list(markers),
         "spearman": stat_rows,
+        "scoring": {
+            "n_workers":               n_workers,
+            "messages":                scored,
+            "seconds":                 round(elapsed, 3),
+            "msgs_per_sec":            round(throughput, 1),
+            "msgs_per_sec_per_worker": round(throughput / n_workers, 1),
+        },
+        "instrumentation": inst.finish(),
     }
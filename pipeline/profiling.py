@@ -0,0 +1,274 @@
+"""
+Opt-in deep profiling of pipeline stages.
+
+Off unless DOL_PROFILE is set (the runner's --profile flag sets it):
+
+    DOL_PROFILE=cprofile    deterministic profiler (cProfile); "1" also works
+    DOL_PROFILE=sample      statistical sampler: a thread records the stage's
+                            call stack every DOL_PROFILE_INTERVAL ms (default 5)
+    DOL_PROFILE_DIR         where the dumps go (default: <work dir>/profiles)
+
+Every stage's run() (and the HTML report build) is wrapped by
+@profiled(stage), so the app, the headless runner and direct calls are all
+covered — set the variable before launching and run as usual.  Per stage
+it writes
+
+    <stage>.prof        pstats dump (cprofile only) — python -m pstats, snakeviz
+    <stage>.collapsed   folded stacks, one "root;…;leaf <weight>" per line —
+                        flamegraph.pl, inferno, speedscope.  Weights are µs
+                        (cprofile) or samples (sample).
+    <stage>.txt         the top functions, human readable
+
+A stage that raises still writes its dumps.
+
+Notes:
+    - Only the thread calling run() is profiled, not process-pool workers
+      (profile scoring, permutations with n_workers > 1).
+    - cProfile records caller → callee totals, not whole stacks, so its
+      collapsed stacks are reconstructed by splitting each function's time
+      over its callers in proportion (as flameprof does).  The sampler's
+      stacks are exact but it only runs when it gets the GIL, so long
+      GIL-holding C calls are under-sampled.
+    - cProfile slows Python-heavy stages (parse, dynamics) by up to ~3×;
+      the instrumentation timings of a profiled run are inflated too.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import contextlib
+import functools
+import inspect
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+PROFILE_ENV = "DOL_PROFILE"
+PROFILE_DIR_ENV = "DOL_PROFILE_DIR"
+INTERVAL_ENV = "DOL_PROFILE_INTERVAL"
+
+MODES = ("cprofile", "sample")
+DEFAULT_INTERVAL_MS = 5.0
+
+# Reconstructed cProfile stacks: deeper paths, or paths carrying less than
+# this share of the stage's time, are cut
+_MAX_DEPTH = 200
+_MIN_SHARE = 1e-4
+
+_TOP_N = 40
+
+# Roots from the profiler's own teardown (the with-block's __exit__)
+_OWN_FILES = {__file__, contextlib.__file__}
+
+# run() arguments that locate the work directory, in order of preference
+_WORK_DIR_ARGS = (("db_path", True), ("work_dir", False), ("out_dir", False), ("json_path", True))
+
+
+def mode() -> Optional[str]:
+    """The profiling mode selected by DOL_PROFILE, or None when off."""
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "off", "false"):
+        return None
+    if value in ("1", "on", "true"):
+        return "cprofile"
+    if value not in MODES:
+        raise ValueError(f"{PROFILE_ENV}={value!r}: expected one of {MODES} (or 1 / 0).")
+    return value
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Collapsed stacks
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _label(filename: str, lineno: int, name: str) -> str:
+    if filename == "~":                     # built-ins: "<built-in method …>"
+        return name.replace(";", ",")
+    return f"{name} ({Path(filename).name}:{lineno})".replace(";", ",")
+
+
+def collapsed_from_stats(stats: pstats.Stats) -> Counter:
+    """
+    Folded stacks {"a;b;c": µs} from a cProfile run: each function's own
+    time is split over the paths reaching it in proportion to the time
+    each caller spent in it.
+    """
+    raw = stats.stats       # func → (cc, nc, tt, ct, {caller: (cc, nc, tt, ct)})
+    children: dict[tuple, dict[tuple, float]] = defaultdict(dict)
+    for func, (*_, callers) in raw.items():
+        for caller, (*_, edge_ct) in callers.items():
+            children[caller][func] = edge_ct
+    roots = [f for f, v in raw.items() if not v[4] and f[0] not in _OWN_FILES]
+    floor = _MIN_SHARE * sum(raw[f][3] for f in roots)
+
+    out: Counter = Counter()
+
+    def _walk(func: tuple, path: list[str], on_stack: set, budget: float) -> None:
+        tt, ct = raw[func][2], raw[func][3]
+        if ct <= 0 or budget <= floor:
+            return
+        scale = min(1.0, budget / ct)
+        path = path + [_label(*func)]
+        own = round(tt * scale * 1e6)
+        if own > 0:
+            out[";".join(path)] += own
+        if len(path) >= _MAX_DEPTH:
+            return
+        for child, edge_ct in children[func].items():
+            if child not in on_stack:       # recursion: counted at the outermost call
+                _walk(child, path, on_stack | {child}, edge_ct * scale)
+
+    for root in roots:
+        _walk(root, [], {root}, raw[root][3])
+    return out
+
+
+def write_collapsed(stacks: Counter, path: str | Path) -> Path:
+    """Write folded stacks, heaviest first."""
+    path = Path(path)
+    lines = [f"{stack} {weight}" for stack, weight in stacks.most_common() if weight > 0]
+    path.write_text("\n".join(lines) + ("\n" if lines else ""), encoding="utf-8")
+    return path
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sampler
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _frame_depth(frame) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class _Sampler(threading.Thread):
+    """Counts the folded call stack of thread *target* every *interval* seconds."""
+
+    def __init__(self, target: int, skip: int, interval: float):
+        super().__init__(name="dol-profile-sampler", daemon=True)
+        self.target = target
+        self.skip = skip                    # outer frames belonging to the caller
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes = codes[::-1][self.skip:]
+            # Caught entering or leaving the with-block (profile_stage's
+            # teardown, contextlib's __exit__): not the profiled code
+            if not codes or codes[0].co_filename in _OWN_FILES:
+                continue
+            stack = [_label(c.co_filename, c.co_firstlineno, c.co_name) for c in codes]
+            self.stacks[";".join(stack)] += 1
+
+    def stop(self) -> Counter:
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+def _sample_report(stacks: Counter, interval: float) -> str:
+    self_counts: Counter = Counter()
+    incl_counts: Counter = Counter()
+    for stack, n in stacks.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += n
+        for frame in set(frames):
+            incl_counts[frame] += n
+    total = sum(stacks.values())
+    lines = [f"{total:,} samples every {interval * 1e3:g} ms", ""]
+    for title, counts in (("self", self_counts), ("inclusive", incl_counts)):
+        lines.append(f"Top {_TOP_N} by {title} samples:")
+        for frame, n in counts.most_common(_TOP_N):
+            lines.append(f"  {n:8,}  {n / max(total, 1):6.1%}  {frame}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+@contextlib.contextmanager
+def profile_stage(
+    stage: str,
+    out_dir: str | Path,
+    how: str = "cprofile",
+    interval_ms: Optional[float] = None,
+) -> Iterator[None]:
+    """Profile the enclosed block as *stage*, writing the dumps to *out_dir*."""
+    if how not in MODES:
+        raise ValueError(f"Unknown profiling mode {how!r}; expected one of {MODES}.")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    if how == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(out_dir / f"{stage}.prof")
+            stats = pstats.Stats(prof)
+            write_collapsed(collapsed_from_stats(stats), out_dir / f"{stage}.collapsed")
+            text = io.StringIO()
+            pstats.Stats(prof, stream=text).sort_stats("cumulative").print_stats(_TOP_N)
+            (out_dir / f"{stage}.txt").write_text(text.getvalue(), encoding="utf-8")
+        return
+
+    if interval_ms is None:
+        interval_ms = float(os.environ.get(INTERVAL_ENV) or DEFAULT_INTERVAL_MS)
+    # Sampled stacks start below the frame running the with-block: this
+    # generator frame and contextlib's __enter__ sit on top of it right now
+    sampler = _Sampler(threading.get_ident(), _frame_depth(sys._getframe()) - 2,
+                       interval_ms / 1e3)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stacks = sampler.stop()
+        write_collapsed(stacks, out_dir / f"{stage}.collapsed")
+        (out_dir / f"{stage}.txt").write_text(_sample_report(stacks, sampler.interval),
+                                              encoding="utf-8")
+
+
+def _profile_dir(signature: inspect.Signature, args: tuple, kwargs: dict) -> Path:
+    """DOL_PROFILE_DIR, else <work dir>/profiles from the stage's arguments."""
+    if os.environ.get(PROFILE_DIR_ENV):
+        return Path(os.environ[PROFILE_DIR_ENV])
+    bound = signature.bind_partial(*args, **kwargs).arguments
+    for name, is_file in _WORK_DIR_ARGS:
+        if bound.get(name) is not None:
+            path = Path(bound[name])
+            return (path.parent if is_file else path) / "profiles"
+    return Path.cwd() / "profiles"
+
+
+def profiled(stage: str) -> Callable[[Callable], Callable]:
+    """Decorator: profile each call of a stage entry point when DOL_PROFILE is set."""
+    def decorate(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            how = mode()
+            if how is None:
+                return fn(*args, **kwargs)
+            with profile_stage(stage, _profile_dir(signature, args, kwargs), how):
+                return fn(*args, **kwargs)
+
+        return wrapper
+    return decorate
@@ -1,33 +1,583 @@
-"""
-Step 8r — Robustness & null model tests.
-
-Grid-searches over K ∈ {40, 60, 80} × SVD dims ∈ {100, 200}.
-Runs three null models (month shuffle, role shuffle, volume downsample)
-with N=200 permutations each.
-
-Output:
-    robustness_null_tests.csv
-    robustness_curves_k{K}_svd{D}.csv  (one per hyperparameter combo)
-"""
-
-from __future__ import annotations
-
-from pathlib import Path
-from typing import Callable
-
-DEFAULT_CONFIG = {
-    "k_values": [40, 60, 80],
-    "svd_values": [100, 200],
-    "n_permutations": 200,
-    "random_state": 42,
-}
-
-
-def run(
-    db_path: str | Path,
-    out_dir: str | Path,
-    config: dict | None = None,
-    progress_cb: Callable[[float, str], None] | None = None,
-) -> dict:
-    """Run robustness grid search and permutation null tests."""
-    raise NotImplementedError("robustness.run() will be implemented in Week 2.")
+"""
+Step 8r — Robustness & null model tests.
+
+Grid-searches over K ∈ {40, 60, 80} × SVD dims ∈ {100, 200}.
+Runs three null models (month shuffle, role shuffle, volume downsample)
+with N=200 permutations each.
+
+The grid shares as much work as possible instead of refitting the topic
+model six times:
+
+    1. TF-IDF is fitted once, with the same settings as topics.py.
+    2. One TruncatedSVD is fitted at the largest requested dimensionality;
+       each smaller dimensionality uses its leading components (the
+       components are ordered by singular value, so the leading D columns
+       are the rank-D projection, up to randomised-solver noise).
+    3. The reduced matrix is written once to a .npy file that the KMeans
+       worker processes open as a read-only memory map — one copy in the
+       page cache, nothing pickled per task.
+    4. Each (K, D) cell is one KMeans fit in a process pool; the labels
+       are reduced to monthly curves with the batched helpers in
+       pipeline.distributions.
+
+The null models run on the fine clusters from topics.py, coded as integer
+arrays (month index, role flag, cluster id).  Permutations are generated
+in blocks of B replicates; each block is reduced to a (B × months ×
+clusters) count tensor with one bincount over combined keys, and entropy,
+JS and trend statistics are evaluated for the whole block at once:
+
+    month_shuffle      user messages' months permuted      → month heterogeneity,
+                                                             entropy trend
+    role_shuffle       roles permuted within each month    → mean dyadic JS
+    volume_downsample  every month subsampled to the       → entropy trend
+                       smallest month's volume
+
+Within-month shuffles and subsamples use one argsort of
+``month + uniform noise`` per replicate: rows stay grouped by month, and
+the order inside each month is a uniform random permutation.
+
+Output:
+    robustness_null_tests.csv          — null_model, statistic, tail, observed,
+                                         null mean / sd / 2.5% / 97.5%, p_value
+    robustness_curves_k{K}_svd{D}.csv  (one per hyperparameter combo) —
+        year_month, user_messages, asst_messages, clusters_present,
+        topic_entropy_nats (user), js_divergence (user vs assistant)
+
+Not a runner stage: the grid refits the topic model once per cell and the
+null models draw thousands of permutations, so "Run all" would pay for a
+validation study on every export.  Call run() after topics.run():
+    from pipeline import robustness
+    robustness.run("work/conversations.db", "work/", progress_cb=print)
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.special import entr
+from scipy.stats import rankdata, spearmanr
+from sklearn.cluster import KMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from pipeline.db import connect
+from pipeline.distributions import count_matrix, js_distance, period_codes
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+from pipeline.topics import DEFAULT_CONFIG as TOPIC_CONFIG
+
+DEFAULT_CONFIG = {
+    "k_values": [40, 60, 80],
+    "svd_values": [100, 200],
+    "n_permutations": 200,
+    "random_state": 42,
+    "n_init": TOPIC_CONFIG["n_init"],
+    "n_workers": 0,          # KMeans processes; 0 = one per grid cell, capped at CPU count
+    "null_models": ["month_shuffle", "role_shuffle", "volume_downsample"],
+    "min_msgs_per_month": 50,   # months with fewer user messages are left out of null tests
+}
+
+NULL_MODELS = ("month_shuffle", "role_shuffle", "volume_downsample")
+
+# Upper bound on (replicates × messages) index cells generated per block
+_MAX_BLOCK_CELLS = 4_000_000
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Grid workers
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Memory-mapped reduced matrix, opened once per worker process by _init_worker
+_WORKER_Z: Optional[np.ndarray] = None
+
+
+def _init_worker(z_path: str) -> None:
+    global _WORKER_Z
+    _WORKER_Z = np.load(z_path, mmap_mode="r")
+
+
+def _fit_cell(k: int, d: int, random_state: int, n_init: int) -> np.ndarray:
+    """KMeans labels for one grid cell, on the L2-normalised leading *d* components."""
+    X = normalize(np.asarray(_WORKER_Z[:, :d]))
+    km = KMeans(n_clusters=k, random_state=random_state, n_init=n_init)
+    return km.fit_predict(X).astype(np.int32)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _monthly_curves(
+    labels: np.ndarray,
+    is_user: np.ndarray,
+    month_codes: np.ndarray,
+    months: np.ndarray,
+    k: int,
+) -> pd.DataFrame:
+    """Monthly user topic entropy and user-vs-assistant JS for one labelling."""
+    n_months = len(months)
+    user = count_matrix(month_codes[is_user], labels[is_user], n_months, k)
+    asst = count_matrix(month_codes[~is_user], labels[~is_user], n_months, k)
+
+    n_user = user.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        entropy = entr(user / n_user[:, None]).sum(axis=1)
+
+    df = pd.DataFrame({
+        "year_month":         months,
+        "user_messages":      n_user,
+        "asst_messages":      asst.sum(axis=1),
+        "clusters_present":   (user > 0).sum(axis=1),
+        "topic_entropy_nats": np.where(n_user > 0, entropy, np.nan),
+        "js_divergence":      js_distance(user, asst),
+    })
+    return df[(df["user_messages"] > 0) | (df["asst_messages"] > 0)].reset_index(drop=True)
+
+
+def _curve_rho(a: pd.Series, b: pd.Series) -> Optional[float]:
+    ok = a.notna() & b.notna()
+    if ok.sum() < 3:
+        return None
+    rho = spearmanr(a[ok], b[ok]).statistic
+    return None if np.isnan(rho) else round(float(rho), 3)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Null-model engine
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _load_null_codes(con: sqlite3.Connection, min_msgs: int) -> Optional[dict]:
+    """
+    Integer-coded (month, is_user, cluster) arrays for the null models,
+    sorted by month and restricted to months with >= *min_msgs* user messages.
+    """
+    df = pd.read_sql_query(
+        """SELECT m.role, m.year_month, n.cluster_id
+           FROM messages m
+           JOIN node_to_fine_cluster n ON m.node_id = n.node_id
+           WHERE m.role IN ('user', 'assistant')""",
+        con,
+    )
+    valid, codes, labels = period_codes(df, "month")
+    is_user = (df["role"] == "user").to_numpy()[valid]
+    cluster = df["cluster_id"].to_numpy(dtype=np.int64)[valid]
+
+    user_per_month = np.bincount(codes[is_user], minlength=len(labels))
+    kept = np.flatnonzero(user_per_month >= min_msgs)
+    if len(kept) < 3:
+        return None
+
+    remap = np.full(len(labels), -1, dtype=np.int64)
+    remap[kept] = np.arange(len(kept))
+    month = remap[codes]
+    keep = month >= 0
+    order = np.argsort(month[keep], kind="stable")
+
+    return {
+        "month":   month[keep][order],
+        "is_user": is_user[keep][order],
+        "cluster": cluster[keep][order],
+        "months":  labels[kept],
+        "k":       int(cluster.max()) + 1,
+    }
+
+
+def _block_counts(
+    month: np.ndarray,
+    cluster: np.ndarray,
+    n_months: int,
+    k: int,
+    weights: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    (B × months × k) counts from (B × n) or broadcastable (n,) code and
+    weight arrays, with one bincount over the combined (replicate, month, cluster) key.
+    """
+    if weights is not None:
+        month, cluster, weights = np.broadcast_arrays(month, cluster, weights)
+        weights = weights.ravel().astype(float)
+    else:
+        month, cluster = np.broadcast_arrays(month, cluster)
+    b = month.shape[0] if month.ndim == 2 else 1
+    rep = np.arange(b, dtype=np.int64)[:, None] if month.ndim == 2 else 0
+    key = (rep * n_months + month) * k + cluster
+    return np.bincount(
+        key.ravel(), weights=weights, minlength=b * n_months * k
+    ).reshape(b, n_months, k)
+
+
+def _entropy(counts: np.ndarray) -> np.ndarray:
+    """Shannon entropy (nats) over the last axis; NaN for empty rows."""
+    n = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        h = entr(counts / n).sum(axis=-1)
+    return np.where(n[..., 0] > 0, h, np.nan)
+
+
+def _heterogeneity(counts: np.ndarray) -> np.ndarray:
+    """Mean JS distance of each month's distribution from the pooled one."""
+    pooled = counts.sum(axis=-2, keepdims=True)
+    return np.nanmean(js_distance(counts, pooled), axis=-1)
+
+
+def _trend_rho(series: np.ndarray) -> np.ndarray:
+    """Spearman ρ of each row of *series* against its index (batched)."""
+    r = rankdata(series, axis=-1)
+    r = r - r.mean(axis=-1, keepdims=True)
+    t = np.arange(series.shape[-1], dtype=float)
+    t -= t.mean()
+    denom = np.sqrt((r ** 2).sum(axis=-1) * (t ** 2).sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (r @ t) / denom
+
+
+def _dyadic_js(user: np.ndarray, asst: np.ndarray) -> np.ndarray:
+    return np.nanmean(js_distance(user, asst), axis=-1)
+
+
+def _within_month_order(
+    month_sorted: np.ndarray,
+    b: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    (b × n) indices that shuffle rows uniformly *within* each month.
+
+    Rows must be sorted by month; position j of every output row still
+    belongs to month ``month_sorted[j]``.
+    """
+    noise = rng.random((b, len(month_sorted)))
+    return np.argsort(month_sorted + noise, axis=1, kind="stable")
+
+
+def _null_distributions(
+    codes: dict,
+    model: str,
+    n_perms: int,
+    rng: np.random.Generator,
+) -> dict[str, np.ndarray]:
+    """All null statistics of one model, generated block by block."""
+    month, is_user, cluster = codes["month"], codes["is_user"], codes["cluster"]
+    T, k = len(codes["months"]), codes["k"]
+    u_month, u_cluster = month[is_user], cluster[is_user]
+    n = len(month) if model == "role_shuffle" else len(u_month)
+    block = max(1, _MAX_BLOCK_CELLS // max(n, 1))
+
+    if model == "volume_downsample":
+        starts = np.searchsorted(u_month, np.arange(T))
+        sizes = np.bincount(u_month, minlength=T)
+        keep_pos = np.flatnonzero(np.arange(len(u_month)) - starts[u_month] < sizes.min())
+
+    out: dict[str, list] = {}
+    for start in range(0, n_perms, block):
+        b = min(block, n_perms - start)
+
+        if model == "month_shuffle":
+            idx = rng.permuted(np.broadcast_to(np.arange(n), (b, n)), axis=1)
+            counts = _block_counts(u_month[idx], u_cluster, T, k)
+            stats = {
+                "month_heterogeneity_js": _heterogeneity(counts),
+                "entropy_trend_rho":      _trend_rho(_entropy(counts)),
+            }
+        elif model == "role_shuffle":
+            role = is_user[_within_month_order(month, b, rng)]
+            user = _block_counts(month, cluster, T, k, weights=role)
+            asst = _block_counts(month, cluster, T, k, weights=~role)
+            stats = {"mean_dyadic_js": _dyadic_js(user, asst)}
+        elif model == "volume_downsample":
+            order = _within_month_order(u_month, b, rng)[:, keep_pos]
+            counts = _block_counts(u_month[keep_pos], u_cluster[order], T, k)
+            stats = {"entropy_trend_rho": _trend_rho(_entropy(counts))}
+        else:
+            raise ValueError(f"Unknown null model {model!r}; expected one of {NULL_MODELS}.")
+
+        for name, values in stats.items():
+            out.setdefault(name, []).append(values)
+
+    return {name: np.concatenate(v) for name, v in out.items()}
+
+
+# Tail used for each statistic's p-value
+#   greater   — P(null >= observed)
+#   two-sided — P(|null| >= |observed|)
+#   sign      — share of replicates whose sign differs from the observed one
+_TAILS = {
+    ("month_shuffle", "month_heterogeneity_js"): "greater",
+    ("month_shuffle", "entropy_trend_rho"):      "two-sided",
+    ("role_shuffle", "mean_dyadic_js"):          "greater",
+    ("volume_downsample", "entropy_trend_rho"):  "sign",
+}
+
+
+def _null_tests(
+    codes: dict,
+    models: list[str],
+    n_perms: int,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    """Observed statistics, null summaries and p-values for each null model."""
+    T, k = len(codes["months"]), codes["k"]
+    is_user = codes["is_user"]
+    user = _block_counts(codes["month"][is_user], codes["cluster"][is_user], T, k)[0]
+    asst = _block_counts(codes["month"][~is_user], codes["cluster"][~is_user], T, k)[0]
+    observed = {
+        "month_heterogeneity_js": float(_heterogeneity(user)),
+        "entropy_trend_rho":      float(_trend_rho(_entropy(user))),
+        "mean_dyadic_js":         float(_dyadic_js(user, asst)),
+    }
+
+    rows = []
+    for model in models:
+        for stat, null in _null_distributions(codes, model, n_perms, rng).items():
+            obs = observed[stat]
+            tail = _TAILS[(model, stat)]
+            finite = null[np.isfinite(null)]
+            if tail == "greater":
+                p = np.mean(finite >= obs)
+            elif tail == "two-sided":
+                p = np.mean(np.abs(finite) >= abs(obs))
+            else:
+                p = np.mean(np.sign(finite) != np.sign(obs))
+            lo, hi = np.quantile(finite, [0.025, 0.975]) if finite.size else (np.nan, np.nan)
+            rows.append({
+                "null_model":     model,
+                "statistic":      stat,
+                "tail":           tail,
+                "observed":       round(obs, 6),
+                "null_mean":      round(float(finite.mean()), 6) if finite.size else None,
+                "null_sd":        round(float(finite.std()), 6) if finite.size else None,
+                "null_lo":        round(float(lo), 6),
+                "null_hi":        round(float(hi), 6),
+                "p_value":        round(float(p), 4) if finite.size else None,
+                "n_permutations": int(finite.size),
+                "months":         T,
+            })
+    return pd.DataFrame(rows)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Grid search
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _run_grid(
+    df: pd.DataFrame,
+    cfg: dict,
+    out_dir: Path,
+    cb: Callable[[float, str], None],
+    inst: Recorder,
+) -> dict:
+    """K × SVD grid: shared TF-IDF + SVD, pooled KMeans, one curves CSV per cell."""
+    n_msgs = len(df)
+
+    # ── 2. TF-IDF once ───────────────────────────────────────────────────────
+    inst.step("TF-IDF", rows_in=n_msgs)
+    cb(0.05, f"Vectorising {n_msgs:,} messages (TF-IDF)…")
+    vec = TfidfVectorizer(
+        max_features=TOPIC_CONFIG["max_features"],
+        min_df=TOPIC_CONFIG["min_df"],
+        max_df=TOPIC_CONFIG["max_df"],
+        stop_words="english",
+        ngram_range=(1, 2),
+    )
+    X = vec.fit_transform(df["text"].astype(str).tolist())
+    inst.rows(X.shape[0])
+
+    # ── 3. Largest SVD once; smaller dims are leading-column slices ──────────
+    d_max = min(max(cfg["svd_values"]), X.shape[1] - 1)
+    dims = sorted({min(d, d_max) for d in cfg["svd_values"]})
+    ks = sorted({min(k, max(2, n_msgs // 5)) for k in cfg["k_values"]})
+    inst.step("SVD", rows_in=X.shape[0])
+    cb(0.15, f"Reducing dimensions (SVD → {d_max})…")
+    svd = TruncatedSVD(n_components=d_max, random_state=cfg["random_state"])
+    Z = svd.fit_transform(X)
+    del X
+    inst.rows(Z.shape[0])
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="robustness_"))
+    z_path = tmp_dir / "svd.npy"
+    np.save(z_path, Z)
+    del Z
+
+    # ── 4. KMeans per grid cell in a process pool ────────────────────────────
+    cells = [(k, d) for k in ks for d in dims]
+    inst.step("KMeans grid", rows_in=n_msgs * len(cells))
+    n_workers = int(cfg["n_workers"]) or min(len(cells), os.cpu_count() or 1)
+    labels_by_cell: dict[tuple[int, int], np.ndarray] = {}
+
+    try:
+        if n_workers <= 1:
+            _init_worker(str(z_path))
+            for i, (k, d) in enumerate(cells):
+                cb(0.25 + 0.6 * i / len(cells), f"Clustering K={k}, SVD={d}…")
+                labels_by_cell[(k, d)] = _fit_cell(k, d, cfg["random_state"], cfg["n_init"])
+        else:
+            cb(0.25, f"Clustering {len(cells)} grid cells on {n_workers} workers…")
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_worker,
+                initargs=(str(z_path),),
+            ) as pool:
+                futures = {
+                    pool.submit(_fit_cell, k, d, cfg["random_state"], cfg["n_init"]): (k, d)
+                    for k, d in cells
+                }
+                for i, fut in enumerate(as_completed(futures)):
+                    cell = futures[fut]
+                    labels_by_cell[cell] = fut.result()
+                    cb(0.25 + 0.6 * (i + 1) / len(cells),
+                        f"Clustered K={cell[0]}, SVD={cell[1]} ({i + 1}/{len(cells)})…")
+    finally:
+        global _WORKER_Z
+        _WORKER_Z = None
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    inst.rows(len(labels_by_cell))
+
+    # ── 5. Monthly curves per cell ───────────────────────────────────────────
+    inst.step("Monthly curves", rows_in=n_msgs * len(cells))
+    cb(0.88, "Computing robustness curves…")
+    valid, month_codes, months = period_codes(df, "month")
+    is_user = (df["role"] == "user").to_numpy()[valid]
+    in_dyad = df["role"].isin(["user", "assistant"]).to_numpy()[valid]
+
+    curves: dict[tuple[int, int], pd.DataFrame] = {}
+    for (k, d), labels in labels_by_cell.items():
+        lab = labels[valid][in_dyad]
+        curves[(k, d)] = _monthly_curves(
+            lab, is_user[in_dyad], month_codes[in_dyad], months, k
+        )
+        curves[(k, d)].to_csv(out_dir / f"robustness_curves_k{k}_svd{d}.csv", index=False)
+    inst.rows(sum(len(c) for c in curves.values()))
+
+    ref = (TOPIC_CONFIG["n_clusters"], TOPIC_CONFIG["svd_components"])
+    if ref not in curves:
+        ref = cells[0]
+    ref_df = curves[ref].set_index("year_month")
+
+    grid = []
+    for (k, d), cdf in curves.items():
+        c = cdf.set_index("year_month").reindex(ref_df.index)
+        grid.append({
+            "k":                  k,
+            "svd":                d,
+            "entropy_mean":       round(float(cdf["topic_entropy_nats"].mean()), 4),
+            "js_mean":            round(float(cdf["js_divergence"].mean()), 4),
+            "entropy_rho_vs_ref": _curve_rho(c["topic_entropy_nats"], ref_df["topic_entropy_nats"]),
+            "js_rho_vs_ref":      _curve_rho(c["js_divergence"], ref_df["js_divergence"]),
+        })
+
+    return {
+        "svd_computed": d_max,
+        "reference":    {"k": ref[0], "svd": ref[1]},
+        "grid":         grid,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+@profiled("robustness")
+def run(
+    db_path: str | Path,
+    out_dir: str | Path,
+    config: dict | None = None,
+    progress_cb: Callable[[float, str], None] | None = None,
+) -> dict:
+    """
+    Run robustness grid search and permutation null tests.
+
+    Args:
+        db_path:     SQLite database written by pipeline.parse.run()
+        out_dir:     Directory for output CSVs
+        config:      Optional overrides for DEFAULT_CONFIG
+        progress_cb: Optional callable(fraction 0–1, status_string)
+
+    Null-model tests need topics.run() (node_to_fine_cluster).  Either part
+    can be skipped: an empty "k_values" skips the grid, an empty
+    "null_models" skips the permutation tests.
+
+    Returns:
+        Summary dict with one entry per grid cell (mean entropy / JS and the
+        Spearman correlation of its curves with the reference cell — the
+        topics.py setting if it is in the grid, else the first cell), the
+        null-test rows and instrumentation (per-step timing, memory and
+        row counts).
+    """
+    cfg = dict(DEFAULT_CONFIG)
+    if config:
+        cfg.update(config)
+
+    def _cb(frac: float, msg: str):
+        if progress_cb:
+            progress_cb(frac, msg)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    models = list(cfg["null_models"] or [])
+    unknown = set(models) - set(NULL_MODELS)
+    if unknown:
+        raise ValueError(f"Unknown null model(s) {sorted(unknown)}; expected any of {NULL_MODELS}.")
+
+    inst = Recorder("robustness")
+
+    # ── 1. Load messages (same selection as topics.py) ───────────────────────
+    inst.step("Load messages")
+    _cb(0.02, "Loading messages…")
+    con = connect(db_path)
+    null_codes = None
+    if models:
+        has_clusters = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'node_to_fine_cluster'"
+        ).fetchone()
+        if not has_clusters:
+            con.close()
+            raise ValueError(
+                "No cluster assignments found. Run topics.run() before the robustness null tests."
+            )
+        null_codes = _load_null_codes(con, cfg["min_msgs_per_month"])
+    df = pd.read_sql_query(
+        """SELECT node_id, role, year_month, text
+           FROM messages
+           WHERE text IS NOT NULL AND LENGTH(text) > 0""",
+        con,
+    )
+    con.close()
+    inst.rows(len(df))
+
+    if df.empty:
+        raise ValueError("No messages found in database.")
+
+    summary: dict = {"n_messages": len(df)}
+    if cfg["k_values"] and cfg["svd_values"]:
+        summary.update(_run_grid(df, cfg, out_dir, lambda f, m: _cb(0.05 + 0.75 * f, m), inst))
+
+    # ── 6. Null-model permutation tests ──────────────────────────────────────
+    if models:
+        if null_codes is None:
+            null_df = pd.DataFrame()
+            summary["null_tests"] = []
+            summary["null_tests_skipped"] = (
+                f"fewer than 3 months with >= {cfg['min_msgs_per_month']} user messages"
+            )
+        else:
+            inst.step("nulls", rows_in=len(null_codes["month"]))
+            _cb(0.82, f"Running null models ({cfg['n_permutations']} permutations each)…")
+            rng = np.random.default_rng(cfg["random_state"])
+            null_df = _null_tests(null_codes, models, int(cfg["n_permutations"]), rng)
+            summary["null_tests"] = null_df.to_dict("records")
+            inst.rows(len(null_df))
+        null_df.to_csv(out_dir / "robustness_null_tests.csv", index=False)
+
+    _cb(1.0, "Robustness tests complete.")
+    summary["instrumentation"] = inst.finish()
+    return summary
@@ -0,0 +1,690 @@
+"""
+Headless pipeline runner.
+
+Runs every stage for one export without the Streamlit UI:
+
+    precheck → parse → profile → topics → alignment → domains → coupling
+             → dynamics → drift → report
+
+and writes a machine-readable run summary (run_summary.json by default)
+with wall time, CPU time and peak RSS for each stage, plus a Chrome trace
+(trace.json in the work directory) of every stage and of the sub-steps
+each stage records through pipeline.instrument.  Nothing here imports
+Streamlit.
+
+Stages are ordered by the DEPENDS_ON each stage module declares and run
+through pipeline.scheduler: with n_workers > 1, independent stages
+(profile ∥ topics, alignment ∥ domains, coupling ∥ dynamics ∥ drift) run
+at the same time in separate processes.  A failed stage skips only the stages
+downstream of it.
+
+With a cache directory (the CLI's default; see pipeline.cache), a stage
+whose export content, effective config, code and upstream stages are all
+unchanged restores its tables, CSVs and result from the cache instead of
+recomputing; the record then has cached = true.
+
+Usage:
+    dol-analyser-run conversations.json --out work/
+    dol-analyser-run conversations.json --out work/ --config run.toml --workers 1
+    dol-analyser-run conversations.json --out work/ --no-cache
+    dol-analyser-run conversations.json --out work/ --trace-malloc
+    dol-analyser-run conversations.json --out work/ --profile sample
+    python -m pipeline.runner conversations.json --out work/ --stages profile,topics
+
+Config file (JSON or TOML) — one table per stage:
+
+    [profile]    overrides for profile.DEFAULT_CONFIG     (→ config=)
+    [topics]     overrides for topics.DEFAULT_CONFIG      (→ config=)
+    [alignment]  overrides for alignment.DEFAULT_CONFIG   (→ config=)
+    [dynamics]   overrides for dynamics.DEFAULT_CONFIG    (→ config=)
+    [domains]    keyword arguments: n_macro, n_bootstrap
+    [coupling]   keyword arguments: n_permutations, n_workers, early_stop, max_lags
+    [precheck]   allow_not_ready = true  — continue when minimums are not met
+    [parse]      fmt = "chatgpt" | "claude"  — only needed without precheck
+    [report]     out_path, session_name
+
+Resource figures (measured in the process that ran the stage):
+    wall_s         time.perf_counter delta
+    cpu_s          user + system CPU of that process and of its finished child
+                   processes (process pools), from getrusage
+    peak_rss_mb    high-water RSS of that process during the stage.  On Linux
+                   the mark is reset before each stage (/proc/self/clear_refs),
+                   so rss_scope is "stage"; elsewhere it is the process-wide
+                   peak so far and rss_scope is "process".
+    peak_rss_children_mb  largest RSS of any finished child process so far
+
+Per-step figures are in each stage's result["instrumentation"] (see
+pipeline.instrument); Python allocation peaks there are only measured with
+--trace-malloc, which slows the allocation-heavy stages several-fold.
+
+--profile [cprofile|sample] turns on pipeline.profiling for every stage
+(also in worker processes) and writes <stage>.prof / .collapsed / .txt
+to OUT/profiles (or --profile-dir); the summary's "profiling" names them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import datetime as _dt
+import importlib
+import inspect
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+
+from pipeline import cache, instrument, profiling, scheduler
+
+try:
+    import resource
+except ImportError:           # Windows
+    resource = None
+
+STAGES = (
+    "precheck", "parse", "profile", "topics", "alignment",
+    "domains", "coupling", "dynamics", "drift", "report",
+)
+
+# Module declaring each stage's DEPENDS_ON
+STAGE_MODULES = {
+    "precheck":  "pipeline.precheck",
+    "parse":     "pipeline.parse",
+    "profile":   "pipeline.profile",
+    "topics":    "pipeline.topics",
+    "alignment": "pipeline.alignment",
+    "domains":   "pipeline.domains",
+    "coupling":  "pipeline.coupling",
+    "dynamics":  "pipeline.dynamics",
+    "drift":     "pipeline.drift",
+    "report":    "reports.html_export",
+}
+
+# The DAG is at most three stages wide (profile ∥ alignment ∥ domains)
+DEFAULT_WORKERS = min(3, os.cpu_count() or 1)
+
+# Never taken from the stage cache: cheap, and its output path is per run
+_UNCACHED = ("report",)
+
+SUMMARY_VERSION = 5
+
+TRACE_FILE = "trace.json"
+
+
+@dataclass
+class StageRecord:
+    """Outcome and resource use of one stage."""
+
+    stage: str
+    status: str = "skipped"              # "ok" | "failed" | "skipped"
+    wall_s: Optional[float] = None
+    cpu_s: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    peak_rss_children_mb: Optional[float] = None
+    rss_scope: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False                 # outputs restored from the stage cache
+    cache_key: Optional[str] = None
+    started: Optional[float] = None      # epoch seconds
+    pid: Optional[int] = None
+    result: dict = field(default_factory=dict)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Resource measurement
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _measure(record: StageRecord, fn: Callable[[], Any]) -> Any:
+    """Run *fn*, filling wall / CPU / RSS fields of *record* (also on failure)."""
+    span = instrument.Span()
+    record.started, record.pid = span.start, os.getpid()
+    try:
+        return fn()
+    finally:
+        figures = span.close()
+        record.wall_s, record.cpu_s = figures["wall_s"], figures["cpu_s"]
+        record.peak_rss_mb = figures["peak_rss_mb"]
+        kids = instrument.maxrss_mb(resource.RUSAGE_CHILDREN) if resource is not None else None
+        record.peak_rss_children_mb = round(kids, 1) if kids is not None else None
+        record.rss_scope = "stage" if span.scoped else "process"
+
+
+def _trace_records(records: Sequence[StageRecord], results: dict) -> list[dict]:
+    """instrument.chrome_trace() input: each stage as measured here, plus its steps."""
+    out = []
+    for rec in records:
+        if rec.started is None:
+            continue
+        inst = _instrumentation(results.get(rec.stage))
+        out.append({
+            "stage":       rec.stage,
+            "pid":         rec.pid,
+            "start":       rec.started,
+            "wall_s":      rec.wall_s,
+            "cpu_s":       rec.cpu_s,
+            "peak_rss_mb": rec.peak_rss_mb,
+            "cached":      rec.cached,
+            "steps":       [] if rec.cached else inst.get("steps", []),
+        })
+    return out
+
+
+def _instrumentation(result: Any) -> dict:
+    if isinstance(result, dict):
+        return result.get("instrumentation") or {}
+    return getattr(result, "instrumentation", None) or {}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Config + JSON helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_config(path: str | Path) -> dict:
+    """Read a runner config from a .json or .toml file."""
+    path = Path(path)
+    if path.suffix.lower() == ".toml":
+        try:
+            import tomllib
+        except ImportError:      # Python 3.10
+            try:
+                import tomli as tomllib
+            except ImportError as exc:
+                raise RuntimeError(
+                    "TOML configs need Python 3.11+ or the 'tomli' package; "
+                    "use a JSON config instead."
+                ) from exc
+        with path.open("rb") as fh:
+            cfg = tomllib.load(fh)
+    else:
+        cfg = json.loads(path.read_text(encoding="utf-8"))
+
+    if not isinstance(cfg, dict):
+        raise ValueError(f"{path}: config must be a table/object of stage sections.")
+    unknown = set(cfg) - set(STAGES)
+    if unknown:
+        raise ValueError(f"{path}: unknown stage section(s) {sorted(unknown)}; expected {STAGES}.")
+    return cfg
+
+
+def _jsonable(obj: Any) -> Any:
+    """Stage results → JSON-safe values (DataFrames are summarised, not dumped)."""
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [_jsonable(v) for v in obj]
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return _jsonable(dataclasses.asdict(obj))
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float):
+        return obj if np.isfinite(obj) else None
+    if obj is None or isinstance(obj, (str, int, bool)):
+        return obj
+    if isinstance(obj, (_dt.datetime, _dt.date)):
+        return obj.isoformat()
+    if isinstance(obj, Path):
+        return str(obj)
+    if hasattr(obj, "shape"):
+        return f"<{type(obj).__name__} shape={tuple(obj.shape)}>"
+    return str(obj)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Stages
+# ─────────────────────────────────────────────────────────────────────────────
+# Each stage takes the shared context dict and its own config section and
+# returns the stage's summary.  Imports are local so that a subset run
+# only pays for the modules it uses.
+
+def _stage_precheck(ctx: dict, cfg: dict) -> Any:
+    from pipeline import precheck
+
+    result = precheck.run(ctx["export_path"], progress_cb=ctx["progress"])
+    if not result.ready and not cfg.get("allow_not_ready", False):
+        raise RuntimeError(
+            "Export does not meet the minimum requirements: "
+            + ("; ".join(result.warnings) or f"format {result.format!r}")
+            + " (set precheck.allow_not_ready = true to continue anyway)"
+        )
+    return result
+
+
+def _stage_parse(ctx: dict, cfg: dict) -> dict:
+    from pipeline import parse
+
+    pre = ctx["results"].get("precheck")
+    fmt = cfg.get("fmt") or (pre.format if pre is not None else None)
+    if not fmt or fmt == "unknown":
+        raise RuntimeError("Export format unknown — run precheck or set parse.fmt.")
+    return parse.run(ctx["export_path"], ctx["db_path"], fmt=fmt, progress_cb=ctx["progress"])
+
+
+def _stage_profile(ctx: dict, cfg: dict) -> dict:
+    from pipeline import profile
+
+    return profile.run(ctx["db_path"], ctx["out_dir"] / "profile",
+                       config=cfg, progress_cb=ctx["progress"])
+
+
+def _stage_topics(ctx: dict, cfg: dict) -> dict:
+    from pipeline import topics
+
+    return topics.run(ctx["db_path"], ctx["out_dir"], config=cfg, progress_cb=ctx["progress"])
+
+
+def _stage_alignment(ctx: dict, cfg: dict) -> dict:
+    from pipeline import alignment
+
+    return alignment.run(ctx["db_path"], ctx["out_dir"], config=cfg, progress_cb=ctx["progress"])
+
+
+def _stage_domains(ctx: dict, cfg: dict) -> dict:
+    from pipeline import domains
+
+    return domains.run(ctx["db_path"], ctx["out_dir"], progress_cb=ctx["progress"], **cfg)
+
+
+def _stage_coupling(ctx: dict, cfg: dict) -> dict:
+    from pipeline import coupling
+
+    frames = (ctx["results"].get("domains") or {}).get("frames")
+    return coupling.run(ctx["out_dir"], frames=frames, progress_cb=ctx["progress"], **cfg)
+
+
+def _stage_dynamics(ctx: dict, cfg: dict) -> dict:
+    from pipeline import dynamics
+
+    return dynamics.run(ctx["db_path"], ctx["out_dir"], config=cfg, progress_cb=ctx["progress"])
+
+
+def _stage_drift(ctx: dict, cfg: dict) -> dict:
+    from pipeline import drift
+
+    return drift.run(ctx["db_path"], ctx["out_dir"], progress_cb=ctx["progress"])
+
+
+def _stage_report(ctx: dict, cfg: dict) -> dict:
+    from reports import html_export
+
+    pre = ctx["results"].get("precheck")
+    parsed = ctx["results"].get("parse") or {}
+    prof = ctx["results"].get("profile") or {}
+    out_dir = ctx["out_dir"]
+    name = cfg.get("session_name", out_dir.resolve().name)
+
+    meta = {
+        "format":        pre.format if pre is not None else cfg.get("format", "—"),
+        "user_messages": parsed.get("user_messages", 0),
+        "threads":       parsed.get("threads", 0),
+        "date_range":    (
+            f"{pre.earliest_date:%b %Y} – {pre.latest_date:%b %Y}"
+            if pre is not None and pre.earliest_date and pre.latest_date else "—"
+        ),
+        "months_scored": prof.get("months_scored", "—"),
+        "session_name":  name,
+    }
+    out_path = Path(cfg.get("out_path", out_dir / f"report_{name}.html"))
+    written = html_export.build(work_dir=out_dir, meta=meta, out_path=out_path)
+    return {"report_path": str(written)}
+
+
+_STAGE_FUNCS: dict[str, Callable[[dict, dict], Any]] = {
+    "precheck":  _stage_precheck,
+    "parse":     _stage_parse,
+    "profile":   _stage_profile,
+    "topics":    _stage_topics,
+    "alignment": _stage_alignment,
+    "domains":   _stage_domains,
+    "coupling":  _stage_coupling,
+    "dynamics":  _stage_dynamics,
+    "drift":     _stage_drift,
+    "report":    _stage_report,
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cache keys
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _effective_config(stage: str, section: dict) -> dict:
+    """The settings a stage actually runs with: run() defaults / DEFAULT_CONFIG + *section*."""
+    module = importlib.import_module(STAGE_MODULES[stage])
+    params = inspect.signature(module.run).parameters
+    cfg = {
+        name: p.default for name, p in params.items()
+        if p.default is not inspect.Parameter.empty
+        and name not in ("config", "progress_cb", "frames")
+    }
+    if "config" in params:
+        cfg.update(getattr(module, "DEFAULT_CONFIG", {}))
+    cfg.update(section)
+
+    if stage == "profile":
+        # Where compiled lexicons are cached does not change the scores
+        cfg.pop("lexicon_cache_dir", None)
+        if cfg.get("lexicon_packs"):
+            # Key on the packs' content, not their paths
+            from pipeline.lexicon import load_packs
+            cfg["lexicon_packs"] = load_packs(cfg["lexicon_packs"], reserved=module.MARKERS)
+    return cfg
+
+
+def _cache_keys(export_path: Path, config: dict, wanted: Sequence[str]) -> dict[str, str]:
+    """
+    Keys for the stages that can use the cache in this run: every stage
+    except _UNCACHED whose ancestors all run too (outputs left in out_dir
+    by an earlier run are not content-addressed).
+    """
+    full = scheduler.load_graph(STAGE_MODULES)
+    digest = cache.file_digest(export_path)
+    keys: dict[str, str] = {}
+    for stage in scheduler.topological_order(full):
+        if stage in _UNCACHED:
+            continue
+        keys[stage] = cache.stage_key(
+            stage, STAGE_MODULES[stage],
+            _effective_config(stage, dict(config.get(stage, {}))),
+            upstream=[keys[d] for d in full[stage]],
+            input_digest=digest,
+        )
+    return {s: k for s, k in keys.items() if s in wanted and scheduler.ancestors(full, s) <= set(wanted)}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _execute_stage(
+    stage: str,
+    inputs: dict,
+    export_path: Path,
+    out_dir: Path,
+    config: dict,
+    progress_cb: Optional[Callable[[str, float, str], None]] = None,
+    progress_queue: Any = None,
+    cache_keys: Optional[dict] = None,
+    cache_dir: Optional[Path] = None,
+    cache_max_bytes: int = cache.DEFAULT_MAX_BYTES,
+) -> tuple[StageRecord, Any]:
+    """
+    Scheduler task: run one stage and measure it in the current process.
+
+    *inputs* maps each finished upstream stage to its (StageRecord, result).
+    A stage with a key in *cache_keys* is restored from *cache_dir* when
+    the entry exists, and stored there after computing otherwise.
+    Returns (StageRecord, raw result); on failure raises StageError whose
+    payload is (StageRecord, None).
+    """
+    if progress_queue is not None:
+        progress = lambda f, m: progress_queue.put((stage, f, m))
+    elif progress_cb is not None:
+        progress = lambda f, m: progress_cb(stage, f, m)
+    else:
+        progress = None
+    ctx = {
+        "export_path": export_path,
+        "out_dir":     out_dir,
+        "db_path":     out_dir / "conversations.db",
+        "results":     {name: value[1] for name, value in inputs.items()},
+        "progress":    progress,
+    }
+
+    key = (cache_keys or {}).get(stage) if cache_dir is not None else None
+    rec = StageRecord(stage=stage, cache_key=key)
+
+    entry = cache.lookup(cache_dir, key) if key else None
+    if entry is not None:
+        try:
+            result = _measure(rec, lambda: cache.restore(entry, ctx["db_path"], out_dir))
+            rec.cached = True
+            # The stored instrumentation describes the run that filled the entry
+            inst = _instrumentation(result)
+            if inst:
+                inst["cached"] = True
+        except Exception:
+            pass          # unreadable entry: recompute (and overwrite below)
+
+    if not rec.cached:
+        since = time.time() - 1.0     # allow for coarse file-system mtimes
+        try:
+            result = _measure(rec, lambda: _STAGE_FUNCS[stage](ctx, dict(config.get(stage, {}))))
+        except Exception as exc:
+            rec.status = "failed"
+            rec.error = f"{type(exc).__name__}: {exc}"
+            rec.result = {"traceback": traceback.format_exc()}
+            raise scheduler.StageError(rec.error, (rec, None)) from None
+        if key:
+            module = importlib.import_module(STAGE_MODULES[stage])
+            cache.store(
+                cache_dir, key, stage, ctx["db_path"], out_dir, result,
+                tables=getattr(module, "OUTPUT_TABLES", ()),
+                files=getattr(module, "OUTPUT_FILES", ()),
+                since=since, max_bytes=cache_max_bytes,
+            )
+    rec.status = "ok"
+    summary = dataclasses.asdict(result) if dataclasses.is_dataclass(result) else dict(result or {})
+    summary.pop("frames", None)
+    rec.result = _jsonable(summary)
+    return rec, result
+
+
+def execute(
+    export_path: str | Path,
+    out_dir: str | Path,
+    config: Optional[dict] = None,
+    stages: Optional[Sequence[str]] = None,
+    n_workers: int = DEFAULT_WORKERS,
+    progress_cb: Optional[Callable[[str, float, str], None]] = None,
+    cache_dir: Optional[str | Path] = None,
+    cache_max_bytes: int = cache.DEFAULT_MAX_BYTES,
+) -> tuple[dict, dict]:
+    """
+    Run the pipeline and return (summary, results).
+
+    Same arguments as run(); *results* maps every successful stage to the
+    object its run() returned (PrecheckResult, summary dicts incl. the
+    in-memory frames of domains), for callers such as the app that display
+    them.
+    """
+    config = config or {}
+    wanted = list(STAGES) if stages is None else list(stages)
+    unknown = set(wanted) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {sorted(unknown)}; expected {STAGES}.")
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    graph = scheduler.load_graph(STAGE_MODULES, wanted)
+
+    started = _dt.datetime.now(_dt.timezone.utc)
+    cpu0, wall0 = instrument.cpu_seconds(), time.perf_counter()
+
+    keys = {}
+    if cache_dir is not None and Path(export_path).is_file():
+        cache_dir = Path(cache_dir)
+        keys = _cache_keys(Path(export_path), config, wanted)
+    task = partial(
+        _execute_stage, export_path=Path(export_path), out_dir=out_dir, config=config,
+        cache_keys=keys, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes,
+    )
+
+    if n_workers > 1 and progress_cb is not None:
+        # Workers report progress through a managed queue drained here
+        with multiprocessing.Manager() as manager:
+            queue = manager.Queue()
+
+            def _drain():
+                while not queue.empty():
+                    progress_cb(*queue.get())
+
+            outcomes = scheduler.run(graph, partial(task, progress_queue=queue),
+                                     n_workers=n_workers, poll=_drain)
+    else:
+        outcomes = scheduler.run(graph, partial(task, progress_cb=progress_cb), n_workers=n_workers)
+
+    records, results = [], {}
+    for stage in STAGES:
+        if stage not in outcomes:
+            continue
+        out = outcomes[stage]
+        if out.value is not None:
+            rec, result = out.value
+        else:   # skipped, or the worker died before reporting back
+            rec, result = StageRecord(stage=stage, status=out.status, error=out.error), None
+        records.append(rec)
+        if out.status == "ok":
+            results[stage] = result
+
+    summary = {
+        "version":      SUMMARY_VERSION,
+        "export":       str(Path(export_path).resolve()),
+        "out_dir":      str(out_dir.resolve()),
+        "started":      started.isoformat(timespec="seconds"),
+        "ok":           all(o.status == "ok" for o in outcomes.values()),
+        "n_workers":    n_workers,
+        "total_wall_s": round(time.perf_counter() - wall0, 4),
+        "total_cpu_s":  round(instrument.cpu_seconds() - cpu0, 4),
+        "platform":     {
+            "python":  platform.python_version(),
+            "system":  platform.system(),
+            "machine": platform.machine(),
+            "cpus":    os.cpu_count(),
+        },
+        "dependencies": {stage: list(deps) for stage, deps in graph.items()},
+        "cache":        {
+            "dir":  str(cache_dir) if cache_dir is not None else None,
+            "hits": sum(r.cached for r in records),
+        },
+        "profiling":    {
+            "mode": profiling.mode(),
+            "dir":  os.environ.get(profiling.PROFILE_DIR_ENV),
+        } if profiling.mode() else None,
+        "trace":        str(instrument.write_chrome_trace(
+                            _trace_records(records, results), out_dir / TRACE_FILE)),
+        "stages":       [dataclasses.asdict(r) for r in records],
+    }
+    return summary, results
+
+
+def run(
+    export_path: str | Path,
+    out_dir: str | Path,
+    config: Optional[dict] = None,
+    stages: Optional[Sequence[str]] = None,
+    n_workers: int = DEFAULT_WORKERS,
+    progress_cb: Optional[Callable[[str, float, str], None]] = None,
+    cache_dir: Optional[str | Path] = None,
+    cache_max_bytes: int = cache.DEFAULT_MAX_BYTES,
+) -> dict:
+    """
+    Run the pipeline headlessly and return the run summary.
+
+    Args:
+        export_path: conversations.json to analyse
+        out_dir:     Work directory (conversations.db + all CSVs land here)
+        config:      {stage: section} — see the module docstring
+        stages:      Subset of STAGES to run (default all).  Stages left out
+                     are expected to have written their outputs to out_dir
+                     already.
+        n_workers:   Stages run concurrently, each in its own process;
+                     1 = one after another in this process
+        progress_cb: Optional callable(stage, fraction 0–1, status_string)
+        cache_dir:   Stage cache directory (None = no cache)
+        cache_max_bytes: LRU bound on the cache's total size
+
+    Returns:
+        Summary dict: version, export, out_dir, started, ok, n_workers,
+        total_wall_s, total_cpu_s, platform, dependencies, cache (dir,
+        hits), profiling (mode and dump directory, or None), trace (path
+        of the Chrome trace written to out_dir), stages
+        (one StageRecord dict each, in pipeline order).  A failing stage is
+        recorded with its error; the stages downstream of it are skipped.
+    """
+    return execute(export_path, out_dir, config=config, stages=stages,
+                   n_workers=n_workers, progress_cb=progress_cb,
+                   cache_dir=cache_dir, cache_max_bytes=cache_max_bytes)[0]
+
+
+def _format_row(rec: dict) -> str:
+    def _num(v, fmt):
+        return format(v, fmt) if v is not None else "—"
+    return (
+        f"{rec['stage']:<10} {rec['status']:<7} "
+        f"wall {_num(rec['wall_s'], '8.2f')} s  cpu {_num(rec['cpu_s'], '8.2f')} s  "
+        f"peak {_num(rec['peak_rss_mb'], '7.1f')} MB"
+        + ("  (cached)" if rec.get("cached") else "")
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """CLI entry point: the ``dol-analyser-run`` command."""
+    parser = argparse.ArgumentParser(
+        prog="dol-analyser-run",
+        description="Run the DOL analysis pipeline headlessly for one export.",
+    )
+    parser.add_argument("export", help="conversations.json to analyse")
+    parser.add_argument("--out", required=True, help="work directory for the database and outputs")
+    parser.add_argument("--config", help="JSON or TOML file with one section per stage")
+    parser.add_argument("--stages", help=f"comma-separated subset of: {','.join(STAGES)}")
+    parser.add_argument("--summary", help="where to write the run summary JSON "
+                                          "(default OUT/run_summary.json; '-' = stdout)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"stages run concurrently (default {DEFAULT_WORKERS}; 1 = sequential)")
+    parser.add_argument("--cache-dir", default=None,
+                        help=f"stage cache directory (default {cache.default_cache_dir()})")
+    parser.add_argument("--cache-max-mb", type=int, default=cache.DEFAULT_MAX_BYTES // 2 ** 20,
+                        help="evict least recently used cache entries beyond this size")
+    parser.add_argument("--no-cache", action="store_true", help="always recompute every stage")
+    parser.add_argument("--trace-malloc", action="store_true",
+                        help="also record peak Python allocation per step (tracemalloc; slow)")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=profiling.MODES,
+                        help="profile every stage (default cprofile) and write per-stage "
+                             "dumps and collapsed stacks")
+    parser.add_argument("--profile-dir", help="where --profile writes (default OUT/profiles)")
+    parser.add_argument("--quiet", action="store_true", help="no per-stage lines on stderr")
+    args = parser.parse_args(argv)
+
+    if args.trace_malloc:
+        os.environ[instrument.TRACEMALLOC_ENV] = "1"    # inherited by worker processes
+    if args.profile:
+        os.environ[profiling.PROFILE_ENV] = args.profile
+        os.environ[profiling.PROFILE_DIR_ENV] = str(
+            Path(args.profile_dir or Path(args.out) / "profiles").resolve())
+
+    config = load_config(args.config) if args.config else {}
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()] if args.stages else None
+
+    def _progress(stage: str, frac: float, msg: str) -> None:
+        print(f"  [{stage}] {frac:5.0%} {msg}", file=sys.stderr)
+
+    cache_dir = None if args.no_cache else (args.cache_dir or cache.default_cache_dir())
+    summary = run(args.export, args.out, config=config, stages=stages, n_workers=args.workers,
+                  progress_cb=None if args.quiet else _progress,
+                  cache_dir=cache_dir, cache_max_bytes=args.cache_max_mb * 2 ** 20)
+
+    text = json.dumps(summary, indent=2)
+    if args.summary == "-":
+        print(text)
+    else:
+        dest = Path(args.summary) if args.summary else Path(args.out) / "run_summary.json"
+        dest.write_text(text, encoding="utf-8")
+
+    if not args.quiet:
+        for rec in summary["stages"]:
+            print(_format_row(rec), file=sys.stderr)
+            if rec["error"]:
+                print(f"           {rec['error']}", file=sys.stderr)
+    return 0 if summary["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
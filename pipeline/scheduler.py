@@ -0,0 +1,227 @@
+"""
+Dependency-aware stage scheduler.
+
+Each stage module declares the stages whose outputs it reads:
+
+    DEPENDS_ON = ("topics",)
+
+which gives the DAG
+
+    precheck → parse ─┬→ profile ──────────────────────────┐
+                      └→ topics ─┬→ alignment ─────────────┤
+                                 └→ domains ─┬→ coupling ──┼→ report
+                                             ├→ dynamics ──┘
+                                             └→ drift
+
+run() starts every stage as soon as all of its dependencies have finished,
+each in its own worker process, so independent branches overlap
+(profile ∥ topics, alignment ∥ domains, coupling ∥ dynamics ∥ drift).
+A failed stage skips only the stages downstream of it; independent
+branches still run to completion.
+
+Stages share conversations.db.  Every stage opens it through
+pipeline.db.connect() (WAL + busy timeout), and the DAG guarantees that
+at most one stage writes a given table while the others only read.
+
+Used by the headless runner (pipeline/runner.py) and the app's "Run all".
+"""
+
+from __future__ import annotations
+
+import importlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Optional, Sequence
+
+
+class StageError(Exception):
+    """Raised by a task to fail its stage while still handing back *payload*."""
+
+    def __init__(self, message: str, payload: Any = None):
+        super().__init__(message, payload)
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return str(self.args[0])
+
+
+@dataclass
+class Outcome:
+    """Result of one scheduled stage."""
+
+    stage: str
+    status: str = "pending"   # "ok" | "failed" | "skipped" once run() returns
+    value: Any = None         # task return value (or StageError payload)
+    error: Optional[str] = None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Graph
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_graph(
+    modules: Mapping[str, str],
+    stages: Optional[Sequence[str]] = None,
+) -> dict[str, tuple[str, ...]]:
+    """
+    Build {stage: dependencies} from each module's DEPENDS_ON.
+
+    Args:
+        modules: {stage: importable module name}
+        stages:  Subset to schedule (default all).  Dependencies on stages
+                 outside the subset are bridged to their nearest scheduled
+                 ancestors, so ordering is kept (e.g. topics + dynamics
+                 without domains still runs topics first).
+    """
+    declared = {
+        name: tuple(getattr(importlib.import_module(mod), "DEPENDS_ON", ()))
+        for name, mod in modules.items()
+    }
+    for name, deps in declared.items():
+        unknown = set(deps) - set(declared)
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on unknown stage(s) {sorted(unknown)}.")
+
+    selected = set(declared if stages is None else stages)
+
+    def _nearest(stage: str, seen: set) -> list[str]:
+        out = []
+        for dep in declared[stage]:
+            if dep in seen:
+                continue
+            seen.add(dep)
+            out.extend([dep] if dep in selected else _nearest(dep, seen))
+        return out
+
+    graph = {s: tuple(dict.fromkeys(_nearest(s, set()))) for s in declared if s in selected}
+    topological_order(graph)
+    return graph
+
+
+def topological_order(graph: Mapping[str, Sequence[str]]) -> list[str]:
+    """Stages in an order that respects *graph* (ties keep insertion order)."""
+    order: list[str] = []
+    done: set[str] = set()
+    remaining = list(graph)
+    while remaining:
+        ready = [s for s in remaining if set(graph[s]) <= done]
+        if not ready:
+            raise ValueError(f"Dependency cycle among stages {remaining}.")
+        order.extend(ready)
+        done.update(ready)
+        remaining = [s for s in remaining if s not in done]
+    return order
+
+
+def ancestors(graph: Mapping[str, Sequence[str]], stage: str) -> set[str]:
+    """Every stage *stage* depends on, directly or transitively."""
+    out: set[str] = set()
+    stack = list(graph[stage])
+    while stack:
+        dep = stack.pop()
+        if dep not in out:
+            out.add(dep)
+            stack.extend(graph[dep])
+    return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Execution
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _error_text(exc: BaseException) -> str:
+    return str(exc) if isinstance(exc, StageError) else f"{type(exc).__name__}: {exc}"
+
+
+def run(
+    graph: Mapping[str, Sequence[str]],
+    task: Callable[[str, dict], Any],
+    n_workers: int = 1,
+    on_event: Optional[Callable[[str, str], None]] = None,
+    poll: Optional[Callable[[], None]] = None,
+    poll_interval: float = 0.2,
+) -> dict[str, Outcome]:
+    """
+    Run every stage of *graph* once its dependencies have succeeded.
+
+    Args:
+        graph:         {stage: dependencies}, e.g. from load_graph()
+        task:          callable(stage, inputs) → value, where inputs maps every
+                       successful ancestor to its value.  Must be picklable
+                       (module-level function or functools.partial of one)
+                       when n_workers > 1.  Raising fails the stage; raise
+                       StageError(message, payload) to keep a payload.
+        n_workers:     Stages run at the same time, each in its own process;
+                       ≤ 1 runs them one after another in this process
+        on_event:      Optional callable(stage, "started" | "ok" | "failed" |
+                       "skipped"), called in this process
+        poll:          Optional callable run every *poll_interval* seconds
+                       while stages are in flight (e.g. to relay progress)
+
+    Returns:
+        {stage: Outcome} in topological order
+    """
+    order = topological_order(graph)
+    outcomes = {s: Outcome(stage=s) for s in order}
+
+    def _emit(stage: str, event: str):
+        if on_event:
+            on_event(stage, event)
+
+    def _inputs(stage: str) -> dict:
+        return {a: outcomes[a].value for a in ancestors(graph, stage) if outcomes[a].status == "ok"}
+
+    def _finish(stage: str, value: Any = None, exc: Optional[BaseException] = None):
+        out = outcomes[stage]
+        if exc is None:
+            out.status, out.value = "ok", value
+        else:
+            out.status, out.error = "failed", _error_text(exc)
+            out.value = exc.payload if isinstance(exc, StageError) else None
+        _emit(stage, out.status)
+
+    def _blocked(stage: str) -> bool:
+        return any(outcomes[d].status in ("failed", "skipped") for d in graph[stage])
+
+    def _skip(stage: str):
+        outcomes[stage].status = "skipped"
+        _emit(stage, "skipped")
+
+    if n_workers <= 1:
+        for stage in order:
+            if _blocked(stage):
+                _skip(stage)
+                continue
+            _emit(stage, "started")
+            try:
+                _finish(stage, task(stage, _inputs(stage)))
+            except Exception as exc:
+                _finish(stage, exc=exc)
+        return outcomes
+
+    waiting = list(order)
+    running: dict[Future, str] = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        while waiting or running:
+            for stage in list(waiting):
+                if _blocked(stage):
+                    waiting.remove(stage)
+                    _skip(stage)
+                elif all(outcomes[d].status == "ok" for d in graph[stage]) and len(running) < n_workers:
+                    waiting.remove(stage)
+                    _emit(stage, "started")
+                    running[pool.submit(task, stage, _inputs(stage))] = stage
+            if not running:
+                continue
+            finished, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            if poll:
+                poll()
+            for fut in finished:
+                stage = running.pop(fut)
+                try:
+                    _finish(stage, fut.result())
+                except Exception as exc:
+                    _finish(stage, exc=exc)
+    if poll:
+        poll()
+    return outcomes
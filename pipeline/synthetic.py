@@ -0,0 +1,455 @@
+"""
+Synthetic conversation exports for benchmarks and tests.
+
+Generates exports in the two formats parse.py reads, at any size:
+
+    chatgpt   conversations with a "mapping" tree — a null client root, a
+              hidden system message, then user / assistant turns.  A share
+              of turns carry abandoned branches off the main path, as
+              ChatGPT writes them for regenerated replies (an assistant
+              sibling) and edited prompts (a user sibling with its own
+              reply).  Branches are never longer than the main path, so
+              parse keeps exactly the generated main-path messages.
+    claude    linear "chat_messages" with sender, text, content blocks and
+              ISO-8601 timestamps (Claude exports have no branches)
+
+Text is drawn from a fixed set of topic vocabularies (TOPICS), mixed
+according to topic_mix, with a conversation occasionally drifting to
+another topic.  User prompts pick up the profile markers (structural
+terms, hedges) at a rate that grows over the months, so every stage has a
+trend to find.  A share of user prompts (duplicate_rate) repeat an earlier
+prompt verbatim, as re-asked and pasted prompts do in real histories.
+
+Messages are spread evenly over *months* calendar months from *start*.
+Everything is drawn from one random.Random(seed): the same config gives
+the same export byte for byte.
+
+Conversations are generated lazily and written one at a time, so a
+1M-message export never sits in memory as a whole.
+
+Usage:
+    python -m pipeline.synthetic conversations.json --messages 100k
+    python -m pipeline.synthetic claude.json --format claude --messages 10k --months 24
+    python -m pipeline.synthetic mix.json --messages 50k --topic-mix code=4,cooking=1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+from pipeline.profile import EPISTEMIC_UNCERTAINTY, STRUCTURAL_THINKING
+
+FORMATS = ("chatgpt", "claude")
+
+TOPICS: dict[str, list[str]] = {
+    "code": [
+        "python", "function", "error", "debug", "variable", "loop", "class",
+        "import", "exception", "list", "dictionary", "test", "refactor", "api",
+    ],
+    "cooking": [
+        "recipe", "oven", "flour", "sugar", "bake", "dinner", "garlic", "onion",
+        "pasta", "sauce", "simmer", "butter", "roast", "spices",
+    ],
+    "travel": [
+        "flight", "hotel", "paris", "itinerary", "museum", "train", "booking",
+        "visa", "passport", "luggage", "airport", "tickets", "beach", "rome",
+    ],
+    "writing": [
+        "poem", "story", "chapter", "character", "novel", "plot", "dialogue",
+        "narrative", "scene", "draft", "editor", "tone", "verse", "metaphor",
+    ],
+    "fitness": [
+        "workout", "running", "muscle", "protein", "diet", "sleep", "cardio",
+        "strength", "yoga", "stretching", "calories", "marathon", "squat", "rest",
+    ],
+    "finance": [
+        "budget", "invest", "stock", "savings", "tax", "mortgage", "loan",
+        "interest", "retirement", "pension", "inflation", "portfolio", "bond", "rent",
+    ],
+    "music": [
+        "guitar", "chord", "song", "melody", "piano", "rhythm", "album", "band",
+        "lyrics", "tempo", "scale", "harmony", "drums", "concert",
+    ],
+    "physics": [
+        "quantum", "energy", "particle", "relativity", "gravity", "wave",
+        "electron", "photon", "entropy", "momentum", "field", "spin", "mass", "orbit",
+    ],
+    "garden": [
+        "plants", "soil", "tomato", "seeds", "water", "compost", "flowers",
+        "pruning", "sunlight", "roses", "weeds", "mulch", "harvest", "pots",
+    ],
+    "research": [
+        "paper", "study", "hypothesis", "data", "sample", "analysis", "survey",
+        "citation", "journal", "method", "results", "review", "evidence", "thesis",
+    ],
+}
+
+FILLER = ["the", "a", "and", "to", "of", "in", "for", "with", "how", "can", "i", "my", "is", "on"]
+
+DEFAULT_CONFIG = {
+    "n_messages":     10_000,    # user + assistant messages on the main paths
+    "months":         12,        # calendar months the messages are spread over
+    "start":          "2023-01", # first month (YYYY-MM, UTC)
+    "topic_mix":      None,      # {topic: weight} or weights in TOPICS order; None = uniform
+    "topic_switch":   0.1,       # chance per turn that the conversation drifts to another topic
+    "duplicate_rate": 0.02,      # share of user prompts repeating an earlier prompt verbatim
+    "branch_rate":    0.1,       # share of ChatGPT turns with an abandoned branch
+    "pairs":          (2, 16),   # user / assistant pairs per conversation (inclusive)
+    "user_words":     (4, 40),
+    "asst_words":     (20, 120),
+    "marker_rate":    (0.15, 0.45),  # share of prompts with a profile marker, first → last month
+    "seed":           0,
+}
+
+# Earlier prompts kept as candidates for verbatim repeats
+_PROMPT_POOL = 2_000
+
+
+def parse_count(text: str | int) -> int:
+    """'10k' → 10_000, '1M' → 1_000_000; plain integers pass through."""
+    if isinstance(text, int):
+        return text
+    s = str(text).strip().lower().replace("_", "").replace(",", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(s[-1:], 1)
+    if scale > 1:
+        s = s[:-1]
+    value = float(s) * scale
+    if value < 0 or value != int(value):
+        raise ValueError(f"Not a message count: {text!r}")
+    return int(value)
+
+
+def _mixture(topic_mix) -> list[float]:
+    """Weights in TOPICS order from a {topic: weight} dict or a sequence."""
+    if topic_mix is None:
+        return [1.0] * len(TOPICS)
+    if isinstance(topic_mix, dict):
+        unknown = set(topic_mix) - set(TOPICS)
+        if unknown:
+            raise ValueError(f"Unknown topic(s) {sorted(unknown)}; expected some of {list(TOPICS)}.")
+        weights = [float(topic_mix.get(name, 0.0)) for name in TOPICS]
+    else:
+        weights = [float(w) for w in topic_mix]
+        if len(weights) != len(TOPICS):
+            raise ValueError(f"topic_mix needs {len(TOPICS)} weights, got {len(weights)}.")
+    if min(weights) < 0 or sum(weights) <= 0:
+        raise ValueError("topic_mix weights must be non-negative and not all zero.")
+    return weights
+
+
+def _month_start(start: str, offset: int) -> float:
+    year, month = (int(p) for p in start.split("-")[:2])
+    year, month = year + (month - 1 + offset) // 12, (month - 1 + offset) % 12 + 1
+    return datetime(year, month, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec="microseconds") \
+        .replace("+00:00", "Z")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Text
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Writer:
+    """Draws topics and message texts from one random stream."""
+
+    def __init__(self, rng: random.Random, cfg: dict):
+        self.rng = rng
+        self.cfg = cfg
+        self.names = list(TOPICS)
+        self.weights = _mixture(cfg["topic_mix"])
+        self.prompts: list[str] = []
+        self.duplicates = 0
+
+    def topic(self) -> str:
+        return self.rng.choices(self.names, self.weights)[0]
+
+    def _words(self, topic: str, bounds: tuple[int, int]) -> list[str]:
+        rng = self.rng
+        n = rng.randint(*bounds)
+        vocab = TOPICS[topic]
+        return [rng.choice(vocab) if rng.random() < 0.7 else rng.choice(FILLER) for _ in range(n)]
+
+    def user(self, topic: str, progress: float) -> str:
+        rng = self.rng
+        if self.prompts and rng.random() < self.cfg["duplicate_rate"]:
+            self.duplicates += 1
+            return rng.choice(self.prompts)
+        words = self._words(topic, self.cfg["user_words"])
+        lo, hi = self.cfg["marker_rate"]
+        rate = lo + (hi - lo) * progress
+        if rng.random() < rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(STRUCTURAL_THINKING))
+        if rng.random() < rate:
+            words.insert(0, rng.choice(EPISTEMIC_UNCERTAINTY))
+        text = " ".join(words).capitalize() + "?"
+        if len(self.prompts) < _PROMPT_POOL:
+            self.prompts.append(text)
+        else:
+            self.prompts[rng.randrange(_PROMPT_POOL)] = text
+        return text
+
+    def edit(self, prompt: str) -> str:
+        """An earlier wording of *prompt*: same words, one dropped, reordered."""
+        words = prompt.rstrip("?").lower().split()
+        if len(words) > 2:
+            words.pop(self.rng.randrange(len(words)))
+        self.rng.shuffle(words)
+        return " ".join(words).capitalize() + "?"
+
+    def assistant(self, topic: str) -> str:
+        words = self._words(topic, self.cfg["asst_words"])
+        # A few sentences rather than one run-on line
+        for i in range(len(words) - 1, 0, -1):
+            if self.rng.random() < 0.08:
+                words[i - 1] += "."
+        return " ".join(words).capitalize() + "."
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Conversations
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _turns(writer: _Writer, n_pairs: int, n_left: int, progress: float, t0: float):
+    """(role, text, timestamp) for one conversation, at most *n_left* messages."""
+    rng = writer.rng
+    topic = writer.topic()
+    t = t0
+    out = []
+    for _ in range(n_pairs):
+        if len(out) >= n_left:
+            break
+        if rng.random() < writer.cfg["topic_switch"]:
+            topic = writer.topic()
+        out.append(("user", writer.user(topic, progress), t))
+        t += rng.uniform(5, 40)
+        if len(out) >= n_left:
+            break
+        out.append(("assistant", writer.assistant(topic), t))
+        t += rng.uniform(30, 600)
+    return out
+
+
+def _chatgpt_message(node_id: str, role: str, text: str, ts: Optional[float]) -> dict:
+    return {
+        "id": node_id,
+        "author": {"role": role, "name": None, "metadata": {}},
+        "create_time": ts,
+        "update_time": None,
+        "content": {"content_type": "text", "parts": [text]},
+        "status": "finished_successfully",
+        "end_turn": True if role == "assistant" else None,
+        "weight": 1.0,
+        "metadata": {"is_visually_hidden_from_conversation": True} if role == "system" else {},
+        "recipient": "all",
+    }
+
+
+def _chatgpt_conversation(writer: _Writer, conv_id: str, title: str, turns: list) -> tuple[dict, int]:
+    """A mapping tree for *turns*; returns (conversation, branch nodes added)."""
+    rng = writer.rng
+    mapping: dict[str, dict] = {}
+
+    def _add(role: Optional[str], text: str, ts: Optional[float], parent: Optional[str]) -> str:
+        node_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        mapping[node_id] = {
+            "id": node_id,
+            "message": _chatgpt_message(node_id, role, text, ts) if role else None,
+            "parent": parent,
+            "children": [],
+        }
+        if parent is not None:
+            mapping[parent]["children"].append(node_id)
+        return node_id
+
+    root = _add(None, "", None, None)
+    prev = _add("system", "", None, root)
+    branches = 0
+    for k, (role, text, ts) in enumerate(turns):
+        # Branches hang off a node whose main continuation is longer than
+        # the branch, so the main path stays the deepest one
+        remaining = len(turns) - k
+        if rng.random() < writer.cfg["branch_rate"]:
+            if role == "assistant" and remaining >= 2:
+                # Regenerated reply: the earlier attempt is a dead end
+                _add("assistant", writer.assistant(writer.topic()), ts - 1, prev)
+                branches += 1
+            elif role == "user" and remaining >= 3:
+                # Edited prompt: the original and its reply form a side branch
+                old = _add("user", writer.edit(text), ts - 2, prev)
+                _add("assistant", writer.assistant(writer.topic()), ts - 1, old)
+                branches += 2
+        prev = _add(role, text, ts, prev)
+
+    created = turns[0][2] if turns else None
+    updated = turns[-1][2] if turns else None
+    return {
+        "title": title,
+        "create_time": created,
+        "update_time": updated,
+        "mapping": mapping,
+        "current_node": prev,
+        "conversation_id": conv_id,
+        "id": conv_id,
+    }, branches
+
+
+def _claude_conversation(writer: _Writer, conv_id: str, title: str, turns: list) -> dict:
+    rng = writer.rng
+    messages = []
+    for role, text, ts in turns:
+        stamp = _iso(ts)
+        messages.append({
+            "uuid": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "text": text,
+            "content": [{"type": "text", "text": text}],
+            "sender": "human" if role == "user" else "assistant",
+            "created_at": stamp,
+            "updated_at": stamp,
+            "attachments": [],
+            "files": [],
+        })
+    created = _iso(turns[0][2]) if turns else None
+    return {
+        "uuid": conv_id,
+        "name": title,
+        "summary": "",
+        "created_at": created,
+        "updated_at": _iso(turns[-1][2]) if turns else created,
+        "account": {"uuid": "00000000-0000-4000-8000-000000000000"},
+        "chat_messages": messages,
+    }
+
+
+def conversations(
+    fmt: str = "chatgpt",
+    config: Optional[dict] = None,
+    stats: Optional[dict] = None,
+) -> Iterator[dict]:
+    """
+    Yield the conversations of one synthetic export.
+
+    Args:
+        fmt:    'chatgpt' or 'claude'
+        config: Optional overrides for DEFAULT_CONFIG
+        stats:  Optional dict filled in as generation proceeds with
+                conversations, messages, branch_nodes and duplicates
+
+    Yields:
+        One conversation dict per thread, month by month.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}.")
+    cfg = dict(DEFAULT_CONFIG)
+    if config:
+        cfg.update(config)
+    n_total = parse_count(cfg["n_messages"])
+    months = int(cfg["months"])
+    if months < 1:
+        raise ValueError("months must be at least 1.")
+
+    rng = random.Random(cfg["seed"])
+    writer = _Writer(rng, cfg)
+    stats = stats if stats is not None else {}
+    stats.update(conversations=0, messages=0, branch_nodes=0, duplicates=0)
+
+    done = 0
+    while done < n_total:
+        month = min(months - 1, done * months // n_total)
+        span = _month_start(cfg["start"], month + 1) - _month_start(cfg["start"], month)
+        # Leave a day at the end of the month for the conversation to run on
+        t0 = _month_start(cfg["start"], month) + rng.uniform(0, span - 86_400)
+        progress = month / max(months - 1, 1)
+        turns = _turns(writer, rng.randint(*cfg["pairs"]), n_total - done, progress, t0)
+
+        index = stats["conversations"]
+        conv_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        title = " ".join(turns[0][1].rstrip("?").split()[:5]).title() or f"Conversation {index + 1}"
+        if fmt == "chatgpt":
+            conv, branches = _chatgpt_conversation(writer, conv_id, title, turns)
+            stats["branch_nodes"] += branches
+        else:
+            conv = _claude_conversation(writer, conv_id, title, turns)
+
+        done += len(turns)
+        stats["conversations"] += 1
+        stats["messages"] = done
+        stats["duplicates"] = writer.duplicates
+        yield conv
+
+
+def write_export(
+    path: str | Path,
+    fmt: str = "chatgpt",
+    config: Optional[dict] = None,
+) -> dict:
+    """
+    Write a synthetic conversations.json to *path*, one conversation at a time.
+
+    Returns:
+        Stats dict: path, format, conversations, messages, branch_nodes,
+        duplicates, bytes
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stats: dict = {}
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("[")
+        for i, conv in enumerate(conversations(fmt, config, stats)):
+            if i:
+                fh.write(",\n")
+            json.dump(conv, fh, ensure_ascii=False)
+        fh.write("]\n")
+    return {"path": str(path), "format": fmt, **stats, "bytes": path.stat().st_size}
+
+
+def _parse_mix(text: str) -> dict[str, float] | list[float]:
+    """'code=4,cooking=1' → {topic: weight}; '4,1,1,…' → weights in TOPICS order."""
+    parts = [p.strip() for p in text.split(",") if p.strip()]
+    if all("=" in p for p in parts):
+        return {name.strip(): float(w) for name, w in (p.split("=", 1) for p in parts)}
+    return [float(p) for p in parts]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """CLI entry point: write one synthetic export."""
+    parser = argparse.ArgumentParser(
+        prog="python -m pipeline.synthetic",
+        description="Write a synthetic ChatGPT or Claude conversations.json.",
+    )
+    parser.add_argument("out", help="destination .json file")
+    parser.add_argument("--format", choices=FORMATS, default="chatgpt")
+    parser.add_argument("--messages", default="10k", help="message count, e.g. 5000, 100k, 1M")
+    parser.add_argument("--months", type=int, default=DEFAULT_CONFIG["months"])
+    parser.add_argument("--start", default=DEFAULT_CONFIG["start"], help="first month, YYYY-MM")
+    parser.add_argument("--topic-mix", help=f"weights, e.g. code=4,cooking=1 (topics: {','.join(TOPICS)})")
+    parser.add_argument("--duplicate-rate", type=float, default=DEFAULT_CONFIG["duplicate_rate"])
+    parser.add_argument("--branch-rate", type=float, default=DEFAULT_CONFIG["branch_rate"])
+    parser.add_argument("--seed", type=int, default=DEFAULT_CONFIG["seed"])
+    args = parser.parse_args(argv)
+
+    config = {
+        "n_messages":     parse_count(args.messages),
+        "months":         args.months,
+        "start":          args.start,
+        "topic_mix":      _parse_mix(args.topic_mix) if args.topic_mix else None,
+        "duplicate_rate": args.duplicate_rate,
+        "branch_rate":    args.branch_rate,
+        "seed":           args.seed,
+    }
+    stats = write_export(args.out, args.format, config)
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
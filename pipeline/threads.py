@@ -0,0 +1,299 @@
+"""
+Step 8.7 — Per-thread feature table.
+
+Materialises one row per thread in the ``thread_features`` table, so that
+dynamics, the reports and later analyses read thread-level facts instead of
+re-deriving them from the full message table:
+
+thread_features table
+    thread_id        TEXT  PRIMARY KEY
+    n_messages       INT   (user + assistant)
+    user_msgs        INT
+    asst_msgs        INT
+    user_turn_share  REAL  user_msgs / n_messages
+    user_chars       INT
+    asst_chars       INT
+    first_ts         REAL  (Unix seconds)
+    last_ts          REAL
+    duration_s       REAL
+    n_mapped         INT   messages with a macro-domain
+    n_domains        INT   distinct macro-domains touched
+    first_domain     INT
+    dominant_domain  INT   most frequent (ties → lowest id)
+    n_shifts         INT   macro-domain changes between consecutive mapped messages
+    user_shifts      INT   … of which the changed-to message is the user's
+    signature        TEXT  message count : last timestamp : total chars
+
+Features are computed with one ordered query and a vectorised groupby
+(bincount over run-length thread codes), never a per-thread loop.
+
+Refresh is incremental: the per-thread signature is recomputed with one
+GROUP BY over messages, and only threads whose signature changed (or that
+are new) are recomputed; threads that disappeared are deleted.  A change
+of domain mapping invalidates every row, so domains.run() asks for a full
+rebuild.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline.db import connect
+
+TABLE = "thread_features"
+
+COLUMNS = [
+    "thread_id", "n_messages", "user_msgs", "asst_msgs", "user_turn_share",
+    "user_chars", "asst_chars", "first_ts", "last_ts", "duration_s",
+    "n_mapped", "n_domains", "first_domain", "dominant_domain",
+    "n_shifts", "user_shifts", "signature",
+]
+
+_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        thread_id        TEXT PRIMARY KEY,
+        n_messages       INTEGER,
+        user_msgs        INTEGER,
+        asst_msgs        INTEGER,
+        user_turn_share  REAL,
+        user_chars       INTEGER,
+        asst_chars       INTEGER,
+        first_ts         REAL,
+        last_ts          REAL,
+        duration_s       REAL,
+        n_mapped         INTEGER,
+        n_domains        INTEGER,
+        first_domain     INTEGER,
+        dominant_domain  INTEGER,
+        n_shifts         INTEGER,
+        user_shifts      INTEGER,
+        signature        TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_thread_features_len ON {TABLE}(n_mapped);
+"""
+
+_SIGNATURE_SQL = """
+    SELECT thread_id,
+           COUNT(*) || ':' || IFNULL(MAX(timestamp), '') || ':' || IFNULL(SUM(char_count), 0)
+               AS signature
+    FROM messages
+    WHERE role IN ('user', 'assistant') AND thread_id IS NOT NULL
+    GROUP BY thread_id
+"""
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Feature computation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _table_exists(con: sqlite3.Connection, name: str) -> bool:
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _load_messages(con: sqlite3.Connection, restrict: bool) -> pd.DataFrame:
+    """Messages of every thread (or of the threads in temp._stale_threads), thread/time ordered."""
+    has_domains = _table_exists(con, "node_to_macro_domain")
+    domain_col = "n.macro_domain" if has_domains else "NULL AS macro_domain"
+    join = "LEFT JOIN node_to_macro_domain n ON m.node_id = n.node_id" if has_domains else ""
+    where = "AND m.thread_id IN (SELECT thread_id FROM temp._stale_threads)" if restrict else ""
+    return pd.read_sql_query(
+        f"""SELECT m.thread_id, m.role, m.timestamp, m.char_count, {domain_col}
+            FROM messages m
+            {join}
+            WHERE m.role IN ('user', 'assistant') AND m.thread_id IS NOT NULL {where}
+            ORDER BY m.thread_id, m.timestamp ASC""",
+        con,
+    )
+
+
+def compute_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One feature row per thread of *df* (ordered by thread_id, timestamp).
+
+    Shifts follow dynamics: consecutive messages of a thread that both have
+    a macro-domain and differ in it; messages without a domain are skipped.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS[:-1])
+
+    tid = df["thread_id"].to_numpy(dtype=object)
+    new_thread = np.ones(len(tid), dtype=bool)
+    new_thread[1:] = tid[1:] != tid[:-1]
+    code = np.cumsum(new_thread) - 1
+    n_threads = int(code[-1]) + 1
+    first_row = np.flatnonzero(new_thread)
+
+    is_user = (df["role"] == "user").to_numpy()
+    chars = df["char_count"].fillna(0).to_numpy(dtype=np.int64)
+    ts = df["timestamp"].to_numpy(dtype=float)
+
+    def _count(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(code[mask], minlength=n_threads)
+
+    n_msgs = np.bincount(code, minlength=n_threads)
+    user_msgs = _count(is_user)
+    first_ts = pd.Series(ts).groupby(code).min().reindex(range(n_threads)).to_numpy()
+    last_ts = pd.Series(ts).groupby(code).max().reindex(range(n_threads)).to_numpy()
+
+    # Domain features over the mapped messages only
+    dom_all = pd.to_numeric(df["macro_domain"], errors="coerce").to_numpy(dtype=float)
+    mapped = np.isfinite(dom_all)
+    m_code, m_dom, m_user = code[mapped], dom_all[mapped].astype(np.int64), is_user[mapped]
+
+    n_mapped = np.bincount(m_code, minlength=n_threads)
+    same = m_code[1:] == m_code[:-1]
+    shift = np.zeros(len(m_code), dtype=bool)
+    shift[1:] = same & (m_dom[1:] != m_dom[:-1])
+    n_shifts = np.bincount(m_code[shift], minlength=n_threads)
+    user_shifts = np.bincount(m_code[shift & m_user], minlength=n_threads)
+
+    first_domain = np.full(n_threads, np.nan)
+    dominant = np.full(n_threads, np.nan)
+    n_domains = np.zeros(n_threads, dtype=np.int64)
+    if len(m_code):
+        m_first = np.ones(len(m_code), dtype=bool)
+        m_first[1:] = ~same
+        first_domain[m_code[m_first]] = m_dom[m_first]
+
+        pairs, pair_counts = np.unique(np.stack([m_code, m_dom], axis=1), axis=0, return_counts=True)
+        n_domains = np.bincount(pairs[:, 0], minlength=n_threads)
+        # Highest count first within each thread, lowest domain id on ties
+        order = np.lexsort((pairs[:, 1], -pair_counts, pairs[:, 0]))
+        top = order[np.r_[True, pairs[order[1:], 0] != pairs[order[:-1], 0]]]
+        dominant[pairs[top, 0]] = pairs[top, 1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = user_msgs / n_msgs
+
+    return pd.DataFrame({
+        "thread_id":       tid[first_row],
+        "n_messages":      n_msgs,
+        "user_msgs":       user_msgs,
+        "asst_msgs":       n_msgs - user_msgs,
+        "user_turn_share": np.round(share, 6),
+        "user_chars":      np.bincount(code, weights=np.where(is_user, chars, 0), minlength=n_threads).astype(np.int64),
+        "asst_chars":      np.bincount(code, weights=np.where(is_user, 0, chars), minlength=n_threads).astype(np.int64),
+        "first_ts":        first_ts,
+        "last_ts":         last_ts,
+        "duration_s":      last_ts - first_ts,
+        "n_mapped":        n_mapped,
+        "n_domains":       n_domains,
+        "first_domain":    pd.array(first_domain, dtype="Int64"),
+        "dominant_domain": pd.array(dominant, dtype="Int64"),
+        "n_shifts":        n_shifts,
+        "user_shifts":     user_shifts,
+    })
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Public API
+# ─────────────────────────────────────────────────────────────────────────────
+
+def refresh(
+    db_path: str | Path,
+    thread_ids: Optional[Iterable[str]] = None,
+    full: bool = False,
+    create: bool = True,
+    progress_cb: Optional[Callable[[float, str], None]] = None,
+) -> dict:
+    """
+    Bring the thread_features table up to date.
+
+    Args:
+        db_path:     SQLite database (messages table, optionally node_to_macro_domain)
+        thread_ids:  Threads known to be touched; recomputed on top of any
+                     whose signature changed
+        full:        Drop and rebuild every row (after a new domain mapping)
+        create:      False = leave a database without the table untouched
+                     (used by parse.run(), before any domain mapping exists)
+        progress_cb: Optional callable(fraction 0–1, status_string)
+
+    Returns:
+        Summary dict: threads (rows in the table), refreshed, deleted, full
+        (empty if create=False and there was no table)
+    """
+    def _cb(frac: float, msg: str):
+        if progress_cb:
+            progress_cb(frac, msg)
+
+    con = connect(db_path)
+    try:
+        if not create and not _table_exists(con, TABLE):
+            return {}
+        if full:
+            con.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        con.executescript(_SCHEMA)
+
+        _cb(0.1, "Checking thread signatures…")
+        sigs = pd.read_sql_query(_SIGNATURE_SQL, con)
+        stored = pd.read_sql_query(f"SELECT thread_id, signature FROM {TABLE}", con)
+        merged = sigs.merge(stored, on="thread_id", how="left", suffixes=("", "_stored"))
+        stale = set(merged.loc[merged["signature"] != merged["signature_stored"], "thread_id"])
+        if thread_ids is not None:
+            stale |= set(thread_ids) & set(sigs["thread_id"])
+        gone = sorted(set(stored["thread_id"]) - set(sigs["thread_id"]))
+
+        con.execute("DROP TABLE IF EXISTS temp._stale_threads")
+        con.execute("CREATE TEMP TABLE _stale_threads (thread_id TEXT PRIMARY KEY)")
+        con.executemany("INSERT INTO temp._stale_threads VALUES (?)", [(t,) for t in stale])
+
+        _cb(0.4, f"Computing features for {len(stale):,} threads…")
+        features = compute_features(_load_messages(con, restrict=not full))
+        features = features.merge(sigs, on="thread_id", how="left")
+
+        _cb(0.8, "Writing thread features…")
+        con.executemany(f"DELETE FROM {TABLE} WHERE thread_id = ?", [(t,) for t in gone])
+        placeholders = ", ".join("?" * len(COLUMNS))
+        rows = features[COLUMNS].astype(object).where(features[COLUMNS].notna(), None)
+        con.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+            rows.itertuples(index=False, name=None),
+        )
+        con.execute("DROP TABLE temp._stale_threads")
+        con.commit()
+        n_rows = con.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+    finally:
+        con.close()
+
+    _cb(1.0, "Thread features up to date.")
+    return {
+        "threads":   int(n_rows),
+        "refreshed": len(features),
+        "deleted":   len(gone),
+        "full":      full,
+    }
+
+
+def load(
+    db_path: str | Path,
+    where: str = "",
+    params: tuple = (),
+) -> pd.DataFrame:
+    """
+    Read thread_features (refreshing it first if it does not exist yet).
+
+    *where* is an optional SQL condition, e.g. ``"n_mapped >= ?"``.
+    """
+    con = connect(db_path)
+    try:
+        exists = _table_exists(con, TABLE)
+    finally:
+        con.close()
+    if not exists:
+        refresh(db_path)
+
+    con = connect(db_path)
+    try:
+        clause = f"WHERE {where}" if where else ""
+        return pd.read_sql_query(
+            f"SELECT * FROM {TABLE} {clause} ORDER BY thread_id", con, params=params,
+        )
+    finally:
+        con.close()
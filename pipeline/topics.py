@@ -23,7 +23,6 @@ Writes to out_dir:
 
 from __future__ import annotations
 
-import sqlite3
 from pathlib import Path
 from typing import Callable, Optional
 
@@ -35,6 +34,14 @@ from sklearn.decomposition import TruncatedSVD
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import normalize
 
+from pipeline.db import connect
+from pipeline.instrument import Recorder
+from pipeline.profiling import profiled
+
+DEPENDS_ON = ("parse",)   # messages table
+OUTPUT_TABLES = ("node_to_fine_cluster", "cluster_summary")
+OUTPUT_FILES = ("cluster_summary_tfidf.csv", "monthly_topic_entropy_tfidf.csv")
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Defaults
 # ─────────────────────────────────────────────────────────────────────────────
@@ -73,7 +80,7 @@ def _write_cluster_tables(
     labels: np.ndarray,
     cluster_summary: pd.DataFrame,
 ) -> None:
-    con = sqlite3.connect(db_path)
+    con = connect(db_path)
     cur = con.cursor()
 
     cur.executescript("""
@@ -115,6 +122,7 @@ def _write_cluster_tables(
 # Public API
 # ─────────────────────────────────────────────────────────────────────────────
 
+@profiled("topics")
 def run(
     db_path: str | Path,
     out_dir: str | Path,
@@ -131,7 +139,8 @@ def run(
         progress_cb: Optional callable(fraction 0–1, status_string)
 
     Returns:
-        Summary dict: n_messages, n_clusters, vocab_size, entropy stats
+        Summary dict: n_messages, n_clusters, vocab_size, entropy stats,
+        instrumentation (per-step timing, memory and row counts)
     """
     cfg = _merge_config(config)
     out_dir = Path(out_dir)
@@ -142,9 +151,12 @@ def run(
         if progress_cb:
             progress_cb(frac, msg)
 
+    inst = Recorder("topics")
+
     # ── 1. Load all messages ──────────────────────────────────────────────────
+    inst.step("Load messages")
     _cb(0.02, "Loading messages…")
-    con = sqlite3.connect(db_path)
+    con = connect(db_path)
     df = pd.read_sql_query(
         """SELECT node_id, role, year_month, text
            FROM messages
@@ -157,6 +169,7 @@ def run(
         raise ValueError("No messages found in database.")
 
     n_msgs = len(df)
+    inst.rows(n_msgs)
 
     # Clamp K so we never have fewer than 5 messages per cluster on average
     k = min(cfg["n_clusters"], max(2, n_msgs // 5))
@@ -166,6 +179,7 @@ def run(
     node_ids = df["node_id"].tolist()
 
     # ── 2. TF-IDF ─────────────────────────────────────────────────────────────
+    inst.step("TF-IDF", rows_in=n_msgs)
     _cb(0.08, f"Vectorising {n_msgs:,} messages (TF-IDF)…")
     vec = TfidfVectorizer(
         max_features=cfg["max_features"],
@@ -176,15 +190,19 @@ def run(
     )
     X = vec.fit_transform(texts)
     terms = np.array(vec.get_feature_names_out())
+    inst.rows(X.shape[0])
 
     # ── 3. SVD ────────────────────────────────────────────────────────────────
+    inst.step("SVD", rows_in=X.shape[0])
     n_components = min(cfg["svd_components"], X.shape[1] - 1)
     _cb(0.25, f"Reducing dimensions (SVD → {n_components})…")
     svd = TruncatedSVD(n_components=n_components, random_state=cfg["random_state"])
     X_red = svd.fit_transform(X)
     X_red = normalize(X_red)
+    inst.rows(X_red.shape[0])
 
     # ── 4. KMeans ─────────────────────────────────────────────────────────────
+    inst.step("KMeans", rows_in=X_red.shape[0])
     _cb(0.45, f"Clustering into {cfg['n_clusters']} topics (KMeans)…")
     km = KMeans(
         n_clusters=cfg["n_clusters"],
@@ -193,8 +211,10 @@ def run(
     )
     labels = km.fit_predict(X_red)
     df["cluster_id"] = labels
+    inst.rows(len(labels))
 
     # ── 5. Cluster labels ─────────────────────────────────────────────────────
+    inst.step("Cluster labels", rows_in=cfg["n_clusters"])
     _cb(0.70, "Extracting cluster labels…")
     top_n = cfg["top_terms"]
     summary_rows = []
@@ -215,14 +235,19 @@ def run(
     cluster_summary = pd.DataFrame(summary_rows).sort_values(
         "size", ascending=False
     )
+    inst.rows(len(cluster_summary))
 
     # ── 6. Write SQLite tables ────────────────────────────────────────────────
+    inst.step("Write SQLite", rows_in=n_msgs + len(cluster_summary))
     _cb(0.78, "Writing cluster assignments to database…")
     _write_cluster_tables(db_path, node_ids, labels, cluster_summary)
+    inst.rows(n_msgs + len(cluster_summary))
 
     # ── 7. Monthly entropy (user messages only) ───────────────────────────────
+    inst.step("Monthly entropy")
     _cb(0.85, "Computing monthly topic entropy…")
     user_df = df[df["role"] == "user"].copy()
+    inst.rows(rows_in=len(user_df))
 
     entropy_rows = []
     for month, grp in user_df.groupby("year_month"):
@@ -237,10 +262,13 @@ def run(
     entropy_df = pd.DataFrame(entropy_rows).sort_values("year_month")
     entropy_path = out_dir / "monthly_topic_entropy_tfidf.csv"
     entropy_df.to_csv(entropy_path, index=False)
+    inst.rows(len(entropy_df))
 
     # ── 8. Cluster summary CSV ────────────────────────────────────────────────
+    inst.step("Write CSV", rows_in=len(cluster_summary))
     _cb(0.93, "Writing cluster summary…")
     cluster_summary.to_csv(out_dir / "cluster_summary_tfidf.csv", index=False)
+    inst.rows(len(cluster_summary))
 
     _cb(1.0, "Topic modelling complete.")
 
@@ -251,4 +279,5 @@ def run(
         "months_with_data": len(entropy_df),
         "entropy_min":      round(float(entropy_df["topic_entropy_nats"].min()), 3),
         "entropy_max":      round(float(entropy_df["topic_entropy_nats"].max()), 3),
+        "instrumentation":  inst.finish(),
     }
@@ -84,6 +84,7 @@ def cognitive_style_timeline(traj_df: pd.DataFrame) -> go.Figure:
     Dual-line monthly rates (per 1,000 user messages):
       • Structural thinking   — solid blue
       • Epistemic uncertainty — dashed orange
+      • Any lexicon-pack markers — thin lines, toggled from the legend
     """
     df = traj_df.copy().sort_values("year_month")
     fig = go.Figure()
@@ -110,6 +111,20 @@ def cognitive_style_timeline(traj_df: pd.DataFrame) -> go.Figure:
             hovertemplate="%{y:.1f} /1k<extra>Epistemic uncertainty</extra>",
         ))
 
+    # Markers from lexicon packs: thin lines, hidden until toggled in the legend
+    builtin = {"structural_thinking_per1k", "epistemic_uncertainty_per1k"}
+    for col in [c for c in df.columns if c.endswith("_per1k") and c not in builtin]:
+        label = col[: -len("_per1k")].replace("_", " ").capitalize()
+        fig.add_trace(go.Scatter(
+            x=df["year_month"],
+            y=df[col],
+            name=label,
+            mode="lines",
+            line=dict(width=1.5),
+            visible="legendonly",
+            hovertemplate=f"%{{y:.1f}} /1k<extra>{label}</extra>",
+        ))
+
     _base(
         fig, "Cognitive Style Over Time",
         yaxis=dict(title="Rate per 1,000 messages", showgrid=True, gridcolor=C_GRID),
@@ -187,11 +202,25 @@ def topic_entropy_timeline(
 def dyadic_alignment_timeline(align_df: pd.DataFrame) -> go.Figure:
     """
     Monthly Jensen-Shannon divergence between user and assistant topic
-    distributions.  Lower = more in sync.
+    distributions.  Lower = more in sync.  Shades the bootstrap interval
+    when the CSV carries js_ci_lower / js_ci_upper.
     """
     df = align_df.copy().sort_values("year_month").dropna(subset=["js_divergence"])
 
     fig = go.Figure()
+
+    # Bootstrap interval band
+    if {"js_ci_lower", "js_ci_upper"}.issubset(df.columns):
+        fig.add_trace(go.Scatter(
+            x=list(df["year_month"]) + list(df["year_month"])[::-1],
+            y=list(df["js_ci_upper"]) + list(df["js_ci_lower"])[::-1],
+            name="95% bootstrap interval",
+            fill="toself",
+            fillcolor="rgba(76,120,168,0.16)",
+            line=dict(width=0),
+            hoverinfo="skip",
+        ))
+
     fig.add_trace(go.Scatter(
         x=df["year_month"],
         y=df["js_divergence"],
@@ -481,7 +510,7 @@ def coupling_bar(
 def shift_initiation_donut(summary_df: pd.DataFrame) -> go.Figure:
     """
     Donut chart: % of domain shifts initiated by user vs assistant,
-    annotated with total count and permutation p-value.
+    annotated with total count and p-value vs 50/50.
     """
     fig = go.Figure()
 
@@ -497,7 +526,8 @@ def shift_initiation_donut(summary_df: pd.DataFrame) -> go.Figure:
     u_pct = float(row["user_initiated_prop"])
     a_pct = float(row["asst_initiated_prop"])
     total = int(row["total_shifts"])
-    p_val = float(row["perm_p_vs_random"])
+    p_val = float(row["p_vs_random"] if "p_vs_random" in row else row["perm_p_vs_random"])
+    test  = "Binomial" if "p_vs_random" in row else "Permutation"
 
     fig.add_trace(go.Pie(
         labels=["You initiated", "AI initiated"],
@@ -523,7 +553,7 @@ def shift_initiation_donut(summary_df: pd.DataFrame) -> go.Figure:
     # p-value below chart
     sig = "✱ significant" if p_val < 0.05 else "not significant"
     fig.add_annotation(
-        text=f"Permutation p = {p_val:.3f}  ({sig} vs 50/50)",
+        text=f"{test} p = {p_val:.3f}  ({sig} vs 50/50)",
         x=0.5, y=-0.10,
         xref="paper", yref="paper",
         showarrow=False,
@@ -539,3 +569,40 @@ def shift_initiation_donut(summary_df: pd.DataFrame) -> go.Figure:
         showlegend=False,
     )
     return fig
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 9 — Topic drift heatmap
+# ─────────────────────────────────────────────────────────────────────────────
+
+def topic_drift_heatmap(
+    drift_df: pd.DataFrame,
+    title: str = "Topic Drift Between Months",
+) -> go.Figure:
+    """
+    Month × month heatmap of Jensen-Shannon distance between monthly topic
+    distributions (one of the topic_drift_{level}_{role}.csv matrices).
+    Darker = the two months' topic mixes are further apart.
+    """
+    df = drift_df.copy()
+    if "year_month" in df.columns:
+        df = df.set_index("year_month")
+    months = [str(m) for m in df.index]
+
+    fig = go.Figure(go.Heatmap(
+        z=df.to_numpy(dtype=float),
+        x=months,
+        y=months,
+        colorscale="Blues",
+        zmin=0,
+        colorbar=dict(title="JS distance"),
+        hovertemplate="%{y} → %{x}<br>JS distance %{z:.3f}<extra></extra>",
+    ))
+
+    _base(
+        fig, title,
+        hovermode="closest",
+        xaxis=dict(showgrid=False, zeroline=False, type="category"),
+        yaxis=dict(showgrid=False, zeroline=False, type="category", autorange="reversed"),
+    )
+    return fig
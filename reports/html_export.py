@@ -18,8 +18,12 @@ from typing import Optional
 import pandas as pd
 import plotly.graph_objects as go
 
+from pipeline.profiling import profiled
 from reports import charts
 
+# Stages whose CSVs the report renders (precheck / parse / profile give the meta)
+DEPENDS_ON = ("profile", "alignment", "coupling", "dynamics")
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Narrative templates
@@ -214,7 +218,7 @@ def _narrative_coupling(coup_df: pd.DataFrame, summary_path: Optional[Path] = No
     )
 
 
-def _narrative_shifts(summary_df: pd.DataFrame) -> str:
+def _narrative_shifts(summary_df: pd.DataFrame, threads_df: Optional[pd.DataFrame] = None) -> str:
     if summary_df.empty:
         return "<p>No shift initiation data available.</p>"
 
@@ -222,7 +226,7 @@ def _narrative_shifts(summary_df: pd.DataFrame) -> str:
     u_pct = float(row["user_initiated_prop"]) * 100
     a_pct = float(row["asst_initiated_prop"]) * 100
     total = int(row["total_shifts"])
-    p     = float(row["perm_p_vs_random"])
+    p     = float(row["p_vs_random"] if "p_vs_random" in row else row["perm_p_vs_random"])
     sig   = "statistically significant" if p < 0.05 else "not statistically significant"
 
     initiator = "You" if u_pct >= 50 else "The AI"
@@ -233,12 +237,29 @@ def _narrative_shifts(summary_df: pd.DataFrame) -> str:
         "whenever the topic changed to a different macro-domain, who made that change — "
         "you or the AI? This reveals whether you are driving the intellectual agenda "
         "within conversations, or following the AI's lead.</p>"
-        "<p>The percentages are tested against a 50/50 random baseline using a "
-        "permutation test (N = 5,000 shuffles).</p>"
+        "<p>The percentages are tested against a 50/50 random baseline using an "
+        "exact binomial test.</p>"
         f"<p><strong>In your data:</strong> Across {total:,} domain shifts, "
         f"<strong>{initiator}</strong> initiated {max(u_pct, a_pct):.1f}% and "
         f"{other} initiated {min(u_pct, a_pct):.1f}%. "
         f"This difference is <em>{sig}</em> (p = {p:.3f}).</p>"
+        + _narrative_threads(threads_df)
+    )
+
+
+def _narrative_threads(threads_df: Optional[pd.DataFrame]) -> str:
+    """One sentence of thread context from thread_features.csv (empty if absent)."""
+    if threads_df is None or threads_df.empty:
+        return ""
+    n_threads   = len(threads_df)
+    with_shift  = int((threads_df["n_shifts"] > 0).sum())
+    median_len  = float(threads_df["n_messages"].median())
+    user_share  = float(threads_df["user_turn_share"].mean()) * 100
+    return (
+        f"<p>{with_shift:,} of your {n_threads:,} threads "
+        f"({with_shift / n_threads * 100:.0f}%) changed domain at least once; "
+        f"the median thread has {median_len:.0f} messages, and on average "
+        f"{user_share:.0f}% of a thread's turns are yours.</p>"
     )
 
 
@@ -356,6 +377,7 @@ def _fig_html(fig: go.Figure) -> str:
 # Public API
 # ─────────────────────────────────────────────────────────────────────────────
 
+@profiled("report")
 def build(
     work_dir: str | Path,
     meta: dict,
@@ -395,6 +417,7 @@ def build(
     states_df  = _csv("monthly_states.csv")
     coup_df    = _csv("coupling_by_domain.csv")
     shift_df   = _csv("shift_initiation_summary.csv")
+    thread_df  = _csv("thread_features.csv")
 
     # ── Build chart HTML ──────────────────────────────────────────────────────
     sections_html = ""
@@ -451,7 +474,7 @@ def build(
     if not shift_df.empty:
         sections_html += _section(
             8, "Domain Shift Initiation",
-            _narrative_shifts(shift_df),
+            _narrative_shifts(shift_df, thread_df),
             _fig_html(charts.shift_initiation_donut(shift_df)),
         )
 
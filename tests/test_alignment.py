@@ -0,0 +1,60 @@
+"""
+Tests for pipeline/alignment.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Monthly CSV        (columns unchanged apart from js_ci_lower /
+                          js_ci_upper, which are absent with n_bootstrap = 0)
+    - Bootstrap interval (same seed → same bounds, finite and ordered)
+    - Minimum messages   (months below min_msgs_per_role are dropped)
+"""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from pipeline import alignment, parse, synthetic, topics
+
+QUICK_TOPICS = {"n_clusters": 20, "n_init": 2, "svd_components": 50}
+BASE_COLUMNS = ["year_month", "user_msgs", "asst_msgs", "js_divergence"]
+
+
+@pytest.fixture(scope="module")
+def clustered(tmp_path_factory):
+    work = tmp_path_factory.mktemp("alignment")
+    synthetic.write_export(work / "c.json", "chatgpt",
+                           {"n_messages": 3_000, "months": 4, "seed": 5})
+    parse.run(work / "c.json", work / "conversations.db", "chatgpt")
+    topics.run(work / "conversations.db", work, config=QUICK_TOPICS)
+    return work
+
+
+def _monthly(work, out, **config) -> pd.DataFrame:
+    alignment.run(work / "conversations.db", out, config={"periods": ["month"], **config})
+    return pd.read_csv(out / "dyadic_alignment_monthly.csv")
+
+
+class TestMonthlyInterval:
+
+    def test_columns(self, clustered, tmp_path):
+        df = _monthly(clustered, tmp_path / "a", n_bootstrap=200)
+        assert list(df.columns) == BASE_COLUMNS + ["js_ci_lower", "js_ci_upper"]
+        assert len(df) == 4
+
+        plain = _monthly(clustered, tmp_path / "b", n_bootstrap=0)
+        assert list(plain.columns) == BASE_COLUMNS
+        pd.testing.assert_frame_equal(plain, df[BASE_COLUMNS])
+
+    def test_seeded(self, clustered, tmp_path):
+        a = _monthly(clustered, tmp_path / "a", n_bootstrap=200, random_seed=3)
+        b = _monthly(clustered, tmp_path / "b", n_bootstrap=200, random_seed=3)
+        pd.testing.assert_frame_equal(a, b)
+        assert a["js_ci_lower"].notna().all()
+        assert (a["js_ci_lower"] <= a["js_ci_upper"]).all()
+
+    def test_min_msgs(self, clustered, tmp_path):
+        df = _monthly(clustered, tmp_path / "a", n_bootstrap=50, min_msgs_per_role=374)
+        assert (df[["user_msgs", "asst_msgs"]].min(axis=1) >= 374).all()
+        assert 0 < len(df) < 4
@@ -0,0 +1,119 @@
+"""
+Tests for pipeline/benchmark.py
+
+Run with:  pytest tests/
+
+Covers:
+    - compare()     (growth beyond threshold and noise floor flagged,
+                     small or relative-only changes ignored, failed stages,
+                     total only for the same stage subset, mismatched
+                     generator settings rejected)
+    - run_suite()   (synthetic export reused, figures per stage from a
+                     child-process run)
+    - main()        (results written, baseline saved, exit 1 on regression)
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+
+import pytest
+
+from pipeline import benchmark
+
+
+def _results(**stages) -> dict:
+    """Results for one 10k size; keyword = stage, value = (wall_s, peak_rss_mb) or status."""
+    figures = {}
+    for stage, value in stages.items():
+        if isinstance(value, str):
+            figures[stage] = {"status": value}
+        else:
+            wall, rss = value
+            figures[stage] = {"status": "ok", "wall_s": wall, "cpu_s": wall, "peak_rss_mb": rss}
+    return {
+        "generator": {"format": "chatgpt", "seed": 0},
+        "n_workers": 1,
+        "stages":    None,
+        "platform":  {"python": "3.11"},
+        "sizes": {"10k": {
+            "messages": 10_000, "conversations": 500, "export_mb": 9.0, "ok": True,
+            "total_wall_s": sum(f.get("wall_s", 0.0) for f in figures.values()),
+            "stages": figures,
+        }},
+    }
+
+
+class TestCompare:
+
+    def test_regression_flagged(self):
+        base = _results(parse=(2.0, 200.0), topics=(10.0, 300.0))
+        cur = _results(parse=(2.1, 200.0), topics=(14.0, 400.0))
+        regs = benchmark.compare(base, cur, threshold=0.25)
+        found = {(r["stage"], r["metric"]) for r in regs}
+        assert found == {("topics", "wall_s"), ("topics", "cpu_s"), ("topics", "peak_rss_mb"),
+                         ("total", "wall_s")}
+        wall = next(r for r in regs if (r["stage"], r["metric"]) == ("topics", "wall_s"))
+        assert (wall["baseline"], wall["current"], wall["change"]) == (10.0, 14.0, 0.4)
+
+    def test_noise_floor(self):
+        # Doubling a 0.1 s stage or adding 10 MB is below MIN_DELTA
+        base = _results(precheck=(0.1, 100.0))
+        cur = _results(precheck=(0.2, 110.0))
+        assert benchmark.compare(base, cur) == []
+
+    def test_improvement_not_flagged(self):
+        assert benchmark.compare(_results(topics=(10.0, 300.0)), _results(topics=(5.0, 150.0))) == []
+
+    def test_failed_stage(self):
+        regs = benchmark.compare(_results(domains=(3.0, 250.0)), _results(domains="failed"))
+        assert regs == [{"size": "10k", "stage": "domains", "metric": "status",
+                         "baseline": "ok", "current": "failed", "change": None}]
+
+    def test_stage_subset(self):
+        base = _results(parse=(2.0, 200.0), topics=(10.0, 300.0))
+        cur = _results(parse=(3.0, 200.0))
+        cur["stages"] = ["parse"]
+        regs = benchmark.compare(base, cur)
+        assert {(r["stage"], r["metric"]) for r in regs} == {("parse", "wall_s"), ("parse", "cpu_s")}
+
+    def test_generator_mismatch(self):
+        base = _results(parse=(2.0, 200.0))
+        cur = copy.deepcopy(base)
+        cur["generator"]["seed"] = 1
+        with pytest.raises(ValueError, match="generator"):
+            benchmark.compare(base, cur)
+
+
+class TestSuite:
+
+    def test_run_suite(self, tmp_path):
+        kwargs = dict(sizes=["1200"], generator_config={"months": 3},
+                      stages=["precheck", "parse"])
+        res = benchmark.run_suite(tmp_path, **kwargs)
+        size = res["sizes"]["1200"]
+        assert size["ok"] and size["messages"] == 1200
+        assert set(size["stages"]) == {"precheck", "parse"}
+        for fig in size["stages"].values():
+            assert fig["status"] == "ok" and fig["wall_s"] >= 0 and "cpu_s" in fig
+        exports = list((tmp_path / "exports").glob("chatgpt-1200-*.json"))
+        assert len(exports) == 2          # export + its stats
+
+        mtime = min(p.stat().st_mtime_ns for p in exports)
+        benchmark.run_suite(tmp_path, **kwargs)
+        assert min(p.stat().st_mtime_ns for p in exports) == mtime
+
+    def test_main_regression_exit(self, tmp_path, monkeypatch):
+        args = ["--out", str(tmp_path), "--sizes", "1200", "--months", "3",
+                "--stages", "precheck,parse"]
+        assert benchmark.main(args + ["--save-baseline", str(tmp_path / "base.json")]) == 0
+        assert json.loads((tmp_path / "benchmark.json").read_text())["sizes"]["1200"]["ok"]
+
+        # A baseline far faster than any real run is a regression at every stage
+        monkeypatch.setitem(benchmark.MIN_DELTA, "wall_s", 0.0)
+        base = json.loads((tmp_path / "base.json").read_text())
+        for fig in base["sizes"]["1200"]["stages"].values():
+            fig["wall_s"] = 1e-6
+        (tmp_path / "fast.json").write_text(json.dumps(base))
+        assert benchmark.main(args + ["--baseline", str(tmp_path / "fast.json")]) == 1
@@ -0,0 +1,144 @@
+"""
+Tests for pipeline/cache.py
+
+Run with:  pytest tests/
+
+Covers:
+    - stage_key     (changes with config, upstream keys, export content, stage)
+    - code_version  (own-package imports found, including relative ones)
+    - store/restore (tables with indexes, files written since the stage
+                     started, result; existing keys not overwritten)
+    - evict         (least recently used entries go first; lookup refreshes)
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+
+import pytest
+
+from pipeline import cache
+
+
+def _make_work(tmp_path, name="work"):
+    work = tmp_path / name
+    (work / "profile").mkdir(parents=True)
+    con = sqlite3.connect(work / "conversations.db")
+    con.executescript("""
+        CREATE TABLE clusters (node_id TEXT PRIMARY KEY, cluster INTEGER);
+        CREATE INDEX idx_clusters ON clusters(cluster);
+        CREATE TABLE other (x INTEGER);
+    """)
+    con.executemany("INSERT INTO clusters VALUES (?, ?)", [(f"n{i}", i % 3) for i in range(50)])
+    con.commit()
+    con.close()
+    return work
+
+
+class TestKeys:
+
+    def test_sensitivity(self):
+        base = dict(stage="topics", module="pipeline.topics", config={"k": 5},
+                    upstream=["abc"], input_digest="d1")
+        key = cache.stage_key(**base)
+        assert key == cache.stage_key(**base)
+        for change in ({"config": {"k": 6}}, {"upstream": ["abd"]},
+                       {"input_digest": "d2"}, {"stage": "alignment"}):
+            assert cache.stage_key(**{**base, **change}) != key, change
+
+    def test_config_order_irrelevant(self):
+        a = cache.stage_key("s", "pipeline.db", {"a": 1, "b": [1, 2]})
+        b = cache.stage_key("s", "pipeline.db", {"b": [1, 2], "a": 1})
+        assert a == b
+
+    def test_own_imports(self):
+        src = (
+            "import numpy as np\n"
+            "from pipeline.db import connect\n"
+            "from pipeline import threads\n"
+            "from .distributions import count_matrix\n"
+            "import reports.charts\n"
+        )
+        found = cache._own_imports(src, "pipeline")
+        assert {"pipeline.db", "pipeline.threads", "pipeline.distributions",
+                "reports.charts"} <= found
+        assert not any(n.startswith("numpy") for n in found)
+
+    def test_code_version_includes_dependencies(self):
+        # dynamics imports threads, which imports db: distinct from db alone
+        assert cache.code_version("pipeline.dynamics") != cache.code_version("pipeline.db")
+        assert len(cache.code_version("pipeline.dynamics")) == 64
+
+
+class TestStoreRestore:
+
+    def test_roundtrip(self, tmp_path):
+        work = _make_work(tmp_path)
+        stale = work / "profile" / "old.csv"
+        stale.write_text("stale")
+        os.utime(stale, (time.time() - 3600, time.time() - 3600))
+        since = time.time() - 1
+        (work / "profile" / "trajectory.csv").write_text("a,b\n1,2\n")
+        (work / "unrelated.csv").write_text("x")
+
+        result = {"months_scored": 3}
+        assert cache.store(tmp_path / "c", "k" * 64, "profile", work / "conversations.db", work,
+                           result, tables=("clusters", "missing"), files=("profile/*.csv",),
+                           since=since)
+        assert not cache.store(tmp_path / "c", "k" * 64, "profile", work / "conversations.db",
+                               work, result)
+
+        fresh = _make_work(tmp_path, "fresh")
+        con = sqlite3.connect(fresh / "conversations.db")
+        con.execute("DELETE FROM clusters")
+        con.commit()
+        con.close()
+
+        entry = cache.lookup(tmp_path / "c", "k" * 64)
+        assert entry is not None
+        assert cache.restore(entry, fresh / "conversations.db", fresh) == result
+
+        assert (fresh / "profile" / "trajectory.csv").read_text() == "a,b\n1,2\n"
+        assert not (fresh / "profile" / "old.csv").exists()
+        assert not (fresh / "unrelated.csv").exists()
+        con = sqlite3.connect(fresh / "conversations.db")
+        assert con.execute("SELECT COUNT(*) FROM clusters").fetchone()[0] == 50
+        assert con.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = 'idx_clusters'"
+        ).fetchone()[0] == 1
+        con.close()
+
+    def test_lookup_miss(self, tmp_path):
+        assert cache.lookup(tmp_path / "c", "0" * 64) is None
+
+
+class TestEvict:
+
+    def _store(self, root, work, key, n_bytes):
+        (work / "blob.bin").write_bytes(os.urandom(n_bytes))
+        assert cache.store(root, key, "s", work / "conversations.db", work, None,
+                           files=("blob.bin",), max_bytes=10 ** 9)
+
+    def test_lru(self, tmp_path):
+        root, work = tmp_path / "c", _make_work(tmp_path)
+        k1, k2, k3 = ("1" * 64, "2" * 64, "3" * 64)
+        self._store(root, work, k1, 100_000)
+        self._store(root, work, k2, 100_000)
+        time.sleep(0.01)
+        assert cache.lookup(root, k1) is not None     # k1 now more recent than k2
+        self._store(root, work, k3, 100_000)
+
+        assert cache.evict(root, max_bytes=250_000) == 1
+        assert cache.lookup(root, k2) is None
+        assert cache.lookup(root, k1) is not None and cache.lookup(root, k3) is not None
+        assert cache.stats(root)["entries"] == 2
+
+    @pytest.mark.parametrize("limit", [0, 1])
+    def test_bound_applies_on_store(self, tmp_path, limit):
+        root, work = tmp_path / "c", _make_work(tmp_path)
+        (work / "blob.bin").write_bytes(b"x" * 1000)
+        cache.store(root, "a" * 64, "s", work / "conversations.db", work, None,
+                    files=("blob.bin",), max_bytes=limit)
+        assert cache.stats(root)["entries"] == 0
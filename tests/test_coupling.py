@@ -0,0 +1,249 @@
+"""
+Tests for pipeline/coupling.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Batched null statistics (identical p-values to the per-permutation loops)
+    - Multi-lag statistics (every lag from one cosine matrix)
+    - Pivot-based share matrices (same U / A as the per-cell loop)
+    - run() on small domain-share CSVs, with and without weekly shares
+    - run(frames=...) on in-memory tables, without the CSVs on disk
+"""
+
+from __future__ import annotations
+
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import coupling
+from pipeline.coupling import (
+    _cosine, _domain_null, _lag_statistics, _pearson, _share_matrices, _system_null,
+)
+from pipeline.permutation import permutation_test
+
+
+def _reference_system_p(dU, dA, observed, n_perms, seed):
+    """The original loop: one Python iteration per permutation and month pair."""
+    rng = np.random.default_rng(seed)
+    T = dU.shape[0] + 1
+    null = []
+    for _ in range(n_perms):
+        dA_p = dA[rng.permutation(dA.shape[0])]
+        mf = np.nanmean([_cosine(dU[t], dA_p[t + 1]) for t in range(T - 2)])
+        mr = np.nanmean([_cosine(dA_p[t], dU[t + 1]) for t in range(T - 2)])
+        null.append((mf, mr, mf - mr))
+    null = np.array(null)
+    return [
+        np.mean(null[:, 0] >= observed[0]),
+        np.mean(null[:, 1] >= observed[1]),
+        np.mean(np.abs(null[:, 2]) >= abs(observed[2])),
+    ]
+
+
+def _reference_domain_p(x_u, y_a, x_a, y_u, n_perms, rng):
+    null_u2a, null_a2u = [], []
+    for _ in range(n_perms):
+        null_u2a.append(_pearson(x_u, y_a[rng.permutation(len(y_a))]))
+        null_a2u.append(_pearson(x_a, y_u[rng.permutation(len(y_u))]))
+    r1, r2 = _pearson(x_u, y_a), _pearson(x_a, y_u)
+    return [np.mean(np.abs(null_u2a) >= abs(r1)), np.mean(np.abs(null_a2u) >= abs(r2))]
+
+
+def _shares(rng, T, M):
+    U = rng.dirichlet(np.ones(M), size=T)
+    A = 0.6 * U + 0.4 * rng.dirichlet(np.ones(M), size=T)
+    return np.diff(U, axis=0), np.diff(A, axis=0)
+
+
+class TestBatchedNulls:
+
+    @pytest.mark.parametrize("seed", [0, 1, 2])
+    def test_system_p_values_match_loop(self, seed):
+        dU, dA = _shares(np.random.default_rng(seed), T=10, M=5)
+        n_pairs = dU.shape[0] - 1
+        fwd = np.nanmean([_cosine(dU[t], dA[t + 1]) for t in range(n_pairs)])
+        rev = np.nanmean([_cosine(dA[t], dU[t + 1]) for t in range(n_pairs)])
+        observed = [fwd, rev, fwd - rev]
+
+        res = permutation_test(
+            partial(_system_null, dU, dA), n=dA.shape[0], observed=observed,
+            n_permutations=400, seed=seed, alternative=["greater", "greater", "two-sided"],
+            rtol=coupling._TIE_RTOL,
+        )
+        np.testing.assert_array_equal(res.p_value, _reference_system_p(dU, dA, observed, 400, seed))
+
+    def test_domain_p_values_match_loop(self):
+        dU, dA = _shares(np.random.default_rng(4), T=12, M=4)
+        Xu, Ya, Xa, Yu = dU[:-1], dA[1:], dA[:-1], dU[1:]
+        rng_ref, rng = np.random.default_rng(9), np.random.default_rng(9)
+
+        for j in range(4):
+            expected = _reference_domain_p(Xu[:, j], Ya[:, j], Xa[:, j], Yu[:, j], 300, rng_ref)
+            res = permutation_test(
+                partial(_domain_null, Xu[:, j], Ya[:, j], Xa[:, j], Yu[:, j]),
+                n=len(Ya), observed=[_pearson(Xu[:, j], Ya[:, j]), _pearson(Xa[:, j], Yu[:, j])],
+                n_permutations=300, rng=rng, alternative="two-sided",
+                draws_per_replicate=2, rtol=coupling._TIE_RTOL,
+            )
+            np.testing.assert_array_equal(res.p_value, expected)
+
+    def test_constant_domain_gives_nan(self):
+        idx = np.array([[[0, 1, 2], [2, 1, 0]]])
+        out = _domain_null(np.ones(3), np.arange(3.0), np.arange(3.0), np.arange(3.0), idx)
+        assert np.isnan(out[0, 0]) and np.isfinite(out[0, 1])
+
+
+class TestMultiLag:
+
+    def test_lag_statistics_match_scalar_loops(self):
+        dU, dA = _shares(np.random.default_rng(3), T=11, M=4)
+        n, M, L = dA.shape[0], 4, 3
+        perms = np.stack([np.arange(n), np.random.default_rng(5).permutation(n)])
+        out = _lag_statistics(dU, dA, L, perms)
+        assert out.shape == (2, 3 * L + 2 * L * M)
+
+        for b, idx in enumerate(perms):
+            dA_p = dA[idx]
+            for lag in range(1, L + 1):
+                fwd = np.mean([_cosine(dU[t], dA_p[t + lag]) for t in range(n - lag)])
+                rev = np.mean([_cosine(dA_p[t], dU[t + lag]) for t in range(n - lag)])
+                np.testing.assert_allclose(out[b, lag - 1], fwd, atol=1e-12)
+                np.testing.assert_allclose(out[b, L + lag - 1], rev, atol=1e-12)
+                for j in range(M):
+                    k = (lag - 1) * M + j
+                    np.testing.assert_allclose(
+                        out[b, 3 * L + k], _pearson(dU[:-lag, j], dA_p[lag:, j]), atol=1e-12)
+                    np.testing.assert_allclose(
+                        out[b, 3 * L + L * M + k], _pearson(dA_p[:-lag, j], dU[lag:, j]), atol=1e-12)
+
+    def test_lag_one_matches_system_null(self):
+        dU, dA = _shares(np.random.default_rng(6), T=9, M=3)
+        idx = np.random.default_rng(0).permuted(np.tile(np.arange(dA.shape[0]), (5, 1)), axis=1)
+        lag = _lag_statistics(dU, dA, 1, idx)
+        np.testing.assert_allclose(lag[:, :3], _system_null(dU, dA, idx), atol=1e-12)
+
+    def test_share_matrices_fill_gaps(self):
+        shares = pd.DataFrame({
+            "week_start": ["w1", "w1", "w2"],
+            "macro_domain": [0, 1, 1],
+            "user_share": [0.4, 0.6, 1.0],
+            "asst_share": [0.5, 0.5, 1.0],
+        })
+        U, A = _share_matrices(shares, "week_start", ["w1", "w2"], [0, 1])
+        np.testing.assert_array_equal(U, [[0.4, 0.6], [0.0, 1.0]])
+        np.testing.assert_array_equal(A, [[0.5, 0.5], [0.0, 1.0]])
+
+
+class TestShareMatrices:
+
+    def test_matches_cell_loop(self):
+        rng = np.random.default_rng(2)
+        rows = [{"year_month": f"2024-{t:02d}", "macro_domain": d,
+                 "user_share": rng.random(), "asst_share": rng.random()}
+                for t in range(1, 7) for d in range(4) if rng.random() > 0.2]
+        shares = pd.DataFrame(rows).sample(frac=1.0, random_state=0)
+        months = sorted(shares["year_month"].unique())
+        domains = sorted(shares["macro_domain"].unique())
+
+        U, A = _share_matrices(shares, "year_month", months, domains)
+
+        for ti, month in enumerate(months):
+            g = shares[shares["year_month"] == month]
+            for ji, d in enumerate(domains):
+                row = g[g["macro_domain"] == d]
+                assert U[ti, ji] == (row["user_share"].values[0] if len(row) else 0.0)
+                assert A[ti, ji] == (row["asst_share"].values[0] if len(row) else 0.0)
+
+
+class TestRun:
+
+    def test_writes_outputs(self, tmp_path):
+        rng = np.random.default_rng(0)
+        months = [f"2024-{m:02d}" for m in range(1, 9)]
+        rows, metrics = [], []
+        for ym in months:
+            u, a = rng.dirichlet(np.ones(3)), rng.dirichlet(np.ones(3))
+            for d in range(3):
+                rows.append({"year_month": ym, "macro_domain": d,
+                             "user_share": u[d], "asst_share": a[d]})
+            metrics.append({"year_month": ym, "user_msgs": 100, "asst_msgs": 100})
+        pd.DataFrame(rows).to_csv(tmp_path / "macro_monthly_domain_shares.csv", index=False)
+        pd.DataFrame(metrics).to_csv(tmp_path / "macro_monthly_metrics.csv", index=False)
+
+        result = coupling.run(tmp_path, n_permutations=200)
+
+        assert result["n_months"] == 8
+        summary = pd.read_csv(tmp_path / "coupling_summary.csv")
+        assert summary.loc[0, "n_permutations"] == 200
+        assert 0.0 <= summary.loc[0, "p_diff_abs"] <= 1.0
+        assert len(pd.read_csv(tmp_path / "coupling_by_domain.csv")) == 3
+        assert len(pd.read_csv(tmp_path / "coupling_pairs.csv")) == 6
+
+    def test_weekly_lags(self, tmp_path):
+        rng = np.random.default_rng(1)
+        months = [f"2024-{m:02d}" for m in range(1, 7)]
+        weeks = [str(d.date()) for d in pd.date_range("2024-01-01", periods=20, freq="W-MON")]
+        rows, metrics, weekly = [], [], []
+        for ym in months:
+            u, a = rng.dirichlet(np.ones(3)), rng.dirichlet(np.ones(3))
+            rows += [{"year_month": ym, "macro_domain": d,
+                      "user_share": u[d], "asst_share": a[d]} for d in range(3)]
+            metrics.append({"year_month": ym, "user_msgs": 100, "asst_msgs": 100})
+        for i, wk in enumerate(weeks):
+            u, a = rng.dirichlet(np.ones(3)), rng.dirichlet(np.ones(3))
+            n_msgs = 5 if i == 3 else 40      # one week below the threshold
+            weekly += [{"week_start": wk, "macro_domain": d, "user_msgs": n_msgs,
+                        "asst_msgs": n_msgs, "user_share": u[d], "asst_share": a[d]}
+                       for d in range(3)]
+        pd.DataFrame(rows).to_csv(tmp_path / "macro_monthly_domain_shares.csv", index=False)
+        pd.DataFrame(metrics).to_csv(tmp_path / "macro_monthly_metrics.csv", index=False)
+        pd.DataFrame(weekly).to_csv(tmp_path / "macro_weekly_domain_shares.csv", index=False)
+
+        result = coupling.run(tmp_path, n_permutations=100, max_lags={"month": 2, "week": 4})
+
+        assert result["n_weeks"] == 19
+        lags = pd.read_csv(tmp_path / "coupling_lags.csv")
+        assert lags.groupby("granularity")["lag"].max().to_dict() == {"month": 2, "week": 4}
+        assert lags.loc[lags["granularity"] == "week", "n_pairs"].tolist() == [17, 16, 15, 14]
+
+        # lag 1 of the monthly rows is the classic lag-1 test
+        summary = pd.read_csv(tmp_path / "coupling_summary.csv")
+        month1 = lags[(lags["granularity"] == "month") & (lags["lag"] == 1)].iloc[0]
+        assert month1["forward_mean"] == summary.loc[0, "forward_mean"]
+        assert month1["reverse_mean"] == summary.loc[0, "reverse_mean"]
+
+        by_domain = pd.read_csv(tmp_path / "coupling_lags_by_domain.csv")
+        assert len(by_domain) == 3 * (2 + 4)
+        assert by_domain[["p_user_leads_asst", "p_asst_leads_user"]].stack().between(0, 1).all()
+
+    def test_max_lag_capped_by_series_length(self, tmp_path):
+        self.test_writes_outputs(tmp_path)
+        coupling.run(tmp_path, n_permutations=50, max_lags={"month": 10})
+        lags = pd.read_csv(tmp_path / "coupling_lags.csv")
+        # 8 months → 7 differences; at least MIN_PAIRS_PER_LAG pairs per lag
+        assert lags["lag"].max() == 7 - coupling.MIN_PAIRS_PER_LAG
+
+    def test_in_memory_frames(self, tmp_path):
+        self.test_weekly_lags(tmp_path)
+        frames = {
+            "shares":  pd.read_csv(tmp_path / "macro_monthly_domain_shares.csv"),
+            "metrics": pd.read_csv(tmp_path / "macro_monthly_metrics.csv"),
+            "weekly":  pd.read_csv(tmp_path / "macro_weekly_domain_shares.csv"),
+        }
+        expected = pd.read_csv(tmp_path / "coupling_lags.csv")
+
+        mem_dir = tmp_path / "mem"
+        mem_dir.mkdir()
+        result = coupling.run(mem_dir, n_permutations=100,
+                              max_lags={"month": 2, "week": 4}, frames=frames)
+
+        assert result["n_weeks"] == 19
+        pd.testing.assert_frame_equal(pd.read_csv(mem_dir / "coupling_lags.csv"), expected)
+
+    def test_missing_inputs_raise(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            coupling.run(tmp_path, n_permutations=10)
@@ -0,0 +1,160 @@
+"""
+Tests for pipeline/distributions.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Period encoding   (contiguous month / week / day codes and labels)
+    - Count matrices    (bincount contingency tables, rolling sums)
+    - JS distance       (batched result matches scipy per row)
+    - Bootstrap interval (same seed → same bounds, bounds bracket the point
+                          JS, empty rows → NaN)
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial.distance import jensenshannon
+
+from pipeline.distributions import (
+    bootstrap_js_interval,
+    count_matrix,
+    js_distance,
+    period_codes,
+    rolling_sum,
+)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Period encoding
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestPeriodCodes:
+
+    def test_months_are_contiguous(self):
+        df = pd.DataFrame({"year_month": ["2023-11", "2024-02", "2023-11"]})
+        valid, codes, labels = period_codes(df, "month")
+
+        assert valid.all()
+        assert codes.tolist() == [0, 3, 0]
+        assert labels.tolist() == ["2023-11", "2023-12", "2024-01", "2024-02"]
+
+    def test_blank_month_excluded(self):
+        df = pd.DataFrame({"year_month": ["2023-11", "", None]})
+        valid, codes, _ = period_codes(df, "month")
+
+        assert valid.tolist() == [True, False, False]
+        assert codes.tolist() == [0]
+
+    def test_weeks_start_on_monday(self):
+        # 2024-01-03 (Wed) and 2024-01-08 (Mon) fall in consecutive ISO weeks
+        ts = [1_704_240_000.0, 1_704_672_000.0]
+        valid, codes, labels = period_codes(pd.DataFrame({"timestamp": ts}), "week")
+
+        assert codes.tolist() == [0, 1]
+        assert labels.tolist() == ["2024-01-01", "2024-01-08"]
+
+    def test_missing_timestamp_excluded(self):
+        df = pd.DataFrame({"timestamp": [1_700_000_000.0, np.nan]})
+        valid, codes, labels = period_codes(df, "day")
+
+        assert valid.tolist() == [True, False]
+        assert labels.tolist() == ["2023-11-14"]
+
+    def test_unknown_period_raises(self):
+        with pytest.raises(ValueError, match="Unknown period"):
+            period_codes(pd.DataFrame({"timestamp": [0.0]}), "year")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Count matrices
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestCounts:
+
+    def test_count_matrix(self):
+        counts = count_matrix(np.array([0, 0, 2]), np.array([1, 1, 0]), 3, 2)
+        assert counts.tolist() == [[0, 2], [0, 0], [1, 0]]
+
+    def test_rolling_sum(self):
+        counts = np.arange(8).reshape(4, 2)
+        rolled = rolling_sum(counts, 3)
+        assert rolled.tolist() == [[6, 9], [12, 15]]
+
+    def test_rolling_sum_short_input(self):
+        assert rolling_sum(np.ones((2, 3)), 5).shape == (0, 3)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# JS distance
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestJSDistance:
+
+    def test_matches_scipy_rowwise(self):
+        rng = np.random.default_rng(0)
+        p = rng.integers(0, 20, size=(6, 10))
+        q = rng.integers(0, 20, size=(6, 10))
+
+        expected = [jensenshannon(p[i] / p[i].sum(), q[i] / q[i].sum()) for i in range(6)]
+        np.testing.assert_allclose(js_distance(p, q), expected, rtol=1e-12)
+
+    def test_identical_rows_zero(self):
+        p = np.array([[1, 2, 3]])
+        assert js_distance(p, p * 4)[0] == pytest.approx(0.0, abs=1e-12)
+
+    def test_empty_row_is_nan(self):
+        p = np.array([[0, 0], [1, 1]])
+        q = np.array([[1, 1], [1, 0]])
+        out = js_distance(p, q)
+        assert np.isnan(out[0])
+        assert np.isfinite(out[1])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bootstrap interval
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestBootstrapInterval:
+
+    @staticmethod
+    def _counts():
+        rng = np.random.default_rng(1)
+        return rng.integers(20, 200, size=(4, 6)), rng.integers(20, 200, size=(4, 6))
+
+    def test_same_seed_same_interval(self):
+        p, q = self._counts()
+        a = bootstrap_js_interval(p, q, 300, np.random.default_rng(7))
+        b = bootstrap_js_interval(p, q, 300, np.random.default_rng(7))
+        c = bootstrap_js_interval(p, q, 300, np.random.default_rng(8))
+        np.testing.assert_array_equal(a[0], b[0])
+        np.testing.assert_array_equal(a[1], b[1])
+        assert not np.array_equal(a[0], c[0])
+
+    def test_block_size_does_not_change_draws(self):
+        p, q = self._counts()
+        whole = bootstrap_js_interval(p, q, 200, np.random.default_rng(3))
+        small = bootstrap_js_interval(p, q, 200, np.random.default_rng(3), max_block_cells=1)
+        assert np.all(small[0] <= small[1])
+        np.testing.assert_allclose(whole[0], small[0], atol=0.05)
+
+    def test_brackets_point_estimate(self):
+        # Well-separated, well-populated rows: plug-in bias is small
+        p = np.array([[400, 300, 200, 100], [250, 250, 250, 250]])
+        q = np.array([[100, 200, 300, 400], [500, 300, 150, 50]])
+        lower, upper = bootstrap_js_interval(p, q, 1_000, np.random.default_rng(0))
+        point = js_distance(p, q)
+        assert np.all(lower <= point) and np.all(point <= upper)
+        assert np.all(upper - lower > 0)
+
+    def test_empty_rows_nan(self):
+        p = np.array([[0, 0, 0], [30, 40, 50]])
+        q = np.array([[10, 20, 30], [50, 40, 30]])
+        lower, upper = bootstrap_js_interval(p, q, 100, np.random.default_rng(0))
+        assert np.isnan(lower[0]) and np.isnan(upper[0])
+        assert np.isfinite(lower[1]) and np.isfinite(upper[1])
+
+        lower, upper = bootstrap_js_interval(p, q, 0, np.random.default_rng(0))
+        assert np.isnan(lower).all() and np.isnan(upper).all()
@@ -0,0 +1,79 @@
+"""
+Tests for pipeline/domains.py
+
+Run with:  pytest tests/
+
+Covers:
+    - macro_monthly_metrics.csv (columns unchanged apart from
+                                 macro_js_ci_lower / macro_js_ci_upper)
+    - Bootstrap interval        (finite and ordered, same bounds on a rerun,
+                                 NaN for months below MIN_MSGS_PER_ROLE)
+    - run() signature           (n_bootstrap after progress_cb, so positional
+                                 callers keep working)
+"""
+
+from __future__ import annotations
+
+import inspect
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import domains, parse, synthetic, topics
+
+QUICK_TOPICS = {"n_clusters": 20, "n_init": 2, "svd_components": 50}
+BASE_COLUMNS = ["year_month", "user_msgs", "asst_msgs",
+                "macro_entropy_user", "macro_js_divergence"]
+
+
+@pytest.fixture(scope="module")
+def metrics(tmp_path_factory):
+    """Four months; the first keeps all user messages but only ~5% of replies."""
+    work = tmp_path_factory.mktemp("domains")
+    db = work / "conversations.db"
+    synthetic.write_export(work / "c.json", "chatgpt",
+                           {"n_messages": 3_000, "months": 4, "seed": 5})
+    parse.run(work / "c.json", db, "chatgpt")
+    topics.run(db, work, config=QUICK_TOPICS)
+
+    con = sqlite3.connect(db)
+    con.execute("DELETE FROM messages WHERE role = 'assistant' AND year_month = '2023-01' "
+                "AND rowid % 20 != 0")
+    con.commit()
+    con.close()
+
+    runs = []
+    for name in ("a", "b"):
+        domains.run(db, work / name, n_bootstrap=300)
+        runs.append(pd.read_csv(work / name / "macro_monthly_metrics.csv"))
+    return runs
+
+
+class TestMonthlyMetrics:
+
+    def test_columns(self, metrics):
+        df = metrics[0]
+        assert list(df.columns) == BASE_COLUMNS + ["macro_js_ci_lower", "macro_js_ci_upper"]
+        assert df["year_month"].tolist() == ["2023-01", "2023-02", "2023-03", "2023-04"]
+
+    def test_interval(self, metrics):
+        df = metrics[0].set_index("year_month")
+        ok = df.drop(index="2023-01")
+        # Both roles share one topic mixture here, so the plug-in JS sits near
+        # zero and the interval above it (see test_distributions for bracketing)
+        assert ok["macro_js_ci_lower"].notna().all()
+        assert (ok["macro_js_ci_lower"] < ok["macro_js_ci_upper"]).all()
+        pd.testing.assert_frame_equal(metrics[0], metrics[1])
+
+    def test_below_minimum_nan(self, metrics):
+        small = metrics[0].set_index("year_month").loc["2023-01"]
+        assert small["user_msgs"] >= domains.MIN_USER_MSGS_PER_MONTH
+        assert small["asst_msgs"] < domains.MIN_MSGS_PER_ROLE
+        assert np.isnan(small["macro_js_divergence"])
+        assert np.isnan(small["macro_js_ci_lower"]) and np.isnan(small["macro_js_ci_upper"])
+
+    def test_positional_signature(self):
+        params = list(inspect.signature(domains.run).parameters)
+        assert params == ["db_path", "out_dir", "n_macro", "progress_cb", "n_bootstrap"]
@@ -0,0 +1,117 @@
+"""
+Tests for pipeline/drift.py
+
+Run with:  pytest tests/
+
+Covers:
+    - _drift_matrix   (symmetric, zero diagonal, matches scipy per pair)
+    - run()           (topic_drift.npz + one CSV per level and role,
+                       MIN_MSGS_PER_MONTH filter, macro level skipped
+                       without node_to_macro_domain, ValueError without
+                       node_to_fine_cluster)
+    - runner stage    (declared after domains)
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial.distance import jensenshannon
+
+from pipeline import drift, runner, scheduler
+from pipeline.drift import _drift_matrix
+
+MONTHS = ["2024-01", "2024-02", "2024-03", "2024-04"]
+
+
+def _make_db(path, per_month: dict[str, int], macro: bool = True, fine: bool = True):
+    """Messages for both roles; *per_month* = user messages per month (assistant: 60)."""
+    rng = np.random.default_rng(0)
+    rows = []
+    for month in MONTHS:
+        for role, n in (("user", per_month.get(month, 60)), ("assistant", 60)):
+            rows += [(f"{month}-{role}-{i}", role, month) for i in range(n)]
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE messages (node_id TEXT, role TEXT, year_month TEXT)")
+    con.executemany("INSERT INTO messages VALUES (?, ?, ?)", rows)
+    ids = [r[0] for r in rows]
+    if fine:
+        con.execute("CREATE TABLE node_to_fine_cluster (node_id TEXT PRIMARY KEY, cluster_id INT)")
+        con.executemany("INSERT INTO node_to_fine_cluster VALUES (?, ?)",
+                        [(nid, int(c)) for nid, c in zip(ids, rng.integers(0, 6, len(ids)))])
+    if macro:
+        con.execute("CREATE TABLE node_to_macro_domain (node_id TEXT PRIMARY KEY, macro_domain INT)")
+        con.executemany("INSERT INTO node_to_macro_domain VALUES (?, ?)",
+                        [(nid, int(c)) for nid, c in zip(ids, rng.integers(0, 3, len(ids)))])
+    con.commit()
+    con.close()
+    return path
+
+
+class TestDriftMatrix:
+
+    def test_properties(self):
+        counts = np.random.default_rng(1).integers(0, 30, size=(5, 8))
+        D = _drift_matrix(counts)
+        assert D.shape == (5, 5)
+        np.testing.assert_allclose(D, D.T, atol=1e-12)
+        np.testing.assert_allclose(np.diagonal(D), 0.0, atol=1e-7)
+
+    def test_matches_scipy(self):
+        counts = np.random.default_rng(2).integers(1, 30, size=(4, 6))
+        D = _drift_matrix(counts)
+        shares = counts / counts.sum(axis=1, keepdims=True)
+        for i, j in [(0, 1), (1, 3), (2, 0)]:
+            assert D[i, j] == pytest.approx(jensenshannon(shares[i], shares[j]), rel=1e-12)
+
+
+class TestRun:
+
+    def test_outputs(self, tmp_path):
+        db = _make_db(tmp_path / "c.db", {})
+        summary = drift.run(db, tmp_path)
+
+        arrays = np.load(tmp_path / "topic_drift.npz")
+        for level in ("fine", "macro"):
+            for role in drift.ROLES:
+                key = f"{level}_{role}"
+                csv = pd.read_csv(tmp_path / f"topic_drift_{key}.csv", index_col="year_month")
+                assert csv.index.tolist() == csv.columns.tolist() == MONTHS
+                assert arrays[key].shape == (4, 4) and arrays[key].dtype == np.float32
+                assert arrays[f"{key}_months"].tolist() == MONTHS
+                np.testing.assert_allclose(csv.to_numpy(), arrays[key], atol=1e-6)
+                assert summary[key]["months"] == 4
+        assert summary["instrumentation"]["stage"] == "drift"
+
+    def test_min_msgs_filter(self, tmp_path):
+        short = drift.MIN_MSGS_PER_MONTH - 1
+        db = _make_db(tmp_path / "c.db", {"2024-02": short})
+        summary = drift.run(db, tmp_path)
+        arrays = np.load(tmp_path / "topic_drift.npz")
+        assert arrays["fine_user_months"].tolist() == ["2024-01", "2024-03", "2024-04"]
+        assert arrays["fine_user"].shape == (3, 3)
+        assert arrays["fine_assistant_months"].tolist() == MONTHS
+        assert summary["fine_user"]["months"] == 3
+
+    def test_macro_skipped(self, tmp_path):
+        db = _make_db(tmp_path / "c.db", {}, macro=False)
+        summary = drift.run(db, tmp_path)
+        assert {k for k in summary if k != "instrumentation"} == {"fine_user", "fine_assistant"}
+        assert not (tmp_path / "topic_drift_macro_user.csv").exists()
+        assert "macro_user" not in np.load(tmp_path / "topic_drift.npz")
+
+    def test_requires_fine_clusters(self, tmp_path):
+        db = _make_db(tmp_path / "c.db", {}, fine=False, macro=False)
+        with pytest.raises(ValueError, match="Run topics.run"):
+            drift.run(db, tmp_path)
+
+
+class TestStage:
+
+    def test_declared_after_domains(self):
+        graph = scheduler.load_graph(runner.STAGE_MODULES)
+        assert graph["drift"] == ("domains",)
+        assert runner.STAGES.index("drift") < runner.STAGES.index("report")
@@ -0,0 +1,310 @@
+"""
+Tests for pipeline/dynamics.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Incremental sliding-window entropy (same values as per-window value_counts)
+    - Window medians with NULL timestamps sorted first
+    - Count and calendar windows written by the rolling-entropy step
+    - Vectorised shift detection (same shifts as the per-thread scan) and
+      the exact binomial initiation test; the old permutation options are
+      ignored with a warning
+    - Scale separation: between/within-month variance split from counts
+    - Episode segmentation by run-length encoding (same episodes as a
+      per-thread scan) and the episode initiation summary
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import binomtest
+from scipy.stats import entropy as shannon_entropy
+
+from pipeline import dynamics
+from pipeline.dynamics import (
+    _calendar_entropy,
+    _detect_shifts,
+    _episode_initiation,
+    _episodes,
+    _load_thread_domains,
+    _rolling_entropy,
+    _scale_separation,
+    _shift_initiation,
+    _sliding_entropy,
+    _variance_split,
+    _window_medians,
+)
+from pipeline.threads import refresh as refresh_thread_features
+
+
+def _reference_rolling(df: pd.DataFrame, window: int, stride: int) -> pd.DataFrame:
+    """The original per-window loop."""
+    rows = []
+    for start in range(0, len(df) - window + 1, stride):
+        chunk = df.iloc[start: start + window]
+        counts = chunk["cluster_id"].value_counts()
+        rows.append({
+            "window_start":  start,
+            "window_end":    start + window - 1,
+            "mid_timestamp": chunk["timestamp"].median(),
+            "entropy_bits":  round(float(shannon_entropy(counts / counts.sum(), base=2)), 4),
+        })
+    return pd.DataFrame(rows)
+
+
+def _messages(n: int, seed: int = 0, n_null: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ts = np.sort(1_700_000_000 + rng.integers(0, 90 * 86_400, n)).astype(float)
+    ts[:n_null] = np.nan
+    return pd.DataFrame({
+        "node_id":    [f"n{i}" for i in range(n)],
+        "timestamp":  ts,
+        "cluster_id": rng.zipf(1.6, n) % 40,
+    })
+
+
+class TestSlidingEntropy:
+
+    @pytest.mark.parametrize("window,stride", [(50, 50), (50, 7), (30, 1), (25, 40)])
+    def test_matches_value_counts(self, window, stride):
+        labels = np.random.default_rng(window).integers(0, 12, 400)
+        lo = np.arange(0, len(labels) - window + 1, stride)
+        got = _sliding_entropy(labels, lo, lo + window)
+        expected = [
+            shannon_entropy(np.bincount(labels[a: a + window]), base=2) for a in lo
+        ]
+        np.testing.assert_allclose(got, expected, atol=1e-9)
+
+    def test_variable_and_empty_windows(self):
+        labels = np.array([3, 3, 1, 2, 2, 2, 5])
+        lo = np.array([0, 0, 2, 4, 7])
+        hi = np.array([0, 2, 5, 7, 7])
+        got = _sliding_entropy(labels, lo, hi)
+        assert np.isnan(got[0]) and np.isnan(got[4])
+        assert got[1] == 0.0
+        np.testing.assert_allclose(got[2], shannon_entropy([1, 2], base=2))
+        np.testing.assert_allclose(got[3], shannon_entropy([2, 1], base=2))
+
+    def test_medians_skip_leading_nans(self):
+        ts = np.array([np.nan, np.nan, 1.0, 2.0, 4.0, 8.0])
+        lo, hi = np.array([0, 0, 1, 2]), np.array([2, 3, 5, 6])
+        got = _window_medians(ts, lo, hi)
+        assert np.isnan(got[0])
+        np.testing.assert_array_equal(got[1:], [1.0, 2.0, 3.0])
+
+
+class TestRollingEntropy:
+
+    @pytest.mark.parametrize("window,stride,n_null", [(250, 250, 0), (100, 10, 0), (80, 30, 5)])
+    def test_count_windows_match_loop(self, tmp_path, window, stride, n_null):
+        df = _messages(1_000, n_null=n_null)
+        got = _rolling_entropy(df, tmp_path, window, stride)
+        pd.testing.assert_frame_equal(got, _reference_rolling(df, window, stride), check_dtype=False)
+        assert (tmp_path / "rolling_entropy_250.csv").exists()
+
+    def test_too_few_messages(self, tmp_path):
+        assert _rolling_entropy(_messages(10), tmp_path, 250, 250).empty
+
+    def test_calendar_windows(self, tmp_path):
+        df = _messages(2_000, seed=3)
+        got = _calendar_entropy(df, tmp_path, days=30, stride_days=7)
+
+        assert (tmp_path / "rolling_entropy_30d.csv").exists()
+        day = 86_400.0
+        first = np.floor(df["timestamp"].iloc[0] / day) * day
+        for i, row in got.iterrows():
+            start = first + i * 7 * day
+            mask = (df["timestamp"] >= start) & (df["timestamp"] < start + 30 * day)
+            chunk = df[mask]
+            assert row["n_messages"] == len(chunk)
+            counts = chunk["cluster_id"].value_counts()
+            assert row["entropy_bits"] == round(float(shannon_entropy(counts, base=2)), 4)
+            assert row["mid_timestamp"] == chunk["timestamp"].median()
+        assert got["window_start"].iloc[0] == pd.to_datetime(first, unit="s").strftime("%Y-%m-%d")
+
+
+def _reference_shifts(df: pd.DataFrame) -> pd.DataFrame:
+    """The original per-thread scan."""
+    shifts = []
+    for _, grp in df.groupby("thread_id"):
+        grp = grp.reset_index(drop=True)
+        for i in range(1, len(grp)):
+            if grp.loc[i, "macro_domain"] != grp.loc[i - 1, "macro_domain"]:
+                shifts.append({
+                    "thread_id":      grp.loc[i, "thread_id"],
+                    "initiator_role": grp.loc[i, "role"],
+                    "from_domain":    grp.loc[i - 1, "macro_domain"],
+                    "to_domain":      grp.loc[i, "macro_domain"],
+                })
+    return pd.DataFrame(shifts)
+
+
+def _thread_messages(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(1, 30, 40)
+    tids = np.repeat([f"t{i:03d}" for i in range(len(lengths))], lengths).astype(object)
+    tids[:3] = None                      # SQLite sorts NULL thread ids first
+    n = len(tids)
+    return pd.DataFrame({
+        "thread_id":    tids,
+        "role":         np.where(np.arange(n) % 2 == 0, "user", "assistant"),
+        "macro_domain": rng.integers(0, 3, n),
+    })
+
+
+def _shift_db(tmp_path, df: pd.DataFrame):
+    db = tmp_path / "conversations.db"
+    con = sqlite3.connect(db)
+    msgs = df.assign(node_id=[f"n{i}" for i in range(len(df))],
+                     timestamp=np.arange(len(df), dtype=float), char_count=100)
+    msgs[["node_id", "thread_id", "role", "timestamp", "char_count"]].to_sql(
+        "messages", con, index=False)
+    msgs[["node_id", "macro_domain"]].to_sql("node_to_macro_domain", con, index=False)
+    msgs[["node_id"]].assign(cluster_id=msgs["macro_domain"]).to_sql(
+        "node_to_fine_cluster", con, index=False)
+    con.close()
+    return db
+
+
+class TestShiftInitiation:
+
+    def test_detect_shifts_matches_scan(self):
+        df = _thread_messages()
+        got = _detect_shifts(df)
+        expected = _reference_shifts(df)
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+    def test_boundaries_are_not_shifts(self):
+        df = pd.DataFrame({
+            "thread_id":    ["a", "a", "b", "b", "c"],
+            "role":         ["user", "assistant", "user", "assistant", "user"],
+            "macro_domain": [0, 0, 1, 1, 2],
+        })
+        assert _detect_shifts(df).empty
+
+    def test_exact_binomial_summary(self, tmp_path):
+        df = _thread_messages(seed=4)
+        db = _shift_db(tmp_path, df)
+
+        refresh_thread_features(db)
+        result = _shift_initiation(_load_thread_domains(db), tmp_path)
+
+        shifts = _reference_shifts(df)
+        n_user = int((shifts["initiator_role"] == "user").sum())
+        assert result["total_shifts"] == len(shifts)
+        summary = pd.read_csv(tmp_path / "shift_initiation_summary.csv")
+        assert summary.loc[0, "user_shifts"] == n_user
+        assert summary.loc[0, "test"] == "binomial-exact"
+        assert summary.loc[0, "p_vs_random"] == round(binomtest(n_user, len(shifts), 0.5).pvalue, 4)
+
+    def test_obsolete_permutation_options_warn(self, tmp_path):
+        db = _shift_db(tmp_path, _thread_messages(seed=4))
+        config = {"shift_permutations": 5_000, "random_seed": 42, "rolling_days": [],
+                  "scale_separation": False, "episode_initiation": False}
+        with pytest.warns(UserWarning, match=r"shift_permutations.*random_seed.*perm_p_vs_random"):
+            result = dynamics.run(db, tmp_path, config=config)
+        assert "p_vs_random" in result
+        assert "p_vs_random" in pd.read_csv(tmp_path / "shift_initiation_summary.csv")
+
+
+class TestScaleSeparation:
+
+    def test_matches_message_level_variance(self):
+        rng = np.random.default_rng(0)
+        month = rng.integers(0, 8, 3_000)
+        domain = (rng.integers(0, 4, 3_000) + (month > 4)) % 4
+        counts = np.zeros((8, 4), dtype=np.int64)
+        np.add.at(counts, (month, domain), 1)
+
+        split = _variance_split(counts)
+
+        for j in range(4):
+            x = (domain == j).astype(float)
+            means = np.array([x[month == t].mean() for t in range(8)])
+            between = np.mean((means[month] - x.mean()) ** 2)
+            within = np.mean((x - means[month]) ** 2)
+            np.testing.assert_allclose(split["between"][j], between, atol=1e-12)
+            np.testing.assert_allclose(split["within"][j], within, atol=1e-12)
+            np.testing.assert_allclose(split["between"][j] + split["within"][j], x.var(), atol=1e-12)
+        np.testing.assert_allclose(split["between"][-1], split["between"][:4].sum())
+
+    def test_skips_with_few_months(self, tmp_path):
+        db = tmp_path / "conversations.db"
+        con = sqlite3.connect(db)
+        pd.DataFrame({
+            "node_id": [f"n{i}" for i in range(400)],
+            "role": np.where(np.arange(400) % 2 == 0, "user", "assistant"),
+            "year_month": np.repeat(["2024-01", "2024-02", "2024-03", "2024-04"], 100),
+        }).to_sql("messages", con, index=False)
+        pd.DataFrame({
+            "node_id": [f"n{i}" for i in range(400)],
+            "macro_domain": np.arange(400) % 3,
+        }).to_sql("node_to_macro_domain", con, index=False)
+        con.close()
+
+        assert "skipped" in _scale_separation(db, tmp_path, min_months=6, min_msgs=10)["scale_separation"]
+        result = _scale_separation(db, tmp_path, min_months=3, min_msgs=10)
+        assert result["scale_months"] == 4
+        table = pd.read_csv(tmp_path / "scale_separation.csv")
+        assert set(table["role"]) == {"user", "assistant"}
+        assert len(table) == 2 * (3 + 1)
+
+
+def _reference_episodes(df: pd.DataFrame, min_thread_len: int, min_len: int) -> pd.DataFrame:
+    rows = []
+    for tid, grp in df[df["thread_id"].notna()].groupby("thread_id", sort=False):
+        if len(grp) < min_thread_len:
+            continue
+        dom, role = grp["macro_domain"].tolist(), grp["role"].tolist()
+        start, k = 0, 0
+        for i in range(1, len(dom) + 1):
+            if i == len(dom) or dom[i] != dom[start]:
+                if i - start >= min_len:
+                    rows.append({"thread_id": tid, "episode": k, "start_pos": start,
+                                 "n_messages": i - start, "macro_domain": dom[start],
+                                 "initiator_role": role[start]})
+                    k += 1
+                start = i
+    return pd.DataFrame(rows)
+
+
+class TestEpisodeInitiation:
+
+    @pytest.mark.parametrize("min_thread_len,min_len", [(20, 3), (5, 1), (10, 2)])
+    def test_matches_scan(self, min_thread_len, min_len):
+        rng = np.random.default_rng(min_len)
+        df = _thread_messages(seed=min_thread_len)
+        # Sticky domains so that runs longer than one message are common
+        df["macro_domain"] = np.cumsum(rng.random(len(df)) < 0.3) % 4
+        got = _episodes(df, min_thread_len, min_len)
+        expected = _reference_episodes(df, min_thread_len, min_len)
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+    def test_runs_do_not_cross_threads(self):
+        df = pd.DataFrame({
+            "thread_id":    ["a"] * 4 + ["b"] * 4,
+            "role":         ["user", "assistant"] * 4,
+            "macro_domain": [0, 0, 1, 1, 1, 1, 2, 2],
+        })
+        got = _episodes(df, min_thread_len=4, min_len=2)
+        assert got["start_pos"].tolist() == [0, 2, 0, 2]
+        assert got["n_messages"].tolist() == [2, 2, 2, 2]
+
+    def test_summary_and_skip(self, tmp_path):
+        df = _thread_messages(seed=1)
+        assert "skipped" in _episode_initiation(df, tmp_path, min_thread_len=1_000, min_len=3)[
+            "episode_initiation"]
+
+        result = _episode_initiation(df, tmp_path, min_thread_len=10, min_len=1)
+        detail = pd.read_csv(tmp_path / "episode_initiation_detail.csv")
+        switched = detail[detail["start_pos"] > 0]
+        n_user = int((switched["initiator_role"] == "user").sum())
+        assert result["episodes"] == len(detail)
+        summary = pd.read_csv(tmp_path / "episode_initiation_summary.csv")
+        assert summary.loc[0, "initiated_episodes"] == len(switched)
+        assert summary.loc[0, "p_vs_random"] == round(binomtest(n_user, len(switched), 0.5).pvalue, 4)
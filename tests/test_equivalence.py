@@ -0,0 +1,168 @@
+"""
+Tests for pipeline/equivalence.py
+
+Run with:  pytest tests/
+
+Covers:
+    - compare_csvs      (identical, within tolerance, beyond tolerance,
+                         same side of alpha, skipped columns, NaN positions,
+                         text columns, missing files, shape mismatches,
+                         rows matched on ROW_KEYS)
+    - compare_clusters  (relabelled partition passes on ARI, a different
+                         partition fails, missing messages)
+    - format_report     (readable table, identical columns summarised)
+    - run_harness()     (every optimised mode passes against the reference
+                         on a synthetic corpus; unknown modes rejected)
+"""
+
+from __future__ import annotations
+
+import math
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import equivalence
+from pipeline.equivalence import Tolerance
+
+# Small corpus and settings that keep a full pipeline run to a few seconds
+QUICK_CONFIG = {
+    "topics":    {"n_clusters": 20, "n_init": 2, "svd_components": 50},
+    "profile":   {"n_permutations": 2_000},
+    "alignment": {"n_bootstrap": 200},
+    "domains":   {"n_bootstrap": 200},
+    "coupling":  {"n_permutations": 1_000},
+}
+QUICK_CORPUS = {"synthetic": ("chatgpt", {"n_messages": 3_000, "months": 6, "seed": 3})}
+
+
+def _write_pair(tmp_path, ref: pd.DataFrame, opt: pd.DataFrame, name: str = "out.csv"):
+    for side, df in (("ref", ref), ("opt", opt)):
+        (tmp_path / side).mkdir(exist_ok=True)
+        df.to_csv(tmp_path / side / name, index=False)
+    return tmp_path / "ref", tmp_path / "opt"
+
+
+def _by_column(rows: list[dict]) -> dict[str, dict]:
+    return {r["column"]: r for r in rows}
+
+
+def _write_clusters(work, labels: dict[str, int]) -> None:
+    work.mkdir(exist_ok=True)
+    con = sqlite3.connect(work / "conversations.db")
+    con.execute("CREATE TABLE node_to_fine_cluster (node_id TEXT PRIMARY KEY, cluster_id INTEGER)")
+    con.executemany("INSERT INTO node_to_fine_cluster VALUES (?, ?)", labels.items())
+    con.commit()
+    con.close()
+
+
+class TestCompareCsvs:
+
+    def test_tolerances(self, tmp_path):
+        ref = pd.DataFrame({"same": [1.0, 2.0], "close": [0.5, 0.7], "far": [1.0, 2.0],
+                            "p_value": [0.01, 0.5], "label": ["a", "b"]})
+        opt = ref.assign(close=[0.5 + 1e-12, 0.7], far=[1.0, 2.5], p_value=[0.03, 0.9])
+        rows = equivalence.compare_csvs(*_write_pair(tmp_path, ref, opt))
+        got = _by_column(rows)
+        assert got["same"]["status"] == got["label"]["status"] == "identical"
+        assert got["close"]["status"] == "within"
+        assert got["far"]["status"] == "FAIL" and got["far"]["max_abs_diff"] == 0.5
+        assert got["p_value"]["status"] == "FAIL"
+
+        rules = [("*", "p_value", Tolerance(atol=math.inf, alpha=0.05)),
+                 ("out.csv", "far", Tolerance(skip="noisy"))]
+        got = _by_column(equivalence.compare_csvs(tmp_path / "ref", tmp_path / "opt", rules))
+        assert got["p_value"]["status"] == "within"
+        assert got["far"]["status"] == "skipped"
+
+    def test_alpha_crossing(self, tmp_path):
+        ref = pd.DataFrame({"p_value": [0.04, 0.5]})
+        opt = pd.DataFrame({"p_value": [0.06, 0.5]})
+        rules = [("*", "p_*", Tolerance(atol=0.1, alpha=0.05))]
+        row = equivalence.compare_csvs(*_write_pair(tmp_path, ref, opt), rules)[0]
+        assert row["status"] == "FAIL" and "cross 0.05" in row["detail"]
+
+    def test_nan_and_text(self, tmp_path):
+        ref = pd.DataFrame({"x": [1.0, np.nan], "state": ["Initial", "Exploration"]})
+        opt = pd.DataFrame({"x": [np.nan, 1.0], "state": ["Initial", "Consolidation"]})
+        got = _by_column(equivalence.compare_csvs(*_write_pair(tmp_path, ref, opt)))
+        assert "NaN position" in got["x"]["detail"]
+        assert got["state"]["status"] == "FAIL" and "'Exploration'" in got["state"]["detail"]
+
+    def test_files_and_shapes(self, tmp_path):
+        ref_dir, opt_dir = _write_pair(tmp_path, pd.DataFrame({"a": [1, 2]}),
+                                       pd.DataFrame({"a": [1]}))
+        pd.DataFrame({"a": [1]}).to_csv(ref_dir / "only_ref.csv", index=False)
+        pd.DataFrame({"b": [1]}).to_csv(ref_dir / "cols.csv", index=False)
+        pd.DataFrame({"c": [1]}).to_csv(opt_dir / "cols.csv", index=False)
+        details = {r["file"]: r["detail"] for r in equivalence.compare_csvs(ref_dir, opt_dir)}
+        assert details["only_ref.csv"] == "missing from the optimised run"
+        assert details["out.csv"] == "2 vs 1 rows"
+        assert details["cols.csv"].startswith("columns differ")
+
+    def test_row_keys(self, tmp_path):
+        # Sorted by p: a change in p reorders the domains
+        ref = pd.DataFrame({"macro_domain": [3, 1], "p_user_leads_asst": [0.01, 0.02]})
+        opt = pd.DataFrame({"macro_domain": [1, 3], "p_user_leads_asst": [0.015, 0.02]})
+        rules = [("*", "p_*", Tolerance(atol=0.02))]
+        rows = equivalence.compare_csvs(*_write_pair(tmp_path, ref, opt, "coupling_by_domain.csv"),
+                                        rules)
+        assert all(r["status"] != "FAIL" for r in rows)
+
+
+class TestCompareClusters:
+
+    def test_relabelled_partition(self, tmp_path):
+        _write_clusters(tmp_path / "ref", {"a": 0, "b": 0, "c": 1, "d": 2})
+        _write_clusters(tmp_path / "opt", {"a": 5, "b": 5, "c": 0, "d": 1})
+        [row] = equivalence.compare_clusters(tmp_path / "ref", tmp_path / "opt")
+        assert row["status"] == "within" and row["detail"].startswith("ARI 1.0000")
+
+    def test_different_partition(self, tmp_path):
+        _write_clusters(tmp_path / "ref", {"a": 0, "b": 0, "c": 1, "d": 1})
+        _write_clusters(tmp_path / "opt", {"a": 0, "b": 1, "c": 0, "d": 1})
+        [row] = equivalence.compare_clusters(tmp_path / "ref", tmp_path / "opt")
+        assert row["status"] == "FAIL"
+        [row] = equivalence.compare_clusters(tmp_path / "ref", tmp_path / "opt", min_ari=-1.0)
+        assert row["status"] == "within"
+
+    def test_missing_messages(self, tmp_path):
+        _write_clusters(tmp_path / "ref", {"a": 0, "b": 1})
+        _write_clusters(tmp_path / "opt", {"a": 0})
+        [row] = equivalence.compare_clusters(tmp_path / "ref", tmp_path / "opt")
+        assert row["status"] == "FAIL" and "1 in both" in row["detail"]
+
+
+class TestReport:
+
+    def test_format(self, tmp_path):
+        ref = pd.DataFrame({"a": [1.0], "b": [2.0]})
+        result = equivalence.compare_dirs(*_write_pair(tmp_path, ref, ref.assign(b=3.0)))
+        text = equivalence.format_report({"ok": result["ok"],
+                                          "corpora": {"demo": {"mode-x": result}}})
+        assert text.splitlines()[0] == "demo · mode-x: FAIL"
+        assert "out.csv" in text and "1 of 2 columns identical" in text
+        assert text.endswith("Differences beyond tolerance.")
+
+
+@pytest.fixture(scope="module")
+def harness(tmp_path_factory):
+    return equivalence.run_harness(tmp_path_factory.mktemp("equivalence"),
+                                   corpora=QUICK_CORPUS, base_config=QUICK_CONFIG)
+
+
+class TestHarness:
+
+    @pytest.mark.parametrize("mode", list(equivalence.MODES))
+    def test_mode_passes(self, harness, mode):
+        result = harness["corpora"]["synthetic"][mode]
+        assert result["ok"], equivalence.format_table(result["rows"])
+        files = {r["file"] for r in result["rows"]}
+        assert {"clusters", "coupling_summary.csv", "profile/spearman_results.csv",
+                "dyadic_alignment_monthly.csv"} <= files
+
+    def test_unknown_mode(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown mode"):
+            equivalence.run_harness(tmp_path, modes=["float16"], corpora={})
@@ -0,0 +1,127 @@
+"""
+Tests for pipeline/instrument.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Recorder      (steps closed in order, row counts, JSON-safe record,
+                     stage figures cover every step)
+    - Span nesting  (a step resetting the peak marks does not hide the
+                     stage's peak; tracemalloc peaks per step)
+    - tracemalloc   (off by default, started by DOL_TRACEMALLOC)
+    - chrome_trace  (complete events per stage and step, relative µs
+                     timestamps, cached stages labelled)
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from pipeline import instrument
+
+
+@pytest.fixture
+def no_tracing(monkeypatch):
+    monkeypatch.delenv(instrument.TRACEMALLOC_ENV, raising=False)
+    was_tracing = tracemalloc.is_tracing()
+    tracemalloc.stop()
+    yield
+    tracemalloc.stop()
+    if was_tracing:
+        tracemalloc.start()
+
+
+class TestRecorder:
+
+    def test_steps_and_rows(self, no_tracing):
+        rec = instrument.Recorder("demo")
+        rec.step("load")
+        rec.rows(100)
+        rec.step("fit", rows_in=100)
+        time.sleep(0.02)
+        rec.rows(rows_out=10)
+        out = rec.finish()
+
+        json.dumps(out)
+        assert out["stage"] == "demo" and out["rss_scope"] in ("span", "process")
+        assert [s["name"] for s in out["steps"]] == ["load", "fit"]
+        assert out["steps"][0]["rows_in"] is None and out["steps"][0]["rows_out"] == 100
+        assert (out["steps"][1]["rows_in"], out["steps"][1]["rows_out"]) == (100, 10)
+        assert out["steps"][1]["wall_s"] >= 0.02
+        assert out["wall_s"] >= sum(s["wall_s"] for s in out["steps"]) - 1e-3
+        assert out["steps"][0]["start"] <= out["steps"][1]["start"]
+        assert out["py_peak_mb"] is None and out["steps"][0]["py_peak_mb"] is None
+
+    def test_rows_without_step_ignored(self, no_tracing):
+        rec = instrument.Recorder("demo")
+        rec.rows(5)
+        assert rec.finish()["steps"] == []
+
+    def test_stage_peak_covers_steps(self, no_tracing):
+        outer = instrument.Span()
+        rec = instrument.Recorder("demo")
+        rec.step("allocate")
+        block = np.ones(40 * 2 ** 20 // 8)          # 40 MB, touched
+        del block                                   # returned to the OS (mmap)
+        rec.step("after")
+        out = rec.finish()
+        stage = outer.close()
+
+        peaks = [s["peak_rss_mb"] for s in out["steps"]]
+        if None in peaks:
+            pytest.skip("no RSS figures on this platform")
+        assert out["peak_rss_mb"] >= max(peaks)
+        assert stage["peak_rss_mb"] >= out["peak_rss_mb"]
+        if out["rss_scope"] == "span":
+            assert peaks[0] >= peaks[1] + 20
+
+
+class TestTracemalloc:
+
+    def test_enabled_by_env(self, no_tracing, monkeypatch):
+        monkeypatch.setenv(instrument.TRACEMALLOC_ENV, "1")
+        rec = instrument.Recorder("demo")
+        rec.step("small")
+        small = [0] * 1000
+        rec.step("big")
+        big = bytearray(8 * 2 ** 20)
+        out = rec.finish()
+        del small, big
+
+        assert tracemalloc.is_tracing()
+        small_mb, big_mb = (s["py_peak_mb"] for s in out["steps"])
+        assert big_mb >= 8 and small_mb < 1
+        assert out["py_peak_mb"] >= big_mb
+
+
+class TestChromeTrace:
+
+    RECORDS = [
+        {"stage": "parse", "pid": 7, "start": 100.0, "wall_s": 2.0, "cpu_s": 1.5,
+         "steps": [{"name": "Load JSON", "start": 100.0, "wall_s": 0.5, "rows_out": 12},
+                   {"name": "Write SQLite", "start": 100.5, "wall_s": 1.5, "rows_in": 12}]},
+        {"stage": "topics", "pid": 8, "start": 102.0, "wall_s": 0.1, "cached": True,
+         "steps": []},
+        {"stage": "never-ran", "start": None},
+    ]
+
+    def test_events(self):
+        trace = instrument.chrome_trace(self.RECORDS)
+        complete = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        assert [e["name"] for e in complete] == ["parse", "Load JSON", "Write SQLite",
+                                                 "topics (cached)"]
+        parse, load, write, topics = complete
+        assert (parse["ts"], parse["dur"], parse["pid"]) == (0, 2_000_000, 7)
+        assert (write["ts"], write["dur"], write["cat"]) == (500_000, 1_500_000, "parse")
+        assert load["args"] == {"rows_out": 12} and parse["args"] == {"cpu_s": 1.5}
+        assert topics["ts"] == 2_000_000 and topics["pid"] == 8
+        assert {e["pid"] for e in trace["traceEvents"] if e["ph"] == "M"} == {7, 8}
+
+    def test_write(self, tmp_path):
+        path = instrument.write_chrome_trace(self.RECORDS, tmp_path / "sub" / "trace.json")
+        assert json.loads(path.read_text())["displayTimeUnit"] == "ms"
@@ -0,0 +1,227 @@
+"""
+Tests for pipeline/jobs.py
+
+Run with:  pytest tests/
+
+Covers:
+    - submit / get / latest / list_jobs  (queued row, options decoded,
+                                          newest job per work directory,
+                                          unknown stages rejected)
+    - cancel()      (queued job dropped at once, finished job untouched,
+                     running job's process terminated)
+    - work()        (failed stage → failed job with partial results,
+                     orphaned running jobs failed on start-up, a second
+                     worker refuses to start)
+    - ensure_worker (real worker process runs precheck + parse and exits
+                     when idle; results loadable after it has gone;
+                     frozen builds start it through launcher.py's
+                     FROZEN_ARG instead of -m)
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import launcher
+from pipeline import jobs, runner, synthetic
+
+
+def _wait(jobs_dir, job_id, statuses, timeout=60.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(jobs_dir, job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} still {job['status']!r} after {timeout}s")
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A reaped-late zombie still answers kill(0); check its state
+    try:
+        with open(f"/proc/{pid}/stat") as fh:
+            return fh.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return True
+
+
+@pytest.fixture
+def in_process_worker(tmp_path):
+    """Run work() in a thread so jobs fork from this (monkeypatched) process."""
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("job processes must be forked to see monkeypatched stages")
+    threads = []
+
+    def _start(idle_exit_s=0.5):
+        t = threading.Thread(target=jobs.work, args=(tmp_path / "jobs",),
+                             kwargs={"idle_exit_s": idle_exit_s, "poll_s": 0.05})
+        t.start()
+        threads.append(t)
+        return t
+
+    yield _start
+    for t in threads:
+        t.join(30)
+
+
+class TestTable:
+
+    def test_submit_and_get(self, tmp_path):
+        job_id = jobs.submit(tmp_path / "jobs", tmp_path / "c.json", tmp_path / "work",
+                             stages=["profile", "topics"], config={"topics": {"n_init": 2}},
+                             n_workers=2, start_worker=False)
+        job = jobs.get(tmp_path / "jobs", job_id)
+        assert job["status"] == "queued" and job["stages"] == ["profile", "topics"]
+        assert job["options"]["config"] == {"topics": {"n_init": 2}}
+        assert job["options"]["n_workers"] == 2 and job["options"]["cache_dir"] is None
+        assert job["work_dir"] == str((tmp_path / "work").resolve())
+        assert jobs.get(tmp_path / "jobs", "nope") is None
+
+    def test_latest_and_list(self, tmp_path):
+        d = tmp_path / "jobs"
+        a = jobs.submit(d, "c.json", tmp_path / "a", stages=["parse"], start_worker=False)
+        b = jobs.submit(d, "c.json", tmp_path / "b", start_worker=False)
+        a2 = jobs.submit(d, "c.json", tmp_path / "a", stages=["profile"], start_worker=False)
+        assert jobs.latest(d, tmp_path / "a")["job_id"] == a2
+        assert jobs.latest(d, tmp_path / "c") is None
+        assert [j["job_id"] for j in jobs.list_jobs(d, work_dir=tmp_path / "a")] == [a, a2]
+        assert [j["job_id"] for j in jobs.list_jobs(d, limit=2)] == [b, a2]
+        assert jobs.get(d, b)["stages"] == list(runner.STAGES)
+
+    def test_unknown_stage(self, tmp_path):
+        with pytest.raises(ValueError, match="Unknown stage"):
+            jobs.submit(tmp_path / "jobs", "c.json", tmp_path, stages=["tpoics"],
+                        start_worker=False)
+
+    def test_cancel_queued(self, tmp_path):
+        d = tmp_path / "jobs"
+        job_id = jobs.submit(d, "c.json", tmp_path, start_worker=False)
+        assert jobs.cancel(d, job_id)
+        assert jobs.get(d, job_id)["status"] == "cancelled"
+        assert not jobs.cancel(d, job_id)
+        assert jobs.work(d, idle_exit_s=0.0, poll_s=0.01) == 0      # nothing left to run
+
+
+class TestWorker:
+
+    def test_cancel_running(self, tmp_path, monkeypatch, in_process_worker):
+        def _slow(ctx, cfg):
+            for i in range(600):
+                ctx["progress"](i / 600, f"step {i}")
+                time.sleep(0.1)
+            return {}
+
+        monkeypatch.setitem(runner._STAGE_FUNCS, "parse", _slow)
+        d = tmp_path / "jobs"
+        job_id = jobs.submit(d, tmp_path / "c.json", tmp_path / "work", stages=["parse"],
+                             start_worker=False)
+        in_process_worker()
+
+        deadline = time.monotonic() + 30
+        while (job := jobs.get(d, job_id))["stage"] != "parse":
+            assert time.monotonic() < deadline, job
+            time.sleep(0.05)
+        assert job["status"] == "running" and job["message"].startswith("step")
+
+        assert jobs.cancel(d, job_id)
+        job = _wait(d, job_id, jobs.FINISHED, timeout=20)
+        assert job["status"] == "cancelled"
+        assert not _alive(job["pid"])
+        assert jobs.load_results(d, job_id) is None
+
+    def test_failed_stage(self, tmp_path, monkeypatch, in_process_worker):
+        def _boom(ctx, cfg):
+            raise RuntimeError("no topics today")
+
+        monkeypatch.setitem(runner._STAGE_FUNCS, "profile", lambda ctx, cfg: {"months_scored": 3})
+        monkeypatch.setitem(runner._STAGE_FUNCS, "topics", _boom)
+        d = tmp_path / "jobs"
+        job_id = jobs.submit(d, tmp_path / "c.json", tmp_path / "work",
+                             stages=["profile", "topics"], start_worker=False)
+        in_process_worker()
+
+        job = _wait(d, job_id, jobs.FINISHED)
+        assert job["status"] == "failed"
+        assert job["error"] == "topics: RuntimeError: no topics today"
+        summary, results = jobs.load_results(d, job_id)
+        assert results == {"profile": {"months_scored": 3}}
+        assert not summary["ok"]
+
+    def test_orphans_and_second_worker(self, tmp_path):
+        d = tmp_path / "jobs"
+        job_id = jobs.submit(d, "c.json", tmp_path, start_worker=False)
+        jobs._update(d, job_id, status="running")
+        assert jobs.work(d, idle_exit_s=0.0, poll_s=0.01) == 0
+        job = jobs.get(d, job_id)
+        assert job["status"] == "failed" and "worker stopped" in job["error"]
+
+        # A fresh heartbeat from another process: this one must not start
+        con = jobs._table(d)
+        con.execute("INSERT OR REPLACE INTO worker (id, pid, heartbeat) VALUES (1, ?, ?)",
+                    (os.getpid() + 1, time.time()))
+        con.commit()
+        con.close()
+        assert jobs.work(d, idle_exit_s=0.0) == -1
+
+
+class TestWorkerProcess:
+
+    def test_end_to_end(self, tmp_path):
+        export = tmp_path / "c.json"
+        synthetic.write_export(export, "chatgpt", {"n_messages": 1_200, "months": 3})
+        d = tmp_path / "jobs"
+        job_id = jobs.submit(d, export, tmp_path / "work", stages=["precheck", "parse"],
+                             start_worker=False)
+        pid = jobs.ensure_worker(d, idle_exit_s=1.0)
+        assert pid is not None
+        assert jobs.ensure_worker(d, idle_exit_s=1.0) is None        # already alive
+
+        job = _wait(d, job_id, jobs.FINISHED)
+        assert job["status"] == "done", job
+        assert job["fraction"] == 1.0 and job["error"] is None
+
+        summary, results = jobs.load_results(d, job_id)
+        assert summary["ok"]
+        assert results["precheck"].format == "chatgpt"
+        assert results["parse"]["messages"] == 1_200
+        assert (tmp_path / "work" / "conversations.db").is_file()
+
+        deadline = time.monotonic() + 30
+        while _alive(pid):
+            assert time.monotonic() < deadline, "worker did not exit when idle"
+            time.sleep(0.1)
+
+
+class TestWorkerCommand:
+
+    def test_from_source(self, tmp_path, monkeypatch):
+        monkeypatch.delattr(sys, "frozen", raising=False)
+        cmd = jobs._worker_command(tmp_path, 5.0)
+        assert cmd == [sys.executable, "-m", "pipeline.jobs", "worker",
+                       "--dir", str(tmp_path), "--idle-exit", "5.0"]
+
+    def test_frozen(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sys, "frozen", True, raising=False)
+        monkeypatch.setattr(sys, "executable", "/opt/DOL_Analyser/DOL_Analyser")
+        cmd = jobs._worker_command(tmp_path, 5.0)
+        assert cmd == ["/opt/DOL_Analyser/DOL_Analyser", jobs.FROZEN_ARG, "worker",
+                       "--dir", str(tmp_path), "--idle-exit", "5.0"]
+
+        # launcher.main() hands that command line to the jobs CLI, not Streamlit
+        calls = []
+        monkeypatch.setattr(jobs, "main", lambda argv: calls.append(argv) or 0)
+        monkeypatch.setattr(sys, "argv", cmd)
+        with pytest.raises(SystemExit) as exc:
+            launcher.main()
+        assert exc.value.code == 0
+        assert calls == [cmd[2:]]
@@ -0,0 +1,216 @@
+"""
+Tests for pipeline/lexicon.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Matching semantics  (identical to one boundary regex per marker)
+    - Overlapping markers (shared terms, phrase prefixes across markers)
+    - Chunked scoring     (process pool gives the same records as in-process)
+    - Lexicon packs       (.json / .txt loading, validation, compiled cache)
+    - SQLite storage      (message_markers rows, SQL trajectories)
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import sqlite3
+
+import pytest
+
+from pipeline import lexicon as lexicon_mod
+from pipeline.lexicon import (
+    compile_cached,
+    compile_lexicon,
+    load_packs,
+    score_chunks,
+    score_rows,
+    trajectory,
+    write_message_markers,
+)
+from pipeline.profile import MARKERS
+
+
+def _reference_count(text: str, words: list[str]) -> int:
+    """The original per-marker matcher: one boundary regex + findall."""
+    escaped = sorted(map(re.escape, words), key=len, reverse=True)
+    pattern = re.compile(r"(?<!\w)(" + "|".join(escaped) + r")(?!\w)", re.IGNORECASE)
+    return len(pattern.findall(text))
+
+
+OVERLAPPING = {
+    "a": ["not sure", "sure", "model", "data model", "i guess"],
+    "b": ["not", "sure thing", "model-based", "guess"],
+    "c": ["data", "data model layer", "model"],
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Matching semantics
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestMatching:
+
+    def test_profile_markers_match_reference(self):
+        lex = compile_lexicon(MARKERS)
+        text = (
+            "Maybe the Framework is a system-level design; I'm not sure. "
+            "Perhaps perhapsx maybe_not, I guess the pipeline's schema… I WONDER."
+        )
+        expected = [_reference_count(text, MARKERS[m]) for m in lex.markers]
+        assert lex.count(text) == expected
+
+    def test_overlapping_markers_match_reference(self):
+        lex = compile_lexicon(OVERLAPPING)
+        text = "Not sure thing: the data model layer vs a data model-based model, i guess."
+        expected = [_reference_count(text, OVERLAPPING[m]) for m in lex.markers]
+        assert lex.count(text) == expected
+
+    def test_randomised_texts_match_reference(self):
+        lex = compile_lexicon(OVERLAPPING)
+        vocab = ["not", "sure", "thing", "data", "model", "layer", "based", "i",
+                 "guess", "x", "-", ",", "_", "Model", "SURE"]
+        rng = random.Random(0)
+        for _ in range(300):
+            text = "".join(
+                rng.choice(vocab) + rng.choice([" ", "", "-", ". "])
+                for _ in range(rng.randint(1, 25))
+            )
+            expected = [_reference_count(text, OVERLAPPING[m]) for m in lex.markers]
+            assert lex.count(text) == expected, text
+
+    def test_non_string_scores_zero(self):
+        lex = compile_lexicon(MARKERS)
+        assert lex.count(None) == [0, 0]
+
+
+class TestChunkedScoring:
+
+    def test_pool_matches_in_process(self):
+        lex = compile_lexicon(OVERLAPPING)
+        rows = [(f"n{i}", "not sure, the data model " * (i % 4)) for i in range(200)]
+        chunks = [rows[i:i + 30] for i in range(0, len(rows), 30)]
+
+        serial = list(score_chunks(lex, chunks, n_workers=1))
+        pooled = list(score_chunks(lex, iter(chunks), n_workers=2))
+
+        assert pooled == serial
+        assert sum(n for n, _ in pooled) == len(rows)
+        assert [r for _, recs in serial for r in recs] == score_rows(lex, rows)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lexicon packs
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestPacks:
+
+    def test_json_and_txt_packs(self, tmp_path):
+        (tmp_path / "style.json").write_text(json.dumps({
+            "name": "style",
+            "markers": {
+                "certainty": {"terms": ["definitely", "clearly"], "two_tailed": False},
+                "politeness": ["please", "thank you"],
+            },
+        }))
+        (tmp_path / "hedges.txt").write_text("# hedging words\nkind of\n\nsort of  # phrase\n")
+
+        markers, tails = load_packs([tmp_path], reserved=MARKERS)
+        assert list(markers) == ["hedges", "certainty", "politeness"]
+        assert markers["hedges"] == ["kind of", "sort of"]
+        assert tails == {"hedges": True, "certainty": False, "politeness": True}
+
+    def test_duplicate_marker_rejected(self, tmp_path):
+        (tmp_path / "structural_thinking.txt").write_text("model\n")
+        with pytest.raises(ValueError, match="already defined"):
+            load_packs([tmp_path], reserved=MARKERS)
+
+    def test_malformed_pack_rejected(self, tmp_path):
+        bad = tmp_path / "bad.json"
+        bad.write_text(json.dumps({"markers": {"x": {"terms": "not-a-list"}}}))
+        with pytest.raises(ValueError, match="list of string terms"):
+            load_packs([bad])
+
+    def test_compiled_lexicon_is_cached(self, tmp_path, monkeypatch):
+        first = compile_cached(OVERLAPPING, tmp_path)
+        assert len(list(tmp_path.glob("lexicon-*.pkl"))) == 1
+
+        def _fail(_):
+            raise AssertionError("cache miss")
+        monkeypatch.setattr(lexicon_mod, "compile_lexicon", _fail)
+
+        again = compile_cached(OVERLAPPING, tmp_path)
+        text = "not sure thing, data model layer"
+        assert again.count(text) == first.count(text)
+
+    def test_no_cache_dir_writes_nothing(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+        monkeypatch.setenv("HOME", str(tmp_path / "home"))
+        lex = compile_cached(OVERLAPPING)
+        assert lex.markers == tuple(OVERLAPPING)
+        assert not any(tmp_path.rglob("*.pkl"))
+
+    def test_changed_terms_change_cache_key(self, tmp_path):
+        compile_cached(OVERLAPPING, tmp_path)
+        compile_cached({**OVERLAPPING, "c": ["data"]}, tmp_path)
+        assert len(list(tmp_path.glob("lexicon-*.pkl"))) == 2
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SQLite storage
+# ─────────────────────────────────────────────────────────────────────────────
+
+@pytest.fixture()
+def db(tmp_path):
+    con = sqlite3.connect(tmp_path / "t.db")
+    con.executescript("""
+        CREATE TABLE messages (node_id TEXT, thread_id TEXT, role TEXT,
+                               timestamp REAL, year_month TEXT, text TEXT);
+    """)
+    con.executemany(
+        "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            ("n1", "t1", "user",      1_700_000_000, "2023-11", "maybe a model"),
+            ("n2", "t1", "assistant", 1_700_000_060, "2023-11", "maybe maybe"),
+            ("n3", "t2", "user",      1_702_000_000, "2023-12", "no markers"),
+            ("n4", "t2", "user",      1_702_000_060, "2023-12", "perhaps, perhaps"),
+        ],
+    )
+    con.commit()
+    yield con
+    con.close()
+
+
+class TestStorage:
+
+    def test_only_nonzero_counts_stored(self, db):
+        lex = compile_lexicon(MARKERS)
+        rows = db.execute("SELECT node_id, text FROM messages WHERE role = 'user'").fetchall()
+        write_message_markers(db, score_rows(lex, rows))
+
+        stored = set(db.execute("SELECT node_id, marker, count FROM message_markers"))
+        assert stored == {
+            ("n1", "structural_thinking", 1),
+            ("n1", "epistemic_uncertainty", 1),
+            ("n4", "epistemic_uncertainty", 2),
+        }
+
+    def test_monthly_and_thread_trajectories(self, db):
+        lex = compile_lexicon(MARKERS)
+        rows = db.execute("SELECT node_id, text FROM messages WHERE role = 'user'").fetchall()
+        write_message_markers(db, score_rows(lex, rows))
+
+        monthly = trajectory(None, MARKERS, by="month", con=db)
+        assert monthly["period"].tolist() == ["2023-11", "2023-12"]
+        assert monthly["user_messages"].tolist() == [1, 2]
+        assert monthly["epistemic_uncertainty_count"].tolist() == [1, 2]
+
+        by_thread = trajectory(None, MARKERS, by="thread", min_messages=2, con=db)
+        assert by_thread["period"].tolist() == ["t2"]
+        assert by_thread["structural_thinking_count"].tolist() == [0]
+
+    def test_unknown_grouping_raises(self, db):
+        with pytest.raises(ValueError, match="Unknown grouping"):
+            trajectory(None, MARKERS, by="year", con=db)
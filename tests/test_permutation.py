@@ -0,0 +1,165 @@
+"""
+Tests for pipeline/permutation.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Serial stream   (identical to a per-replicate rng.permutation loop)
+    - Parallel streams (SeedSequence.spawn chunks, independent of worker count;
+                        drawn SeedSequence where numpy < 1.25 has no seed_seq)
+    - Early stopping  (Besag–Clifford and confidence-interval rules)
+    - Tails, ties and non-finite values
+"""
+
+from __future__ import annotations
+
+from functools import partial
+
+import numpy as np
+import pytest
+
+from pipeline.permutation import _seed_sequence, permutation_test
+
+
+def _mean_of_first_half(x: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    return x[idx][..., : idx.shape[-1] // 2].mean(axis=-1)
+
+
+def _two_draws(x: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    return np.stack([x[idx[:, 0]][:, 0], x[idx[:, 1]][:, -1]], axis=1)
+
+
+X = np.arange(12, dtype=float)
+
+
+class TestSerialStream:
+
+    def test_matches_permutation_loop(self):
+        observed = X[:6].mean() + 2.0
+        rng = np.random.default_rng(3)
+        null = np.array([rng.permutation(X)[:6].mean() for _ in range(777)])
+
+        res = permutation_test(
+            partial(_mean_of_first_half, X), n=12, observed=observed,
+            n_permutations=777, seed=3, max_block_cells=100, keep_null=True,
+        )
+        np.testing.assert_array_equal(res.null, null)
+        assert res.p_value == float(np.mean(null >= observed))
+        assert res.n_permutations == 777 and not res.stopped_early
+
+    def test_shared_generator_continues_stream(self):
+        rng = np.random.default_rng(0)
+        expected = [rng.permutation(12) for _ in range(10)]
+
+        rng = np.random.default_rng(0)
+        first = permutation_test(lambda idx: idx[:, 0], 12, 0, 4, rng=rng, keep_null=True)
+        second = permutation_test(lambda idx: idx[:, 0], 12, 0, 6, rng=rng, keep_null=True)
+        got = np.concatenate([first.null, second.null])
+        np.testing.assert_array_equal(got, [e[0] for e in expected])
+
+    def test_draws_per_replicate_interleave(self):
+        rng = np.random.default_rng(5)
+        expected = []
+        for _ in range(50):
+            p1, p2 = rng.permutation(12), rng.permutation(12)
+            expected.append((X[p1][0], X[p2][-1]))
+
+        res = permutation_test(
+            partial(_two_draws, X), n=12, observed=[0.0, 0.0], n_permutations=50,
+            seed=5, draws_per_replicate=2, keep_null=True, max_block_cells=48,
+        )
+        np.testing.assert_array_equal(res.null, np.array(expected))
+
+
+class _OldNumpyGenerator:
+    """A Generator whose bit generator hides seed_seq, as before numpy 1.25."""
+
+    def __init__(self, seed):
+        self._rng = np.random.default_rng(seed)
+        self.bit_generator = object()
+
+    def integers(self, *args, **kwargs):
+        return self._rng.integers(*args, **kwargs)
+
+
+class TestParallel:
+
+    def test_reproducible_and_independent_of_worker_count(self):
+        kwargs = dict(n=12, observed=7.0, n_permutations=2_500, seed=11, chunk_size=400)
+        stat = partial(_mean_of_first_half, X)
+        a = permutation_test(stat, n_workers=2, keep_null=True, **kwargs)
+        b = permutation_test(stat, n_workers=3, keep_null=True, **kwargs)
+        np.testing.assert_array_equal(a.null, b.null)
+        assert a.n_permutations == 2_500
+        assert 0.0 < a.p_value < 0.1
+
+    def test_generator_without_seed_seq(self):
+        rng = np.random.default_rng(4)
+        assert _seed_sequence(rng) is rng.bit_generator.seed_seq
+
+        a = _seed_sequence(_OldNumpyGenerator(4))
+        b = _seed_sequence(_OldNumpyGenerator(4))
+        assert isinstance(a, np.random.SeedSequence) and a.entropy == b.entropy
+
+        kwargs = dict(n=12, observed=7.0, n_permutations=800, chunk_size=300, keep_null=True)
+        stat = partial(_mean_of_first_half, X)
+        r1 = permutation_test(stat, n_workers=2, rng=_OldNumpyGenerator(9), **kwargs)
+        r2 = permutation_test(stat, n_workers=2, rng=_OldNumpyGenerator(9), **kwargs)
+        np.testing.assert_array_equal(r1.null, r2.null)
+        assert r1.n_permutations == 800
+
+
+class TestEarlyStopping:
+
+    def test_besag_clifford_stops_on_large_p(self):
+        res = permutation_test(
+            partial(_mean_of_first_half, X), n=12, observed=0.0,
+            n_permutations=100_000, seed=0, early_stop="besag-clifford", h=10,
+            max_block_cells=12 * 50,
+        )
+        assert res.stopped_early
+        assert res.n_permutations == 50
+        assert res.p_value == 1.0
+
+    def test_confidence_rule_stops_on_tiny_p(self):
+        res = permutation_test(
+            partial(_mean_of_first_half, X), n=12, observed=X[6:].mean(),
+            n_permutations=200_000, seed=0, early_stop="confidence",
+            max_block_cells=12 * 1_000,
+        )
+        assert res.stopped_early
+        assert res.n_permutations < 200_000
+        assert res.p_value < 0.05
+
+    def test_unknown_rule_raises(self):
+        with pytest.raises(ValueError, match="early_stop"):
+            permutation_test(lambda idx: idx[:, 0], 4, 0, 10, early_stop="bogus")
+
+
+class TestTails:
+
+    def test_alternatives_per_statistic(self):
+        stat = lambda idx: np.stack([idx[:, 0] - 5.5, idx[:, 0] - 5.5, idx[:, 0] - 5.5], axis=1)
+        res = permutation_test(
+            stat, n=12, observed=[5.5, -5.5, 5.5], n_permutations=12_000, seed=1,
+            alternative=["greater", "less", "two-sided"],
+        )
+        # one value of 12 ≥ 5.5, one ≤ -5.5, two with |·| ≥ 5.5
+        np.testing.assert_allclose(res.p_value, [1 / 12, 1 / 12, 2 / 12], atol=0.01)
+
+    def test_non_finite_values(self):
+        stat = lambda idx: np.where(idx[:, 0] < 6, np.nan, idx[:, 0].astype(float))
+        res = permutation_test(stat, n=12, observed=9.0, n_permutations=1_000, seed=2)
+        assert res.n_valid < 1_000
+        assert res.p_value == pytest.approx(3 / 6, abs=0.08)
+
+        nan_obs = permutation_test(stat, n=12, observed=np.nan, n_permutations=10, seed=2)
+        assert np.isnan(nan_obs.p_value)
+
+    def test_relative_tolerance_counts_near_ties(self):
+        stat = lambda idx: np.full(idx.shape[0], 0.3)
+        observed = 0.1 + 0.2   # 0.30000000000000004
+        strict = permutation_test(stat, 4, observed, 10, seed=0)
+        tolerant = permutation_test(stat, 4, observed, 10, seed=0, rtol=1e-9)
+        assert strict.p_value == 0.0
+        assert tolerant.p_value == 1.0
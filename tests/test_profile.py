@@ -0,0 +1,54 @@
+"""
+Tests for pipeline/profile.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Permutation p-value (batched null identical to the per-replicate spearmanr loop)
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from scipy.stats import spearmanr
+
+from pipeline.profile import _permutation_p
+
+
+def _reference_p(observed, x, y, n_perms, seed, two_tailed):
+    """The original implementation: one spearmanr call per permutation."""
+    rng = np.random.default_rng(seed)
+    null = np.array([spearmanr(x, rng.permutation(y)).statistic for _ in range(n_perms)])
+    if two_tailed:
+        return float(np.mean(np.abs(null) >= abs(observed)))
+    return float(np.mean(null >= observed))
+
+
+class TestPermutationP:
+
+    @pytest.mark.parametrize("two_tailed", [False, True])
+    @pytest.mark.parametrize("decimals", [0, 3])   # 0 → many tied values
+    def test_matches_reference_for_same_seed(self, two_tailed, decimals):
+        rng = np.random.default_rng(7)
+        for seed in range(5):
+            T = int(rng.integers(5, 30))
+            x = np.arange(1, T + 1, dtype=float)
+            y = np.round(rng.random(T) * 5 + 0.05 * x, decimals)
+            observed = spearmanr(x, y).statistic
+            expected = _reference_p(observed, x, y, 500, seed, two_tailed)
+            got = _permutation_p(observed, x, y, n_perms=500, seed=seed,
+                                 two_tailed=two_tailed, max_block_cells=200)
+            assert got == expected
+
+    def test_block_size_does_not_change_result(self):
+        x = np.arange(1, 13, dtype=float)
+        y = np.random.default_rng(0).random(12)
+        rho = spearmanr(x, y).statistic
+        ps = {_permutation_p(rho, x, y, n_perms=1_000, max_block_cells=c)
+              for c in (12, 120, 1_000_000)}
+        assert len(ps) == 1
+
+    def test_perfect_trend_is_significant(self):
+        x = np.arange(1, 21, dtype=float)
+        assert _permutation_p(1.0, x, x * 2, n_perms=2_000) == 0.0
@@ -0,0 +1,175 @@
+"""
+Tests for pipeline/profiling.py
+
+Run with:  pytest tests/
+
+Covers:
+    - mode()                (off by default, aliases, unknown values rejected)
+    - profiled()            (no-op when off; cprofile and sample dumps written
+                             to DOL_PROFILE_DIR or <work dir>/profiles; dumps
+                             written when the stage raises; signature kept)
+    - collapsed_from_stats  (stacks rooted at the stage, nested calls, weights
+                             add up to the profiled time)
+    - sampler               (stacks start at the profiled function; samples
+                             caught in profile_stage / contextlib teardown
+                             dropped)
+    - runner --profile      (dumps for every stage, summary entry)
+"""
+
+from __future__ import annotations
+
+import inspect
+import json
+import pstats
+import time
+
+import pytest
+
+from pipeline import profiling, runner
+
+
+def _spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def _inner() -> None:
+    _spin(0.15)
+
+
+def _outer(db_path, out_dir=None, fail=False) -> str:
+    _inner()
+    _spin(0.05)
+    if fail:
+        raise RuntimeError("stage failed")
+    return "done"
+
+
+staged = profiling.profiled("demo")(_outer)
+
+
+def _short(db_path) -> None:
+    _spin(0.01)
+
+
+short_staged = profiling.profiled("short")(_short)
+
+
+def _read_collapsed(path) -> dict[str, int]:
+    out = {}
+    for line in path.read_text().splitlines():
+        stack, weight = line.rsplit(" ", 1)
+        out[stack] = int(weight)
+    return out
+
+
+@pytest.fixture
+def env(monkeypatch):
+    for name in (profiling.PROFILE_ENV, profiling.PROFILE_DIR_ENV, profiling.INTERVAL_ENV):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+class TestMode:
+
+    @pytest.mark.parametrize("value, expected", [
+        ("", None), ("0", None), ("1", "cprofile"), ("cprofile", "cprofile"),
+        ("SAMPLE", "sample"),
+    ])
+    def test_values(self, env, value, expected):
+        env.setenv(profiling.PROFILE_ENV, value)
+        assert profiling.mode() == expected
+
+    def test_unknown(self, env):
+        env.setenv(profiling.PROFILE_ENV, "perf")
+        with pytest.raises(ValueError, match="DOL_PROFILE"):
+            profiling.mode()
+
+
+class TestProfiled:
+
+    def test_off(self, env, tmp_path):
+        assert staged(tmp_path / "x.db") == "done"
+        assert not (tmp_path / "profiles").exists()
+
+    def test_signature_kept(self):
+        assert list(inspect.signature(staged).parameters) == ["db_path", "out_dir", "fail"]
+
+    def test_cprofile(self, env, tmp_path):
+        env.setenv(profiling.PROFILE_ENV, "cprofile")
+        assert staged(tmp_path / "x.db") == "done"
+        out = tmp_path / "profiles"
+        assert {p.name for p in out.iterdir()} == {"demo.prof", "demo.collapsed", "demo.txt"}
+
+        stats = pstats.Stats(str(out / "demo.prof"))
+        assert any(name == "_outer" for _, _, name in stats.stats)
+
+        stacks = _read_collapsed(out / "demo.collapsed")
+        assert all(s.startswith("_outer (test_profiling.py") for s in stacks)
+        inner = sum(w for s, w in stacks.items() if "_inner" in s)
+        total = sum(stacks.values())
+        assert 0.15e6 <= inner and 0.2e6 <= total <= 0.4e6
+        assert "_outer" in (out / "demo.txt").read_text()
+
+    def test_sample(self, env, tmp_path):
+        env.setenv(profiling.PROFILE_ENV, "sample")
+        env.setenv(profiling.INTERVAL_ENV, "2")
+        env.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path / "dumps"))
+        staged(tmp_path / "x.db")
+        out = tmp_path / "dumps"
+        assert {p.name for p in out.iterdir()} == {"demo.collapsed", "demo.txt"}
+
+        stacks = _read_collapsed(out / "demo.collapsed")
+        assert stacks and all(s.startswith("_outer (test_profiling.py") for s in stacks)
+        inner = sum(w for s, w in stacks.items() if ";_inner (" in s)
+        assert inner >= sum(stacks.values()) / 2
+        assert "samples every 2 ms" in (out / "demo.txt").read_text()
+
+    def test_sample_drops_teardown_frames(self, env, tmp_path):
+        # Hold the sampler open after the stage returns so it is sure to see
+        # the thread inside contextlib's __exit__ and profile_stage's finally
+        stop = profiling._Sampler.stop
+
+        def _late_stop(self):
+            _spin(0.05)
+            return stop(self)
+
+        env.setattr(profiling._Sampler, "stop", _late_stop)
+        env.setenv(profiling.PROFILE_ENV, "sample")
+        env.setenv(profiling.INTERVAL_ENV, "1")
+        env.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+        short_staged(tmp_path / "x.db")
+
+        stacks = _read_collapsed(tmp_path / "short.collapsed")
+        assert stacks
+        roots = {s.split(";")[0] for s in stacks}
+        assert not any("(profiling.py:" in r or "(contextlib.py:" in r for r in roots), roots
+        assert all(r.startswith("_short (test_profiling.py") for r in roots)
+
+    def test_failure_still_dumps(self, env, tmp_path):
+        env.setenv(profiling.PROFILE_ENV, "1")
+        with pytest.raises(RuntimeError):
+            staged(tmp_path / "x.db", fail=True)
+        assert (tmp_path / "profiles" / "demo.collapsed").stat().st_size > 0
+
+    def test_dir_from_out_dir(self, env, tmp_path):
+        env.setenv(profiling.PROFILE_ENV, "1")
+        profiling.profiled("demo")(lambda out_dir: None)(tmp_path / "work")
+        assert (tmp_path / "work" / "profiles" / "demo.prof").exists()
+
+
+class TestRunner:
+
+    def test_profile_flag(self, env, tmp_path):
+        # main() sets both variables; registering them here restores them afterwards
+        env.setenv(profiling.PROFILE_ENV, "0")
+        env.setenv(profiling.PROFILE_DIR_ENV, "")
+        export = tmp_path / "conversations.json"
+        export.write_text(json.dumps([]))
+        work = tmp_path / "work"
+        runner.main([str(export), "--out", str(work), "--stages", "precheck",
+                     "--no-cache", "--quiet", "--profile", "sample"])
+        summary = json.loads((work / "run_summary.json").read_text())
+        assert summary["profiling"] == {"mode": "sample", "dir": str((work / "profiles").resolve())}
+        assert (work / "profiles" / "precheck.txt").exists()
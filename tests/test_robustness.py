@@ -0,0 +1,200 @@
+"""
+Tests for pipeline/robustness.py
+
+Run with:  pytest tests/
+
+Covers:
+    - Grid search   (one curves CSV per (K, SVD) cell, pooled == in-process,
+                     instrumentation steps)
+    - Monthly curves (entropy / JS reduction from labels)
+    - Null models    (block counts, within-month shuffles, downsampling, CSV)
+    - DOL_PROFILE    (run() writes robustness profile dumps)
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import profiling, robustness
+from pipeline.robustness import (
+    _block_counts,
+    _monthly_curves,
+    _null_distributions,
+    _within_month_order,
+)
+
+_TOPICS = [
+    "python pandas dataframe merge index column",
+    "garden tomato soil compost seedling watering",
+    "guitar chord melody rhythm scale practice",
+    "budget savings invoice expense ledger account",
+]
+
+
+@pytest.fixture()
+def db(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(240):
+        words = _TOPICS[int(rng.integers(len(_TOPICS)))].split()
+        text = " ".join(rng.choice(words, size=6))
+        month = f"2024-{1 + i % 4:02d}"
+        role = "user" if (i // 4) % 2 == 0 else "assistant"
+        rows.append((f"n{i}", role, month, text))
+
+    path = tmp_path / "t.db"
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE messages (node_id TEXT, role TEXT, year_month TEXT, text TEXT)")
+    con.executemany("INSERT INTO messages VALUES (?, ?, ?, ?)", rows)
+    con.commit()
+    con.close()
+    return path
+
+
+@pytest.fixture()
+def clustered_db(db):
+    con = sqlite3.connect(db)
+    ids = [r[0] for r in con.execute("SELECT node_id FROM messages ORDER BY rowid")]
+    clusters = np.random.default_rng(5).integers(0, 3, len(ids))
+    con.execute("CREATE TABLE node_to_fine_cluster (node_id TEXT PRIMARY KEY, cluster_id INT)")
+    con.executemany(
+        "INSERT INTO node_to_fine_cluster VALUES (?, ?)",
+        [(nid, int(c)) for nid, c in zip(ids, clusters)],
+    )
+    con.commit()
+    con.close()
+    return db
+
+
+def _codes(rng, n=400, months=5, k=4):
+    month = np.sort(rng.integers(0, months, n))
+    return {
+        "month":   month,
+        "is_user": rng.random(n) < 0.5,
+        "cluster": rng.integers(0, k, n),
+        "months":  np.array([f"2024-{m + 1:02d}" for m in range(months)], dtype=object),
+        "k":       k,
+    }
+
+
+_SMALL_GRID = {"k_values": [2, 4], "svd_values": [3, 6], "n_init": 1, "null_models": []}
+
+
+class TestGrid:
+
+    def test_writes_one_curve_per_cell(self, db, tmp_path):
+        out = tmp_path / "out"
+        summary = robustness.run(db, out, config={**_SMALL_GRID, "n_workers": 1})
+
+        assert summary["svd_computed"] == 6
+        assert {(g["k"], g["svd"]) for g in summary["grid"]} == {
+            (2, 3), (2, 6), (4, 3), (4, 6)
+        }
+        for k in (2, 4):
+            for d in (3, 6):
+                df = pd.read_csv(out / f"robustness_curves_k{k}_svd{d}.csv")
+                assert df["year_month"].tolist() == ["2024-01", "2024-02", "2024-03", "2024-04"]
+                assert (df["user_messages"] == 30).all()
+                assert (df["clusters_present"] <= k).all()
+
+        steps = [s["name"] for s in summary["instrumentation"]["steps"]]
+        assert steps == ["Load messages", "TF-IDF", "SVD", "KMeans grid", "Monthly curves"]
+
+    def test_pool_matches_in_process(self, db, tmp_path):
+        robustness.run(db, tmp_path / "a", config={**_SMALL_GRID, "n_workers": 1})
+        robustness.run(db, tmp_path / "b", config={**_SMALL_GRID, "n_workers": 2})
+        for f in sorted((tmp_path / "a").glob("robustness_curves_*.csv")):
+            pd.testing.assert_frame_equal(pd.read_csv(f), pd.read_csv(tmp_path / "b" / f.name))
+
+
+class TestMonthlyCurves:
+
+    def test_entropy_and_js(self):
+        labels = np.array([0, 1, 0, 1, 0, 0])
+        is_user = np.array([True, True, False, False, True, False])
+        months = np.array(["2024-01", "2024-02"], dtype=object)
+        codes = np.array([0, 0, 0, 0, 1, 1])
+
+        df = _monthly_curves(labels, is_user, codes, months, k=2)
+
+        assert df["user_messages"].tolist() == [2, 1]
+        assert df["topic_entropy_nats"].tolist() == pytest.approx([np.log(2), 0.0])
+        assert df["js_divergence"].tolist() == pytest.approx([0.0, 0.0])
+
+
+class TestNullModels:
+
+    def test_block_counts_match_per_replicate_bincount(self):
+        rng = np.random.default_rng(0)
+        month = rng.integers(0, 3, (4, 50))
+        cluster = rng.integers(0, 5, 50)
+        counts = _block_counts(month, cluster, 3, 5)
+        for b in range(4):
+            expected = np.zeros((3, 5), dtype=int)
+            np.add.at(expected, (month[b], cluster), 1)
+            np.testing.assert_array_equal(counts[b], expected)
+
+    def test_within_month_order_stays_in_month(self):
+        rng = np.random.default_rng(1)
+        month = np.sort(rng.integers(0, 6, 200))
+        order = _within_month_order(month, 10, rng)
+        np.testing.assert_array_equal(month[order], np.broadcast_to(month, order.shape))
+        assert len({tuple(row) for row in order}) == 10
+
+    def test_role_shuffle_preserves_month_margins(self, monkeypatch):
+        codes = _codes(np.random.default_rng(2))
+        seen = []
+        real = _block_counts
+
+        def _spy(*args, **kwargs):
+            out = real(*args, **kwargs)
+            seen.append(out)
+            return out
+
+        monkeypatch.setattr("pipeline.robustness._block_counts", _spy)
+        _null_distributions(codes, "role_shuffle", 8, np.random.default_rng(0))
+        user, asst = seen
+        n_user = np.bincount(codes["month"][codes["is_user"]], minlength=5)
+        np.testing.assert_array_equal(user.sum(axis=2), np.broadcast_to(n_user, (8, 5)))
+        total = real(codes["month"], codes["cluster"], 5, 4)[0]
+        np.testing.assert_array_equal(user + asst, np.broadcast_to(total, user.shape))
+
+    def test_null_lengths_and_unknown_model(self):
+        codes = _codes(np.random.default_rng(3))
+        rng = np.random.default_rng(0)
+        nulls = _null_distributions(codes, "month_shuffle", 25, rng)
+        assert set(nulls) == {"month_heterogeneity_js", "entropy_trend_rho"}
+        assert all(len(v) == 25 for v in nulls.values())
+        with pytest.raises(ValueError, match="Unknown null model"):
+            _null_distributions(codes, "bogus", 5, rng)
+
+    def test_writes_null_tests_csv(self, clustered_db, tmp_path):
+        summary = robustness.run(
+            clustered_db, tmp_path,
+            config={"k_values": [], "n_permutations": 20, "min_msgs_per_month": 10},
+        )
+        df = pd.read_csv(tmp_path / "robustness_null_tests.csv")
+        assert list(df["null_model"]) == [
+            "month_shuffle", "month_shuffle", "role_shuffle", "volume_downsample"
+        ]
+        assert (df["n_permutations"] == 20).all()
+        assert df["p_value"].between(0, 1).all()
+        assert "grid" not in summary
+        steps = summary["instrumentation"]["steps"]
+        assert [s["name"] for s in steps] == ["Load messages", "nulls"]
+        assert steps[-1]["rows_out"] == 4
+
+    def test_null_tests_require_clusters(self, db, tmp_path):
+        with pytest.raises(ValueError, match="topics.run"):
+            robustness.run(db, tmp_path, config={"k_values": []})
+
+    def test_profiled(self, clustered_db, tmp_path, monkeypatch):
+        monkeypatch.setenv(profiling.PROFILE_ENV, "cprofile")
+        monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path / "profiles"))
+        robustness.run(clustered_db, tmp_path,
+                       config={"k_values": [], "n_permutations": 5, "min_msgs_per_month": 10})
+        assert (tmp_path / "profiles" / "robustness.prof").is_file()
@@ -0,0 +1,281 @@
+"""
+Tests for pipeline/runner.py
+
+Run with:  pytest tests/
+
+Covers:
+    - load_config      (JSON, TOML, unknown sections rejected)
+    - run()            (stage subset in-process and in worker processes,
+                        per-stage timing fields, per-step instrumentation and
+                        Chrome trace, failure → downstream stages skipped,
+                        unknown stage names)
+    - stage cache      (restore in a new work dir — instrumentation marked
+                        cached —, invalidation by config and export content,
+                        partial ancestry, unreadable entries)
+    - main()           (summary file / stdout, exit codes, stage config passed
+                        through, no Streamlit import)
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import runner
+
+BASE_TS = 1_700_000_000
+ONE_MONTH = 30 * 24 * 3600
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fixture builders
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _conversation(idx: int, ts: float, n_pairs: int = 4) -> dict:
+    root = f"c{idx}-root"
+    mapping = {root: {"id": root, "parent": None, "children": [f"c{idx}-u0"], "message": None}}
+    prev = root
+    for i in range(n_pairs):
+        for role, nid, nxt in (
+            ("user", f"c{idx}-u{i}", f"c{idx}-a{i}"),
+            ("assistant", f"c{idx}-a{i}", f"c{idx}-u{i + 1}" if i < n_pairs - 1 else None),
+        ):
+            mapping[nid] = {
+                "id": nid,
+                "parent": prev,
+                "children": [nxt] if nxt else [],
+                "message": {
+                    "author": {"role": role},
+                    "create_time": ts + len(mapping) * 60,
+                    "content": {"content_type": "text",
+                                "parts": [f"{role} message {i} in conversation {idx}"]},
+                },
+            }
+            prev = nid
+    return {"id": f"conv_{idx}", "title": f"Conversation {idx}",
+            "create_time": ts, "mapping": mapping}
+
+
+@pytest.fixture
+def export(tmp_path) -> Path:
+    """A small ChatGPT export spread over three months."""
+    convs = [_conversation(i, BASE_TS + (i % 3) * ONE_MONTH + i * 3600) for i in range(12)]
+    path = tmp_path / "conversations.json"
+    path.write_text(json.dumps(convs), encoding="utf-8")
+    return path
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Config
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestLoadConfig:
+
+    def test_json(self, tmp_path):
+        path = tmp_path / "run.json"
+        path.write_text(json.dumps({"topics": {"k": 5}, "coupling": {"n_permutations": 10}}))
+        assert runner.load_config(path) == {"topics": {"k": 5}, "coupling": {"n_permutations": 10}}
+
+    def test_toml(self, tmp_path):
+        pytest.importorskip("tomllib")
+        path = tmp_path / "run.toml"
+        path.write_text('[precheck]\nallow_not_ready = true\n\n[domains]\nn_macro = 4\n')
+        assert runner.load_config(path) == {
+            "precheck": {"allow_not_ready": True},
+            "domains": {"n_macro": 4},
+        }
+
+    def test_unknown_section(self, tmp_path):
+        path = tmp_path / "run.json"
+        path.write_text(json.dumps({"topic": {}}))
+        with pytest.raises(ValueError, match="unknown stage"):
+            runner.load_config(path)
+
+
+class TestJsonable:
+
+    def test_values(self):
+        out = runner._jsonable({
+            "n": np.int64(3),
+            "x": np.float32(0.5),
+            "nan": float("nan"),
+            "when": dt.datetime(2024, 1, 2),
+            "path": Path("a/b"),
+            "df": pd.DataFrame({"a": [1, 2]}),
+            "nested": [(1, np.bool_(True))],
+        })
+        json.dumps(out)
+        assert out["n"] == 3 and out["x"] == 0.5 and out["nan"] is None
+        assert out["when"] == "2024-01-02T00:00:00"
+        assert out["df"] == "<DataFrame shape=(2, 1)>"
+        assert out["nested"] == [[1, True]]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# run()
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestRun:
+
+    @pytest.mark.parametrize("n_workers", [1, 2])
+    def test_subset(self, export, tmp_path, n_workers):
+        progress = []
+        summary = runner.run(
+            export, tmp_path / "work",
+            config={"precheck": {"allow_not_ready": True}},
+            stages=["parse", "precheck"],
+            n_workers=n_workers,
+            progress_cb=lambda stage, f, m: progress.append(stage),
+        )
+        json.dumps(summary)
+        assert summary["ok"] and summary["dependencies"] == {"precheck": [], "parse": ["precheck"]}
+        assert [s["stage"] for s in summary["stages"]] == ["precheck", "parse"]
+        for rec in summary["stages"]:
+            assert rec["status"] == "ok" and rec["error"] is None
+            assert rec["wall_s"] >= 0 and rec["cpu_s"] >= 0
+            assert rec["rss_scope"] in ("stage", "process")
+        assert summary["stages"][0]["result"]["format"] == "chatgpt"
+        assert summary["stages"][1]["result"]["threads"] == 12
+        assert set(progress) <= {"precheck", "parse"} and progress
+
+        steps = [s["name"] for s in summary["stages"][1]["result"]["instrumentation"]["steps"]]
+        assert steps == ["Load JSON", "Extract messages", "Write SQLite", "Thread features"]
+        trace = json.loads(Path(summary["trace"]).read_text())
+        names = {e["name"] for e in trace["traceEvents"] if e["ph"] == "X"}
+        assert {"precheck", "parse", "Load JSON", "Write SQLite"} <= names
+
+        con = sqlite3.connect(tmp_path / "work" / "conversations.db")
+        assert con.execute("SELECT COUNT(*) FROM messages WHERE role = 'user'").fetchone()[0] == 48
+        con.close()
+
+    @pytest.mark.parametrize("n_workers", [1, 2])
+    def test_failure_skips_remaining(self, export, tmp_path, n_workers):
+        # Three months of data: precheck's minimums are not met
+        summary = runner.run(export, tmp_path / "work", stages=["precheck", "parse", "profile"],
+                             n_workers=n_workers)
+        assert not summary["ok"]
+        statuses = [s["status"] for s in summary["stages"]]
+        assert statuses == ["failed", "skipped", "skipped"]
+        failed = summary["stages"][0]
+        assert "allow_not_ready" in failed["error"]
+        assert failed["wall_s"] is not None and "traceback" in failed["result"]
+        assert summary["stages"][1]["wall_s"] is None
+
+    def test_parse_needs_format(self, export, tmp_path):
+        summary = runner.run(export, tmp_path / "work", stages=["parse"])
+        assert "format unknown" in summary["stages"][0]["error"]
+        summary = runner.run(export, tmp_path / "work", stages=["parse"],
+                             config={"parse": {"fmt": "chatgpt"}})
+        assert summary["ok"]
+
+    def test_unknown_stage(self, export, tmp_path):
+        with pytest.raises(ValueError, match="Unknown stage"):
+            runner.run(export, tmp_path / "work", stages=["parse", "report_html"])
+
+
+class TestCache:
+
+    CFG = {"precheck": {"allow_not_ready": True}, "profile": {"n_permutations": 99}}
+    STAGES = ["precheck", "parse", "profile"]
+
+    def _run(self, export, tmp_path, work, config=None, stages=None):
+        return runner.run(export, tmp_path / work, config=config or self.CFG,
+                          stages=stages or self.STAGES, n_workers=1,
+                          cache_dir=tmp_path / "cache")
+
+    @staticmethod
+    def _cached(summary):
+        return {r["stage"]: r["cached"] for r in summary["stages"]}
+
+    def test_second_session_restores(self, export, tmp_path):
+        first = self._run(export, tmp_path, "a")
+        assert first["ok"] and first["cache"]["hits"] == 0
+        second = self._run(export, tmp_path, "b")
+        assert second["ok"] and second["cache"]["hits"] == 3
+        for a, b in zip(first["stages"], second["stages"]):
+            assert a["cache_key"] == b["cache_key"]
+            a_inst, b_inst = a["result"].pop("instrumentation"), b["result"].pop("instrumentation")
+            assert a["result"] == b["result"]
+            assert b_inst == {**a_inst, "cached": True}
+        for rel in ("profile/trajectory_monthly.csv", "profile/spearman_results.csv"):
+            assert (tmp_path / "a" / rel).read_bytes() == (tmp_path / "b" / rel).read_bytes()
+        con = sqlite3.connect(tmp_path / "b" / "conversations.db")
+        assert con.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 96
+        assert con.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'message_markers'"
+        ).fetchone()[0] == 1
+        con.close()
+
+    def test_config_change_invalidates_downstream_only(self, export, tmp_path):
+        self._run(export, tmp_path, "a")
+        cfg = {**self.CFG, "profile": {"n_permutations": 49}}
+        summary = self._run(export, tmp_path, "b", config=cfg)
+        assert self._cached(summary) == {"precheck": True, "parse": True, "profile": False}
+
+    def test_export_change_invalidates_everything(self, export, tmp_path):
+        self._run(export, tmp_path, "a")
+        export.write_text(export.read_text().replace("message 0", "message zero"))
+        summary = self._run(export, tmp_path, "b")
+        assert not any(self._cached(summary).values())
+
+    def test_partial_ancestry_not_cached(self, export, tmp_path):
+        self._run(export, tmp_path, "a")
+        summary = self._run(export, tmp_path, "a", stages=["profile"])
+        assert summary["stages"][0]["cache_key"] is None and not summary["stages"][0]["cached"]
+
+    def test_unreadable_entry_recomputed(self, export, tmp_path):
+        first = self._run(export, tmp_path, "a")
+        key = first["stages"][2]["cache_key"]
+        (tmp_path / "cache" / key[:2] / key / "result.pkl").write_bytes(b"garbage")
+        summary = self._run(export, tmp_path, "b")
+        assert summary["ok"]
+        assert self._cached(summary) == {"precheck": True, "parse": True, "profile": False}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TestMain:
+
+    def test_summary_file_and_exit_code(self, export, tmp_path):
+        cfg = tmp_path / "run.json"
+        cfg.write_text(json.dumps({"precheck": {"allow_not_ready": True}}))
+        work = tmp_path / "work"
+        rc = runner.main([str(export), "--out", str(work), "--config", str(cfg),
+                          "--stages", "precheck,parse", "--cache-dir", str(tmp_path / "cache"),
+                          "--quiet"])
+        assert rc == 0
+        summary = json.loads((work / "run_summary.json").read_text())
+        assert summary["version"] == runner.SUMMARY_VERSION
+        assert [s["status"] for s in summary["stages"]] == ["ok", "ok"]
+
+        assert runner.main([str(export), "--out", str(work), "--stages", "precheck",
+                            "--no-cache", "--quiet"]) == 1
+
+    def test_summary_stdout(self, export, tmp_path, capsys):
+        runner.main([str(export), "--out", str(tmp_path / "work"), "--stages", "parse",
+                     "--summary", "-", "--no-cache", "--quiet"])
+        summary = json.loads(capsys.readouterr().out)
+        assert summary["stages"][0]["stage"] == "parse"
+
+    def test_does_not_import_streamlit(self, export, tmp_path):
+        code = (
+            "import sys\n"
+            "from pipeline import runner\n"
+            f"runner.main([{str(export)!r}, '--out', {str(tmp_path / 'work')!r},"
+            " '--stages', 'precheck', '--no-cache', '--quiet'])\n"
+            "assert 'streamlit' not in sys.modules\n"
+        )
+        repo = Path(__file__).resolve().parents[1]
+        proc = subprocess.run([sys.executable, "-c", code], cwd=repo,
+                              capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,126 @@
+"""
+Tests for pipeline/scheduler.py and pipeline/db.py
+
+Run with:  pytest tests/
+
+Covers:
+    - load_graph         (DEPENDS_ON of the real stage modules, subsets bridged
+                          to the nearest scheduled ancestor)
+    - topological_order  (dependency order, cycles rejected)
+    - run()              (in-process and process pool give the same outcomes,
+                          dependencies finish before dependents start, a failure
+                          skips only downstream stages, StageError payloads,
+                          ancestor values passed as inputs)
+    - db.connect         (WAL mode, concurrent reader while another process writes)
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import time
+
+import pytest
+
+from pipeline import db, scheduler
+from pipeline.runner import STAGE_MODULES
+
+DIAMOND = {"a": (), "b": ("a",), "c": ("a",), "d": ("b", "c"), "e": ()}
+
+
+def _task(stage: str, inputs: dict):
+    """Records start/end times; fails on 'b' and 'boom'."""
+    start = time.time()
+    time.sleep(0.05)
+    if stage == "b":
+        raise scheduler.StageError("b broke", payload={"partial": 1})
+    if stage == "boom":
+        raise RuntimeError("plain failure")
+    return {"start": start, "end": time.time(), "inputs": sorted(inputs)}
+
+
+class TestGraph:
+
+    def test_pipeline_dag(self):
+        graph = scheduler.load_graph(STAGE_MODULES)
+        assert graph["precheck"] == ()
+        assert graph["profile"] == ("parse",)
+        assert graph["topics"] == ("parse",)
+        assert graph["alignment"] == graph["domains"] == ("topics",)
+        assert graph["coupling"] == graph["dynamics"] == ("domains",)
+        assert set(graph["report"]) == {"profile", "alignment", "coupling", "dynamics"}
+
+    def test_subset_bridges_missing_stages(self):
+        graph = scheduler.load_graph(STAGE_MODULES, ["dynamics", "topics", "coupling"])
+        assert graph == {"topics": (), "coupling": ("topics",), "dynamics": ("topics",)}
+
+    def test_order_and_cycle(self):
+        order = scheduler.topological_order(DIAMOND)
+        assert order.index("a") < order.index("b") < order.index("d")
+        assert order.index("c") < order.index("d")
+        with pytest.raises(ValueError, match="cycle"):
+            scheduler.topological_order({"x": ("y",), "y": ("x",)})
+
+    def test_ancestors(self):
+        assert scheduler.ancestors(DIAMOND, "d") == {"a", "b", "c"}
+        assert scheduler.ancestors(DIAMOND, "e") == set()
+
+
+class TestRun:
+
+    @pytest.mark.parametrize("n_workers", [1, 3])
+    def test_failure_skips_downstream_only(self, n_workers):
+        events = []
+        out = scheduler.run(DIAMOND, _task, n_workers=n_workers,
+                            on_event=lambda s, e: events.append((s, e)))
+        assert {s: o.status for s, o in out.items()} == {
+            "a": "ok", "b": "failed", "c": "ok", "d": "skipped", "e": "ok",
+        }
+        assert out["b"].error == "b broke" and out["b"].value == {"partial": 1}
+        assert out["c"].value["inputs"] == ["a"]
+        assert ("d", "skipped") in events and ("d", "started") not in events
+
+    def test_plain_exception(self):
+        out = scheduler.run({"boom": (), "after": ("boom",)}, _task, n_workers=2)
+        assert out["boom"].error == "RuntimeError: plain failure"
+        assert out["after"].status == "skipped"
+
+    def test_dependencies_respected_in_parallel(self):
+        graph = {"p": (), "q": ("p",), "r": ("p",), "s": ("r",), "t": ()}
+        out = scheduler.run(graph, _task, n_workers=3)
+        v = {s: o.value for s, o in out.items()}
+        assert all(o.status == "ok" for o in out.values())
+        assert v["q"]["start"] >= v["p"]["end"] and v["r"]["start"] >= v["p"]["end"]
+        assert v["s"]["start"] >= v["r"]["end"]
+        assert v["s"]["inputs"] == ["p", "r"]
+
+
+def _write_rows(path: str, n: int) -> None:
+    con = db.connect(path)
+    for i in range(n):
+        con.execute("INSERT INTO t VALUES (?)", (i,))
+        con.commit()
+    con.close()
+
+
+class TestConnect:
+
+    def test_wal(self, tmp_path):
+        con = db.connect(tmp_path / "x.db")
+        assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        con.close()
+
+    def test_read_while_another_process_writes(self, tmp_path):
+        path = str(tmp_path / "x.db")
+        con = db.connect(path)
+        con.execute("CREATE TABLE t (x INTEGER)")
+        con.commit()
+
+        writer = multiprocessing.get_context().Process(target=_write_rows, args=(path, 300))
+        writer.start()
+        seen = 0
+        while writer.is_alive():
+            seen = max(seen, con.execute("SELECT COUNT(*) FROM t").fetchone()[0])
+        writer.join()
+        assert writer.exitcode == 0
+        assert con.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 300
+        con.close()
@@ -0,0 +1,144 @@
+"""
+Tests for pipeline/synthetic.py
+
+Run with:  pytest tests/
+
+Covers:
+    - parse_count       (k / M suffixes, integers, junk rejected)
+    - ChatGPT exports   (exact main-path message count through parse.run,
+                         branches present but off the main path, detected
+                         by precheck)
+    - Claude exports    (linear chat_messages through parse.run)
+    - config            (months covered, topic mixture, duplicate rate,
+                         same seed → identical file)
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from collections import Counter
+
+import pytest
+
+from pipeline import parse, precheck, synthetic
+
+
+def _messages(db_path) -> list[tuple]:
+    con = sqlite3.connect(db_path)
+    rows = con.execute("SELECT role, year_month, text FROM messages").fetchall()
+    con.close()
+    return rows
+
+
+class TestParseCount:
+
+    @pytest.mark.parametrize("text, expected", [
+        ("10k", 10_000), ("1M", 1_000_000), ("2.5k", 2_500), ("1_000", 1_000), (42, 42),
+    ])
+    def test_values(self, text, expected):
+        assert synthetic.parse_count(text) == expected
+
+    @pytest.mark.parametrize("text", ["ten", "1.5", "-3k"])
+    def test_rejected(self, text):
+        with pytest.raises(ValueError):
+            synthetic.parse_count(text)
+
+
+class TestChatGPT:
+
+    def test_parsed_message_count(self, tmp_path):
+        stats = synthetic.write_export(tmp_path / "c.json", "chatgpt",
+                                       {"n_messages": 1_500, "months": 4, "branch_rate": 0.3})
+        summary = parse.run(tmp_path / "c.json", tmp_path / "c.db", "chatgpt")
+
+        assert stats["messages"] == summary["messages"] == 1_500
+        assert stats["conversations"] == summary["threads"]
+        assert stats["branch_nodes"] > 0
+
+    def test_branches_off_main_path(self, tmp_path):
+        convs = list(synthetic.conversations("chatgpt", {"n_messages": 400, "branch_rate": 0.5}))
+        n_nodes = sum(
+            1 for c in convs for node in c["mapping"].values()
+            if (node["message"] or {}).get("author", {}).get("role") in ("user", "assistant")
+        )
+        assert n_nodes > 400
+        assert any(len(n["children"]) > 1 for c in convs for n in c["mapping"].values())
+
+        synthetic.write_export(tmp_path / "c.json", "chatgpt",
+                               {"n_messages": 400, "branch_rate": 0.5})
+        parse.run(tmp_path / "c.json", tmp_path / "c.db", "chatgpt")
+        roles = [role for role, _, _ in _messages(tmp_path / "c.db")]
+        assert len(roles) == 400
+        assert Counter(roles) == {"user": 200, "assistant": 200}
+
+    def test_precheck_detects(self, tmp_path):
+        synthetic.write_export(tmp_path / "c.json", "chatgpt", {"n_messages": 3_000, "months": 3})
+        result = precheck.run(tmp_path / "c.json")
+        assert result.format == "chatgpt"
+        assert result.months_covered == 3
+        assert result.passes_conversation_minimum and result.passes_avg_msgs_minimum
+
+
+class TestClaude:
+
+    def test_parsed(self, tmp_path):
+        stats = synthetic.write_export(tmp_path / "k.json", "claude", {"n_messages": 801})
+        summary = parse.run(tmp_path / "k.json", tmp_path / "k.db", "claude")
+        assert summary["messages"] == stats["messages"] == 801
+        assert stats["branch_nodes"] == 0
+
+        data = json.loads((tmp_path / "k.json").read_text())
+        msg = data[0]["chat_messages"][0]
+        assert msg["sender"] == "human" and msg["created_at"].endswith("Z")
+        assert msg["content"] == [{"type": "text", "text": msg["text"]}]
+
+
+class TestConfig:
+
+    def test_months(self, tmp_path):
+        synthetic.write_export(tmp_path / "c.json", "claude",
+                               {"n_messages": 1_200, "months": 6, "start": "2024-11"})
+        parse.run(tmp_path / "c.json", tmp_path / "c.db", "claude")
+        per_month = Counter(ym for _, ym, _ in _messages(tmp_path / "c.db"))
+        assert sorted(per_month) == ["2024-11", "2024-12", "2025-01",
+                                     "2025-02", "2025-03", "2025-04"]
+        assert min(per_month.values()) >= 150
+
+    def test_topic_mix(self):
+        convs = synthetic.conversations("claude", {
+            "n_messages": 600, "topic_mix": {"cooking": 1}, "topic_switch": 0.0,
+        })
+        vocab = set(synthetic.TOPICS["cooking"]) | set(synthetic.FILLER)
+        for conv in convs:
+            for msg in conv["chat_messages"]:
+                if msg["sender"] == "assistant":
+                    words = {w.strip(".").lower() for w in msg["text"].split()}
+                    assert words <= vocab
+
+    def test_topic_mix_rejected(self):
+        with pytest.raises(ValueError, match="Unknown topic"):
+            list(synthetic.conversations("chatgpt", {"topic_mix": {"knitting": 1}}))
+        with pytest.raises(ValueError, match="weights"):
+            list(synthetic.conversations("chatgpt", {"topic_mix": [1, 2]}))
+
+    def test_duplicate_rate(self):
+        stats: dict = {}
+        convs = list(synthetic.conversations(
+            "claude", {"n_messages": 4_000, "duplicate_rate": 0.25}, stats))
+        prompts = [m["text"] for c in convs for m in c["chat_messages"] if m["sender"] == "human"]
+        repeats = len(prompts) - len(set(prompts))
+        assert 0.18 <= stats["duplicates"] / len(prompts) <= 0.32
+        assert repeats >= stats["duplicates"] * 0.9
+
+        none = synthetic.conversations("claude", {"n_messages": 2_000, "duplicate_rate": 0.0})
+        prompts = [m["text"] for c in none for m in c["chat_messages"] if m["sender"] == "human"]
+        assert len(set(prompts)) == len(prompts)
+
+    def test_seed_reproducible(self, tmp_path):
+        for name in ("a", "b"):
+            synthetic.write_export(tmp_path / f"{name}.json", "chatgpt",
+                                   {"n_messages": 500, "seed": 7})
+        synthetic.write_export(tmp_path / "c.json", "chatgpt", {"n_messages": 500, "seed": 8})
+        a, b, c = ((tmp_path / f"{n}.json").read_bytes() for n in "abc")
+        assert a == b and a != c
@@ -0,0 +1,157 @@
+"""
+Tests for pipeline/threads.py
+
+Run with:  pytest tests/
+
+Covers:
+    - compute_features (same values as a per-thread pandas scan)
+    - refresh(): full build, incremental refresh of touched / new / deleted
+      threads, create=False on a database without the table
+    - load() with a WHERE filter
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import zlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import threads
+
+
+def _messages(seed: int = 0, n_threads: int = 30) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for t in range(n_threads):
+        start = 1_700_000_000 + t * 10_000
+        for i in range(int(rng.integers(1, 25))):
+            rows.append({
+                "node_id":    f"t{t}-m{i}",
+                "thread_id":  f"t{t:03d}",
+                "role":       "user" if i % 2 == 0 else "assistant",
+                "timestamp":  float(start + i * 60),
+                "char_count": int(rng.integers(10, 500)),
+            })
+    return pd.DataFrame(rows)
+
+
+def _write_db(path, msgs: pd.DataFrame) -> None:
+    """Messages plus a domain mapping that is stable per node (≈10 % unmapped)."""
+    con = sqlite3.connect(path)
+    msgs.to_sql("messages", con, index=False, if_exists="replace")
+    h = np.array([zlib.crc32(n.encode()) for n in msgs["node_id"]])
+    mapped = h % 10 != 0
+    pd.DataFrame({
+        "node_id": msgs["node_id"][mapped],
+        "macro_domain": (h[mapped] // 10) % 4,
+    }).to_sql("node_to_macro_domain", con, index=False, if_exists="replace")
+    con.close()
+
+
+def _reference(db) -> pd.DataFrame:
+    con = sqlite3.connect(db)
+    df = pd.read_sql_query(
+        """SELECT m.thread_id, m.role, m.timestamp, m.char_count, n.macro_domain
+           FROM messages m LEFT JOIN node_to_macro_domain n ON m.node_id = n.node_id
+           ORDER BY m.thread_id, m.timestamp""",
+        con,
+    )
+    con.close()
+    rows = []
+    for tid, g in df.groupby("thread_id"):
+        d = g["macro_domain"].dropna().astype(int).tolist()
+        roles = g.loc[g["macro_domain"].notna(), "role"].tolist()
+        shifts = [i for i in range(1, len(d)) if d[i] != d[i - 1]]
+        counts = pd.Series(d).value_counts()
+        rows.append({
+            "thread_id":       tid,
+            "n_messages":      len(g),
+            "user_msgs":       int((g["role"] == "user").sum()),
+            "user_chars":      int(g.loc[g["role"] == "user", "char_count"].sum()),
+            "duration_s":      g["timestamp"].max() - g["timestamp"].min(),
+            "n_mapped":        len(d),
+            "n_domains":       len(set(d)),
+            "first_domain":    d[0] if d else None,
+            "dominant_domain": int(counts[counts == counts.max()].index.min()) if d else None,
+            "n_shifts":        len(shifts),
+            "user_shifts":     sum(roles[i] == "user" for i in shifts),
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "conversations.db"
+    _write_db(path, _messages())
+    return path
+
+
+class TestFeatures:
+
+    def test_matches_per_thread_scan(self, db):
+        threads.refresh(db, full=True)
+        got = threads.load(db)
+        expected = _reference(db)
+        for col in expected.columns:
+            np.testing.assert_array_equal(
+                got[col].astype(object).where(got[col].notna(), None).tolist(),
+                expected[col].astype(object).where(expected[col].notna(), None).tolist(),
+                err_msg=col,
+            )
+
+    def test_without_domain_table(self, tmp_path):
+        path = tmp_path / "conversations.db"
+        con = sqlite3.connect(path)
+        _messages(n_threads=3).to_sql("messages", con, index=False)
+        con.close()
+        threads.refresh(path)
+        got = threads.load(path)
+        assert len(got) == 3
+        assert (got["n_mapped"] == 0).all() and got["first_domain"].isna().all()
+
+
+class TestRefresh:
+
+    def test_incremental_matches_full_rebuild(self, db, tmp_path):
+        assert threads.refresh(db)["refreshed"] == 30
+
+        # Re-ingest: one thread grows, one disappears, one is new
+        msgs = _messages()
+        grown = msgs[msgs["thread_id"] == "t005"].iloc[[-1]].assign(
+            node_id="t5-extra", timestamp=lambda d: d["timestamp"] + 60,
+        )
+        new = _messages(seed=9, n_threads=1).assign(
+            thread_id="t999", node_id=lambda d: "new-" + d["node_id"],
+        )
+        msgs = pd.concat([msgs[msgs["thread_id"] != "t007"], grown, new], ignore_index=True)
+        _write_db(db, msgs)
+
+        summary = threads.refresh(db, thread_ids=["t001"])
+        # t005 (signature changed), t999 (new), t001 (explicitly touched)
+        assert summary["refreshed"] == 3
+        assert summary["deleted"] == 1
+        assert summary["threads"] == 30
+
+        incremental = threads.load(db)
+        threads.refresh(db, full=True)
+        pd.testing.assert_frame_equal(incremental, threads.load(db))
+
+    def test_nothing_to_do(self, db):
+        threads.refresh(db)
+        assert threads.refresh(db)["refreshed"] == 0
+
+    def test_create_false(self, db):
+        assert threads.refresh(db, create=False) == {}
+        con = sqlite3.connect(db)
+        assert con.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'thread_features'"
+        ).fetchone()[0] == 0
+        con.close()
+
+    def test_load_filter_builds_table(self, db):
+        long_threads = threads.load(db, where="n_mapped >= ?", params=(10,))
+        assert (long_threads["n_mapped"] >= 10).all()
+        assert len(long_threads) == int((_reference(db)["n_mapped"] >= 10).sum())